@@ -1,13 +1,20 @@
 """
 管理员功能API端点
 """
-from typing import Any, Dict, List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Any, Dict, List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from pydantic import BaseModel, Field
+import asyncio
 import logging
 
 from app.core.config import settings
-from app.db.mysql_client import mysql_client
+from app.db.async_client import db
+from app.db.instrumentation import reset_query_stats, slow_queries, top_queries, transaction_stats
 from app.schemas.common import ResponseModel
+from app.services import lottery, seats
+from app.services.enrollment_queue import enrollment_queue
+from app.services.prerequisites import prerequisite_graph
+from app.services.seat_ledger import seat_ledger
 from app.api.v1.endpoints.auth import get_current_user
 
 logger = logging.getLogger(__name__)
@@ -15,6 +22,14 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
+class RegistrationLotteryRequest(BaseModel):
+    seed: int = Field(..., description="随机种子，相同种子和志愿得到相同结果")
+    weighting: Literal["random", "seniority"] = Field(
+        "random", description="random: 等概率抽签; seniority: 按年级加权，高年级优先"
+    )
+    dry_run: bool = Field(False, description="只计算分配结果，不写入")
+
+
 @router.get("/statistics", response_model=ResponseModel[Dict[str, Any]])
 async def get_admin_statistics(
     current_user: Dict[str, Any] = Depends(get_current_user)
@@ -118,4 +133,232 @@ async def get_recent_activities(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="获取活动记录失败"
-        ) 
\ No newline at end of file
+        ) 
+
+_QUERY_SORT_KEYS = ("total_ms", "avg_ms", "max_ms", "p95_ms", "count", "errors", "rows")
+
+
+@router.get("/db/queries", response_model=ResponseModel[List[Dict[str, Any]]])
+async def get_top_queries(
+    top: int = Query(10, ge=1, le=200, description="返回条数"),
+    sort: str = Query("total_ms", description=f"排序字段: {' / '.join(_QUERY_SORT_KEYS)}"),
+    by_endpoint: bool = Query(True, description="是否按调用接口分别统计"),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+) -> ResponseModel[List[Dict[str, Any]]]:
+    """
+    获取按SQL指纹统计的最耗时查询（本进程启动或上次清空以来）
+    """
+    if current_user.get("user_type") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="只有管理员可以查看查询统计"
+        )
+    if sort not in _QUERY_SORT_KEYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"不支持的排序字段: {sort}"
+        )
+
+    return ResponseModel(
+        code=200,
+        message="获取查询统计成功",
+        data=top_queries(top, sort, by_endpoint)
+    )
+
+
+@router.get("/db/slow-queries", response_model=ResponseModel[List[Dict[str, Any]]])
+async def get_slow_queries(
+    limit: int = Query(50, ge=1, le=settings.SLOW_QUERY_LOG_SIZE, description="返回条数"),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+) -> ResponseModel[List[Dict[str, Any]]]:
+    """
+    获取最近的慢查询（耗时超过 SLOW_QUERY_THRESHOLD_MS），最新的在前
+    """
+    if current_user.get("user_type") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="只有管理员可以查看慢查询"
+        )
+
+    return ResponseModel(
+        code=200,
+        message="获取慢查询成功",
+        data=slow_queries(limit)
+    )
+
+
+@router.get("/db/transactions", response_model=ResponseModel[List[Dict[str, Any]]])
+async def get_transaction_retry_stats(
+    current_user: Dict[str, Any] = Depends(get_current_user)
+) -> ResponseModel[List[Dict[str, Any]]]:
+    """
+    获取各接口的事务次数和因死锁、锁等待超时产生的重试次数
+    """
+    if current_user.get("user_type") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="只有管理员可以查看事务统计"
+        )
+
+    return ResponseModel(
+        code=200,
+        message="获取事务统计成功",
+        data=transaction_stats()
+    )
+
+
+@router.delete("/db/queries", response_model=ResponseModel[None])
+async def clear_query_stats(
+    current_user: Dict[str, Any] = Depends(get_current_user)
+) -> ResponseModel[None]:
+    """
+    清空查询统计、慢查询记录和事务重试统计
+    """
+    if current_user.get("user_type") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="只有管理员可以清空查询统计"
+        )
+
+    reset_query_stats()
+    return ResponseModel(code=200, message="查询统计已清空", data=None)
+
+
+@router.get("/db/cache", response_model=ResponseModel[Dict[str, Any]])
+async def get_query_cache_status(
+    top: int = Query(20, ge=0, le=200, description="返回的语句条数"),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+) -> ResponseModel[Dict[str, Any]]:
+    """
+    获取查询结果缓存状态和各语句的命中率
+    """
+    if current_user.get("user_type") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="只有管理员可以查看缓存状态"
+        )
+
+    return ResponseModel(
+        code=200,
+        message="获取缓存状态成功",
+        data=db.client.cache.status(top)
+    )
+
+
+@router.delete("/db/cache", response_model=ResponseModel[None])
+async def clear_query_cache(
+    current_user: Dict[str, Any] = Depends(get_current_user)
+) -> ResponseModel[None]:
+    """
+    清空查询结果缓存
+    """
+    if current_user.get("user_type") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="只有管理员可以清空缓存"
+        )
+
+    db.client.cache.clear()
+    return ResponseModel(code=200, message="查询结果缓存已清空", data=None)
+
+
+@router.get("/seat-ledger", response_model=ResponseModel[Dict[str, Any]])
+async def get_seat_ledger_status(
+    current_user: Dict[str, Any] = Depends(get_current_user)
+) -> ResponseModel[Dict[str, Any]]:
+    """
+    获取选课名额账本状态（拒绝、批量写入和回退逐条写入的次数）
+    """
+    if current_user.get("user_type") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="只有管理员可以查看名额账本"
+        )
+
+    return ResponseModel(
+        code=200,
+        message="获取名额账本状态成功",
+        data=seat_ledger.status()
+    )
+
+
+@router.get("/enrollment-queue", response_model=ResponseModel[Dict[str, Any]])
+async def get_enrollment_queue_status(
+    current_user: Dict[str, Any] = Depends(get_current_user)
+) -> ResponseModel[Dict[str, Any]]:
+    """
+    获取选课排队状态（排队人数、等待时间分位数和处理结果统计）
+    """
+    if current_user.get("user_type") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="只有管理员可以查看选课排队"
+        )
+
+    return ResponseModel(
+        code=200,
+        message="获取选课排队状态成功",
+        data=enrollment_queue.status()
+    )
+
+
+@router.post("/registration-lottery", response_model=ResponseModel[Dict[str, Any]])
+async def run_registration_lottery(
+    lottery_data: RegistrationLotteryRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+) -> ResponseModel[Dict[str, Any]]:
+    """
+    预选课抽签分配
+    预选窗口结束后运行：按抽签顺序分轮分配志愿（遵守人数上限、时间冲突和先修课程），
+    在一个事务中批量写入选课记录并清空志愿表；dry_run 时只返回统计
+    """
+    try:
+        if current_user.get("user_type") != "admin":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="只有管理员可以运行抽签"
+            )
+
+        if not lottery.cart_closed():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="预选尚未结束，不能抽签"
+            )
+
+        data = await lottery.load(db)
+        await prerequisite_graph.ensure(db)
+        weights = lottery.seniority_weights(data["grades"]) if lottery_data.weighting == lottery.SENIORITY else None
+        # 分配是纯计算，放到线程中执行，不阻塞事件循环
+        result = await asyncio.to_thread(
+            lottery.allocate, data["carts"], data["courses"], data["enrollments"],
+            lottery_data.seed, weights, prerequisite_graph
+        )
+        stats = {**result["stats"], "weighting": lottery_data.weighting, "dry_run": lottery_data.dry_run}
+
+        if not lottery_data.dry_run:
+            try:
+                await db.run_transaction(
+                    lambda tx: lottery.write(tx, result["assignments"], data["enrollments"])
+                )
+            except seats.SeatUnavailableError as e:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f"课程 {e} 的名额在抽签期间发生变化，请重新运行抽签"
+                )
+            if seat_ledger.enabled:
+                await seat_ledger.reconcile()
+
+        return ResponseModel(
+            code=200,
+            message="抽签分配完成" if not lottery_data.dry_run else "抽签试算完成",
+            data=stats
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"抽签分配失败: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="抽签分配失败"
+        )
@@ -11,7 +11,7 @@ from passlib.context import CryptContext
 import logging
 
 from app.core.config import settings
-from app.db.mysql_client import mysql_client
+from app.db.async_client import db
 from app.schemas.auth import Token, UserLogin, UserRegister, UserResponse
 from app.schemas.common import ResponseModel
 from app.utils.security import create_access_token, verify_password, get_password_hash
@@ -25,30 +25,50 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # OAuth2 方案
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
+# 可选认证：未携带令牌时不返回401
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login", auto_error=False)
+
+
+def database_error(detail: str) -> HTTPException:
+    """元组接口调用失败时的响应：熔断中返回503提示稍后重试，其他数据库错误返回500和 detail"""
+    if db.unavailable:
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="数据库暂时不可用，请稍后重试"
+        )
+    return HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail=detail
+    )
 
 
 async def get_user_by_id(user_id: str, user_type: str = "student") -> Optional[Dict[str, Any]]:
-    """根据用户ID获取用户信息"""
-    try:
-        if user_type == "student":
-            table = "students"
-            id_field = "student_id"
-        else:
-            table = "administrators"
-            id_field = "admin_id"
-        
-        success, results, error = mysql_client.select(
-            table=table,
-            where={id_field: user_id}
+    """
+    根据用户ID获取用户信息，用户不存在时返回None
+    数据库查询失败时抛出503，不能当作用户不存在处理（否则会退回默认测试账户）
+    """
+    if user_type == "student":
+        table = "students"
+        id_field = "student_id"
+    else:
+        table = "administrators"
+        id_field = "admin_id"
+
+    success, results, error = await db.select(
+        table=table,
+        where={id_field: user_id}
+    )
+
+    if not success:
+        logger.error(f"获取用户信息失败: {error}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="数据库暂时不可用，请稍后重试"
         )
-        
-        if success and results:
-            return results[0]
-        return None
-        
-    except Exception as e:
-        logger.error(f"获取用户信息失败: {str(e)}")
-        return None
+    if results:
+        # 调用方会补充 user_type 等字段，转换为可修改的字典
+        return dict(results[0])
+    return None
 
 
 async def authenticate_user(username: str, password: str) -> Optional[Dict[str, Any]]:
@@ -63,7 +83,7 @@ async def authenticate_user(username: str, password: str) -> Optional[Dict[str,
             user = await get_user_by_id(username, "admin")
             user_type = "admin"
 
-        # 如果数据库中没找到，尝试使用默认测试账户（当数据库不可用时）
+        # 如果数据库中没找到，尝试使用默认测试账户（数据库不可用时上面已经返回503）
         if not user:
             # 默认测试账户 (使用预计算的哈希值)
             default_users = {
@@ -115,6 +135,8 @@ async def authenticate_user(username: str, password: str) -> Optional[Dict[str,
 
         return user
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"用户认证失败: {str(e)}")
         return None
@@ -132,7 +154,7 @@ async def record_login_log(user_id: str, user_type: str, status: str,
             "user_agent": user_agent or "unknown"
         }
         
-        success, insert_id, error = mysql_client.insert("login_logs", log_data)
+        success, insert_id, error = await db.insert("login_logs", log_data)
         if not success:
             logger.error(f"记录登录日志失败: {error}")
             
@@ -200,6 +222,13 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict[str, Any
     return user
 
 
+async def get_optional_user(token: Optional[str] = Depends(optional_oauth2_scheme)) -> Optional[Dict[str, Any]]:
+    """获取当前用户，未携带令牌时返回None（令牌无效时仍返回401）"""
+    if not token:
+        return None
+    return await get_current_user(token)
+
+
 @router.post("/login", response_model=ResponseModel[Token])
 async def login(
     request: Request,
@@ -275,7 +304,7 @@ async def register(user_data: UserRegister) -> ResponseModel[UserResponse]:
     """
     try:
         # 检查学号是否已存在
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="students",
             where={"student_id": user_data.student_id}
         )
@@ -287,7 +316,7 @@ async def register(user_data: UserRegister) -> ResponseModel[UserResponse]:
             )
         
         # 检查身份证号是否已存在
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="students",
             where={"id_number": user_data.id_number}
         )
@@ -300,7 +329,7 @@ async def register(user_data: UserRegister) -> ResponseModel[UserResponse]:
         
         # 检查邮箱是否已存在
         if user_data.email:
-            success, results, error = mysql_client.select(
+            success, results, error = await db.select(
                 table="students",
                 where={"email": user_data.email}
             )
@@ -313,7 +342,7 @@ async def register(user_data: UserRegister) -> ResponseModel[UserResponse]:
         
         # 验证院系是否存在
         if user_data.department_id:
-            success, results, error = mysql_client.select(
+            success, results, error = await db.select(
                 table="departments",
                 where={"department_id": user_data.department_id}
             )
@@ -341,7 +370,7 @@ async def register(user_data: UserRegister) -> ResponseModel[UserResponse]:
             "status": "active"
         }
         
-        success, insert_id, error = mysql_client.insert("students", student_data)
+        success, insert_id, error = await db.insert("students", student_data)
         
         if not success:
             logger.error(f"注册失败: {error}")
@@ -444,7 +473,7 @@ async def logout(
         user_id = current_user["student_id"] if current_user["user_type"] == "student" else current_user["admin_id"]
         
         # 更新登录日志的登出时间
-        success, affected_rows, error = mysql_client.update(
+        success, affected_rows, error = await db.update(
             table="login_logs",
             data={"logout_time": datetime.now().isoformat()},
             where={
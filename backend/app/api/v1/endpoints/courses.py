@@ -17,9 +17,16 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 import logging
 
 from app.core.config import settings
-from app.db.mysql_client import mysql_client
+from app.db.async_client import db
+from app.db.statements import in_clause
 from app.schemas.common import ResponseModel, PaginationResponse
-from app.api.v1.endpoints.auth import get_current_user
+from app.services import waitlist
+from app.services.prerequisites import CyclicPrerequisiteError, prerequisite_graph
+from app.services.schedule_index import schedule_index
+from app.services.seat_ledger import seat_ledger
+from app.utils.course_validation import compile_schedule, mask_to_text, schedule_aligned, union_mask
+from app.api.v1.endpoints.auth import database_error, get_current_user, get_optional_user
+from app.api.v1.endpoints.websocket import push_notification
 
 logger = logging.getLogger(__name__)
 
@@ -42,6 +49,7 @@ class CourseCreate(BaseModel):
     max_students: int = Field(100, ge=1, description="最大选课人数")
     semester: Optional[str] = Field(None, max_length=20, description="开课学期")
     schedule: Optional[str] = Field(None, max_length=200, description="上课时间安排")
+    prerequisites: Optional[List[str]] = Field(None, description="先修课程号")
 
 class CourseUpdate(BaseModel):
     course_name: Optional[str] = Field(None, max_length=100, description="课程名称")
@@ -53,6 +61,7 @@ class CourseUpdate(BaseModel):
     max_students: Optional[int] = Field(None, ge=1, description="最大选课人数")
     semester: Optional[str] = Field(None, max_length=20, description="开课学期")
     schedule: Optional[str] = Field(None, max_length=200, description="上课时间安排")
+    prerequisites: Optional[List[str]] = Field(None, description="先修课程号（替换原有的先修课程）")
     status: Optional[str] = Field(None, description="课程状态")
 
 class CourseResponse(BaseModel):
@@ -68,9 +77,10 @@ class CourseResponse(BaseModel):
     current_students: int
     semester: Optional[str] = None
     schedule: Optional[str] = None
+    prerequisites: List[str] = []
     status: str
-    created_at: Optional[str] = None
-    updated_at: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
 
 
 @router.get("/", response_model=ResponseModel[PaginationResponse[CourseResponse]])
@@ -80,11 +90,15 @@ async def get_courses(
     department_id: Optional[str] = Query(None, description="院系ID"),
     semester: Optional[str] = Query(None, description="学期"),
     status: Optional[str] = Query(None, description="课程状态"),
-    search: Optional[str] = Query(None, description="搜索关键词")
+    search: Optional[str] = Query(None, description="搜索关键词"),
+    fits_schedule: bool = Query(False, description="只返回与当前学生在修课程时间不冲突的课程"),
+    current_user: Optional[Dict[str, Any]] = Depends(get_optional_user)
 ) -> ResponseModel[PaginationResponse[CourseResponse]]:
     """
     获取课程列表（分页）
-    支持按院系、学期、状态筛选，以及关键词搜索
+    支持按院系、学期、状态筛选，以及关键词搜索；
+    fits_schedule 时在课程时间索引上一次筛出不冲突且符合条件的课程号，只查询当前页（需要学生登录），
+    未指定状态时只返回开放选课（active）的课程
     """
     try:
         # 构建WHERE条件
@@ -109,6 +123,16 @@ async def get_courses(
         # 计算偏移量
         offset = (page - 1) * page_size
         
+        if fits_schedule:
+            # 按时间冲突筛选是为了找能选的课，未指定状态时排除未开放的课程
+            course_ids = await _fitting_course_ids(current_user, department_id, semester, status or "active", search)
+            total = len(course_ids)
+            page_ids = course_ids[offset:offset + page_size]
+            # 分页在筛选后的课程号上进行，这里只取当前页
+            params = {}
+            where_clause = f"courses.course_id IN ({in_clause(page_ids, params, 'p')})"
+            offset = 0
+        
         # 获取总数
         count_sql = f"""
         SELECT COUNT(*) as total 
@@ -116,15 +140,6 @@ async def get_courses(
         WHERE {where_clause}
         """
         
-        success, count_results, error = mysql_client.execute_raw_sql(count_sql, params)
-        if not success:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"查询课程总数失败: {error}"
-            )
-        
-        total = int(count_results[0]["total"]) if count_results else 0
-        
         # 获取分页数据
         data_sql = f"""
         SELECT 
@@ -137,18 +152,27 @@ async def get_courses(
         LIMIT {page_size} OFFSET {offset}
         """
         
-        success, results, error = mysql_client.execute_raw_sql(data_sql, params)
-        if not success:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"查询课程列表失败: {error}"
-            )
+        if fits_schedule and not page_ids:
+            results = []
+        else:
+            # 总数和当前页互不依赖，并发查询；按时间冲突筛选时总数已知，只查询当前页
+            statements = [(data_sql, params)] if fits_schedule else [(count_sql, params), (data_sql, params)]
+            success, rows, error = await db.execute_batch(statements, cache_ttl=settings.QUERY_CACHE_TTL)
+            if not success:
+                logger.error(f"查询课程列表失败: {error}")
+                raise database_error(f"查询课程列表失败: {error}")
+            results = rows[-1]
+            if not fits_schedule:
+                total = rows[0][0]["total"] if rows[0] else 0
         
         # 转换结果
+        await prerequisite_graph.ensure(db)
         courses = []
         for course in results:
             try:
-                courses.append(CourseResponse(**course))
+                courses.append(
+                    CourseResponse(**course, prerequisites=prerequisite_graph.direct(course["course_id"]))
+                )
             except Exception as e:
                 logger.warning(f"转换课程数据失败: {e}")
                 continue
@@ -178,6 +202,88 @@ async def get_courses(
         )
 
 
+async def _fitting_course_ids(current_user: Optional[Dict[str, Any]], department_id: Optional[str],
+                              semester: Optional[str], course_status: Optional[str],
+                              search: Optional[str]) -> List[str]:
+    """符合筛选条件、且与学生在修课程时间不冲突的课程号（按创建时间倒序）"""
+    if not current_user or current_user.get("user_type") != "student":
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="按时间冲突筛选需要学生登录"
+        )
+    success, enrolled, error = await db.execute_raw_sql(
+        """
+        SELECT c.schedule, c.schedule_mask
+        FROM enrollments e
+        JOIN courses c ON e.course_id = c.course_id
+        WHERE e.student_id = :student_id AND e.status = 'enrolled'
+        """,
+        {"student_id": current_user["student_id"]}
+    )
+    if not success:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"查询课程列表失败: {error}"
+        )
+    await schedule_index.ensure(db)
+    return schedule_index.fits(union_mask(enrolled), department_id, semester, course_status, search)
+
+
+def _check_schedule(schedule: Optional[str]):
+    """上课时间须在5分钟整点上，时间位图才能精确判断冲突"""
+    if not schedule_aligned(schedule):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="上课时间的起止时间须为5分钟的整数倍"
+        )
+
+
+async def _check_prerequisites(course_id: str, prerequisite_ids: List[str]):
+    """写入前检查先修课程：须已存在，且不能形成循环"""
+    if prerequisite_ids:
+        params: Dict[str, Any] = {}
+        success, rows, error = await db.execute_raw_sql(
+            f"SELECT course_id FROM courses WHERE course_id IN ({in_clause(prerequisite_ids, params, 'c')})", params
+        )
+        unknown = set(prerequisite_ids) - {row["course_id"] for row in rows} if success else set(prerequisite_ids)
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"先修课程不存在: {', '.join(sorted(unknown))}"
+            )
+
+    # 写入前按最新的关系检查循环
+    prerequisite_graph.invalidate()
+    await prerequisite_graph.ensure(db)
+    try:
+        prerequisite_graph.check_new_prerequisites(course_id, prerequisite_ids)
+    except CyclicPrerequisiteError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
+async def _replace_prerequisites(course_id: str, prerequisite_ids: List[str]):
+    """在一个事务中替换课程的先修课程"""
+    async def replace(tx):
+        await tx.execute("DELETE FROM course_prerequisites WHERE course_id = :course_id", {"course_id": course_id})
+        if prerequisite_ids:
+            success, _, error = await tx.insert_many("course_prerequisites", [
+                {"course_id": course_id, "prerequisite_id": prerequisite_id} for prerequisite_id in prerequisite_ids
+            ])
+            if not success:
+                raise RuntimeError(error)
+
+    await db.run_transaction(replace)
+    prerequisite_graph.invalidate()
+
+
+async def _with_prerequisites(course: Dict[str, Any]) -> CourseResponse:
+    await prerequisite_graph.ensure(db)
+    return CourseResponse(**course, prerequisites=prerequisite_graph.direct(course["course_id"]))
+
+
 @router.get("/{course_id}", response_model=ResponseModel[CourseResponse])
 async def get_course(course_id: str) -> ResponseModel[CourseResponse]:
     """
@@ -191,7 +297,9 @@ async def get_course(course_id: str) -> ResponseModel[CourseResponse]:
         WHERE courses.course_id = :course_id
         """
         
-        success, results, error = mysql_client.execute_raw_sql(sql, {"course_id": course_id})
+        success, results, error = await db.execute_raw_sql(
+            sql, {"course_id": course_id}, cache_ttl=settings.QUERY_CACHE_TTL
+        )
         
         if not success:
             raise HTTPException(
@@ -205,7 +313,7 @@ async def get_course(course_id: str) -> ResponseModel[CourseResponse]:
                 detail="课程不存在"
             )
         
-        course = CourseResponse(**results[0])
+        course = await _with_prerequisites(results[0])
         
         return ResponseModel(
             code=200,
@@ -241,7 +349,7 @@ async def create_course(
             )
         
         # 检查课程号是否已存在
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="courses",
             where={"course_id": course_data.course_id}
         )
@@ -253,7 +361,7 @@ async def create_course(
             )
         
         # 检查院系是否存在
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="departments",
             where={"department_id": course_data.department_id}
         )
@@ -264,18 +372,26 @@ async def create_course(
                 detail="院系不存在"
             )
         
+        _check_schedule(course_data.schedule)
+        prerequisite_ids = list(dict.fromkeys(course_data.prerequisites or []))
+        await _check_prerequisites(course_data.course_id, prerequisite_ids)
+        
         # 创建课程数据
-        course_dict = course_data.dict()
+        course_dict = course_data.dict(exclude={"prerequisites"})
         course_dict["current_students"] = 0
         course_dict["status"] = "active"
+        course_dict["schedule_mask"] = mask_to_text(compile_schedule(course_data.schedule))
         
-        success, insert_id, error = mysql_client.insert("courses", course_dict)
+        success, insert_id, error = await db.insert("courses", course_dict)
+        schedule_index.invalidate()
         
         if not success:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"创建课程失败: {error}"
             )
+        if prerequisite_ids:
+            await _replace_prerequisites(course_data.course_id, prerequisite_ids)
         
         # 获取创建的课程信息
         sql = """
@@ -285,12 +401,12 @@ async def create_course(
         WHERE courses.course_id = :course_id
         """
         
-        success, results, error = mysql_client.execute_raw_sql(sql, {"course_id": course_data.course_id})
+        success, results, error = await db.execute_raw_sql(sql, {"course_id": course_data.course_id})
         
         if success and results:
-            course = CourseResponse(**results[0])
+            course = await _with_prerequisites(results[0])
         else:
-            course = CourseResponse(**course_dict)
+            course = CourseResponse(**course_dict, prerequisites=prerequisite_ids)
         
         return ResponseModel(
             code=200,
@@ -327,7 +443,7 @@ async def update_course(
             )
         
         # 检查课程是否存在
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="courses",
             where={"course_id": course_id}
         )
@@ -339,26 +455,55 @@ async def update_course(
             )
         
         # 准备更新数据
-        update_data = {k: v for k, v in course_data.dict().items() if v is not None}
+        update_data = {k: v for k, v in course_data.dict(exclude={"prerequisites"}).items() if v is not None}
+        if "schedule" in update_data:
+            _check_schedule(update_data["schedule"])
+            update_data["schedule_mask"] = mask_to_text(compile_schedule(update_data["schedule"]))
         
-        if not update_data:
+        if not update_data and course_data.prerequisites is None:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="没有需要更新的数据"
             )
         
-        # 更新课程
-        success, affected_rows, error = mysql_client.update(
-            table="courses",
-            data=update_data,
-            where={"course_id": course_id}
-        )
+        if course_data.prerequisites is not None:
+            prerequisite_ids = list(dict.fromkeys(course_data.prerequisites))
+            await _check_prerequisites(course_id, prerequisite_ids)
         
-        if not success:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"更新课程失败: {error}"
-            )
+        # 更新课程；人数上限或状态变化可能空出名额，在同一事务中递补候补学生
+        promoted = []
+        if update_data:
+            await prerequisite_graph.ensure(db)
+
+            async def update(tx):
+                success, affected_rows, error = await tx.update(
+                    table="courses",
+                    data=update_data,
+                    where={"course_id": course_id}
+                )
+                if not success:
+                    return False, [], error
+                if "max_students" in update_data or "status" in update_data:
+                    return True, await waitlist.promote(tx, course_id, prerequisites=prerequisite_graph), ""
+                return True, [], ""
+
+            success, promoted, error = await db.run_transaction(update)
+            schedule_index.invalidate()
+            
+            if not success:
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail=f"更新课程失败: {error}"
+                )
+            # 人数上限、状态和递补占用的名额都不经过名额账本，按数据库重新对账
+            if seat_ledger.enabled and ("max_students" in update_data or "status" in update_data):
+                await seat_ledger.reconcile()
+        
+        if promoted:
+            await waitlist.notify(push_notification, promoted)
+        
+        if course_data.prerequisites is not None:
+            await _replace_prerequisites(course_id, prerequisite_ids)
         
         # 获取更新后的课程信息
         sql = """
@@ -368,7 +513,7 @@ async def update_course(
         WHERE courses.course_id = :course_id
         """
         
-        success, results, error = mysql_client.execute_raw_sql(sql, {"course_id": course_id})
+        success, results, error = await db.execute_raw_sql(sql, {"course_id": course_id})
         
         if not success or not results:
             raise HTTPException(
@@ -376,7 +521,7 @@ async def update_course(
                 detail="获取更新后的课程信息失败"
             )
         
-        course = CourseResponse(**results[0])
+        course = await _with_prerequisites(results[0])
         
         return ResponseModel(
             code=200,
@@ -412,7 +557,7 @@ async def delete_course(
             )
         
         # 检查课程是否存在
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="courses",
             where={"course_id": course_id}
         )
@@ -424,7 +569,7 @@ async def delete_course(
             )
         
         # 检查是否有学生选课
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="enrollments",
             where={"course_id": course_id}
         )
@@ -436,10 +581,12 @@ async def delete_course(
             )
         
         # 删除课程
-        success, deleted_rows, error = mysql_client.delete(
+        success, deleted_rows, error = await db.delete(
             table="courses",
             where={"course_id": course_id}
         )
+        schedule_index.invalidate()
+        prerequisite_graph.invalidate()
         
         if not success:
             raise HTTPException(
@@ -463,6 +610,46 @@ async def delete_course(
         )
 
 
+@router.get("/{course_id}/prerequisites", response_model=ResponseModel[Dict[str, Any]])
+async def get_course_prerequisites(
+    course_id: str,
+    current_user: Optional[Dict[str, Any]] = Depends(get_optional_user)
+) -> ResponseModel[Dict[str, Any]]:
+    """
+    获取课程的先修课程树和全部（传递）先修课程；学生登录时同时返回其缺少的直接先修课程
+    """
+    try:
+        await prerequisite_graph.ensure(db)
+        data: Dict[str, Any] = {
+            "tree": prerequisite_graph.tree(course_id),
+            "all_prerequisites": prerequisite_graph.all_prerequisites(course_id)
+        }
+        
+        if current_user and current_user.get("user_type") == "student":
+            success, results, error = await db.select(
+                table="enrollments",
+                columns=["course_id"],
+                where={"student_id": current_user["student_id"], "status": "completed"}
+            )
+            completed = [row["course_id"] for row in results] if success else []
+            data["missing"] = prerequisite_graph.missing(course_id, completed)
+        
+        return ResponseModel(
+            code=200,
+            message="获取先修课程成功",
+            data=data
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"获取先修课程失败: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="获取先修课程失败"
+        )
+
+
 @router.get("/{course_id}/enrollments", response_model=ResponseModel[List[Dict[str, Any]]])
 async def get_course_enrollments(
     course_id: str,
@@ -481,7 +668,7 @@ async def get_course_enrollments(
             )
         
         # 检查课程是否存在
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="courses",
             where={"course_id": course_id}
         )
@@ -493,7 +680,7 @@ async def get_course_enrollments(
             )
         
         # 获取选课学生信息
-        sql = f"""
+        sql = """
         SELECT 
             e.*,
             s.name as student_name,
@@ -502,11 +689,11 @@ async def get_course_enrollments(
             s.major as student_major
         FROM enrollments e
         LEFT JOIN students s ON e.student_id = s.student_id
-        WHERE e.course_id = '{course_id}'
+        WHERE e.course_id = :course_id
         ORDER BY e.enrollment_date DESC
         """
         
-        success, results, error = mysql_client.execute_raw_sql(sql)
+        success, results, error = await db.execute_raw_sql(sql, {"course_id": course_id})
         
         if not success:
             raise HTTPException(
@@ -12,12 +12,13 @@
   v1.0.0:
     - 初始骨架
 """
+from datetime import datetime
 from typing import Any, Dict, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 import logging
 
 from app.core.config import settings
-from app.db.mysql_client import mysql_client
+from app.db.async_client import db
 from app.schemas.common import ResponseModel, PaginationResponse
 from app.api.v1.endpoints.auth import get_current_user
 
@@ -43,8 +44,8 @@ class DepartmentResponse(BaseModel):
     description: Optional[str] = None
     student_count: Optional[int] = 0
     course_count: Optional[int] = 0
-    created_at: Optional[str] = None
-    updated_at: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
 
 
 @router.get("/", response_model=ResponseModel[List[DepartmentResponse]])
@@ -82,7 +83,7 @@ async def get_departments(
             # 基础查询
             sql = "SELECT * FROM departments ORDER BY department_id"
         
-        success, results, error = mysql_client.execute_raw_sql(sql)
+        success, results, error = await db.execute_raw_sql(sql, cache_ttl=settings.QUERY_CACHE_TTL)
         
         if not success:
             raise HTTPException(
@@ -148,7 +149,7 @@ async def get_department(
         else:
             sql = "SELECT * FROM departments WHERE department_id = :department_id"
         
-        success, results, error = mysql_client.execute_raw_sql(sql, {"department_id": department_id})
+        success, results, error = await db.execute_raw_sql(sql, {"department_id": department_id})
         
         if not success:
             raise HTTPException(
@@ -198,7 +199,7 @@ async def create_department(
             )
         
         # 检查院系ID是否已存在
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="departments",
             where={"department_id": department_data.department_id}
         )
@@ -210,7 +211,7 @@ async def create_department(
             )
         
         # 检查院系名称是否已存在
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="departments",
             where={"department_name": department_data.department_name}
         )
@@ -223,7 +224,7 @@ async def create_department(
         
         # 创建院系
         department_dict = department_data.dict()
-        success, insert_id, error = mysql_client.insert("departments", department_dict)
+        success, insert_id, error = await db.insert("departments", department_dict)
         
         if not success:
             raise HTTPException(
@@ -271,7 +272,7 @@ async def update_department(
             )
         
         # 检查院系是否存在
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="departments",
             where={"department_id": department_id}
         )
@@ -284,7 +285,7 @@ async def update_department(
         
         # 如果更新院系名称，检查名称是否已存在
         if department_data.department_name:
-            success, results, error = mysql_client.select(
+            success, results, error = await db.select(
                 table="departments",
                 where={"department_name": department_data.department_name}
             )
@@ -305,7 +306,7 @@ async def update_department(
             )
         
         # 更新院系
-        success, affected_rows, error = mysql_client.update(
+        success, affected_rows, error = await db.update(
             table="departments",
             data=update_data,
             where={"department_id": department_id}
@@ -339,7 +340,7 @@ async def update_department(
         WHERE d.department_id = :department_id
         """
         
-        success, results, error = mysql_client.execute_raw_sql(sql, {"department_id": department_id})
+        success, results, error = await db.execute_raw_sql(sql, {"department_id": department_id})
         
         if not success or not results:
             raise HTTPException(
@@ -383,7 +384,7 @@ async def delete_department(
             )
         
         # 检查院系是否存在
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="departments",
             where={"department_id": department_id}
         )
@@ -395,7 +396,7 @@ async def delete_department(
             )
         
         # 检查是否有学生
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="students",
             where={"department_id": department_id}
         )
@@ -407,7 +408,7 @@ async def delete_department(
             )
         
         # 检查是否有课程
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="courses",
             where={"department_id": department_id}
         )
@@ -419,7 +420,7 @@ async def delete_department(
             )
         
         # 删除院系
-        success, deleted_rows, error = mysql_client.delete(
+        success, deleted_rows, error = await db.delete(
             table="departments",
             where={"department_id": department_id}
         )
@@ -464,7 +465,7 @@ async def get_department_students(
             )
         
         # 检查院系是否存在
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="departments",
             where={"department_id": department_id}
         )
@@ -491,7 +492,7 @@ async def get_department_students(
         ORDER BY grade DESC, name
         """
         
-        success, results, error = mysql_client.execute_raw_sql(sql, {"department_id": department_id})
+        success, results, error = await db.execute_raw_sql(sql, {"department_id": department_id})
         
         if not success:
             raise HTTPException(
@@ -524,7 +525,7 @@ async def get_department_courses(
     """
     try:
         # 检查院系是否存在
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="departments",
             where={"department_id": department_id}
         )
@@ -553,7 +554,7 @@ async def get_department_courses(
         ORDER BY semester DESC, course_name
         """
         
-        success, results, error = mysql_client.execute_raw_sql(sql, {"department_id": department_id})
+        success, results, error = await db.execute_raw_sql(sql, {"department_id": department_id})
         
         if not success:
             raise HTTPException(
@@ -13,15 +13,24 @@
   v1.0.0:
     - 初始骨架
 """
-from typing import Any, Dict, List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from typing import Any, Dict, List, Literal, Optional, Union
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from fastapi.responses import StreamingResponse
 import logging
 from datetime import datetime
 
 from app.core.config import settings
-from app.db.mysql_client import mysql_client
+from app.db.async_client import db
+from app.db.statements import in_clause
 from app.schemas.common import ResponseModel, PaginationResponse
-from app.api.v1.endpoints.auth import get_current_user
+from app.services import batch_enrollment, lottery, planner, seats, waitlist
+from app.services.enrollment_queue import QueueFullError, enrollment_queue
+from app.services.prerequisites import prerequisite_graph
+from app.services.seat_ledger import seat_ledger
+from app.utils.course_validation import check_enrollment_conflicts
+from app.utils.export import attachment_headers, csv_stream
+from app.api.v1.endpoints.auth import database_error, get_current_user
+from app.api.v1.endpoints.websocket import push_notification
 
 logger = logging.getLogger(__name__)
 
@@ -49,22 +58,99 @@ class EnrollmentResponse(BaseModel):
     course_name: Optional[str] = None
     department_name: Optional[str] = None
     credits: Optional[float] = None
-    enrollment_date: Optional[str] = None
+    enrollment_date: Optional[datetime] = None
     grade: Optional[float] = None
-    grade_date: Optional[str] = None
+    grade_date: Optional[datetime] = None
     status: str
     remarks: Optional[str] = None
-    created_at: Optional[str] = None
-    updated_at: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
 
+class EnrollmentBatchRequest(BaseModel):
+    add: List[str] = Field(default_factory=list, max_length=20, description="要选的课程号")
+    drop: List[str] = Field(default_factory=list, max_length=20, description="要退的课程号")
+    mode: Literal["all_or_nothing", "best_effort"] = Field(
+        "best_effort", description="all_or_nothing: 全部成功才生效; best_effort: 跳过失败的课程"
+    )
 
-@router.post("/", response_model=ResponseModel[EnrollmentResponse])
+class EnrollmentBatchItem(BaseModel):
+    course_id: str
+    action: str
+    success: bool
+    enrollment_id: Optional[int] = None
+    message: str
+
+class EnrollmentBatchResponse(BaseModel):
+    mode: str
+    applied: bool = Field(..., description="是否有课程生效")
+    succeeded: int
+    failed: int
+    results: List[EnrollmentBatchItem]
+
+class EnrollmentPlanRequest(BaseModel):
+    course_ids: List[str] = Field(..., min_length=1, max_length=30, description="想选的课程号")
+    objective: Literal["count", "credits"] = Field(
+        "count", description="count: 课程数最多; credits: 学分最多"
+    )
+    limit: int = Field(3, ge=1, le=10, description="返回的方案数")
+
+class EnrollmentPlan(BaseModel):
+    rank: int
+    course_ids: List[str]
+    courses: List[Dict[str, Any]]
+    count: int
+    credits: float
+
+class EnrollmentPlanExcluded(BaseModel):
+    course_id: str
+    reason: str
+
+class EnrollmentPlanResponse(BaseModel):
+    objective: str
+    complete: bool = Field(..., description="是否在时间上限内搜索完所有组合")
+    elapsed_ms: float
+    plans: List[EnrollmentPlan]
+    excluded: List[EnrollmentPlanExcluded] = Field(..., description="不能选的课程及原因")
+
+class WaitlistCreate(BaseModel):
+    course_id: str
+
+class WaitlistResponse(BaseModel):
+    waitlist_id: int
+    course_id: str
+    course_name: Optional[str] = None
+    position: int = Field(..., description="排在前面的人数")
+    created_at: Optional[datetime] = None
+
+class RegistrationCartUpdate(BaseModel):
+    course_ids: List[str] = Field(..., description="按志愿排序的课程号，第一个为第一志愿")
+
+class RegistrationCartItem(BaseModel):
+    course_id: str
+    course_name: Optional[str] = None
+    choice_rank: int
+    schedule: Optional[str] = None
+
+class EnrollmentTicketResponse(BaseModel):
+    ticket_id: str
+    course_id: str
+    status: str = Field(..., description="queued/processing/enrolled/rejected/failed")
+    position: Optional[int] = Field(None, description="排在前面的人数")
+    enrollment_id: Optional[int] = None
+    message: Optional[str] = None
+    queued_at: datetime
+    finished_at: Optional[datetime] = None
+
+
+@router.post("/", response_model=ResponseModel[Union[EnrollmentResponse, EnrollmentTicketResponse]])
 async def enroll_course(
     enrollment_data: EnrollmentCreate,
+    response: Response,
     current_user: Dict[str, Any] = Depends(get_current_user)
-) -> ResponseModel[EnrollmentResponse]:
+) -> ResponseModel[Union[EnrollmentResponse, EnrollmentTicketResponse]]:
     """
     学生选课
+    启用选课排队时返回202和排队凭证，通过 GET /enrollments/tickets/{ticket_id} 或 WebSocket 获取结果
     """
     try:
         # 只有学生可以选课
@@ -77,8 +163,15 @@ async def enroll_course(
         student_id = current_user["student_id"]
         course_id = enrollment_data.course_id
         
+        # 启用名额账本时，已满的课程直接拒绝，不访问数据库
+        if seat_ledger.is_full(course_id):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="课程选课人数已满，可以加入候补"
+            )
+        
         # 检查课程是否存在且处于激活状态
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="courses",
             where={"course_id": course_id, "status": "active"}
         )
@@ -91,52 +184,86 @@ async def enroll_course(
         
         course = results[0]
         
-        # 检查是否已经选过这门课
-        success, results, error = mysql_client.select(
-            table="enrollments",
-            where={"student_id": student_id, "course_id": course_id}
+        # 读取学生的选课记录，检查是否已经选过这门课、先修课程以及与在修课程的时间冲突
+        success, results, error = await db.execute_raw_sql(
+            """
+            SELECT e.course_id, e.status, c.course_name, c.schedule, c.schedule_mask
+            FROM enrollments e
+            JOIN courses c ON e.course_id = c.course_id
+            WHERE e.student_id = :student_id
+            """,
+            {"student_id": student_id}
         )
         
-        if success and results:
-            existing_status = results[0]["status"]
-            if existing_status in ["enrolled", "completed"]:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="您已经选过这门课程"
-                )
-        
-        # 检查课程是否已满
-        current_students = int(course.get("current_students", 0))
-        max_students = int(course.get("max_students", 0))
+        # 读取失败时不能跳过先修课程和时间冲突检查
+        if not success:
+            logger.error(f"读取选课记录失败: {error}")
+            raise database_error("选课失败，请稍后重试")
+
+        existing = next((row for row in results if row["course_id"] == course_id), None)
+        if existing and existing["status"] in seats.SEAT_STATUSES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="您已经选过这门课程"
+            )
+        completed = [row["course_id"] for row in results if row["status"] == "completed"]
+        await prerequisite_graph.ensure(db)
+        missing = prerequisite_graph.missing(course_id, completed)
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"缺少先修课程: {', '.join(missing)}"
+            )
+        conflicts = check_enrollment_conflicts(
+            course, [row for row in results if row["status"] == "enrolled"]
+        )
+        if conflicts:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"与已选课程时间冲突: {', '.join(conflict['name'] for conflict in conflicts)}"
+            )
         
-        if current_students >= max_students:
+        # 课程已满时直接返回，不进入事务（只是提前判断，名额以事务内的条件更新为准）
+        if course["current_students"] >= course["max_students"]:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="课程选课人数已满"
-            )
-        
-        # 使用事务进行选课操作
-        with mysql_client.transaction():
-            # 创建选课记录
-            enrollment_dict = {
-                "student_id": student_id,
-                "course_id": course_id,
-                "status": "enrolled"
-            }
-            
-            success, insert_id, error = mysql_client.insert("enrollments", enrollment_dict)
-            
-            if not success:
+                detail="课程选课人数已满，可以加入候补"
+            )
+        
+        if enrollment_queue.enabled:
+            try:
+                ticket = enrollment_queue.submit(student_id, course_id)
+            except QueueFullError:
                 raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"选课失败: {error}"
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="选课排队人数过多，请稍后重试"
                 )
-            
-            # 更新课程当前人数（触发器会自动处理，这里作为备份）
-            success, affected_rows, error = mysql_client.update(
-                table="courses",
-                data={"current_students": current_students + 1},
-                where={"course_id": course_id}
+            response.status_code = status.HTTP_202_ACCEPTED
+            return ResponseModel(
+                code=202,
+                message="已进入选课排队",
+                data=EnrollmentTicketResponse(**ticket.to_dict(enrollment_queue.position(ticket)))
+            )
+        
+        # 选课事务：带条件地占用名额并写入选课记录，死锁或锁等待超时时整体重试
+        async def enroll(tx):
+            return await seats.enroll(tx, student_id, course_id)
+
+        try:
+            if seat_ledger.enabled:
+                # 在账本中占用名额，与同一时段的其他选课一起批量写入
+                insert_id = await seat_ledger.enroll(student_id, course_id)
+            else:
+                insert_id = await db.run_transaction(enroll)
+        except seats.SeatUnavailableError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="课程选课人数已满，可以加入候补"
+            )
+        except seats.AlreadyEnrolledError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="您已经选过这门课程"
             )
         
         # 获取完整的选课信息
@@ -154,14 +281,18 @@ async def enroll_course(
         WHERE e.enrollment_id = :enrollment_id
         """
         
-        success, results, error = mysql_client.execute_raw_sql(sql, {"enrollment_id": insert_id})
+        success, results, error = await db.execute_raw_sql(sql, {"enrollment_id": insert_id})
         
         if success and results:
             enrollment = EnrollmentResponse(**results[0])
         else:
             # 如果联查失败，返回基础信息
-            enrollment_dict["enrollment_id"] = insert_id
-            enrollment = EnrollmentResponse(**enrollment_dict)
+            enrollment = EnrollmentResponse(
+                enrollment_id=insert_id,
+                student_id=student_id,
+                course_id=course_id,
+                status="enrolled"
+            )
         
         return ResponseModel(
             code=200,
@@ -179,6 +310,412 @@ async def enroll_course(
         )
 
 
+@router.post("/batch", response_model=ResponseModel[EnrollmentBatchResponse])
+async def batch_enroll(
+    batch_data: EnrollmentBatchRequest,
+    response: Response,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+) -> ResponseModel[EnrollmentBatchResponse]:
+    """
+    批量选课和退课
+    一次检查整组课程（状态、名额、重复选课、时间冲突），在一个事务中先退课再选课，返回每门课程的结果；
+    all_or_nothing 模式下有课程失败时整组不生效并返回400
+    """
+    try:
+        if current_user.get("user_type") != "student":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="只有学生可以选课"
+            )
+        
+        add = list(dict.fromkeys(batch_data.add))
+        drop = list(dict.fromkeys(batch_data.drop))
+        if not add and not drop:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="请选择要选或要退的课程"
+            )
+        if set(add) & set(drop):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="同一课程不能同时选课和退课"
+            )
+        
+        student_id = current_user["student_id"]
+        mode = batch_data.mode
+        courses, enrollments = await batch_enrollment.load(db, student_id, add + drop)
+        await prerequisite_graph.ensure(db)
+        errors = batch_enrollment.check(courses, enrollments, add, drop, prerequisite_graph)
+        
+        if mode == batch_enrollment.ALL_OR_NOTHING and any(errors.values()):
+            results = batch_enrollment.unapplied(add, drop, errors)
+        else:
+            # 批量选课事务：死锁或锁等待超时时整体重试
+            async def apply(tx):
+                return await batch_enrollment.apply(
+                    tx, student_id, enrollments, add, drop, errors, mode, prerequisite_graph
+                )
+
+            try:
+                results = await db.run_transaction(apply)
+            except batch_enrollment.BatchRejectedError as e:
+                results = e.results
+        
+        # 批量选课不经过名额账本，提交后同步账本中的已占名额
+        for result in results:
+            if not result["success"]:
+                continue
+            if result["action"] == batch_enrollment.ADD:
+                seat_ledger.take(result["course_id"])
+            elif result.get("promoted"):
+                await waitlist.notify(push_notification, result["promoted"])
+            else:
+                seat_ledger.release(result["course_id"])
+        
+        succeeded = sum(1 for result in results if result["success"])
+        if mode == batch_enrollment.ALL_OR_NOTHING and not succeeded:
+            response.status_code = status.HTTP_400_BAD_REQUEST
+        return ResponseModel(
+            code=response.status_code or 200,
+            message="批量选课完成" if succeeded else "批量选课未生效",
+            data=EnrollmentBatchResponse(
+                mode=mode,
+                applied=succeeded > 0,
+                succeeded=succeeded,
+                failed=len(results) - succeeded,
+                results=[EnrollmentBatchItem(**result) for result in results]
+            )
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"批量选课失败: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="批量选课失败"
+        )
+
+
+@router.post("/plan", response_model=ResponseModel[EnrollmentPlanResponse])
+async def plan_enrollments(
+    plan_data: EnrollmentPlanRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+) -> ResponseModel[EnrollmentPlanResponse]:
+    """
+    选课方案规划
+    在想选的课程中找出彼此及与已选课程都不冲突、满足名额和先修要求的组合，
+    按课程数或学分从高到低返回若干方案，不实际选课
+    """
+    try:
+        if current_user.get("user_type") != "student":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="只有学生可以规划选课"
+            )
+        
+        wishlist = list(dict.fromkeys(plan_data.course_ids))
+        courses, enrollments = await batch_enrollment.load(db, current_user["student_id"], wishlist)
+        await prerequisite_graph.ensure(db)
+        result = planner.plan(
+            courses, enrollments, wishlist,
+            objective=plan_data.objective,
+            limit=plan_data.limit,
+            time_budget=settings.TIMETABLE_PLANNER_BUDGET,
+            prerequisites=prerequisite_graph
+        )
+        
+        return ResponseModel(
+            code=200,
+            message="规划选课方案成功" if result["plans"] else "没有可选的课程组合",
+            data=EnrollmentPlanResponse(**result)
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"规划选课方案失败: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="规划选课方案失败"
+        )
+
+
+@router.post("/waitlist", response_model=ResponseModel[WaitlistResponse])
+async def join_waitlist(
+    waitlist_data: WaitlistCreate,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+) -> ResponseModel[WaitlistResponse]:
+    """
+    加入课程候补
+    只有已满的课程可以候补；有名额释放时按候补顺序自动选上，并通过 WebSocket 通知
+    """
+    try:
+        if current_user.get("user_type") != "student":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="只有学生可以候补选课"
+            )
+        
+        student_id = current_user["student_id"]
+        course_id = waitlist_data.course_id
+        courses, enrollments = await batch_enrollment.load(db, student_id, [course_id])
+        course = courses.get(course_id)
+        if course is not None and course["current_students"] < course["max_students"]:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="课程仍有名额，请直接选课"
+            )
+        
+        # 除名额外与选课相同的检查（课程状态、重复选课、先修课程、时间冲突）
+        await prerequisite_graph.ensure(db)
+        if course is not None:
+            courses = {course_id: {**dict(course), "current_students": 0}}
+        error = batch_enrollment.check(courses, enrollments, [course_id], [], prerequisite_graph)[course_id]
+        if error:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=error
+            )
+        
+        async def join(tx):
+            return await waitlist.join(tx, student_id, course_id)
+
+        try:
+            entry = await db.run_transaction(join)
+        except waitlist.AlreadyWaitlistedError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="您已在该课程的候补中"
+            )
+        
+        return ResponseModel(
+            code=200,
+            message="已加入候补",
+            data=WaitlistResponse(course_id=course_id, course_name=course["course_name"], **entry)
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"加入候补失败: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="加入候补失败"
+        )
+
+
+@router.get("/waitlist", response_model=ResponseModel[List[WaitlistResponse]])
+async def get_my_waitlist(
+    current_user: Dict[str, Any] = Depends(get_current_user)
+) -> ResponseModel[List[WaitlistResponse]]:
+    """
+    获取我的候补及位次
+    """
+    try:
+        if current_user.get("user_type") != "student":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="只有学生可以查看候补"
+            )
+        
+        rows = await waitlist.for_student(db, current_user["student_id"])
+        
+        return ResponseModel(
+            code=200,
+            message="获取候补成功",
+            data=[WaitlistResponse(**row) for row in rows]
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"获取候补失败: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="获取候补失败"
+        )
+
+
+@router.delete("/waitlist/{course_id}", response_model=ResponseModel[None])
+async def leave_waitlist(
+    course_id: str,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+) -> ResponseModel[None]:
+    """
+    退出课程候补
+    """
+    try:
+        if current_user.get("user_type") != "student":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="只有学生可以退出候补"
+            )
+        
+        async def leave(tx):
+            return await waitlist.leave(tx, current_user["student_id"], course_id)
+
+        if not await db.run_transaction(leave):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="您不在该课程的候补中"
+            )
+        
+        return ResponseModel(
+            code=200,
+            message="已退出候补",
+            data=None
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"退出候补失败: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="退出候补失败"
+        )
+
+
+async def _registration_cart(student_id: str) -> List[RegistrationCartItem]:
+    rows = await db.fetch(
+        """
+        SELECT r.course_id, c.course_name, r.choice_rank, c.schedule
+        FROM registration_carts r
+        JOIN courses c ON r.course_id = c.course_id
+        WHERE r.student_id = :student_id
+        ORDER BY r.choice_rank
+        """,
+        {"student_id": student_id}
+    )
+    return [RegistrationCartItem(**row) for row in rows]
+
+
+@router.put("/cart", response_model=ResponseModel[List[RegistrationCartItem]])
+async def update_registration_cart(
+    cart_data: RegistrationCartUpdate,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+) -> ResponseModel[List[RegistrationCartItem]]:
+    """
+    提交预选志愿（整体替换）
+    只能在预选窗口内提交，窗口结束后由管理员抽签分配
+    """
+    try:
+        if current_user.get("user_type") != "student":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="只有学生可以提交预选志愿"
+            )
+        
+        if not lottery.cart_open():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="当前不在预选时间内"
+            )
+        
+        course_ids = list(dict.fromkeys(cart_data.course_ids))
+        if len(course_ids) > settings.REGISTRATION_CART_MAX_CHOICES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"最多填写 {settings.REGISTRATION_CART_MAX_CHOICES} 个志愿"
+            )
+        
+        if course_ids:
+            params: Dict[str, Any] = {}
+            rows = await db.fetch(
+                "SELECT course_id FROM courses WHERE status = 'active' "
+                f"AND course_id IN ({in_clause(course_ids, params, 'c')})",
+                params
+            )
+            unknown = set(course_ids) - {row["course_id"] for row in rows}
+            if unknown:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"课程不存在或未开放选课: {', '.join(sorted(unknown))}"
+                )
+        
+        student_id = current_user["student_id"]
+
+        async def replace(tx):
+            await tx.execute("DELETE FROM registration_carts WHERE student_id = :student_id", {"student_id": student_id})
+            if course_ids:
+                success, _, error = await tx.insert_many("registration_carts", [
+                    {"student_id": student_id, "course_id": course_id, "choice_rank": rank}
+                    for rank, course_id in enumerate(course_ids, start=1)
+                ])
+                if not success:
+                    raise RuntimeError(error)
+
+        await db.run_transaction(replace)
+        
+        return ResponseModel(
+            code=200,
+            message="提交预选志愿成功",
+            data=await _registration_cart(student_id)
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"提交预选志愿失败: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="提交预选志愿失败"
+        )
+
+
+@router.get("/cart", response_model=ResponseModel[List[RegistrationCartItem]])
+async def get_registration_cart(
+    current_user: Dict[str, Any] = Depends(get_current_user)
+) -> ResponseModel[List[RegistrationCartItem]]:
+    """
+    获取我的预选志愿
+    """
+    try:
+        if current_user.get("user_type") != "student":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="只有学生可以查看预选志愿"
+            )
+        
+        return ResponseModel(
+            code=200,
+            message="获取预选志愿成功",
+            data=await _registration_cart(current_user["student_id"])
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"获取预选志愿失败: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="获取预选志愿失败"
+        )
+
+
+@router.get("/tickets/{ticket_id}", response_model=ResponseModel[EnrollmentTicketResponse])
+async def get_enrollment_ticket(
+    ticket_id: str,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+) -> ResponseModel[EnrollmentTicketResponse]:
+    """
+    查询选课排队凭证
+    """
+    ticket = enrollment_queue.get(ticket_id)
+    if ticket is None or ticket.student_id != current_user.get("student_id"):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="排队凭证不存在或已过期"
+        )
+    
+    return ResponseModel(
+        code=200,
+        message="获取排队凭证成功",
+        data=EnrollmentTicketResponse(**ticket.to_dict(enrollment_queue.position(ticket)))
+    )
+
+
 @router.delete("/{enrollment_id}", response_model=ResponseModel[None])
 async def drop_course(
     enrollment_id: int,
@@ -189,7 +726,7 @@ async def drop_course(
     """
     try:
         # 检查选课记录是否存在
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="enrollments",
             where={"enrollment_id": enrollment_id}
         )
@@ -228,34 +765,24 @@ async def drop_course(
                 detail="已有成绩的课程不能退课"
             )
         
-        # 使用事务进行退课操作
-        with mysql_client.transaction():
-            # 更新选课状态为已退课
-            success, affected_rows, error = mysql_client.update(
-                table="enrollments",
-                data={"status": "dropped"},
-                where={"enrollment_id": enrollment_id}
+        # 退课事务：修改选课状态并释放名额，名额在同一事务中递补给候补队首，死锁或锁等待超时时整体重试
+        await prerequisite_graph.ensure(db)
+
+        async def drop(tx):
+            if not await seats.drop(tx, enrollment_id, enrollment["course_id"]):
+                return None
+            return await waitlist.promote(tx, enrollment["course_id"], limit=1, prerequisites=prerequisite_graph)
+
+        promoted = await db.run_transaction(drop)
+        if promoted is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="该选课记录已退课或状态已变更"
             )
-            
-            if not success:
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"退课失败: {error}"
-                )
-            
-            # 减少课程当前人数
-            success, results, error = mysql_client.select(
-                table="courses",
-                where={"course_id": enrollment["course_id"]}
-            )
-            
-            if success and results:
-                current_students = int(results[0]["current_students"])
-                mysql_client.update(
-                    table="courses",
-                    data={"current_students": max(0, current_students - 1)},
-                    where={"course_id": enrollment["course_id"]}
-                )
+        if promoted:
+            await waitlist.notify(push_notification, promoted)
+        else:
+            seat_ledger.release(enrollment["course_id"])
         
         return ResponseModel(
             code=200,
@@ -318,7 +845,7 @@ async def get_my_enrollments(
         ORDER BY e.enrollment_date DESC
         """
         
-        success, results, error = mysql_client.execute_raw_sql(sql, params)
+        success, results, error = await db.execute_raw_sql(sql, params)
         
         if not success:
             raise HTTPException(
@@ -370,7 +897,7 @@ async def update_grade(
             )
         
         # 检查选课记录是否存在
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="enrollments",
             where={"enrollment_id": enrollment_id}
         )
@@ -398,7 +925,7 @@ async def update_grade(
             "remarks": grade_data.remarks
         }
         
-        success, affected_rows, error = mysql_client.update(
+        success, affected_rows, error = await db.update(
             table="enrollments",
             data=update_data,
             where={"enrollment_id": enrollment_id}
@@ -425,7 +952,7 @@ async def update_grade(
         WHERE e.enrollment_id = :enrollment_id
         """
         
-        success, results, error = mysql_client.execute_raw_sql(sql, {"enrollment_id": enrollment_id})
+        success, results, error = await db.execute_raw_sql(sql, {"enrollment_id": enrollment_id})
         
         if not success or not results:
             raise HTTPException(
@@ -469,7 +996,7 @@ async def get_course_enrollments(
             )
         
         # 检查课程是否存在
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="courses",
             where={"course_id": course_id}
         )
@@ -499,7 +1026,7 @@ async def get_course_enrollments(
         ORDER BY e.enrollment_date
         """
         
-        success, results, error = mysql_client.execute_raw_sql(sql, {"course_id": course_id})
+        success, results, error = await db.execute_raw_sql(sql, {"course_id": course_id})
         
         if not success:
             raise HTTPException(
@@ -532,6 +1059,49 @@ async def get_course_enrollments(
         )
 
 
+@router.get("/export")
+async def export_enrollments(
+    course_id: Optional[str] = Query(None, description="课程ID，不指定时导出全部"),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+) -> StreamingResponse:
+    """
+    以CSV格式导出选课记录
+    数据按批从数据库流式读取并写出，内存占用与记录总数无关
+    需要管理员权限
+    """
+    if current_user.get("user_type") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="只有管理员可以导出选课记录"
+        )
+    
+    sql = """
+    SELECT 
+        e.enrollment_id,
+        e.student_id,
+        s.name as student_name,
+        e.course_id,
+        c.course_name,
+        e.enrollment_date,
+        e.status,
+        e.grade
+    FROM enrollments e
+    LEFT JOIN students s ON e.student_id = s.student_id
+    LEFT JOIN courses c ON e.course_id = c.course_id
+    """
+    params = {}
+    if course_id:
+        sql += " WHERE e.course_id = :course_id"
+        params["course_id"] = course_id
+    sql += " ORDER BY e.enrollment_id"
+    
+    return StreamingResponse(
+        csv_stream(db.stream(sql, params)),
+        media_type="text/csv; charset=utf-8",
+        headers=attachment_headers("enrollments.csv")
+    )
+
+
 @router.get("/statistics", response_model=ResponseModel[Dict[str, Any]])
 async def get_enrollment_statistics(
     current_user: Dict[str, Any] = Depends(get_current_user)
@@ -559,7 +1129,7 @@ async def get_enrollment_statistics(
         WHERE status IN ('enrolled', 'completed')
         """
         
-        success, total_results, error = mysql_client.execute_raw_sql(total_sql)
+        success, total_results, error = await db.execute_raw_sql(total_sql)
         
         if not success:
             raise HTTPException(
@@ -574,7 +1144,7 @@ async def get_enrollment_statistics(
         GROUP BY status
         """
         
-        success, status_results, error = mysql_client.execute_raw_sql(status_sql)
+        success, status_results, error = await db.execute_raw_sql(status_sql)
         
         if not success:
             raise HTTPException(
@@ -596,7 +1166,7 @@ async def get_enrollment_statistics(
         ORDER BY enrollment_count DESC
         """
         
-        success, department_results, error = mysql_client.execute_raw_sql(department_sql)
+        success, department_results, error = await db.execute_raw_sql(department_sql)
         
         if not success:
             raise HTTPException(
@@ -17,7 +17,7 @@ import logging
 from datetime import datetime
 
 from app.core.config import settings
-from app.db.mysql_client import mysql_client
+from app.db.async_client import db
 from app.schemas.common import ResponseModel, PaginationResponse
 from app.api.v1.endpoints.auth import get_current_user
 
@@ -43,14 +43,14 @@ class FriendshipResponse(BaseModel):
     friend_major: Optional[str] = None
     friend_avatar: Optional[str] = None
     status: str
-    created_at: Optional[str] = None
-    updated_at: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
 
 class FriendRecommendationResponse(BaseModel):
     student_id: str
     name: str
     major: Optional[str] = None
-    grade: Optional[str] = None
+    grade: Optional[int] = None
     department_name: Optional[str] = None
     common_friends: int
     common_courses: int
@@ -85,7 +85,7 @@ async def send_friend_request(
             )
         
         # 检查目标用户是否存在
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="students",
             where={"student_id": friend_id, "status": "active"}
         )
@@ -97,7 +97,7 @@ async def send_friend_request(
             )
         
         # 检查是否已经是好友或已有申请记录
-        success, results, error = mysql_client.execute_raw_sql(
+        success, results, error = await db.execute_raw_sql(
             """
             SELECT * FROM friendships 
             WHERE (student_id = :student_id AND friend_id = :friend_id) 
@@ -120,7 +120,7 @@ async def send_friend_request(
                 )
         
         # 检查好友数量限制
-        success, results, error = mysql_client.execute_raw_sql(
+        success, results, error = await db.execute_raw_sql(
             """
             SELECT COUNT(*) as friend_count 
             FROM friendships 
@@ -131,7 +131,7 @@ async def send_friend_request(
         )
         
         if success and results:
-            friend_count = int(results[0]["friend_count"])
+            friend_count = results[0]["friend_count"]
             if friend_count >= settings.MAX_FRIENDS_COUNT:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -146,7 +146,7 @@ async def send_friend_request(
             "message": request_data.message
         }
         
-        success, insert_id, error = mysql_client.insert("friendships", friendship_data)
+        success, insert_id, error = await db.insert("friendships", friendship_data)
         
         if not success:
             raise HTTPException(
@@ -189,7 +189,7 @@ async def accept_friend_request(
         student_id = current_user["student_id"]
         
         # 检查好友申请是否存在且是发给当前用户的
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="friendships",
             where={"friendship_id": friendship_id}
         )
@@ -215,7 +215,7 @@ async def accept_friend_request(
             )
         
         # 更新好友申请状态
-        success, affected_rows, error = mysql_client.update(
+        success, affected_rows, error = await db.update(
             table="friendships",
             data={"status": "accepted"},
             where={"friendship_id": friendship_id}
@@ -262,7 +262,7 @@ async def reject_friend_request(
         student_id = current_user["student_id"]
         
         # 检查好友申请是否存在且是发给当前用户的
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="friendships",
             where={"friendship_id": friendship_id}
         )
@@ -288,7 +288,7 @@ async def reject_friend_request(
             )
         
         # 更新好友申请状态
-        success, affected_rows, error = mysql_client.update(
+        success, affected_rows, error = await db.update(
             table="friendships",
             data={"status": "rejected"},
             where={"friendship_id": friendship_id}
@@ -353,7 +353,7 @@ async def get_friends_list(
         ORDER BY f.created_at DESC
         """
         
-        success, results, error = mysql_client.execute_raw_sql(sql, {"student_id": student_id})
+        success, results, error = await db.execute_raw_sql(sql, {"student_id": student_id})
         
         if not success:
             raise HTTPException(
@@ -363,8 +363,9 @@ async def get_friends_list(
         
         # 转换结果
         friends = []
-        for friendship in results:
+        for row in results:
             try:
+                friendship = dict(row)
                 # 确定好友ID
                 if friendship["student_id"] == student_id:
                     friend_id = friendship["friend_id"]
@@ -422,7 +423,7 @@ async def get_friend_requests(
         ORDER BY f.created_at DESC
         """
         
-        success, results, error = mysql_client.execute_raw_sql(sql, {"student_id": student_id})
+        success, results, error = await db.execute_raw_sql(sql, {"student_id": student_id})
         
         if not success:
             raise HTTPException(
@@ -474,9 +475,11 @@ async def get_friend_recommendations(
         student_id = current_user["student_id"]
         
         # 调用好友推荐存储过程
-        sql = f"CALL GetFriendRecommendations('{student_id}', {settings.FRIEND_RECOMMENDATION_COUNT})"
+        sql = "CALL GetFriendRecommendations(:student_id, :limit)"
         
-        success, results, error = mysql_client.execute_raw_sql(sql)
+        success, results, error = await db.execute_raw_sql(
+            sql, {"student_id": student_id, "limit": settings.FRIEND_RECOMMENDATION_COUNT}
+        )
         
         if not success:
             # 如果存储过程失败，使用简单的推荐算法
@@ -512,7 +515,7 @@ async def get_friend_recommendations(
             LIMIT :limit
             """
             
-            success, results, error = mysql_client.execute_raw_sql(
+            success, results, error = await db.execute_raw_sql(
                 sql, 
                 {
                     "student_id": student_id, 
@@ -570,7 +573,7 @@ async def delete_friendship(
         student_id = current_user["student_id"]
         
         # 检查好友关系是否存在
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="friendships",
             where={"friendship_id": friendship_id}
         )
@@ -591,7 +594,7 @@ async def delete_friendship(
             )
         
         # 删除好友关系
-        success, deleted_rows, error = mysql_client.delete(
+        success, deleted_rows, error = await db.delete(
             table="friendships",
             where={"friendship_id": friendship_id}
         )
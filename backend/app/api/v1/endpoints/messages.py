@@ -17,7 +17,7 @@ import logging
 from datetime import datetime
 
 from app.core.config import settings
-from app.db.mysql_client import mysql_client
+from app.db.async_client import db
 from app.schemas.common import ResponseModel, PaginationResponse
 from app.api.v1.endpoints.auth import get_current_user
 
@@ -45,8 +45,8 @@ class MessageResponse(BaseModel):
     message_type: str
     status: str
     is_read: bool
-    created_at: Optional[str] = None
-    read_at: Optional[str] = None
+    created_at: Optional[datetime] = None
+    read_at: Optional[datetime] = None
 
 class MessageStatusUpdate(BaseModel):
     is_read: bool = Field(..., description="是否已读")
@@ -81,7 +81,7 @@ async def send_message(
             )
         
         # 检查收件人是否存在
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="students",
             where={"student_id": recipient_id, "status": "active"}
         )
@@ -94,7 +94,7 @@ async def send_message(
         
         # 如果是学生发送，检查好友关系
         if sender_type == "student":
-            success, results, error = mysql_client.execute_raw_sql(
+            success, results, error = await db.execute_raw_sql(
                 """
                 SELECT * FROM friendships 
                 WHERE ((student_id = :sender_id AND friend_id = :recipient_id) 
@@ -121,7 +121,7 @@ async def send_message(
             "is_read": False
         }
         
-        success, insert_id, error = mysql_client.insert("messages", message_dict)
+        success, insert_id, error = await db.insert("messages", message_dict)
         
         if not success:
             raise HTTPException(
@@ -141,7 +141,7 @@ async def send_message(
         WHERE m.message_id = :message_id
         """
         
-        success, results, error = mysql_client.execute_raw_sql(sql, {"message_id": insert_id})
+        success, results, error = await db.execute_raw_sql(sql, {"message_id": insert_id})
         
         if success and results:
             message = MessageResponse(**results[0])
@@ -215,15 +215,6 @@ async def get_inbox_messages(
         WHERE {where_clause}
         """
         
-        success, count_results, error = mysql_client.execute_raw_sql(count_sql, params)
-        if not success:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"查询消息总数失败: {error}"
-            )
-        
-        total = int(count_results[0]["total"]) if count_results else 0
-        
         # 获取分页数据
         data_sql = f"""
         SELECT 
@@ -238,13 +229,18 @@ async def get_inbox_messages(
         LIMIT {page_size} OFFSET {offset}
         """
         
-        success, results, error = mysql_client.execute_raw_sql(data_sql, params)
+        # 总数和当前页互不依赖，并发查询
+        success, (count_results, results), error = await db.execute_batch(
+            [(count_sql, params), (data_sql, params)]
+        )
         if not success:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"查询收件箱消息失败: {error}"
             )
         
+        total = count_results[0]["total"] if count_results else 0
+        
         # 转换结果
         messages = []
         for message in results:
@@ -324,15 +320,6 @@ async def get_sent_messages(
         WHERE {where_clause}
         """
         
-        success, count_results, error = mysql_client.execute_raw_sql(count_sql, params)
-        if not success:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"查询消息总数失败: {error}"
-            )
-        
-        total = int(count_results[0]["total"]) if count_results else 0
-        
         # 获取分页数据
         data_sql = f"""
         SELECT 
@@ -347,13 +334,18 @@ async def get_sent_messages(
         LIMIT {page_size} OFFSET {offset}
         """
         
-        success, results, error = mysql_client.execute_raw_sql(data_sql, params)
+        # 总数和当前页互不依赖，并发查询
+        success, (count_results, results), error = await db.execute_batch(
+            [(count_sql, params), (data_sql, params)]
+        )
         if not success:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"查询发件箱消息失败: {error}"
             )
         
+        total = count_results[0]["total"] if count_results else 0
+        
         # 转换结果
         messages = []
         for message in results:
@@ -418,7 +410,7 @@ async def get_message(
         WHERE m.message_id = :message_id
         """
         
-        success, results, error = mysql_client.execute_raw_sql(sql, {"message_id": message_id})
+        success, results, error = await db.execute_raw_sql(sql, {"message_id": message_id})
         
         if not success:
             raise HTTPException(
@@ -432,7 +424,7 @@ async def get_message(
                 detail="消息不存在"
             )
         
-        message = results[0]
+        message = dict(results[0])
         
         # 检查权限：只能查看自己发送或接收的消息
         if message["sender_id"] != user_id and message["recipient_id"] != user_id:
@@ -443,7 +435,7 @@ async def get_message(
         
         # 如果是接收的消息且未读，标记为已读
         if message["recipient_id"] == user_id and not message["is_read"]:
-            success, affected_rows, error = mysql_client.update(
+            success, affected_rows, error = await db.update(
                 table="messages",
                 data={"is_read": True, "read_at": datetime.now().isoformat()},
                 where={"message_id": message_id}
@@ -491,7 +483,7 @@ async def update_message_status(
         user_id = current_user.get("student_id") or current_user.get("admin_id")
         
         # 检查消息是否存在
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="messages",
             where={"message_id": message_id}
         )
@@ -518,7 +510,7 @@ async def update_message_status(
         else:
             update_data["read_at"] = None
         
-        success, affected_rows, error = mysql_client.update(
+        success, affected_rows, error = await db.update(
             table="messages",
             data=update_data,
             where={"message_id": message_id}
@@ -542,7 +534,7 @@ async def update_message_status(
         WHERE m.message_id = :message_id
         """
         
-        success, results, error = mysql_client.execute_raw_sql(sql, {"message_id": message_id})
+        success, results, error = await db.execute_raw_sql(sql, {"message_id": message_id})
         
         if not success or not results:
             raise HTTPException(
@@ -587,7 +579,7 @@ async def delete_message(
         user_id = current_user.get("student_id") or current_user.get("admin_id")
         
         # 检查消息是否存在
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="messages",
             where={"message_id": message_id}
         )
@@ -608,7 +600,7 @@ async def delete_message(
             )
         
         # 删除消息
-        success, deleted_rows, error = mysql_client.delete(
+        success, deleted_rows, error = await db.delete(
             table="messages",
             where={"message_id": message_id}
         )
@@ -659,7 +651,7 @@ async def get_unread_count(
         WHERE recipient_id = :user_id AND is_read = FALSE
         """
         
-        success, results, error = mysql_client.execute_raw_sql(sql, {"user_id": user_id})
+        success, results, error = await db.execute_raw_sql(sql, {"user_id": user_id})
         
         if not success:
             raise HTTPException(
@@ -667,7 +659,7 @@ async def get_unread_count(
                 detail=f"查询未读消息数量失败: {error}"
             )
         
-        unread_count = int(results[0]["unread_count"]) if results else 0
+        unread_count = results[0]["unread_count"] if results else 0
         
         return ResponseModel(
             code=200,
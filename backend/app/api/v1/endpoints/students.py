@@ -17,9 +17,9 @@ import logging
 from datetime import datetime
 
 from app.core.config import settings
-from app.db.mysql_client import mysql_client
+from app.db.async_client import db
 from app.schemas.common import ResponseModel, PaginationResponse
-from app.api.v1.endpoints.auth import get_current_user
+from app.api.v1.endpoints.auth import database_error, get_current_user
 from app.utils.security import verify_password, get_password_hash
 
 logger = logging.getLogger(__name__)
@@ -46,16 +46,16 @@ class StudentResponse(BaseModel):
     name: str
     email: Optional[str] = None
     phone: Optional[str] = None
-    grade: Optional[str] = None
+    grade: Optional[int] = None
     major: Optional[str] = None
-    department_id: Optional[int] = None
+    department_id: Optional[str] = None
     department_name: Optional[str] = None
     address: Optional[str] = None
     bio: Optional[str] = None
     avatar_url: Optional[str] = None
     status: str
-    created_at: Optional[str] = None
-    updated_at: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
 
 
 @router.get("/profile", response_model=ResponseModel[StudentResponse])
@@ -85,13 +85,11 @@ async def get_student_profile(
         WHERE s.student_id = :student_id
         """
         
-        success, results, error = mysql_client.execute_raw_sql(sql, {"student_id": student_id})
+        success, results, error = await db.execute_raw_sql(sql, {"student_id": student_id})
         
         if not success:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"获取学生资料失败: {error}"
-            )
+            logger.error(f"获取学生资料失败: {error}")
+            raise database_error(f"获取学生资料失败: {error}")
         
         if not results:
             raise HTTPException(
@@ -149,7 +147,7 @@ async def update_student_profile(
         
         # 检查邮箱和手机号唯一性
         if "email" in update_data and update_data["email"]:
-            success, results, error = mysql_client.execute_raw_sql(
+            success, results, error = await db.execute_raw_sql(
                 "SELECT student_id FROM students WHERE email = :email AND student_id != :student_id",
                 {"email": update_data["email"], "student_id": student_id}
             )
@@ -160,7 +158,7 @@ async def update_student_profile(
                 )
         
         if "phone" in update_data and update_data["phone"]:
-            success, results, error = mysql_client.execute_raw_sql(
+            success, results, error = await db.execute_raw_sql(
                 "SELECT student_id FROM students WHERE phone = :phone AND student_id != :student_id",
                 {"phone": update_data["phone"], "student_id": student_id}
             )
@@ -173,17 +171,15 @@ async def update_student_profile(
         # 更新学生信息
         update_data["updated_at"] = datetime.now().isoformat()
         
-        success, affected_rows, error = mysql_client.update(
+        success, affected_rows, error = await db.update(
             table="students",
             data=update_data,
             where={"student_id": student_id}
         )
         
         if not success:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"更新学生资料失败: {error}"
-            )
+            logger.error(f"更新学生资料失败: {error}")
+            raise database_error(f"更新学生资料失败: {error}")
         
         # 获取更新后的学生信息
         sql = """
@@ -195,7 +191,7 @@ async def update_student_profile(
         WHERE s.student_id = :student_id
         """
         
-        success, results, error = mysql_client.execute_raw_sql(sql, {"student_id": student_id})
+        success, results, error = await db.execute_raw_sql(sql, {"student_id": student_id})
         
         if not success or not results:
             raise HTTPException(
@@ -247,13 +243,16 @@ async def change_password(
         student_id = current_user["student_id"]
         
         # 获取当前密码哈希
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="students",
             columns=["password_hash"],
             where={"student_id": student_id}
         )
         
-        if not success or not results:
+        if not success:
+            logger.error(f"查询学生信息失败: {error}")
+            raise database_error("查询学生信息失败")
+        if not results:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="学生信息不存在"
@@ -272,7 +271,7 @@ async def change_password(
         new_password_hash = get_password_hash(password_data.new_password)
         
         # 更新密码
-        success, affected_rows, error = mysql_client.update(
+        success, affected_rows, error = await db.update(
             table="students",
             data={
                 "password_hash": new_password_hash,
@@ -282,10 +281,8 @@ async def change_password(
         )
         
         if not success:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"修改密码失败: {error}"
-            )
+            logger.error(f"修改密码失败: {error}")
+            raise database_error(f"修改密码失败: {error}")
         
         return ResponseModel(
             code=200,
@@ -356,109 +353,27 @@ async def get_students_list(
         WHERE {where_clause}
         """
         
-        # 尝试数据库查询，如果失败则使用模拟数据
-        try:
-            success, count_results, error = mysql_client.execute_raw_sql(count_sql, params)
-            if not success:
-                raise Exception(f"数据库查询失败: {error}")
-
-            total = int(count_results[0]["total"]) if count_results else 0
-
-            # 获取分页数据
-            data_sql = f"""
-            SELECT
-                s.*,
-                d.department_name
-            FROM students s
-            LEFT JOIN departments d ON s.department_id = d.department_id
-            WHERE {where_clause}
-            ORDER BY s.created_at DESC
-            LIMIT {page_size} OFFSET {offset}
-            """
-
-            success, results, error = mysql_client.execute_raw_sql(data_sql, params)
-            if not success:
-                raise Exception(f"数据库查询失败: {error}")
-
-        except Exception as db_error:
-            logger.warning(f"数据库连接失败，使用模拟数据: {str(db_error)}")
-
-            # 返回模拟学生数据
-            mock_students = [
-                {
-                    "student_id": "2021001",
-                    "name": "张三",
-                    "email": "zhangsan@example.com",
-                    "department_name": "计算机学院",
-                    "grade": "2021",
-                    "status": "active",
-                    "created_at": "2024-09-01T00:00:00Z"
-                },
-                {
-                    "student_id": "2021002",
-                    "name": "李四",
-                    "email": "lisi@example.com",
-                    "department_name": "商学院",
-                    "grade": "2021",
-                    "status": "active",
-                    "created_at": "2024-09-01T00:00:00Z"
-                },
-                {
-                    "student_id": "2021003",
-                    "name": "王五",
-                    "email": "wangwu@example.com",
-                    "department_name": "文学院",
-                    "grade": "2021",
-                    "status": "active",
-                    "created_at": "2024-09-01T00:00:00Z"
-                },
-                {
-                    "student_id": "2021004",
-                    "name": "赵六",
-                    "email": "zhaoliu@example.com",
-                    "department_name": "理学院",
-                    "grade": "2021",
-                    "status": "disabled",
-                    "created_at": "2024-09-01T00:00:00Z"
-                }
-            ]
-
-            # 应用筛选条件
-            filtered_students = mock_students
-
-            if search:
-                search_lower = search.lower()
-                filtered_students = [
-                    s for s in filtered_students
-                    if search_lower in s["name"].lower() or
-                       search_lower in s["student_id"].lower() or
-                       search_lower in s["email"].lower()
-                ]
-
-            if department_id:
-                filtered_students = [
-                    s for s in filtered_students
-                    if s["department_name"] == department_id
-                ]
-
-            if grade:
-                filtered_students = [
-                    s for s in filtered_students
-                    if str(s["grade"]) == str(grade)
-                ]
-
-            if status:
-                filtered_students = [
-                    s for s in filtered_students
-                    if s["status"] == status
-                ]
+        # 获取分页数据
+        data_sql = f"""
+        SELECT
+            s.*,
+            d.department_name
+        FROM students s
+        LEFT JOIN departments d ON s.department_id = d.department_id
+        WHERE {where_clause}
+        ORDER BY s.created_at DESC
+        LIMIT {page_size} OFFSET {offset}
+        """
 
-            total = len(filtered_students)
+        # 总数和当前页互不依赖，并发查询
+        success, (count_results, results), error = await db.execute_batch(
+            [(count_sql, params), (data_sql, params)]
+        )
+        if not success:
+            logger.error(f"获取学生列表失败: {error}")
+            raise database_error("获取学生列表失败")
 
-            # 应用分页
-            start_idx = (page - 1) * page_size
-            end_idx = start_idx + page_size
-            results = filtered_students[start_idx:end_idx]
+        total = count_results[0]["total"] if count_results else 0
         
         # 转换结果
         students = []
@@ -522,19 +437,22 @@ async def update_student_status(
             )
         
         # 检查学生是否存在
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="students",
             where={"student_id": student_id}
         )
         
-        if not success or not results:
+        if not success:
+            logger.error(f"查询学生信息失败: {error}")
+            raise database_error("查询学生信息失败")
+        if not results:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="学生不存在"
             )
         
         # 更新学生状态
-        success, affected_rows, error = mysql_client.update(
+        success, affected_rows, error = await db.update(
             table="students",
             data={
                 "status": status,
@@ -544,10 +462,8 @@ async def update_student_status(
         )
         
         if not success:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"更新学生状态失败: {error}"
-            )
+            logger.error(f"更新学生状态失败: {error}")
+            raise database_error(f"更新学生状态失败: {error}")
         
         # 获取更新后的学生信息
         sql = """
@@ -559,7 +475,7 @@ async def update_student_status(
         WHERE s.student_id = :student_id
         """
         
-        success, results, error = mysql_client.execute_raw_sql(sql, {"student_id": student_id})
+        success, results, error = await db.execute_raw_sql(sql, {"student_id": student_id})
         
         if not success or not results:
             raise HTTPException(
@@ -616,13 +532,11 @@ async def get_students_statistics(
         FROM students
         """
         
-        success, results, error = mysql_client.execute_raw_sql(sql)
+        success, results, error = await db.execute_raw_sql(sql)
         
         if not success:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"获取学生统计失败: {error}"
-            )
+            logger.error(f"获取学生统计失败: {error}")
+            raise database_error(f"获取学生统计失败: {error}")
         
         statistics = results[0] if results else {}
         
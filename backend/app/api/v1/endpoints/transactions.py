@@ -13,13 +13,15 @@
 """
 from typing import Any, Dict, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
 import logging
 from datetime import datetime, timedelta
 from decimal import Decimal
 
 from app.core.config import settings
-from app.db.mysql_client import mysql_client
+from app.db.async_client import db
 from app.schemas.common import ResponseModel, PaginationResponse
+from app.utils.export import attachment_headers, csv_stream
 from app.api.v1.endpoints.auth import get_current_user
 
 logger = logging.getLogger(__name__)
@@ -45,8 +47,8 @@ class TransactionResponse(BaseModel):
     transaction_fee: float
     status: str
     description: Optional[str] = None
-    created_at: Optional[str] = None
-    completed_at: Optional[str] = None
+    created_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
 
 class BalanceResponse(BaseModel):
     student_id: str
@@ -85,7 +87,7 @@ async def create_transaction(
             )
         
         # 检查收款人是否存在
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="students",
             where={"student_id": recipient_id, "status": "active"}
         )
@@ -99,7 +101,7 @@ async def create_transaction(
         recipient = results[0]
         
         # 检查是否为好友关系
-        success, results, error = mysql_client.execute_raw_sql(
+        success, results, error = await db.execute_raw_sql(
             """
             SELECT * FROM friendships 
             WHERE ((student_id = :sender_id AND friend_id = :recipient_id) 
@@ -118,7 +120,7 @@ async def create_transaction(
         # 验证支付密码（这里简化处理，实际应该有独立的支付密码系统）
         # 暂时使用登录密码验证
         from app.utils.security import verify_password
-        success, results, error = mysql_client.select(
+        success, results, error = await db.select(
             table="students",
             where={"student_id": sender_id}
         )
@@ -132,7 +134,7 @@ async def create_transaction(
                 )
         
         # 检查余额（假设每个学生初始余额为1000元）
-        success, results, error = mysql_client.execute_raw_sql(
+        success, results, error = await db.execute_raw_sql(
             """
             SELECT 
                 COALESCE(1000 + COALESCE(received.total, 0) - COALESCE(sent.total, 0), 1000) as balance
@@ -160,7 +162,7 @@ async def create_transaction(
                 detail="查询余额失败"
             )
         
-        current_balance = Decimal(str(results[0]["balance"]))
+        current_balance = results[0]["balance"]
         
         # 计算手续费（1%，最低0.1元）
         transaction_fee = max(amount * Decimal("0.01"), Decimal("0.1"))
@@ -181,7 +183,7 @@ async def create_transaction(
         
         # 检查日限额
         today = datetime.now().date()
-        success, results, error = mysql_client.execute_raw_sql(
+        success, results, error = await db.execute_raw_sql(
             """
             SELECT COALESCE(SUM(amount + transaction_fee), 0) as daily_spent
             FROM transactions 
@@ -193,7 +195,7 @@ async def create_transaction(
         )
         
         if success and results:
-            daily_spent = Decimal(str(results[0]["daily_spent"]))
+            daily_spent = results[0]["daily_spent"]
             if daily_spent + total_amount > Decimal(str(settings.DAILY_TRANSACTION_LIMIT)):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -203,28 +205,31 @@ async def create_transaction(
         # 风险控制：大额转账需要额外验证
         is_high_risk = amount >= Decimal(str(settings.HIGH_RISK_AMOUNT))
         
-        # 使用事务创建转账记录
-        with mysql_client.transaction():
-            transaction_dict = {
-                "sender_id": sender_id,
-                "recipient_id": recipient_id,
-                "amount": float(amount),
-                "transaction_fee": float(transaction_fee),
-                "status": "pending" if is_high_risk else "completed",
-                "description": transaction_data.description,
-                "risk_level": "high" if is_high_risk else "normal"
-            }
-            
-            if not is_high_risk:
-                transaction_dict["completed_at"] = datetime.now().isoformat()
-            
-            success, insert_id, error = mysql_client.insert("transactions", transaction_dict)
+        transaction_dict = {
+            "sender_id": sender_id,
+            "recipient_id": recipient_id,
+            "amount": float(amount),
+            "transaction_fee": float(transaction_fee),
+            "status": "pending" if is_high_risk else "completed",
+            "description": transaction_data.description,
+            "risk_level": "high" if is_high_risk else "normal"
+        }
+        
+        if not is_high_risk:
+            transaction_dict["completed_at"] = datetime.now().isoformat()
+
+        # 转账事务（事务内语句在同一连接上执行），死锁或锁等待超时时整体重试
+        async def transfer(tx):
+            success, insert_id, error = await tx.insert("transactions", transaction_dict)
             
             if not success:
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                     detail=f"创建转账记录失败: {error}"
                 )
+            return insert_id
+
+        insert_id = await db.run_transaction(transfer)
         
         # 获取完整的转账信息
         sql = """
@@ -238,7 +243,7 @@ async def create_transaction(
         WHERE t.transaction_id = :transaction_id
         """
         
-        success, results, error = mysql_client.execute_raw_sql(sql, {"transaction_id": insert_id})
+        success, results, error = await db.execute_raw_sql(sql, {"transaction_id": insert_id})
         
         if success and results:
             transaction = TransactionResponse(**results[0])
@@ -321,7 +326,7 @@ async def get_balance(
         WHERE s.student_id = :student_id
         """
         
-        success, results, error = mysql_client.execute_raw_sql(sql, {"student_id": student_id})
+        success, results, error = await db.execute_raw_sql(sql, {"student_id": student_id})
         
         if not success or not results:
             raise HTTPException(
@@ -398,15 +403,6 @@ async def get_transaction_history(
         WHERE {where_clause}
         """
         
-        success, count_results, error = mysql_client.execute_raw_sql(count_sql, params)
-        if not success:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"查询转账记录总数失败: {error}"
-            )
-        
-        total = int(count_results[0]["total"]) if count_results else 0
-        
         # 获取分页数据
         data_sql = f"""
         SELECT 
@@ -421,13 +417,18 @@ async def get_transaction_history(
         LIMIT {page_size} OFFSET {offset}
         """
         
-        success, results, error = mysql_client.execute_raw_sql(data_sql, params)
+        # 总数和当前页互不依赖，并发查询
+        success, (count_results, results), error = await db.execute_batch(
+            [(count_sql, params), (data_sql, params)]
+        )
         if not success:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"查询转账记录失败: {error}"
             )
         
+        total = count_results[0]["total"] if count_results else 0
+        
         # 转换结果
         transactions = []
         for transaction in results:
@@ -462,6 +463,39 @@ async def get_transaction_history(
         )
 
 
+@router.get("/export")
+async def export_transactions(
+    current_user: Dict[str, Any] = Depends(get_current_user)
+) -> StreamingResponse:
+    """
+    以CSV格式导出全部转账记录
+    数据按批从数据库流式读取并写出，内存占用与记录总数无关
+    需要管理员权限
+    """
+    if current_user.get("user_type") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="只有管理员可以导出转账记录"
+        )
+    
+    sql = """
+    SELECT 
+        t.*,
+        s1.name as sender_name,
+        s2.name as recipient_name
+    FROM transactions t
+    LEFT JOIN students s1 ON t.sender_id = s1.student_id
+    LEFT JOIN students s2 ON t.recipient_id = s2.student_id
+    ORDER BY t.created_at
+    """
+    
+    return StreamingResponse(
+        csv_stream(db.stream(sql)),
+        media_type="text/csv; charset=utf-8",
+        headers=attachment_headers("transactions.csv")
+    )
+
+
 @router.get("/statistics", response_model=ResponseModel[Dict[str, Any]])
 async def get_transaction_statistics(
     current_user: Dict[str, Any] = Depends(get_current_user)
@@ -513,7 +547,7 @@ async def get_transaction_statistics(
             """
             params = {"student_id": student_id}
         
-        success, results, error = mysql_client.execute_raw_sql(sql, params)
+        success, results, error = await db.execute_raw_sql(sql, params)
         
         if not success:
             raise HTTPException(
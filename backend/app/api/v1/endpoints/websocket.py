@@ -6,6 +6,8 @@ from typing import Dict, List
 import json
 from datetime import datetime
 
+from app.utils.security import decode_access_token
+
 router = APIRouter()
 
 
@@ -81,9 +83,12 @@ async def websocket_endpoint(
     WebSocket 连接端点
     连接方式: ws://localhost:8000/api/v1/ws?token=<jwt_token>
     """
-    # TODO: 验证 token 并获取用户ID
-    # user_id = verify_token(token)
-    user_id = "test_user"  # 模拟
+    payload = decode_access_token(token)
+    if not payload or not payload.get("sub"):
+        # 1008: 违反策略，令牌无效
+        await websocket.close(code=1008)
+        return
+    user_id = payload["sub"]
 
     await manager.connect(websocket, user_id)
 
@@ -44,7 +44,71 @@ class Settings(BaseSettings):
     MYSQL_USER: str = config("MYSQL_USER", default="root")
     MYSQL_PASSWORD: str = config("MYSQL_PASSWORD", default="")
     MYSQL_DATABASE: str = config("MYSQL_DATABASE", default="student_course_system")
-    
+
+    # 数据库执行后端: pool(连接池) / cli(命令行回退模式) / sqlite(离线测试)
+    DB_BACKEND: str = config("DB_BACKEND", default="pool")
+    SQLITE_PATH: str = config("SQLITE_PATH", default=":memory:")  # sqlite后端的数据库文件，:memory: 为内存库
+    SQLITE_INIT_SCRIPT: str = config("SQLITE_INIT_SCRIPT", default="")  # 空库初始化脚本，默认 database/init.sql
+    MYSQL_POOL_SIZE: int = config("MYSQL_POOL_SIZE", default=10, cast=int)
+    MYSQL_POOL_TIMEOUT: float = config("MYSQL_POOL_TIMEOUT", default=5.0, cast=float)  # 等待连接超时(秒)
+    MYSQL_POOL_HEALTH_CHECK_INTERVAL: float = config("MYSQL_POOL_HEALTH_CHECK_INTERVAL", default=30.0, cast=float)
+    MYSQL_POOL_MAX_LIFETIME: float = config("MYSQL_POOL_MAX_LIFETIME", default=3600.0, cast=float)
+    MYSQL_CONNECT_TIMEOUT: int = config("MYSQL_CONNECT_TIMEOUT", default=3, cast=int)  # 建立连接超时(秒)
+    DB_CALL_TIMEOUT: float = config("DB_CALL_TIMEOUT", default=30.0, cast=float)  # 单次异步数据库调用超时(秒)
+    STATEMENT_CACHE_SIZE: int = config("STATEMENT_CACHE_SIZE", default=512, cast=int)  # SQL模板编译缓存条目数
+    PREPARED_STATEMENTS_PER_CONNECTION: int = config("PREPARED_STATEMENTS_PER_CONNECTION", default=64, cast=int)
+    BULK_WRITE_CHUNK_SIZE: int = config("BULK_WRITE_CHUNK_SIZE", default=500, cast=int)  # 批量写入每条语句的行数
+    STREAM_BATCH_SIZE: int = config("STREAM_BATCH_SIZE", default=1000, cast=int)  # 流式查询每批读取的行数
+
+    # 数据库熔断：连续连接失败达到阈值后快速失败，每隔探测间隔放行一个调用检查数据库是否恢复
+    DB_BREAKER_FAILURE_THRESHOLD: int = config("DB_BREAKER_FAILURE_THRESHOLD", default=5, cast=int)
+    DB_BREAKER_PROBE_INTERVAL: float = config("DB_BREAKER_PROBE_INTERVAL", default=5.0, cast=float)  # 探测间隔(秒)
+
+    # 事务重试：死锁和锁等待超时时回滚并重试整个事务
+    DB_TX_RETRY_MAX_ATTEMPTS: int = config("DB_TX_RETRY_MAX_ATTEMPTS", default=4, cast=int)  # 含首次执行
+    DB_TX_RETRY_BASE_DELAY: float = config("DB_TX_RETRY_BASE_DELAY", default=0.02, cast=float)  # 首次重试的最大等待(秒)
+    DB_TX_RETRY_MAX_DELAY: float = config("DB_TX_RETRY_MAX_DELAY", default=0.5, cast=float)  # 单次重试的最大等待(秒)
+    DB_TX_RETRY_DEADLINE: float = config("DB_TX_RETRY_DEADLINE", default=3.0, cast=float)  # 超过该时长不再重试(秒)
+
+    # 选课名额账本：高峰期在进程内过滤已满课程并批量写入选课记录
+    SEAT_LEDGER_ENABLED: bool = config("SEAT_LEDGER_ENABLED", default=False, cast=bool)
+    SEAT_LEDGER_BATCH_SIZE: int = config("SEAT_LEDGER_BATCH_SIZE", default=200, cast=int)  # 每批最多写入的选课数
+    SEAT_LEDGER_FLUSH_INTERVAL: float = config("SEAT_LEDGER_FLUSH_INTERVAL", default=0.01, cast=float)  # 批量写入间隔(秒)
+    SEAT_LEDGER_RECONCILE_INTERVAL: float = config("SEAT_LEDGER_RECONCILE_INTERVAL", default=5.0, cast=float)  # 对账间隔(秒)
+
+    # 选课排队：选课请求按课程排队并返回凭证，由工作协程批量处理
+    ENROLLMENT_QUEUE_ENABLED: bool = config("ENROLLMENT_QUEUE_ENABLED", default=False, cast=bool)
+    ENROLLMENT_QUEUE_WORKERS: int = config("ENROLLMENT_QUEUE_WORKERS", default=4, cast=int)  # 工作协程数（数据库并发上限）
+    ENROLLMENT_QUEUE_BATCH_SIZE: int = config("ENROLLMENT_QUEUE_BATCH_SIZE", default=100, cast=int)  # 每个事务处理的请求数
+    ENROLLMENT_QUEUE_MAX_DEPTH: int = config("ENROLLMENT_QUEUE_MAX_DEPTH", default=5000, cast=int)  # 每门课程最多排队人数
+    ENROLLMENT_QUEUE_TICKET_TTL: float = config("ENROLLMENT_QUEUE_TICKET_TTL", default=600.0, cast=float)  # 凭证保留时长(秒)
+
+    # 预选课抽签：窗口内学生提交志愿，窗口结束后管理员运行抽签分配；时间格式 YYYY-MM-DD HH:MM:SS，为空时不开放预选
+    REGISTRATION_CART_OPENS_AT: str = config("REGISTRATION_CART_OPENS_AT", default="")
+    REGISTRATION_CART_CLOSES_AT: str = config("REGISTRATION_CART_CLOSES_AT", default="")
+    REGISTRATION_CART_MAX_CHOICES: int = config("REGISTRATION_CART_MAX_CHOICES", default=8, cast=int)  # 每个学生最多志愿数
+
+    # 读写分离：从库列表，逗号分隔的 host[:port][/database]，为空时所有语句走主库
+    MYSQL_REPLICAS: str = config("MYSQL_REPLICAS", default="")
+    MYSQL_REPLICA_MAX_LAG: float = config("MYSQL_REPLICA_MAX_LAG", default=5.0, cast=float)  # 允许的复制延迟(秒)
+    MYSQL_REPLICA_LAG_CHECK_INTERVAL: float = config("MYSQL_REPLICA_LAG_CHECK_INTERVAL", default=10.0, cast=float)
+    MYSQL_REPLICA_RETRY_INTERVAL: float = config("MYSQL_REPLICA_RETRY_INTERVAL", default=30.0, cast=float)  # 从库摘除后重试间隔(秒)
+    DB_STICKY_SECONDS: float = config("DB_STICKY_SECONDS", default=5.0, cast=float)  # 写操作后后续请求读主库的时长(秒)
+
+    # 查询结果缓存（接口通过 cache_ttl 显式开启）
+    QUERY_CACHE_ENABLED: bool = config("QUERY_CACHE_ENABLED", default=True, cast=bool)
+    QUERY_CACHE_MAX_ENTRIES: int = config("QUERY_CACHE_MAX_ENTRIES", default=2000, cast=int)
+    QUERY_CACHE_MAX_MB: int = config("QUERY_CACHE_MAX_MB", default=64, cast=int)
+    QUERY_CACHE_TTL: float = config("QUERY_CACHE_TTL", default=30.0, cast=float)  # 院系、课程等读多写少数据的缓存秒数
+    COURSE_SCHEDULE_INDEX_TTL: float = config("COURSE_SCHEDULE_INDEX_TTL", default=30.0, cast=float)  # 课程时间索引的缓存秒数
+    PREREQUISITE_GRAPH_TTL: float = config("PREREQUISITE_GRAPH_TTL", default=60.0, cast=float)  # 先修课程关系图的缓存秒数
+    TIMETABLE_PLANNER_BUDGET: float = config("TIMETABLE_PLANNER_BUDGET", default=0.08, cast=float)  # 选课方案搜索的时间上限（秒）
+
+    # 慢查询日志
+    SLOW_QUERY_THRESHOLD_MS: float = config("SLOW_QUERY_THRESHOLD_MS", default=200.0, cast=float)
+    SLOW_QUERY_PARAM_SAMPLE_RATE: float = config("SLOW_QUERY_PARAM_SAMPLE_RATE", default=0.1, cast=float)  # 附带参数的比例
+    SLOW_QUERY_LOG_SIZE: int = config("SLOW_QUERY_LOG_SIZE", default=200, cast=int)  # 内存中保留的最近慢查询条数
+
     # JWT配置
     SECRET_KEY: str = config("SECRET_KEY", default="your-secret-key-here-change-in-production")
     ALGORITHM: str = "HS256"
@@ -109,6 +173,7 @@ class Settings(BaseSettings):
             "password": self.MYSQL_PASSWORD,
             "database": self.MYSQL_DATABASE,
             "charset": "utf8mb4",
+            "connection_timeout": self.MYSQL_CONNECT_TIMEOUT,
             "autocommit": False,
             "use_unicode": True
         }
@@ -0,0 +1,383 @@
+"""
+异步数据库客户端
+在有界线程池中执行同步客户端的调用，避免数据库操作阻塞事件循环
+
+用法::
+
+    from app.db.async_client import db
+
+    rows = await db.fetch("SELECT * FROM courses WHERE course_id = :id", {"id": course_id})
+    result = await db.execute("UPDATE courses SET status = 'inactive' WHERE course_id = :id", {"id": course_id})
+
+    async with db.transaction() as tx:
+        success, insert_id, error = await tx.insert("enrollments", data)
+
+    async def enroll(tx):
+        ...
+    insert_id = await db.run_transaction(enroll)    # 死锁或锁等待超时时整体重试
+
+    async for rows in db.stream("SELECT * FROM enrollments"):
+        ...
+
+并发度由 settings.MYSQL_POOL_SIZE 决定：同一时刻最多有该数量的调用（或事务）占用数据库连接，
+其余调用在事件循环中排队等待，不占用工作线程。
+"""
+import asyncio
+import contextlib
+import contextvars
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from app.core.config import settings
+from app.db.breaker import CLOSED
+from app.db.backend import QUERY_TIMEOUT_ERRNO
+from app.db.mysql_client import DatabaseError, MySQLCommandLineClient, mysql_client
+from app.db.instrumentation import record_transaction
+from app.db.result import ChunkResult, QueryResult, Row
+from app.db.retry import RetryPolicy, default_retry_policy, is_retryable
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT_MESSAGE = "数据库操作超时"
+
+T = TypeVar("T")
+
+
+def _next_batch(iterator):
+    """在工作线程中读取下一批数据，读完时返回None（StopIteration无法跨线程传递）"""
+    return next(iterator, None)
+
+
+class _AsyncQueryMethods:
+    """select/insert/update/delete/execute_raw_sql 等方法的异步版本，子类提供 _call()"""
+
+    _target = None
+    # execute_batch 中的语句能否并发执行
+    _concurrent = True
+
+    async def _call(self, fn, *args, timeout: Optional[float] = None, **kwargs):
+        raise NotImplementedError
+
+    def _owner(self) -> "AsyncDatabase":
+        """执行调用的异步客户端"""
+        raise NotImplementedError
+
+    def _stream_slot(self):
+        """流式查询期间持有的并发名额"""
+        raise NotImplementedError
+
+    async def _call_tuple(self, fn, empty, *args, timeout: Optional[float] = None, **kwargs):
+        """调用返回 (成功标志, 数据, 错误信息) 的方法，超时同样以该形式返回"""
+        try:
+            return await self._call(fn, *args, timeout=timeout, **kwargs)
+        except asyncio.TimeoutError:
+            logger.error(f"{TIMEOUT_MESSAGE}: {fn.__name__}")
+            return False, empty, TIMEOUT_MESSAGE
+
+    async def select(self, table: str, columns: List[str] = None, where: Dict[str, Any] = None,
+                     order_by: str = None, limit: int = None, joins: List[str] = None,
+                     cache_ttl: Optional[float] = None,
+                     timeout: Optional[float] = None) -> Tuple[bool, List[Row], str]:
+        """SELECT查询操作，cache_ttl 为查询结果缓存秒数"""
+        return await self._call_tuple(
+            self._target.select, [], table, columns=columns, where=where,
+            order_by=order_by, limit=limit, joins=joins, cache_ttl=cache_ttl, timeout=timeout
+        )
+
+    async def insert(self, table: str, data: Dict[str, Any],
+                     timeout: Optional[float] = None) -> Tuple[bool, int, str]:
+        """INSERT插入操作"""
+        return await self._call_tuple(self._target.insert, 0, table, data, timeout=timeout)
+
+    async def update(self, table: str, data: Dict[str, Any], where: Dict[str, Any],
+                     timeout: Optional[float] = None) -> Tuple[bool, int, str]:
+        """UPDATE更新操作"""
+        return await self._call_tuple(self._target.update, 0, table, data, where, timeout=timeout)
+
+    async def delete(self, table: str, where: Dict[str, Any],
+                     timeout: Optional[float] = None) -> Tuple[bool, int, str]:
+        """DELETE删除操作"""
+        return await self._call_tuple(self._target.delete, 0, table, where, timeout=timeout)
+
+    async def insert_many(self, table: str, rows: List[Dict[str, Any]], chunk_size: Optional[int] = None,
+                          timeout: Optional[float] = None) -> Tuple[bool, List[ChunkResult], str]:
+        """多行INSERT"""
+        return await self._call_tuple(self._target.insert_many, [], table, rows, chunk_size, timeout=timeout)
+
+    async def upsert_many(self, table: str, rows: List[Dict[str, Any]], update_columns: List[str] = None,
+                          chunk_size: Optional[int] = None,
+                          timeout: Optional[float] = None) -> Tuple[bool, List[ChunkResult], str]:
+        """多行 INSERT ... ON DUPLICATE KEY UPDATE"""
+        return await self._call_tuple(
+            self._target.upsert_many, [], table, rows, update_columns, chunk_size, timeout=timeout
+        )
+
+    async def update_many(self, table: str, rows: List[Dict[str, Any]], key: str,
+                          chunk_size: Optional[int] = None,
+                          timeout: Optional[float] = None) -> Tuple[bool, List[ChunkResult], str]:
+        """按键列批量更新"""
+        return await self._call_tuple(self._target.update_many, [], table, rows, key, chunk_size, timeout=timeout)
+
+    async def execute_raw_sql(self, sql: str, params: Optional[Dict[str, Any]] = None,
+                              cache_ttl: Optional[float] = None,
+                              timeout: Optional[float] = None) -> Tuple[bool, List[Row], str]:
+        """执行原始SQL语句，cache_ttl 为查询结果缓存秒数"""
+        return await self._call_tuple(self._target.execute_raw_sql, [], sql, params, cache_ttl, timeout=timeout)
+
+    async def execute_batch(self, statements: List[Tuple[str, Optional[Dict[str, Any]]]],
+                            cache_ttl: Optional[float] = None,
+                            timeout: Optional[float] = None) -> Tuple[bool, List[List[Row]], str]:
+        """
+        执行多条互不依赖的查询（如分页接口的总数和当前页），返回 (成功标志, 各语句的结果列表, 错误信息)
+        各语句在不同的连接上并发执行，总耗时接近其中最慢的一条；事务内在同一连接上依次执行
+        任一语句失败时成功标志为False，错误信息取第一个失败的语句
+        """
+        calls = [
+            self._call_tuple(self._target.execute_raw_sql, [], sql, params, cache_ttl, timeout=timeout)
+            for sql, params in statements
+        ]
+        if self._concurrent:
+            outcomes = await asyncio.gather(*calls)
+        else:
+            outcomes = [await call for call in calls]
+        error = next((error for success, _, error in outcomes if not success), "")
+        return not error, [rows for _, rows, _ in outcomes], error
+
+    async def execute(self, sql: str, params: Optional[Dict[str, Any]] = None,
+                      cache_ttl: Optional[float] = None,
+                      timeout: Optional[float] = None) -> QueryResult:
+        """执行SQL并返回完整结果（影响行数、自增ID等），失败或超时抛出 DatabaseError"""
+        try:
+            return await self._call(self._target.query, sql, params, cache_ttl, timeout=timeout)
+        except asyncio.TimeoutError:
+            raise DatabaseError(TIMEOUT_MESSAGE, QUERY_TIMEOUT_ERRNO)
+
+    async def fetch(self, sql: str, params: Optional[Dict[str, Any]] = None,
+                    cache_ttl: Optional[float] = None,
+                    timeout: Optional[float] = None) -> List[Row]:
+        """执行查询并返回所有行，失败或超时抛出 DatabaseError"""
+        result = await self.execute(sql, params, cache_ttl, timeout=timeout)
+        return result.as_rows()
+
+    async def fetch_one(self, sql: str, params: Optional[Dict[str, Any]] = None,
+                        cache_ttl: Optional[float] = None,
+                        timeout: Optional[float] = None) -> Optional[Row]:
+        """执行查询并返回第一行，没有结果时返回None"""
+        rows = await self.fetch(sql, params, cache_ttl, timeout=timeout)
+        return rows[0] if rows else None
+
+    async def stream(self, sql: str, params: Optional[Dict[str, Any]] = None,
+                     batch_size: Optional[int] = None,
+                     timeout: Optional[float] = None) -> AsyncIterator[List[Row]]:
+        """
+        流式查询的异步迭代器，每批数据在工作线程中读取
+        整个迭代期间占用一个并发名额和一个连接；timeout 作用于每一批的读取，超时抛出 DatabaseError
+        """
+        database = self._owner()
+        async with self._stream_slot():
+            batches = self._target.stream(sql, params, batch_size)
+            pending = None
+            try:
+                while True:
+                    pending = database._submit(_next_batch, batches)
+                    try:
+                        rows = await asyncio.wait_for(asyncio.shield(pending), timeout or database.timeout)
+                    except asyncio.TimeoutError:
+                        raise DatabaseError(TIMEOUT_MESSAGE, QUERY_TIMEOUT_ERRNO)
+                    pending = None
+                    if rows is None:
+                        break
+                    yield rows
+            finally:
+                # 生成器不能在执行中被关闭，先等待正在读取的批次结束
+                if pending is not None:
+                    await asyncio.wait([pending])
+                await database._run_in_thread(batches.close)
+
+
+@contextlib.asynccontextmanager
+async def _no_slot():
+    yield
+
+
+class AsyncTransaction(_AsyncQueryMethods):
+    """异步事务会话，所有语句在事务独占的连接上依次执行"""
+
+    _concurrent = False
+
+    def __init__(self, database: "AsyncDatabase", timeout: Optional[float]):
+        self._database = database
+        self._timeout = timeout
+        self._cm = None
+        self._target = None
+        self._pending = None
+
+    async def _call(self, fn, *args, timeout: Optional[float] = None, **kwargs):
+        future = self._database._submit(fn, *args, **kwargs)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout or self._timeout)
+        except asyncio.TimeoutError:
+            # 超时的语句仍在连接上执行，结束事务前需等待其完成
+            self._pending = future
+            raise
+
+    def _owner(self) -> "AsyncDatabase":
+        return self._database
+
+    def _stream_slot(self):
+        # 事务已持有并发名额
+        return _no_slot()
+
+    async def __aenter__(self) -> "AsyncTransaction":
+        await self._database._acquire_slot()
+        try:
+            self._cm = self._database.client.transaction()
+            # 借出连接由连接池自身的等待超时控制
+            self._target = await self._database._run_in_thread(self._cm.__enter__, timeout=None)
+        except BaseException:
+            self._database._release_slot()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            if self._pending is not None:
+                await asyncio.wait([self._pending])
+            # 提交/回滚不受单次调用超时限制，确保连接被正确归还
+            return await self._database._run_in_thread(self._cm.__exit__, exc_type, exc, tb, timeout=None)
+        finally:
+            self._database._release_slot()
+
+
+class AsyncDatabase(_AsyncQueryMethods):
+    """
+    异步数据库客户端
+    - 调用在最多 max_concurrency 个工作线程中执行
+    - 每次调用（或整个事务）占用一个并发名额，名额数与连接池大小一致，
+      保证进入工作线程的调用一定能拿到连接
+    - timeout 为单次调用的默认超时（秒），可在每次调用时单独指定
+    """
+
+    def __init__(self, client: MySQLCommandLineClient, max_concurrency: int, timeout: float):
+        self.client = client
+        self._target = client
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="db")
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._slots_loop = None
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # 信号量绑定事件循环，循环变化（如测试中多次启动应用）时重新创建
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._slots_loop = loop
+        return self._slots
+
+    async def _acquire_slot(self):
+        await self._semaphore().acquire()
+
+    def _release_slot(self):
+        self._semaphore().release()
+
+    def _submit(self, fn, *args, **kwargs) -> asyncio.Future:
+        """提交到工作线程执行，保留当前上下文变量（用于按请求统计数据库往返）"""
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        return loop.run_in_executor(self._executor, functools.partial(ctx.run, fn, *args, **kwargs))
+
+    async def _run_in_thread(self, fn, *args, timeout: Optional[float] = None, **kwargs):
+        future = self._submit(fn, *args, **kwargs)
+        if timeout is None:
+            return await future
+        return await asyncio.wait_for(future, timeout)
+
+    async def _call(self, fn, *args, timeout: Optional[float] = None, **kwargs):
+        slots = self._semaphore()
+        await slots.acquire()
+        try:
+            future = self._submit(fn, *args, **kwargs)
+        except BaseException:
+            slots.release()
+            raise
+        # 超时或取消后工作线程仍占用连接，名额在线程执行结束时才归还，保证名额数与连接数一致
+        future.add_done_callback(lambda _: slots.release())
+        return await asyncio.wait_for(asyncio.shield(future), timeout or self.timeout)
+
+    def _owner(self) -> "AsyncDatabase":
+        return self
+
+    def _stream_slot(self):
+        return self._semaphore()
+
+    def transaction(self, timeout: Optional[float] = None) -> AsyncTransaction:
+        """
+        异步事务上下文管理器::
+
+            async with db.transaction() as tx:
+                await tx.insert(...)
+        """
+        return AsyncTransaction(self, timeout or self.timeout)
+
+    async def run_transaction(self, body: Callable[[AsyncTransaction], Awaitable[T]],
+                              policy: Optional[RetryPolicy] = None,
+                              timeout: Optional[float] = None) -> T:
+        """
+        在事务中执行 body(tx) 并返回其结果，死锁或锁等待超时时回滚并按重试策略重新执行整个 body::
+
+            async def enroll(tx):
+                success, insert_id, error = await tx.insert("enrollments", data)
+                ...
+                return insert_id
+
+            insert_id = await db.run_transaction(enroll)
+
+        body 可能被执行多次，只能在事务内读写数据库，不能有其他副作用；
+        重试用尽后抛出最后一次的 DatabaseError，body 抛出的其他异常直接传给调用方。
+        重试次数按接口记录在 transaction_stats() 中
+        """
+        policy = policy or default_retry_policy()
+        started = time.monotonic()
+        conflicts: List[int] = []
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                async with self.transaction(timeout) as tx:
+                    result = await body(tx)
+            except DatabaseError as e:
+                if not is_retryable(e):
+                    record_transaction(conflicts)
+                    raise
+                conflicts.append(e.errno)
+                delay = policy.next_delay(e, attempt, time.monotonic() - started)
+                if delay is None:
+                    logger.error(f"事务第{attempt}次执行仍发生锁冲突，放弃重试: {e.message}")
+                    record_transaction(conflicts, exhausted=True)
+                    raise
+                logger.warning(f"事务第{attempt}次执行发生锁冲突，{delay * 1000:.0f}ms 后重试: {e.message}")
+                await asyncio.sleep(delay)
+            except BaseException:
+                record_transaction(conflicts)
+                raise
+            else:
+                record_transaction(conflicts)
+                return result
+
+    @property
+    def unavailable(self) -> bool:
+        """熔断器未关闭时为True；元组接口调用失败时据此区分数据库不可用和语句执行失败"""
+        return self.client.breaker.state != CLOSED
+
+    def close(self):
+        """关闭工作线程和底层执行后端"""
+        self._executor.shutdown(wait=False)
+        self.client.backend.close()
+
+
+# 创建全局异步数据库客户端实例
+db = AsyncDatabase(mysql_client, settings.MYSQL_POOL_SIZE, settings.DB_CALL_TIMEOUT)
@@ -0,0 +1,82 @@
+"""
+执行后端公共定义
+执行后端（连接池、命令行、SQLite）共用的基类、错误类型和驱动返回值处理
+"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.db.result import QueryResult
+from app.db.statements import CompiledStatement
+
+
+class DatabaseError(Exception):
+    """执行后端抛出的数据库错误，errno为MySQL错误码（未知时为None）"""
+
+    def __init__(self, message: str, errno: Optional[int] = None):
+        super().__init__(message)
+        self.message = message
+        self.errno = errno
+
+
+# 连接级错误：客户端错误码(2000-2999)、连接数过多、认证失败、库不存在、服务器关闭中
+_CONNECTION_ERRNOS = frozenset((1040, 1045, 1049, 1053))
+
+# 语句执行超时（ER_QUERY_TIMEOUT），客户端等待单条语句超时也使用该错误码：数据库仍可用，只是语句慢（如锁等待）
+QUERY_TIMEOUT_ERRNO = 3024
+
+
+def is_connection_error(error: BaseException) -> bool:
+    """
+    数据库不可用类错误（错误码未知的数据库错误如等待连接超时也视为不可用），
+    SQL错误和语句执行超时返回False
+    """
+    if not isinstance(error, DatabaseError):
+        return False
+    errno = error.errno
+    return errno is None or 2000 <= errno < 3000 or errno in _CONNECTION_ERRNOS
+
+
+_BYTES_TYPES = frozenset((bytes, bytearray))
+
+
+def _from_driver(value: Any) -> Any:
+    """驱动已按列类型转换数值、日期等，只需将以字节返回的文本解码为str"""
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", errors="replace")
+    return value
+
+
+def _from_driver_rows(rows: List[Tuple]) -> List[Tuple]:
+    """解码驱动返回的行，不含字节值的行（绝大多数）直接复用驱动的元组"""
+    return [
+        row if _BYTES_TYPES.isdisjoint(map(type, row)) else tuple(map(_from_driver, row))
+        for row in rows
+    ]
+
+
+class BaseBackend:
+    """
+    执行后端基类
+    子类实现:
+      - run(): 一次执行同时返回列信息、数据行、影响行数和自增ID
+      - session(): 借出一个固定连接，供事务内的所有语句使用
+      - stream(): 按批读取结果集，内存占用与批大小成正比
+    """
+
+    name = "base"
+
+    def run(self, statement: CompiledStatement, params: Optional[Dict[str, Any]] = None,
+            fetch_results: bool = True) -> QueryResult:
+        raise NotImplementedError
+
+    def session(self):
+        raise NotImplementedError
+
+    def stream(self, statement: CompiledStatement, params: Optional[Dict[str, Any]],
+               batch_size: int) -> Iterator[QueryResult]:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def status(self) -> Dict[str, Any]:
+        return {"backend": self.name}
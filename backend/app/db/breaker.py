@@ -0,0 +1,133 @@
+"""
+数据库熔断器
+所有数据库调用共用一个状态机，数据库不可用时快速失败，避免每个请求都等到连接超时：
+  - closed（正常）：连续 failure_threshold 次连接级错误后进入 open
+  - open（熔断）：调用直接抛出 DatabaseUnavailableError，不访问数据库；probe_interval 秒后进入 half_open
+  - half_open（探测）：只放行一个调用作为探测，成功则恢复 closed，连接失败则重新进入 open
+
+只有连接级错误（连接失败、认证失败、等待连接超时等）计入失败；SQL错误和语句执行超时说明数据库可以访问，视为成功
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from app.db.backend import DatabaseError, is_connection_error
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# CR_CONN_HOST_ERROR：与客户端连接失败时的错误码一致，调用方无需区分
+UNAVAILABLE_ERRNO = 2003
+
+
+class DatabaseUnavailableError(DatabaseError):
+    """熔断期间拒绝执行时抛出，retry_after 为距下次探测的秒数"""
+
+    def __init__(self, retry_after: float):
+        super().__init__("数据库暂时不可用，请稍后重试", UNAVAILABLE_ERRNO)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """线程安全的熔断器，before_call/record_success/record_failure 也可以直接使用，通常使用 guard()"""
+
+    def __init__(self, failure_threshold: int, probe_interval: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.probe_interval = probe_interval
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._rejected = 0
+        self._trips = 0
+        self._last_error: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def _retry_after(self, now: float) -> float:
+        return max(0.0, self._opened_at + self.probe_interval - now)
+
+    def _open(self, now: float):
+        self._state = OPEN
+        self._opened_at = now
+        self._trips += 1
+        logger.error(f"数据库熔断器打开，{self.probe_interval:.0f} 秒后探测: {self._last_error}")
+
+    def before_call(self):
+        """调用数据库前检查，熔断中或已有探测在进行时抛出 DatabaseUnavailableError"""
+        if self._state == CLOSED:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            if self._state == OPEN and self._retry_after(now) == 0:
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN and not self._probing:
+                self._probing = True
+                logger.info("数据库熔断器半开，放行一个探测调用")
+                return
+            self._rejected += 1
+            raise DatabaseUnavailableError(self._retry_after(now) or self.probe_interval)
+
+    def record_success(self):
+        if self._state == CLOSED and not self._failures:
+            return
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self._state != CLOSED:
+                self._state = CLOSED
+                logger.info("数据库已恢复，熔断器关闭")
+
+    def record_failure(self, error: BaseException):
+        """按错误类型记录调用结果：连接级错误计入失败，其他数据库错误视为成功"""
+        if not is_connection_error(error):
+            if isinstance(error, DatabaseError):
+                self.record_success()
+            elif self._probing:
+                # 与数据库无关的异常（如调用方代码出错）不能说明数据库状态，让下一个调用重新探测
+                with self._lock:
+                    self._probing = False
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._probing = False
+            self._failures += 1
+            self._last_error = str(error)
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._open(now)
+
+    @contextmanager
+    def guard(self):
+        """在熔断器保护下执行一次数据库调用"""
+        self.before_call()
+        try:
+            yield
+        except BaseException as e:
+            self.record_failure(e)
+            raise
+        else:
+            self.record_success()
+
+    def status(self) -> Dict[str, Any]:
+        """熔断器状态，不访问数据库"""
+        with self._lock:
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "probe_interval": self.probe_interval,
+                "retry_after": round(self._retry_after(time.monotonic()), 3) if self._state == OPEN else 0.0,
+                "trips": self._trips,
+                "rejected": self._rejected,
+                "last_error": self._last_error
+            }
@@ -0,0 +1,270 @@
+"""
+查询结果缓存
+按 (SQL, 参数) 缓存只读查询的结果，调用方通过 cache_ttl 显式开启：
+  - 每个条目按读取的表打标签，insert/update/delete 等写语句执行后使涉及表的条目失效
+  - 触发器和视图涉及的表在 TABLE_DEPENDENCIES / VIEW_TABLES 中声明
+  - 表名无法确定的写语句（如未声明的存储过程）清空全部缓存
+  - 条目数和估算内存均有上限，超出时淘汰最久未使用的条目
+  - 查询期间涉及的表发生写入时，查询结果不写入缓存，避免缓存写入前的旧数据
+  - 配置从库时，表写入后 settle_seconds 内不缓存该表的查询结果，避免缓存复制延迟中的旧数据
+
+缓存只在本进程内有效，多进程部署时其他进程的写入只能等待TTL过期
+"""
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from app.db.instrumentation import fingerprint
+from app.db.result import QueryResult
+
+# 写入一张表时一并失效的表（触发器中修改的表）；选课人数由应用显式更新 courses，无需声明
+TABLE_DEPENDENCIES: Dict[str, Tuple[str, ...]] = {}
+
+# 视图依赖的基础表，读取视图的条目按基础表打标签
+VIEW_TABLES: Dict[str, Tuple[str, ...]] = {
+    "student_grades": ("students", "enrollments", "courses"),
+    "friend_relationships": ("friendships", "students"),
+}
+
+# 存储过程写入的表，只读的存储过程为空；未声明的存储过程视为可能写入任意表
+PROCEDURE_TABLES: Dict[str, Tuple[str, ...]] = {
+    "recommendfriends": (),
+}
+
+_READ_PREFIXES = ('SELECT', 'SHOW', 'DESCRIBE', 'EXPLAIN', 'WITH')
+
+_SOURCE_PATTERN = re.compile(
+    r"\b(?:FROM|JOIN)\s+(`?\w+`?(?:\s+(?:AS\s+)?\w+)?(?:\s*,\s*`?\w+`?(?:\s+(?:AS\s+)?\w+)?)*)",
+    re.IGNORECASE
+)
+_WRITE_TARGET_PATTERN = re.compile(
+    r"^\s*(?:INSERT(?:\s+IGNORE)?(?:\s+INTO)?|REPLACE(?:\s+INTO)?|UPDATE(?:\s+IGNORE)?|DELETE(?:\s+IGNORE)?\s+FROM"
+    r"|TRUNCATE(?:\s+TABLE)?|(?:ALTER|DROP|CREATE)\s+TABLE(?:\s+IF\s+(?:NOT\s+)?EXISTS)?)\s+`?(\w+)`?",
+    re.IGNORECASE
+)
+_CALL_PATTERN = re.compile(r"^\s*CALL\s+`?(\w+)`?", re.IGNORECASE)
+
+# 事务控制等不修改数据的语句
+_NO_WRITE_PREFIXES = ('SET', 'START', 'BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE', 'USE', 'DO')
+
+
+def _expand(tables) -> FrozenSet[str]:
+    tags = set()
+    for table in tables:
+        table = table.strip("`").lower()
+        tags.update(VIEW_TABLES.get(table, (table,)))
+    return frozenset(tags)
+
+
+@lru_cache(maxsize=1024)
+def read_tags(sql: str) -> FrozenSet[str]:
+    """只读查询读取的表（视图展开为基础表）"""
+    tables = []
+    for match in _SOURCE_PATTERN.finditer(sql):
+        tables.extend(part.split()[0] for part in match.group(1).split(","))
+    return _expand(tables)
+
+
+@lru_cache(maxsize=1024)
+def write_tags(sql: str) -> Optional[FrozenSet[str]]:
+    """
+    语句写入的表（含触发器中修改的表），不写入数据的语句返回空集合
+    无法确定写入哪些表时返回None
+    """
+    head = sql.lstrip().upper()
+    if head.startswith(_READ_PREFIXES) or head.startswith(_NO_WRITE_PREFIXES):
+        return frozenset()
+    call = _CALL_PATTERN.match(sql)
+    if call:
+        tables = PROCEDURE_TABLES.get(call.group(1).lower())
+        return None if tables is None else frozenset(tables)
+    target = _WRITE_TARGET_PATTERN.match(sql)
+    if not target:
+        return None
+    # 多表UPDATE/DELETE及 INSERT ... SELECT 中出现的表一并失效，宁可多失效
+    tags = set(read_tags(sql))
+    tags.add(target.group(1).lower())
+    for table in list(tags):
+        tags.update(TABLE_DEPENDENCIES.get(table, ()))
+    return frozenset(tags)
+
+
+def _estimate_size(result: QueryResult) -> int:
+    """结果集的估算内存占用（字节）"""
+    size = sys.getsizeof(result.rows)
+    for row in result.rows:
+        size += sys.getsizeof(row)
+        for value in row:
+            if value is not None:
+                size += sys.getsizeof(value)
+    return size
+
+
+class _CacheEntry:
+    __slots__ = ("result", "expires_at", "tags", "size")
+
+    def __init__(self, result: QueryResult, expires_at: float, tags: FrozenSet[str], size: int):
+        self.result = result
+        self.expires_at = expires_at
+        self.tags = tags
+        self.size = size
+
+
+class _StatementStats:
+    __slots__ = ("hits", "misses", "skipped")
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+
+class QueryCache:
+    """进程内的查询结果缓存（LRU + TTL + 表标签失效）"""
+
+    def __init__(self, max_entries: int, max_bytes: int, settle_seconds: float = 0.0, enabled: bool = True):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.settle_seconds = settle_seconds
+        self.enabled = enabled
+        self._entries: "OrderedDict[Tuple[str, Any], _CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # 表标签的版本号，写入时递增；_generation 在清空全部缓存时递增
+        self._tag_versions: Dict[str, int] = {}
+        self._tag_written_at: Dict[str, float] = {}
+        self._generation = 0
+        self._flushed_at = float("-inf")
+        self._statements: Dict[str, _StatementStats] = {}
+        self._evictions = 0
+        self._invalidations = 0
+
+    @staticmethod
+    def _key(sql: str, params: Optional[Dict[str, Any]]) -> Optional[Tuple[str, Any]]:
+        """缓存键，参数不可哈希时返回None（不缓存）"""
+        try:
+            frozen = tuple(sorted(params.items())) if params else ()
+            hash(frozen)
+        except TypeError:
+            return None
+        return sql, frozen
+
+    def _statement_stats(self, sql: str) -> _StatementStats:
+        text = fingerprint(sql)
+        stats = self._statements.get(text)
+        if stats is None:
+            stats = self._statements[text] = _StatementStats()
+        return stats
+
+    def _versions(self, tags: FrozenSet[str]) -> Tuple[int, Tuple[int, ...]]:
+        return self._generation, tuple(self._tag_versions.get(tag, 0) for tag in sorted(tags))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def get_or_load(self, sql: str, params: Optional[Dict[str, Any]], ttl: float,
+                    load: Callable[[], QueryResult]) -> QueryResult:
+        """读取缓存，未命中时调用 load() 查询并写入缓存"""
+        key = self._key(sql, params) if self.enabled and ttl > 0 else None
+        if key is None:
+            return load()
+
+        tags = read_tags(sql)
+        now = time.monotonic()
+        with self._lock:
+            stats = self._statement_stats(sql)
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires_at > now:
+                    self._entries.move_to_end(key)
+                    stats.hits += 1
+                    return entry.result
+                self._remove(key)
+            stats.misses += 1
+            versions = self._versions(tags)
+
+        result = load()
+
+        size = _estimate_size(result)
+        with self._lock:
+            now = time.monotonic()
+            written_at = max([self._flushed_at] + [self._tag_written_at.get(tag, float("-inf")) for tag in tags])
+            settling = now - written_at < self.settle_seconds
+            if self._versions(tags) != versions or settling or size > self.max_bytes:
+                stats.skipped += 1
+                return result
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _CacheEntry(result, now + ttl, tags, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+        return result
+
+    def invalidate(self, tags: Optional[FrozenSet[str]]):
+        """使带有任一标签的条目失效，tags 为None时清空全部缓存"""
+        if tags is not None and not tags:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if tags is None:
+                self._generation += 1
+                self._invalidations += len(self._entries)
+                self._entries.clear()
+                self._bytes = 0
+                self._flushed_at = now
+                return
+            for tag in tags:
+                self._tag_versions[tag] = self._tag_versions.get(tag, 0) + 1
+                self._tag_written_at[tag] = now
+            stale = [key for key, entry in self._entries.items() if not entry.tags.isdisjoint(tags)]
+            for key in stale:
+                self._remove(key)
+            self._invalidations += len(stale)
+
+    def invalidate_statement(self, sql: str):
+        """语句执行后按其写入的表失效"""
+        self.invalidate(write_tags(sql))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._generation += 1
+
+    def status(self, top: int = 20) -> Dict[str, Any]:
+        """缓存状态和命中率，statements 按访问次数排序"""
+        with self._lock:
+            statements: List[Dict[str, Any]] = []
+            hits = misses = 0
+            for text, stats in self._statements.items():
+                hits += stats.hits
+                misses += stats.misses
+                total = stats.hits + stats.misses
+                statements.append({
+                    "statement": text,
+                    "hits": stats.hits,
+                    "misses": stats.misses,
+                    "skipped": stats.skipped,
+                    "hit_rate": round(stats.hits / total, 4) if total else 0.0
+                })
+            statements.sort(key=lambda item: item["hits"] + item["misses"], reverse=True)
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+                "statements": statements[:top]
+            }
@@ -0,0 +1,336 @@
+"""
+数据库调用统计
+- 按HTTP请求统计数据库往返次数，便于发现重复查询等性能回退
+- 按SQL指纹和调用接口统计调用次数、耗时直方图、返回行数和错误数
+- 超过 SLOW_QUERY_THRESHOLD_MS 的调用写入慢查询日志，并按采样率附带参数
+- 按调用接口统计事务次数和因死锁、锁等待超时产生的重试次数
+"""
+import bisect
+import hashlib
+import logging
+import random
+import re
+import threading
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+
+class RequestStats:
+    """单个请求内的数据库调用统计"""
+
+    __slots__ = ("round_trips", "_scope")
+
+    def __init__(self, scope: Optional[Dict[str, Any]] = None):
+        self.round_trips = 0
+        self._scope = scope
+
+    @property
+    def endpoint(self) -> str:
+        """调用接口，如 "GET /api/v1/courses/{course_id}"；路由匹配前为 "(unmatched)" """
+        if self._scope is None:
+            return BACKGROUND_ENDPOINT
+        scope = self._scope
+        if scope.get("route") is None:
+            return f"{scope.get('method', '')} (unmatched)".strip()
+        # 嵌套路由中 route.path 只是相对路径，这里把实际路径中的路径参数值还原为参数名
+        params = {str(value): name for name, value in scope.get("path_params", {}).items()}
+        path = "/".join(
+            f"{{{params[segment]}}}" if segment in params else segment
+            for segment in scope.get("path", "").split("/")
+        )
+        return f"{scope.get('method', '')} {path}".strip()
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("db_request_stats", default=None)
+
+_lock = threading.Lock()
+_total_round_trips = 0
+
+
+def begin_request(scope: Optional[Dict[str, Any]] = None) -> RequestStats:
+    """
+    在请求开始时调用，返回本请求的统计对象
+    scope 为ASGI scope，路由匹配后从中取得调用接口的路由模板
+    """
+    stats = RequestStats(scope)
+    _request_stats.set(stats)
+    return stats
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    """当前请求的统计对象，不在请求上下文中时为None"""
+    return _request_stats.get()
+
+
+def record_round_trip(count: int = 1):
+    """记录一次与数据库的往返"""
+    global _total_round_trips
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.round_trips += count
+    with _lock:
+        _total_round_trips += count
+
+
+def total_round_trips() -> int:
+    """进程启动以来的数据库往返总数"""
+    return _total_round_trips
+
+
+# ---- 按SQL指纹统计 ----
+
+# 延迟直方图的桶上界（毫秒），最后一个桶收集超过最大上界的调用
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# 单进程最多跟踪的 (指纹, 接口) 组合数，超出后新组合计入 OVERFLOW_ENDPOINT
+MAX_TRACKED_QUERIES = 2000
+OVERFLOW_ENDPOINT = "(overflow)"
+BACKGROUND_ENDPOINT = "(background)"
+
+_FINGERPRINT_RULES = [
+    (re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\""), "?"),   # 字符串字面量
+    (re.compile(r"(?<![:\w]):[A-Za-z_]\w*"), "?"),                          # 命名参数
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),                                # 数字
+    (re.compile(r"\s+"), " "),                                              # 空白
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+"), "(?+)+"),  # 多行VALUES
+    (re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)+\s*\)", re.IGNORECASE), "IN (?+)"),             # IN列表
+    (re.compile(r"(?:\bWHEN \? THEN \? )+", re.IGNORECASE), "WHEN ? THEN ? "),              # 批量更新的CASE
+]
+
+slow_query_logger = logging.getLogger("app.db.slow_query")
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql: str) -> str:
+    """将SQL归一化为指纹：字面量和参数替换为 ?，多行VALUES/IN列表合并，空白压缩"""
+    text = sql
+    for pattern, replacement in _FINGERPRINT_RULES:
+        text = pattern.sub(replacement, text)
+    return text.strip().rstrip(";").strip()
+
+
+@lru_cache(maxsize=4096)
+def fingerprint_id(text: str) -> str:
+    """指纹的短标识"""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+class QueryStats:
+    """一个SQL指纹在一个调用接口下的累计统计"""
+
+    __slots__ = ("fingerprint", "endpoint", "count", "errors", "rows", "total_time", "max_time", "buckets")
+
+    def __init__(self, fingerprint_text: str, endpoint: str):
+        self.fingerprint = fingerprint_text
+        self.endpoint = endpoint
+        self.count = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, elapsed: float, rows: int, error: bool):
+        self.count += 1
+        self.rows += rows
+        self.total_time += elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+        if error:
+            self.errors += 1
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed * 1000)] += 1
+
+    def merge(self, other: "QueryStats"):
+        self.count += other.count
+        self.errors += other.errors
+        self.rows += other.rows
+        self.total_time += other.total_time
+        self.max_time = max(self.max_time, other.max_time)
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+
+    def percentile_ms(self, fraction: float) -> float:
+        """按直方图估算分位数，返回所在桶的上界（最后一个桶返回最大耗时）"""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target:
+                if index < len(LATENCY_BUCKETS_MS):
+                    return float(LATENCY_BUCKETS_MS[index])
+                break
+        return round(self.max_time * 1000, 3)
+
+    def as_dict(self) -> Dict[str, Any]:
+        labels = [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        return {
+            "fingerprint_id": fingerprint_id(self.fingerprint),
+            "fingerprint": self.fingerprint,
+            "endpoint": self.endpoint,
+            "count": self.count,
+            "errors": self.errors,
+            "rows": self.rows,
+            "total_ms": round(self.total_time * 1000, 3),
+            "avg_ms": round(self.total_time * 1000 / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_time * 1000, 3),
+            "p50_ms": self.percentile_ms(0.50),
+            "p95_ms": self.percentile_ms(0.95),
+            "p99_ms": self.percentile_ms(0.99),
+            "histogram": {label: count for label, count in zip(labels, self.buckets) if count}
+        }
+
+
+_query_stats: Dict[Tuple[str, str], QueryStats] = {}
+_slow_queries: Deque[Dict[str, Any]] = deque(maxlen=settings.SLOW_QUERY_LOG_SIZE)
+
+
+def _current_endpoint() -> str:
+    stats = _request_stats.get()
+    return stats.endpoint if stats is not None else BACKGROUND_ENDPOINT
+
+
+def _sample_params(params: Optional[Dict[str, Any]], limit: int = 20) -> Optional[Dict[str, str]]:
+    """截断后的参数样本，避免日志中出现超长值或批量写入的全部参数"""
+    if not params:
+        return None
+    sample = {}
+    for index, (name, value) in enumerate(params.items()):
+        if index >= limit:
+            sample["..."] = f"共{len(params)}个参数"
+            break
+        text = repr(value)
+        sample[name] = text if len(text) <= 64 else text[:61] + "..."
+    return sample
+
+
+def record_query(sql: str, elapsed: float, rows: int = 0, error: bool = False,
+                 params: Optional[Dict[str, Any]] = None):
+    """记录一次SQL调用的耗时、行数和是否出错，超过阈值时写入慢查询日志"""
+    text = fingerprint(sql)
+    endpoint = _current_endpoint()
+    with _lock:
+        key = (text, endpoint)
+        stats = _query_stats.get(key)
+        if stats is None:
+            if len(_query_stats) >= MAX_TRACKED_QUERIES:
+                key = (text, OVERFLOW_ENDPOINT)
+                stats = _query_stats.get(key)
+            if stats is None:
+                stats = _query_stats[key] = QueryStats(*key)
+        stats.add(elapsed, rows, error)
+
+    elapsed_ms = elapsed * 1000
+    if elapsed_ms < settings.SLOW_QUERY_THRESHOLD_MS:
+        return
+    entry = {
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "fingerprint_id": fingerprint_id(text),
+        "fingerprint": text,
+        "endpoint": endpoint,
+        "elapsed_ms": round(elapsed_ms, 3),
+        "rows": rows,
+        "error": error,
+        "params": _sample_params(params) if random.random() < settings.SLOW_QUERY_PARAM_SAMPLE_RATE else None
+    }
+    with _lock:
+        _slow_queries.append(entry)
+    slow_query_logger.warning(
+        f"慢查询 {entry['elapsed_ms']:.1f}ms [{endpoint}] {text}"
+        + (f" 参数: {entry['params']}" if entry["params"] else "")
+    )
+
+
+def top_queries(limit: int = 10, sort_by: str = "total_ms", by_endpoint: bool = True) -> List[Dict[str, Any]]:
+    """
+    耗时最多的SQL指纹
+    sort_by: total_ms / avg_ms / max_ms / p95_ms / count / errors / rows
+    by_endpoint=False 时合并同一指纹在各接口下的统计
+    """
+    with _lock:
+        if by_endpoint:
+            entries = [stats.as_dict() for stats in _query_stats.values()]
+        else:
+            merged: Dict[str, QueryStats] = {}
+            for (text, _), stats in _query_stats.items():
+                total = merged.get(text)
+                if total is None:
+                    total = merged[text] = QueryStats(text, "*")
+                total.merge(stats)
+            entries = [stats.as_dict() for stats in merged.values()]
+    entries.sort(key=lambda entry: entry[sort_by], reverse=True)
+    return entries[:limit]
+
+
+def slow_queries(limit: int = 50) -> List[Dict[str, Any]]:
+    """最近的慢查询，最新的在前"""
+    with _lock:
+        entries = list(_slow_queries)
+    return entries[::-1][:limit]
+
+
+class TransactionStats:
+    """一个接口的事务执行和重试统计"""
+
+    __slots__ = ("endpoint", "transactions", "retries", "deadlocks", "lock_timeouts", "exhausted")
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.transactions = 0
+        self.retries = 0
+        self.deadlocks = 0
+        self.lock_timeouts = 0
+        self.exhausted = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "endpoint": self.endpoint,
+            "transactions": self.transactions,
+            "retries": self.retries,
+            "deadlocks": self.deadlocks,
+            "lock_timeouts": self.lock_timeouts,
+            "exhausted": self.exhausted,
+            "retry_rate": round(self.retries / self.transactions, 4) if self.transactions else 0.0
+        }
+
+
+_transaction_stats: Dict[str, TransactionStats] = {}
+
+
+def record_transaction(conflicts: List[int], exhausted: bool = False):
+    """
+    记录一次（含重试的）事务执行
+    conflicts 为各次失败执行的错误码（1213 死锁 / 1205 锁等待超时），exhausted 表示重试用尽仍失败
+    """
+    endpoint = _current_endpoint()
+    with _lock:
+        stats = _transaction_stats.get(endpoint)
+        if stats is None:
+            stats = _transaction_stats[endpoint] = TransactionStats(endpoint)
+        stats.transactions += 1
+        stats.retries += len(conflicts) - (1 if exhausted else 0)
+        stats.deadlocks += sum(1 for errno in conflicts if errno == 1213)
+        stats.lock_timeouts += sum(1 for errno in conflicts if errno == 1205)
+        if exhausted:
+            stats.exhausted += 1
+
+
+def transaction_stats() -> List[Dict[str, Any]]:
+    """各接口的事务重试统计，按重试次数排序"""
+    with _lock:
+        entries = [stats.as_dict() for stats in _transaction_stats.values()]
+    entries.sort(key=lambda entry: entry["retries"], reverse=True)
+    return entries
+
+
+def reset_query_stats():
+    """清空指纹统计、慢查询记录和事务重试统计"""
+    with _lock:
+        _query_stats.clear()
+        _slow_queries.clear()
+        _transaction_stats.clear()
@@ -1,88 +1,135 @@
 """
 MySQL命令行客户端
 实现通过MySQL命令行进行CRUD操作，包含连接管理、事务处理、SQL注入防护等功能
+
+执行后端（settings.DB_BACKEND）:
+  - pool:   基于mysql.connector的连接池（默认）
+  - cli:    每条语句启动一个mysql命令行进程（回退模式）
+  - sqlite: 以SQLite代替MySQL（离线测试和基准测试，见 app/db/sqlite_backend.py）
 """
 import mysql.connector
 import subprocess
 import logging
 import json
 import re
-from typing import Dict, List, Any, Optional, Tuple
-from contextlib import contextmanager
+import threading
+import time
+from typing import Dict, Iterator, List, Any, Optional, Tuple
+from contextlib import ExitStack, contextmanager, nullcontext
 from app.core.config import settings
+from app.db.backend import BaseBackend, DatabaseError, _from_driver_rows
+from app.db.breaker import CircuitBreaker
+from app.db.cache import QueryCache
+from app.db.instrumentation import record_query, record_round_trip
+from app.db.pool import ConnectionPool, PooledConnection, PoolTimeoutError
+from app.db.result import ChunkResult, QueryResult, Row, decode_text_row, text_decoders
+from app.db.retry import is_retryable
+from app.db.routing import Replica, RoutingBackend, parse_replicas
+from app.db.statements import CompiledStatement, compile_statement, statement_cache_info
 
 logger = logging.getLogger(__name__)
 
+# 单条预处理语句可绑定的参数个数上限
+MAX_STATEMENT_PARAMS = 65535
 
-class MySQLCommandLineClient:
-    """MySQL命令行客户端类，负责执行SQL命令并处理结果"""
-    
-    def __init__(self):
-        self.config = settings.DATABASE_CONFIG
-        self._connection_pool = None
-        
-    def _sanitize_sql(self, sql: str, params: Optional[Dict[str, Any]] = None) -> str:
-        """
-        SQL注入防护：清理和验证SQL语句
-        使用参数化查询和白名单验证
-        """
-        if not sql or not isinstance(sql, str):
-            raise ValueError("SQL语句不能为空")
-            
-        # 移除危险的SQL关键字
-        dangerous_keywords = [
-            r'\bDROP\b', r'\bDELETE\b.*\bWHERE\s+1\s*=\s*1\b', 
-            r'\bTRUNCATE\b', r'\bALTER\b', r'\bCREATE\b.*\bUSER\b',
-            r'\bGRANT\b', r'\bREVOKE\b', r'--', r'/\*', r'\*/',
-            r'\bUNION\b.*\bSELECT\b', r'\bEXEC\b', r'\bEVAL\b'
+
+def _returns_rows(sql: str) -> bool:
+    """判断语句是否返回结果集"""
+    return sql.lstrip().upper().startswith(('SELECT', 'SHOW', 'DESCRIBE', 'EXPLAIN', 'WITH'))
+
+
+def _is_write(sql: str) -> bool:
+    """判断语句是否为数据写入语句"""
+    return sql.lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE', 'REPLACE'))
+
+
+def _from_driver_error(e: "mysql.connector.Error") -> "DatabaseError":
+    """将mysql.connector异常转换为DatabaseError"""
+    return DatabaseError(e.msg if getattr(e, "msg", None) else str(e), getattr(e, "errno", None))
+
+
+class CommandLineBackend(BaseBackend):
+    """命令行执行后端：每条语句启动一个mysql子进程"""
+
+    name = "cli"
+
+    _ERRNO_PATTERN = re.compile(r'ERROR (\d+)')
+    _FIELD_PATTERN = re.compile(r'^Field\s+\d+:')
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+
+    def _build_command(self, sql: str, fetch_results: bool) -> List[str]:
+        cmd = [
+            "mysql",
+            f"--host={self.config['host']}",
+            f"--port={self.config['port']}",
+            f"--user={self.config['user']}",
+            f"--password={self.config['password']}",
+            f"--database={self.config['database']}",
+            f"--connect-timeout={self.config['connection_timeout']}",
+            "--execute", sql
         ]
-        
-        sql_upper = sql.upper()
-        for pattern in dangerous_keywords:
-            if re.search(pattern, sql_upper, re.IGNORECASE):
-                raise ValueError(f"检测到潜在的SQL注入攻击: {pattern}")
-        
-        # 参数化处理
-        if params:
-            for key, value in params.items():
-                if isinstance(value, str):
-                    # 转义单引号
-                    value = value.replace("'", "''")
-                    sql = sql.replace(f":{key}", f"'{value}'")
-                elif isinstance(value, (int, float)):
-                    sql = sql.replace(f":{key}", str(value))
-                elif value is None:
-                    sql = sql.replace(f":{key}", "NULL")
-        
-        return sql
-    
-    def _execute_mysql_command(self, sql: str, fetch_results: bool = True) -> Tuple[bool, List[Dict], str]:
+        if _is_write(sql):
+            cmd[-1] = sql.rstrip().rstrip(';') + "; SELECT LAST_INSERT_ID(), ROW_COUNT();"
+            cmd.extend(["--batch", "--raw"])
+        elif fetch_results:
+            # 保留列名行，列信息与数据来自同一次执行；--column-type-info 在数据前输出各列类型
+            cmd.extend(["--batch", "--raw", "--column-type-info"])
+        return cmd
+
+    @classmethod
+    def _read_header(cls, lines: Iterator[str]) -> Tuple[List[str], List[Any]]:
         """
-        执行MySQL命令行操作
-        
-        Args:
-            sql: SQL语句
-            fetch_results: 是否需要获取查询结果
-            
-        Returns:
-            Tuple[成功标志, 结果数据, 错误信息]
+        读取数据行之前的内容：各列的类型信息块（每块以 Field N: 开头、空行结束）和列名行
+        返回列名和每列的解码函数
         """
+        type_names: List[str] = []
+        in_field = False
+        for line in lines:
+            line = line.rstrip('\n')
+            if cls._FIELD_PATTERN.match(line):
+                in_field = True
+            elif in_field:
+                if not line:
+                    in_field = False
+                elif line.startswith("Type:"):
+                    type_names.append(line[len("Type:"):].strip())
+            elif line:
+                columns = line.split('\t')
+                if len(type_names) != len(columns):
+                    type_names = []
+                return columns, text_decoders(type_names) if type_names else [None] * len(columns)
+        return [], []
+
+    @staticmethod
+    def _decode_line(line: str, width: int, decoders: List[Any]) -> Optional[Tuple]:
+        """解码一行制表符分隔的数据，NULL解码为None，列数不符时返回None"""
+        values = line.rstrip('\n').split('\t')
+        if len(values) != width:
+            return None
+        return decode_text_row([None if v == "NULL" else v for v in values], decoders)
+
+    @classmethod
+    def _decode_batch_output(cls, output: str) -> Tuple[List[str], List[Tuple]]:
+        """解析 --batch 输出：列类型信息、列名行，其余为数据行"""
+        lines = iter(output.rstrip('\n').split('\n'))
+        columns, decoders = cls._read_header(lines)
+        width = len(columns)
+        rows = []
+        for line in lines:
+            row = cls._decode_line(line, width, decoders)
+            if row is not None:
+                rows.append(row)
+        return columns, rows
+
+    def run(self, statement: CompiledStatement, params: Optional[Dict[str, Any]] = None,
+            fetch_results: bool = True) -> QueryResult:
+        # 命令行无法绑定参数，按占位符位置拼接转义后的字面量
+        sql = statement.render(params)
+        cmd = self._build_command(sql, fetch_results)
+        record_round_trip()
         try:
-            # 构建MySQL命令
-            cmd = [
-                "mysql",
-                f"--host={self.config['host']}",
-                f"--port={self.config['port']}",
-                f"--user={self.config['user']}",
-                f"--password={self.config['password']}",
-                f"--database={self.config['database']}",
-                "--execute", sql
-            ]
-            
-            if fetch_results:
-                cmd.extend(["--batch", "--raw", "--skip-column-names"])
-            
-            # 执行命令
             result = subprocess.run(
                 cmd,
                 capture_output=True,
@@ -90,83 +137,498 @@ class MySQLCommandLineClient:
                 timeout=30,
                 encoding='utf-8'
             )
-            
-            if result.returncode != 0:
-                error_msg = result.stderr.strip()
-                logger.error(f"MySQL命令执行失败: {error_msg}")
-                return False, [], error_msg
-            
-            # 处理结果
-            results = []
-            if fetch_results and result.stdout.strip():
-                lines = result.stdout.strip().split('\n')
-                if lines:
-                    # 第一行是列名
-                    if sql.strip().upper().startswith('SELECT') or sql.strip().upper().startswith('SHOW'):
-                        # 重新执行获取列名
-                        header_cmd = cmd.copy()
-                        header_cmd.remove("--skip-column-names")
-                        header_result = subprocess.run(header_cmd, capture_output=True, text=True, timeout=30)
-                        
-                        if header_result.returncode == 0:
-                            header_lines = header_result.stdout.strip().split('\n')
-                            if len(header_lines) > 1:
-                                columns = header_lines[0].split('\t')
-                                for line in header_lines[1:]:
-                                    values = line.split('\t')
-                                    if len(values) == len(columns):
-                                        row_dict = dict(zip(columns, values))
-                                        results.append(row_dict)
-            
-            logger.info(f"MySQL命令执行成功，返回{len(results)}条记录")
-            return True, results, ""
-            
         except subprocess.TimeoutExpired:
-            error_msg = "MySQL命令执行超时"
-            logger.error(error_msg)
-            return False, [], error_msg
-        except Exception as e:
-            error_msg = f"MySQL命令执行异常: {str(e)}"
-            logger.error(error_msg)
-            return False, [], error_msg
-    
+            raise DatabaseError("MySQL命令执行超时")
+
+        if result.returncode != 0:
+            error_msg = result.stderr.strip()
+            match = self._ERRNO_PATTERN.search(error_msg)
+            raise DatabaseError(error_msg, int(match.group(1)) if match else None)
+
+        if _is_write(sql):
+            # 写语句追加的 LAST_INSERT_ID()/ROW_COUNT() 与其在同一进程（同一连接）内执行
+            _, rows = self._decode_batch_output(result.stdout)
+            if rows:
+                lastrowid, rowcount = rows[-1]
+                return QueryResult(rowcount=int(rowcount), lastrowid=int(lastrowid) or None)
+            return QueryResult()
+
+        if not (fetch_results and _returns_rows(sql) and result.stdout.strip()):
+            return QueryResult()
+
+        columns, rows = self._decode_batch_output(result.stdout)
+        return QueryResult(columns, rows, rowcount=len(rows))
+
+    def stream(self, statement: CompiledStatement, params: Optional[Dict[str, Any]],
+               batch_size: int) -> Iterator[QueryResult]:
+        """
+        使用 --quick 逐行读取mysql进程的输出，客户端不缓存完整结果集
+        提前结束迭代时终止子进程
+        """
+        cmd = self._build_command(statement.render(params), True)
+        cmd.append("--quick")
+        record_round_trip()
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding='utf-8'
+        )
+        try:
+            columns, decoders = self._read_header(process.stdout)
+            if columns:
+                width = len(columns)
+                rows = []
+                for line in process.stdout:
+                    row = self._decode_line(line, width, decoders)
+                    if row is None:
+                        continue
+                    rows.append(row)
+                    if len(rows) >= batch_size:
+                        yield QueryResult(columns, rows, rowcount=len(rows))
+                        rows = []
+                if rows:
+                    yield QueryResult(columns, rows, rowcount=len(rows))
+
+            if process.wait() != 0:
+                error_msg = process.stderr.read().strip()
+                match = self._ERRNO_PATTERN.search(error_msg)
+                raise DatabaseError(error_msg, int(match.group(1)) if match else None)
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            process.stderr.close()
+
     @contextmanager
-    def transaction(self):
+    def session(self):
+        """命令行模式无法跨进程固定连接，事务内语句逐条自动提交"""
+        logger.warning("命令行执行后端不支持事务，事务内的语句将逐条自动提交")
+        yield _CommandLineSession(self)
+
+
+class ConnectorPoolBackend(BaseBackend):
+    """连接池执行后端：复用mysql.connector长连接，省去进程启动、TCP连接和认证开销"""
+
+    name = "pool"
+
+    def __init__(self, config: Dict[str, Any], pool_size: int, pool_timeout: float,
+                 health_check_interval: float, max_lifetime: float,
+                 statements_per_connection: int = 64):
+        # 普通语句逐条自动提交，与命令行模式的行为保持一致
+        pool_config = dict(config, autocommit=True)
+        self.pool = ConnectionPool(
+            pool_config,
+            size=pool_size,
+            timeout=pool_timeout,
+            health_check_interval=health_check_interval,
+            max_lifetime=max_lifetime
+        )
+        self.statements_per_connection = statements_per_connection
+        self._prepared_lock = threading.Lock()
+        self._prepared_hits = 0
+        self._prepared_misses = 0
+
+    def run(self, statement: CompiledStatement, params: Optional[Dict[str, Any]] = None,
+            fetch_results: bool = True) -> QueryResult:
+        try:
+            with self.pool.connection() as conn:
+                return self._run_on(conn, statement, params, fetch_results)
+        except PoolTimeoutError as e:
+            raise DatabaseError(str(e))
+        except mysql.connector.Error as e:
+            raise _from_driver_error(e)
+
+    @contextmanager
+    def session(self):
+        """从连接池借出一个连接并在会话期间独占"""
+        try:
+            conn = self.pool.acquire()
+        except PoolTimeoutError as e:
+            raise DatabaseError(str(e))
+        except mysql.connector.Error as e:
+            raise _from_driver_error(e)
+        try:
+            yield _PooledSession(self, conn)
+        finally:
+            # 归还时若仍处于事务中会先回滚，回滚失败则丢弃该连接
+            self.pool.release(conn)
+
+    def stream(self, statement: CompiledStatement, params: Optional[Dict[str, Any]],
+               batch_size: int) -> Iterator[QueryResult]:
         """
-        事务管理上下文管理器
+        在独占的连接上使用非缓冲游标按批读取
+        提前结束迭代时连接上仍有未读的结果，直接丢弃该连接而不是读完剩余数据
         """
-        transaction_id = None
         try:
-            # 开始事务
-            success, _, error = self._execute_mysql_command("START TRANSACTION;", fetch_results=False)
-            if not success:
-                raise Exception(f"开始事务失败: {error}")
-            
-            logger.info("事务已开始")
-            yield self
-            
-            # 提交事务
-            success, _, error = self._execute_mysql_command("COMMIT;", fetch_results=False)
-            if not success:
-                raise Exception(f"提交事务失败: {error}")
-                
-            logger.info("事务已提交")
-            
-        except Exception as e:
-            # 回滚事务
+            conn = self.pool.acquire()
+        except PoolTimeoutError as e:
+            raise DatabaseError(str(e))
+        except mysql.connector.Error as e:
+            raise _from_driver_error(e)
+        discard = True
+        try:
+            yield from self._stream_on(conn, statement, params, batch_size, drain=False)
+            discard = False
+        except mysql.connector.Error as e:
+            raise _from_driver_error(e)
+        finally:
+            self.pool.release(conn, discard=discard)
+
+    @staticmethod
+    def _stream_on(conn: PooledConnection, statement: CompiledStatement,
+                   params: Optional[Dict[str, Any]], batch_size: int,
+                   drain: bool) -> Iterator[QueryResult]:
+        """
+        在指定连接上流式执行查询
+        drain=True 时提前结束也会读完剩余结果（用于事务内无法丢弃的连接）
+        """
+        record_round_trip()
+        if statement.param_names:
+            # 流式游标不放入预处理缓存，避免未读完的结果影响后续复用
+            values = statement.bind(params)
+            cursor = conn.raw.cursor(prepared=True)
+            cursor.execute(statement.driver_sql, values)
+        else:
+            cursor = conn.raw.cursor()
+            cursor.execute(statement.sql)
+
+        finished = False
+        try:
+            if cursor.with_rows:
+                columns = [desc[0] for desc in cursor.description]
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield QueryResult(
+                        columns,
+                        _from_driver_rows(rows),
+                        rowcount=len(rows)
+                    )
+            finished = True
+        finally:
+            if not finished and drain:
+                while cursor.fetchmany(batch_size):
+                    pass
+                finished = True
+            if finished:
+                cursor.close()
+
+    def _prepared_cursor(self, conn: PooledConnection, statement: CompiledStatement):
+        """取出连接上已预处理的游标，未命中时新建，超出上限时关闭最久未用的游标"""
+        cache = conn.statements
+        cursor = cache.get(statement.driver_sql)
+        hit = cursor is not None
+        with self._prepared_lock:
+            if hit:
+                self._prepared_hits += 1
+            else:
+                self._prepared_misses += 1
+        if hit:
+            cache.move_to_end(statement.driver_sql)
+            return cursor
+
+        cursor = conn.raw.cursor(prepared=True)
+        cache[statement.driver_sql] = cursor
+        while len(cache) > self.statements_per_connection:
+            _, evicted = cache.popitem(last=False)
             try:
-                self._execute_mysql_command("ROLLBACK;", fetch_results=False)
-                logger.info("事务已回滚")
-            except:
+                evicted.close()
+            except Exception:
                 pass
-            raise e
+        return cursor
+
+    def _run_on(self, conn: PooledConnection, statement: CompiledStatement,
+                params: Optional[Dict[str, Any]], fetch_results: bool) -> QueryResult:
+        """
+        在指定连接上执行一条语句
+        带参数的语句使用缓存的预处理游标，参数由服务端绑定；
+        游标只在语句文本对象相同时跳过预处理，因此传入的始终是编译缓存中的 driver_sql
+        """
+        record_round_trip()
+        if not statement.param_names:
+            cursor = conn.raw.cursor()
+            try:
+                cursor.execute(statement.sql)
+                return self._collect(cursor, fetch_results)
+            finally:
+                cursor.close()
+
+        values = statement.bind(params)
+        cursor = self._prepared_cursor(conn, statement)
+        try:
+            cursor.execute(statement.driver_sql, values)
+            return self._collect(cursor, fetch_results)
+        except Exception:
+            # 执行失败后游标状态不确定，移出缓存并关闭
+            conn.statements.pop(statement.driver_sql, None)
+            try:
+                cursor.close()
+            except Exception:
+                pass
+            raise
+
+    @staticmethod
+    def _collect(cursor, fetch_results: bool) -> QueryResult:
+        """读取游标的执行结果"""
+        if cursor.with_rows:
+            rows = cursor.fetchall()
+            if not fetch_results:
+                return QueryResult(rowcount=len(rows))
+            columns = [desc[0] for desc in cursor.description]
+            return QueryResult(
+                columns,
+                _from_driver_rows(rows),
+                rowcount=len(rows)
+            )
+        return QueryResult(rowcount=cursor.rowcount, lastrowid=cursor.lastrowid)
+
+    def close(self):
+        self.pool.close()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "pool": self.pool.stats(),
+            "statement_cache": statement_cache_info(),
+            "prepared_statements": {
+                "hits": self._prepared_hits,
+                "misses": self._prepared_misses,
+                "per_connection": self.statements_per_connection
+            }
+        }
+
+
+class _PooledSession:
+    """固定在一个池化连接上的会话"""
+
+    def __init__(self, backend: ConnectorPoolBackend, conn):
+        self._backend = backend
+        self._conn = conn
+
+    def _call(self, fn):
+        record_round_trip()
+        try:
+            fn()
+        except mysql.connector.Error as e:
+            raise _from_driver_error(e)
+
+    def run(self, statement: CompiledStatement, params: Optional[Dict[str, Any]] = None,
+            fetch_results: bool = True) -> QueryResult:
+        try:
+            return self._backend._run_on(self._conn, statement, params, fetch_results)
+        except mysql.connector.Error as e:
+            raise _from_driver_error(e)
+
+    def stream(self, statement: CompiledStatement, params: Optional[Dict[str, Any]],
+               batch_size: int) -> Iterator[QueryResult]:
+        try:
+            yield from ConnectorPoolBackend._stream_on(self._conn, statement, params, batch_size, drain=True)
+        except mysql.connector.Error as e:
+            raise _from_driver_error(e)
+
+    def begin(self):
+        self._call(self._conn.raw.start_transaction)
+
+    def commit(self):
+        self._call(self._conn.raw.commit)
+
+    def rollback(self):
+        self._call(self._conn.raw.rollback)
+
+
+class _CommandLineSession:
+    """命令行模式的会话：语句逐条执行并自动提交"""
+
+    def __init__(self, backend: CommandLineBackend):
+        self._backend = backend
+
+    def run(self, statement: CompiledStatement, params: Optional[Dict[str, Any]] = None,
+            fetch_results: bool = True) -> QueryResult:
+        return self._backend.run(statement, params, fetch_results)
+
+    def stream(self, statement: CompiledStatement, params: Optional[Dict[str, Any]],
+               batch_size: int) -> Iterator[QueryResult]:
+        return self._backend.stream(statement, params, batch_size)
+
+    def begin(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def _create_single_backend(mode: str, config: Dict[str, Any]):
+    """创建连接单个数据库的执行后端"""
+    if mode == "cli":
+        return CommandLineBackend(config)
+    if mode == "pool":
+        return ConnectorPoolBackend(
+            config,
+            pool_size=settings.MYSQL_POOL_SIZE,
+            pool_timeout=settings.MYSQL_POOL_TIMEOUT,
+            health_check_interval=settings.MYSQL_POOL_HEALTH_CHECK_INTERVAL,
+            max_lifetime=settings.MYSQL_POOL_MAX_LIFETIME,
+            statements_per_connection=settings.PREPARED_STATEMENTS_PER_CONNECTION
+        )
+    if mode == "sqlite":
+        # 延迟导入：sqlite_backend 依赖本模块中的 BaseBackend
+        from app.db.sqlite_backend import SQLiteBackend
+        return SQLiteBackend(
+            settings.SQLITE_PATH,
+            init_script=settings.SQLITE_INIT_SCRIPT or None,
+            timeout=settings.MYSQL_POOL_TIMEOUT
+        )
+    raise ValueError(f"不支持的数据库执行后端: {mode}")
+
+
+def create_backend(mode: Optional[str] = None):
+    """根据配置创建执行后端，配置了从库时返回读写分离后端"""
+    mode = (mode or settings.DB_BACKEND).lower()
+    config = settings.DATABASE_CONFIG
+    primary = _create_single_backend(mode, config)
+    if not settings.MYSQL_REPLICAS:
+        return primary
+
+    replicas = [
+        Replica(
+            f"{replica['host']}:{replica['port']}/{replica['database']}",
+            _create_single_backend(mode, dict(config, **replica))
+        )
+        for replica in parse_replicas(settings.MYSQL_REPLICAS, settings.MYSQL_PORT, settings.MYSQL_DATABASE)
+    ]
+    return RoutingBackend(
+        primary,
+        replicas,
+        max_lag=settings.MYSQL_REPLICA_MAX_LAG,
+        lag_check_interval=settings.MYSQL_REPLICA_LAG_CHECK_INTERVAL,
+        retry_interval=settings.MYSQL_REPLICA_RETRY_INTERVAL
+    )
+
+
+def create_query_cache() -> QueryCache:
+    """根据配置创建查询结果缓存，配置了从库时写入后按最大复制延迟暂停缓存"""
+    return QueryCache(
+        max_entries=settings.QUERY_CACHE_MAX_ENTRIES,
+        max_bytes=settings.QUERY_CACHE_MAX_MB * 1024 * 1024,
+        settle_seconds=settings.MYSQL_REPLICA_MAX_LAG if settings.MYSQL_REPLICAS else 0.0,
+        enabled=settings.QUERY_CACHE_ENABLED
+    )
+
+
+def create_circuit_breaker() -> CircuitBreaker:
+    """根据配置创建数据库熔断器"""
+    return CircuitBreaker(
+        failure_threshold=settings.DB_BREAKER_FAILURE_THRESHOLD,
+        probe_interval=settings.DB_BREAKER_PROBE_INTERVAL
+    )
+
+
+class _QueryMethods:
+    """
+    select/insert/update/delete/execute_raw_sql 的公共实现
+    子类通过 _run() 决定语句在哪个连接上执行
+    """
+
+    def _run(self, statement: CompiledStatement, params: Optional[Dict[str, Any]] = None,
+             fetch_results: bool = True) -> QueryResult:
+        raise NotImplementedError
+
+    def _stream(self, statement: CompiledStatement, params: Optional[Dict[str, Any]],
+                batch_size: int) -> Iterator[QueryResult]:
+        raise NotImplementedError
+
+    @staticmethod
+    def _where_clause(where: Dict[str, Any], params: Dict[str, Any], prefix: str) -> List[str]:
+        """构建WHERE条件，值以命名参数绑定，None转换为IS NULL"""
+        conditions = []
+        for index, (key, value) in enumerate(where.items()):
+            if value is None:
+                conditions.append(f"{key} IS NULL")
+            else:
+                name = f"{prefix}{index}"
+                params[name] = value
+                conditions.append(f"{key} = :{name}")
+        return conditions
+
+    # 查询结果缓存，None表示不使用缓存
+    cache: Optional[QueryCache] = None
+
+    def _invalidate(self, sql: str):
+        """写语句执行后使缓存中涉及表的结果失效"""
+        if self.cache is not None:
+            self.cache.invalidate_statement(sql)
+
+    def _timed_run(self, sql: str, params: Optional[Dict[str, Any]], fetch_results: bool) -> QueryResult:
+        """编译并执行SQL，按SQL指纹记录耗时、行数和错误"""
+        start = time.perf_counter()
+        try:
+            result = self._run(compile_statement(sql), params, fetch_results)
+        except Exception:
+            record_query(sql, time.perf_counter() - start, error=True, params=params)
+            # 失败的写语句可能已部分生效（如多行写入、存储过程）
+            if not fetch_results:
+                self._invalidate(sql)
+            raise
+        rows = len(result) if fetch_results else result.rowcount
+        record_query(sql, time.perf_counter() - start, max(rows, 0), params=params)
+        if not fetch_results:
+            self._invalidate(sql)
+        return result
+
+    def _cached_run(self, sql: str, params: Optional[Dict[str, Any]], fetch_results: bool,
+                    cache_ttl: Optional[float] = None) -> QueryResult:
+        """cache_ttl 大于0且为只读查询时经过查询结果缓存"""
+        if cache_ttl and fetch_results and self.cache is not None:
+            return self.cache.get_or_load(sql, params, cache_ttl, lambda: self._timed_run(sql, params, True))
+        return self._timed_run(sql, params, fetch_results)
+
+    def _execute(self, sql: str, params: Optional[Dict[str, Any]] = None,
+                 fetch_results: bool = True, cache_ttl: Optional[float] = None) -> Tuple[bool, QueryResult, str]:
+        """编译并执行SQL，返回 (成功标志, 查询结果, 错误信息)"""
+        try:
+            result = self._cached_run(sql, params, fetch_results, cache_ttl)
+            logger.info(f"MySQL语句执行成功，返回{len(result)}条记录")
+            return True, result, ""
+        except DatabaseError as e:
+            logger.error(f"MySQL语句执行失败: {e.message}")
+            return False, QueryResult(), e.message
+        except Exception as e:
+            error_msg = f"MySQL语句执行异常: {str(e)}"
+            logger.error(error_msg)
+            return False, QueryResult(), error_msg
+
+    def _execute_mysql_command(self, sql: str, fetch_results: bool = True,
+                               params: Optional[Dict[str, Any]] = None,
+                               cache_ttl: Optional[float] = None) -> Tuple[bool, List[Row], str]:
+        """
+        执行SQL
+        
+        Args:
+            sql: SQL语句模板（可包含 :name 命名参数）
+            fetch_results: 是否需要获取查询结果
+            params: 命名参数
+            cache_ttl: 查询结果缓存秒数，不传时不使用缓存
+            
+        Returns:
+            Tuple[成功标志, 结果数据, 错误信息]
+        """
+        success, result, error = self._execute(sql, params, fetch_results, cache_ttl)
+        return success, result.as_rows(), error
     
     def select(self, table: str, columns: List[str] = None, 
                where: Dict[str, Any] = None, 
                order_by: str = None, 
                limit: int = None,
-               joins: List[str] = None) -> Tuple[bool, List[Dict], str]:
-        """SELECT查询操作"""
+               joins: List[str] = None,
+               cache_ttl: Optional[float] = None) -> Tuple[bool, List[Row], str]:
+        """SELECT查询操作，cache_ttl 为查询结果缓存秒数"""
         try:
             # 构建SELECT语句
             if columns:
@@ -175,6 +637,7 @@ class MySQLCommandLineClient:
                 columns_str = "*"
             
             sql = f"SELECT {columns_str} FROM {table}"
+            params: Dict[str, Any] = {}
             
             # 添加JOIN
             if joins:
@@ -183,16 +646,7 @@ class MySQLCommandLineClient:
             
             # 添加WHERE条件
             if where:
-                conditions = []
-                for key, value in where.items():
-                    if isinstance(value, str):
-                        escaped_value = value.replace("'", "''")
-                        conditions.append(f"{key} = '{escaped_value}'")
-                    elif isinstance(value, (int, float)):
-                        conditions.append(f"{key} = {value}")
-                    elif value is None:
-                        conditions.append(f"{key} IS NULL")
-                
+                conditions = self._where_clause(where, params, "w")
                 if conditions:
                     sql += f" WHERE {' AND '.join(conditions)}"
             
@@ -202,14 +656,11 @@ class MySQLCommandLineClient:
             
             # 添加LIMIT
             if limit:
-                sql += f" LIMIT {limit}"
+                sql += f" LIMIT {int(limit)}"
             
             sql += ";"
             
-            # 验证SQL安全性
-            sql = self._sanitize_sql(sql)
-            
-            return self._execute_mysql_command(sql, fetch_results=True)
+            return self._execute_mysql_command(sql, fetch_results=True, params=params, cache_ttl=cache_ttl)
             
         except Exception as e:
             error_msg = f"SELECT查询失败: {str(e)}"
@@ -223,35 +674,16 @@ class MySQLCommandLineClient:
                 raise ValueError("插入数据不能为空")
             
             columns = list(data.keys())
-            values = []
-            
-            for value in data.values():
-                if isinstance(value, str):
-                    escaped_value = value.replace("'", "''")
-                    values.append(f"'{escaped_value}'")
-                elif isinstance(value, (int, float)):
-                    values.append(str(value))
-                elif value is None:
-                    values.append("NULL")
-                else:
-                    escaped_value = str(value).replace("'", "''")
-                    values.append(f"'{escaped_value}'")
+            params = {f"v{index}": value for index, value in enumerate(data.values())}
+            placeholders = ", ".join(f":{name}" for name in params)
             
-            sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(values)});"
+            sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders});"
             
-            # 验证SQL安全性
-            sql = self._sanitize_sql(sql)
-            
-            success, results, error = self._execute_mysql_command(sql, fetch_results=False)
+            success, result, error = self._execute(sql, params, fetch_results=False)
             
             if success:
-                # 获取插入的ID
-                success_id, id_results, _ = self._execute_mysql_command("SELECT LAST_INSERT_ID();")
-                insert_id = 0
-                if success_id and id_results:
-                    insert_id = int(list(id_results[0].values())[0])
-                
-                return True, insert_id, ""
+                # 插入的ID由驱动随同执行结果返回
+                return True, result.lastrowid or 0, ""
             else:
                 return False, 0, error
                 
@@ -269,42 +701,23 @@ class MySQLCommandLineClient:
                 raise ValueError("WHERE条件不能为空，防止误删")
             
             # 构建SET子句
+            params: Dict[str, Any] = {}
             set_clauses = []
-            for key, value in data.items():
-                if isinstance(value, str):
-                    escaped_value = value.replace("'", "''")
-                    set_clauses.append(f"{key} = '{escaped_value}'")
-                elif isinstance(value, (int, float)):
-                    set_clauses.append(f"{key} = {value}")
-                elif value is None:
-                    set_clauses.append(f"{key} = NULL")
+            for index, (key, value) in enumerate(data.items()):
+                name = f"s{index}"
+                params[name] = value
+                set_clauses.append(f"{key} = :{name}")
             
             # 构建WHERE子句
-            where_clauses = []
-            for key, value in where.items():
-                if isinstance(value, str):
-                    escaped_value = value.replace("'", "''")
-                    where_clauses.append(f"{key} = '{escaped_value}'")
-                elif isinstance(value, (int, float)):
-                    where_clauses.append(f"{key} = {value}")
-                elif value is None:
-                    where_clauses.append(f"{key} IS NULL")
+            where_clauses = self._where_clause(where, params, "w")
             
             sql = f"UPDATE {table} SET {', '.join(set_clauses)} WHERE {' AND '.join(where_clauses)};"
             
-            # 验证SQL安全性
-            sql = self._sanitize_sql(sql)
-            
-            success, results, error = self._execute_mysql_command(sql, fetch_results=False)
+            success, result, error = self._execute(sql, params, fetch_results=False)
             
             if success:
-                # 获取影响行数
-                success_rows, rows_results, _ = self._execute_mysql_command("SELECT ROW_COUNT();")
-                affected_rows = 0
-                if success_rows and rows_results:
-                    affected_rows = int(list(rows_results[0].values())[0])
-                
-                return True, affected_rows, ""
+                # 影响行数由驱动随同执行结果返回
+                return True, result.rowcount, ""
             else:
                 return False, 0, error
                 
@@ -320,31 +733,16 @@ class MySQLCommandLineClient:
                 raise ValueError("WHERE条件不能为空，防止误删全表")
             
             # 构建WHERE子句
-            where_clauses = []
-            for key, value in where.items():
-                if isinstance(value, str):
-                    escaped_value = value.replace("'", "''")
-                    where_clauses.append(f"{key} = '{escaped_value}'")
-                elif isinstance(value, (int, float)):
-                    where_clauses.append(f"{key} = {value}")
-                elif value is None:
-                    where_clauses.append(f"{key} IS NULL")
+            params: Dict[str, Any] = {}
+            where_clauses = self._where_clause(where, params, "w")
             
             sql = f"DELETE FROM {table} WHERE {' AND '.join(where_clauses)};"
             
-            # 验证SQL安全性
-            sql = self._sanitize_sql(sql)
-            
-            success, results, error = self._execute_mysql_command(sql, fetch_results=False)
+            success, result, error = self._execute(sql, params, fetch_results=False)
             
             if success:
-                # 获取删除行数
-                success_rows, rows_results, _ = self._execute_mysql_command("SELECT ROW_COUNT();")
-                deleted_rows = 0
-                if success_rows and rows_results:
-                    deleted_rows = int(list(rows_results[0].values())[0])
-                
-                return True, deleted_rows, ""
+                # 删除行数由驱动随同执行结果返回
+                return True, result.rowcount, ""
             else:
                 return False, 0, error
                 
@@ -353,22 +751,318 @@ class MySQLCommandLineClient:
             logger.error(error_msg)
             return False, 0, error_msg
     
-    def execute_raw_sql(self, sql: str, params: Optional[Dict[str, Any]] = None) -> Tuple[bool, List[Dict], str]:
-        """执行原始SQL语句"""
+    @staticmethod
+    def _bulk_columns(rows: List[Dict[str, Any]]) -> List[str]:
+        """批量写入的列名，所有行必须包含相同的列"""
+        if not rows:
+            raise ValueError("批量写入数据不能为空")
+        columns = list(rows[0].keys())
+        if not columns:
+            raise ValueError("批量写入数据不能为空")
+        expected = set(columns)
+        for index, row in enumerate(rows):
+            if set(row.keys()) != expected:
+                raise ValueError(f"第{index + 1}行的列与首行不一致")
+        return columns
+
+    @staticmethod
+    def _chunk_size(chunk_size: Optional[int], params_per_row: int) -> int:
+        """每块行数，同时保证单条语句的占位符数量不超过MySQL的上限"""
+        size = chunk_size or settings.BULK_WRITE_CHUNK_SIZE
+        if size < 1:
+            raise ValueError("分块大小必须大于0")
+        return max(1, min(size, MAX_STATEMENT_PARAMS // max(params_per_row, 1)))
+
+    def _write_chunks(self, rows: List[Dict[str, Any]], size: int,
+                      build) -> Tuple[bool, List[ChunkResult], str]:
+        """
+        逐块执行 build(chunk) 生成的 (sql, params)
+        某块失败时停止并返回已完成分块的结果；需要全部成功或全部回滚时在 transaction() 中调用
+        """
+        results: List[ChunkResult] = []
+        for offset in range(0, len(rows), size):
+            chunk = rows[offset:offset + size]
+            sql, params = build(chunk)
+            success, result, error = self._execute(sql, params, fetch_results=False)
+            if not success:
+                return False, results, f"第{offset + 1}-{offset + len(chunk)}行写入失败: {error}"
+            results.append(ChunkResult(offset, len(chunk), result.rowcount, result.lastrowid))
+        return True, results, ""
+
+    @staticmethod
+    def _values_clause(chunk: List[Dict[str, Any]], columns: List[str],
+                       params: Dict[str, Any]) -> str:
+        """多行VALUES子句，参数名为 r<行>_<列>"""
+        groups = []
+        for i, row in enumerate(chunk):
+            names = []
+            for j, column in enumerate(columns):
+                name = f"r{i}_{j}"
+                params[name] = row[column]
+                names.append(f":{name}")
+            groups.append(f"({', '.join(names)})")
+        return ", ".join(groups)
+
+    def insert_many(self, table: str, rows: List[Dict[str, Any]],
+                    chunk_size: Optional[int] = None) -> Tuple[bool, List[ChunkResult], str]:
+        """
+        多行INSERT，每块一条语句
+        返回每块的结果，lastrowid 为该块第一行的自增ID
+        """
+        try:
+            columns = self._bulk_columns(rows)
+            size = self._chunk_size(chunk_size, len(columns))
+            head = f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+
+            def build(chunk):
+                params: Dict[str, Any] = {}
+                return head + self._values_clause(chunk, columns, params) + ";", params
+
+            return self._write_chunks(rows, size, build)
+
+        except Exception as e:
+            error_msg = f"批量INSERT失败: {str(e)}"
+            logger.error(error_msg)
+            return False, [], error_msg
+
+    def upsert_many(self, table: str, rows: List[Dict[str, Any]],
+                    update_columns: List[str] = None,
+                    chunk_size: Optional[int] = None) -> Tuple[bool, List[ChunkResult], str]:
+        """
+        多行 INSERT ... ON DUPLICATE KEY UPDATE
+        update_columns 为主键/唯一键冲突时更新的列，默认更新所有列
+        rowcount 遵循MySQL约定：新插入计1，更新计2，值未变化计0
+        """
+        try:
+            columns = self._bulk_columns(rows)
+            updates = update_columns or columns
+            unknown = [column for column in updates if column not in columns]
+            if unknown:
+                raise ValueError(f"更新列不在写入数据中: {', '.join(unknown)}")
+            size = self._chunk_size(chunk_size, len(columns))
+            head = f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+            tail = " ON DUPLICATE KEY UPDATE " + ", ".join(
+                f"{column} = VALUES({column})" for column in updates
+            ) + ";"
+
+            def build(chunk):
+                params: Dict[str, Any] = {}
+                return head + self._values_clause(chunk, columns, params) + tail, params
+
+            return self._write_chunks(rows, size, build)
+
+        except Exception as e:
+            error_msg = f"批量UPSERT失败: {str(e)}"
+            logger.error(error_msg)
+            return False, [], error_msg
+
+    def update_many(self, table: str, rows: List[Dict[str, Any]], key: str,
+                    chunk_size: Optional[int] = None) -> Tuple[bool, List[ChunkResult], str]:
+        """
+        按键列批量更新，每块一条 UPDATE ... SET col = CASE key WHEN ... END WHERE key IN (...)
+        rows 中每行包含键列和要更新的列
+        """
+        try:
+            columns = self._bulk_columns(rows)
+            if key not in columns:
+                raise ValueError(f"批量更新数据缺少键列: {key}")
+            set_columns = [column for column in columns if column != key]
+            if not set_columns:
+                raise ValueError("更新数据不能为空")
+            # 每行的键在每个CASE和IN中各出现一次
+            size = self._chunk_size(chunk_size, len(set_columns) * 2 + 1)
+
+            def build(chunk):
+                params: Dict[str, Any] = {}
+                for i, row in enumerate(chunk):
+                    params[f"k{i}"] = row[key]
+                cases = []
+                for j, column in enumerate(set_columns):
+                    whens = []
+                    for i, row in enumerate(chunk):
+                        params[f"r{i}_{j}"] = row[column]
+                        whens.append(f"WHEN :k{i} THEN :r{i}_{j}")
+                    cases.append(f"{column} = CASE {key} {' '.join(whens)} ELSE {column} END")
+                keys = ", ".join(f":k{i}" for i in range(len(chunk)))
+                return f"UPDATE {table} SET {', '.join(cases)} WHERE {key} IN ({keys});", params
+
+            return self._write_chunks(rows, size, build)
+
+        except Exception as e:
+            error_msg = f"批量UPDATE失败: {str(e)}"
+            logger.error(error_msg)
+            return False, [], error_msg
+
+    def execute_raw_sql(self, sql: str, params: Optional[Dict[str, Any]] = None,
+                        cache_ttl: Optional[float] = None) -> Tuple[bool, List[Row], str]:
+        """执行原始SQL语句，:name 形式的参数由驱动绑定，cache_ttl 为查询结果缓存秒数"""
         try:
-            # 验证SQL安全性
-            sql = self._sanitize_sql(sql, params)
-            
             # 判断是否需要返回结果
-            fetch_results = sql.strip().upper().startswith(('SELECT', 'SHOW', 'DESCRIBE', 'EXPLAIN'))
+            fetch_results = _returns_rows(sql)
             
-            return self._execute_mysql_command(sql, fetch_results)
+            return self._execute_mysql_command(sql, fetch_results, params=params, cache_ttl=cache_ttl)
             
         except Exception as e:
             error_msg = f"执行原始SQL失败: {str(e)}"
             logger.error(error_msg)
             return False, [], error_msg
 
+    def query(self, sql: str, params: Optional[Dict[str, Any]] = None,
+              cache_ttl: Optional[float] = None) -> QueryResult:
+        """
+        执行原始SQL并返回完整的查询结果
+        与 execute_raw_sql 不同，失败时抛出 DatabaseError 而不是返回错误信息
+        """
+        try:
+            return self._cached_run(sql, params, _returns_rows(sql), cache_ttl)
+        except ValueError as e:
+            raise DatabaseError(str(e))
+
+    def stream(self, sql: str, params: Optional[Dict[str, Any]] = None,
+               batch_size: Optional[int] = None) -> Iterator[List[Row]]:
+        """
+        流式查询，每次产出最多 batch_size 行（Row 列表）
+        失败时抛出 DatabaseError；未迭代完时应调用 close() 及时释放连接::
+
+            with contextlib.closing(mysql_client.stream(sql, params)) as batches:
+                for rows in batches:
+                    ...
+        """
+        if not _returns_rows(sql):
+            raise DatabaseError("流式查询只支持返回结果集的语句")
+        try:
+            statement = compile_statement(sql)
+        except ValueError as e:
+            raise DatabaseError(str(e))
+
+        # 只统计读取批次的耗时，不含调用方处理每批数据的时间
+        batches = self._stream(statement, params, batch_size or settings.STREAM_BATCH_SIZE)
+        elapsed, rows, error = 0.0, 0, False
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    batch = next(batches)
+                except StopIteration:
+                    break
+                except Exception:
+                    error = True
+                    raise
+                finally:
+                    elapsed += time.perf_counter() - start
+                rows += len(batch)
+                yield batch.as_rows()
+        finally:
+            batches.close()
+            record_query(sql, elapsed, rows, error, params)
+
+
+class TransactionSession(_QueryMethods):
+    """
+    事务会话
+    会话内的所有语句在同一个连接上执行，插入ID和影响行数直接取自驱动
+    会话内的读取不经过查询结果缓存；写语句涉及的表在执行时和提交后各失效一次，
+    避免其他请求在提交前把旧数据重新写入缓存
+    语句遇到死锁或锁等待超时时记录在 conflict 中，事务结束时回滚并抛出该错误，供调用方整体重试
+    传入 breaker 时每条语句在熔断器保护下执行
+    """
+
+    def __init__(self, conn, cache: Optional[QueryCache] = None, breaker: Optional[CircuitBreaker] = None):
+        self._conn = conn
+        self._result_cache = cache
+        self._breaker = breaker
+        self._written: List[str] = []
+        self.conflict: Optional[DatabaseError] = None
+
+    def _invalidate(self, sql: str):
+        if self._result_cache is not None:
+            self._result_cache.invalidate_statement(sql)
+            self._written.append(sql)
+
+    def _invalidate_written(self):
+        """事务提交后再次使写入涉及的表失效"""
+        for sql in self._written:
+            self._result_cache.invalidate_statement(sql)
+        self._written.clear()
+
+    def _guard(self):
+        return self._breaker.guard() if self._breaker is not None else nullcontext()
+
+    def _run(self, statement: CompiledStatement, params: Optional[Dict[str, Any]] = None,
+             fetch_results: bool = True) -> QueryResult:
+        try:
+            with self._guard():
+                return self._conn.run(statement, params, fetch_results)
+        except DatabaseError as e:
+            if is_retryable(e) and self.conflict is None:
+                self.conflict = e
+            raise
+
+    def _stream(self, statement: CompiledStatement, params: Optional[Dict[str, Any]],
+                batch_size: int) -> Iterator[QueryResult]:
+        with self._guard():
+            yield from self._conn.stream(statement, params, batch_size)
+
+
+class MySQLCommandLineClient(_QueryMethods):
+    """MySQL客户端类，负责构建SQL、交给执行后端执行并处理结果"""
+
+    def __init__(self, backend=None, cache: Optional[QueryCache] = None,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.config = settings.DATABASE_CONFIG
+        self.backend = backend or create_backend()
+        self.cache = cache if cache is not None else create_query_cache()
+        self.breaker = breaker or create_circuit_breaker()
+
+    def _run(self, statement: CompiledStatement, params: Optional[Dict[str, Any]] = None,
+             fetch_results: bool = True) -> QueryResult:
+        with self.breaker.guard():
+            return self.backend.run(statement, params, fetch_results)
+
+    def _stream(self, statement: CompiledStatement, params: Optional[Dict[str, Any]],
+                batch_size: int) -> Iterator[QueryResult]:
+        with self.breaker.guard():
+            yield from self.backend.stream(statement, params, batch_size)
+
+    @contextmanager
+    def transaction(self):
+        """
+        事务管理上下文管理器
+        整个事务独占一个连接，返回的会话对象提供与客户端相同的增删改查方法::
+
+            with mysql_client.transaction() as tx:
+                success, insert_id, error = tx.insert("enrollments", data)
+
+        熔断中时直接抛出 DatabaseUnavailableError，不借出连接
+        熔断器只保护借出连接、事务内的每条语句和提交，调用方事务体中的其他异常（业务异常、单条语句等待超时等）
+        不计入熔断
+        事务内的语句遇到死锁或锁等待超时后，无论调用方如何处理该语句的返回值，
+        事务都会回滚并抛出该 DatabaseError（见 AsyncDatabase.run_transaction 的重试）
+        """
+        with ExitStack() as stack:
+            with self.breaker.guard():
+                conn = stack.enter_context(self.backend.session())
+                conn.begin()
+            logger.info("事务已开始")
+            session = TransactionSession(conn, self.cache, self.breaker)
+            try:
+                yield session
+                if session.conflict is not None:
+                    raise session.conflict
+            except Exception as exc:
+                try:
+                    conn.rollback()
+                    logger.info("事务已回滚")
+                except Exception as e:
+                    logger.error(f"事务回滚失败: {str(e)}")
+                if session.conflict is not None and exc is not session.conflict:
+                    raise session.conflict from exc
+                raise
+            with self.breaker.guard():
+                conn.commit()
+            session._invalidate_written()
+            logger.info("事务已提交")
+
 
 # 创建全局MySQL客户端实例
 mysql_client = MySQLCommandLineClient() 
\ No newline at end of file
@@ -0,0 +1,181 @@
+"""
+MySQL连接池
+基于mysql.connector实现的有界连接池，借出前进行健康检查并回收过期连接
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import mysql.connector
+
+logger = logging.getLogger(__name__)
+
+# 建立连接时mysql.connector可识别的配置项
+_CONNECT_KEYS = (
+    "host", "port", "user", "password", "database",
+    "charset", "autocommit", "use_unicode", "connection_timeout"
+)
+
+
+class PoolTimeoutError(Exception):
+    """等待可用连接超时"""
+
+
+class PooledConnection:
+    """
+    连接池中的连接，记录创建时间和最近一次归还时间
+    statements 缓存该连接上已预处理的语句（driver_sql -> 预处理游标），随连接一起关闭
+    """
+
+    __slots__ = ("raw", "created_at", "last_used", "statements")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.statements: "OrderedDict[str, Any]" = OrderedDict()
+
+
+class ConnectionPool:
+    """
+    有界连接池
+    - 最多同时持有 size 个连接，连接按需创建
+    - 连接耗尽时阻塞等待，超过 timeout 抛出 PoolTimeoutError
+    - 空闲超过 health_check_interval 的连接在借出前 ping 一次
+    - 存活超过 max_lifetime 的连接在借出时重建
+    """
+
+    def __init__(self, config: Dict[str, Any], size: int = 10, timeout: float = 5.0,
+                 health_check_interval: float = 30.0, max_lifetime: float = 3600.0):
+        if size < 1:
+            raise ValueError("连接池大小必须大于0")
+        self.config = {k: v for k, v in config.items() if k in _CONNECT_KEYS}
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.max_lifetime = max_lifetime
+
+        self._idle: List[PooledConnection] = []
+        self._created = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _connect(self) -> PooledConnection:
+        raw = mysql.connector.connect(**self.config)
+        logger.debug("连接池新建连接")
+        return PooledConnection(raw)
+
+    def _close_raw(self, conn: PooledConnection):
+        for cursor in conn.statements.values():
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        conn.statements.clear()
+        try:
+            conn.raw.close()
+        except Exception:
+            pass
+
+    def _is_usable(self, conn: PooledConnection) -> bool:
+        """检查空闲连接是否仍然可用"""
+        now = time.monotonic()
+        if now - conn.created_at > self.max_lifetime:
+            return False
+        if now - conn.last_used < self.health_check_interval:
+            return True
+        try:
+            conn.raw.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def acquire(self) -> PooledConnection:
+        """借出一个连接"""
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("连接池已关闭")
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._created < self.size:
+                    self._created += 1
+                    conn = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeoutError(f"等待数据库连接超时（连接池大小: {self.size}）")
+                self._cond.wait(remaining)
+
+        # 建立连接和健康检查都在锁外进行，避免阻塞其他线程
+        try:
+            if conn is None:
+                return self._connect()
+            if self._is_usable(conn):
+                return conn
+            logger.info("连接健康检查失败或已过期，重新建立连接")
+            self._close_raw(conn)
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn: PooledConnection, discard: bool = False):
+        """归还连接，discard=True 时直接关闭"""
+        if not discard:
+            try:
+                if conn.raw.in_transaction:
+                    conn.raw.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            if discard or self._closed:
+                self._created -= 1
+            else:
+                conn.last_used = time.monotonic()
+                self._idle.append(conn)
+            self._cond.notify()
+
+        if discard or self._closed:
+            self._close_raw(conn)
+
+    @contextmanager
+    def connection(self):
+        """借出连接的上下文管理器，连接级错误时丢弃该连接"""
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+        except (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def close(self):
+        """关闭连接池及所有空闲连接"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self._close_raw(conn)
+
+    def stats(self) -> Dict[str, int]:
+        """连接池状态"""
+        with self._cond:
+            return {
+                "size": self.size,
+                "created": self._created,
+                "idle": len(self._idle),
+                "in_use": self._created - len(self._idle)
+            }
@@ -0,0 +1,159 @@
+"""
+查询结果
+执行后端一次执行得到的列信息、数据行、影响行数和自增ID
+
+数据行按列类型解码为Python值（整数、Decimal、datetime等），并以 Row 对象返回：
+同一结果集的所有行共享一份列名索引，每行只保存一个值元组。
+"""
+from collections.abc import Mapping
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from pydantic_core import SchemaSerializer, core_schema
+
+
+class Row(Mapping):
+    """
+    只读的数据行，支持 row["column"]、row.get()、dict(row) 和 **row
+    需要修改时先用 dict(row) 或 row.copy() 转换为字典
+    """
+
+    __slots__ = ("_index", "_values")
+
+    def __init__(self, index: Dict[str, int], values: Tuple[Any, ...]):
+        self._index = index
+        self._values = values
+
+    def __getitem__(self, key: str) -> Any:
+        return self._values[self._index[key]]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        position = self._index.get(key)
+        return default if position is None else self._values[position]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def copy(self) -> Dict[str, Any]:
+        return dict(self.items())
+
+    def __repr__(self) -> str:
+        return f"Row({self.copy()!r})"
+
+
+# 让pydantic（及FastAPI响应序列化）把 Row 当作字典输出，Row 可以直接放在 Dict[str, Any] 等字段中返回
+Row.__pydantic_serializer__ = SchemaSerializer(core_schema.any_schema(
+    serialization=core_schema.plain_serializer_function_ser_schema(Row.copy)
+))
+
+
+class QueryResult:
+    """一次SQL执行的结果，列名与数据行来自同一次执行"""
+
+    __slots__ = ("columns", "rows", "rowcount", "lastrowid")
+
+    def __init__(self, columns: Sequence[str] = (), rows: List[Tuple[Any, ...]] = None,
+                 rowcount: int = 0, lastrowid: Optional[int] = None):
+        self.columns = list(columns)
+        self.rows = rows if rows is not None else []
+        self.rowcount = rowcount
+        self.lastrowid = lastrowid
+
+    def as_rows(self) -> List[Row]:
+        """按列名组装为 Row 列表，所有行共享同一份列名索引"""
+        # 列名重复时（如 SELECT a.*, b.*）与字典一样以后出现的列为准
+        index = {name: position for position, name in enumerate(self.columns)}
+        return [Row(index, values) for values in self.rows]
+
+    def as_dicts(self) -> List[Dict[str, Any]]:
+        """按列名组装为字典列表"""
+        columns = self.columns
+        return [dict(zip(columns, row)) for row in self.rows]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+class ChunkResult:
+    """批量写入中一个分块的执行结果"""
+
+    __slots__ = ("offset", "rows", "rowcount", "lastrowid")
+
+    def __init__(self, offset: int, rows: int, rowcount: int = 0, lastrowid: Optional[int] = None):
+        self.offset = offset        # 本块第一行在输入中的下标
+        self.rows = rows            # 本块提交的行数
+        self.rowcount = rowcount    # 数据库报告的影响行数
+        self.lastrowid = lastrowid  # 多行INSERT时为本块第一行的自增ID
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "offset": self.offset,
+            "rows": self.rows,
+            "rowcount": self.rowcount,
+            "lastrowid": self.lastrowid
+        }
+
+
+def _parse_datetime(text: str) -> Any:
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        # 零值日期（0000-00-00 00:00:00）等无法表示的值保留原文
+        return text
+
+
+def _parse_date(text: str) -> Any:
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        return text
+
+
+def _parse_time(text: str) -> timedelta:
+    """TIME 可以为负数或超过24小时，与驱动一致解码为 timedelta"""
+    negative = text.startswith("-")
+    hours, minutes, seconds = text.lstrip("-").split(":")
+    value = timedelta(hours=int(hours), minutes=int(minutes), seconds=float(seconds))
+    return -value if negative else value
+
+
+# 按mysql客户端 --column-type-info 输出的类型名解码文本值，未列出的类型（字符串、ENUM、JSON等）保持为str
+TEXT_DECODERS: Dict[str, Callable[[str], Any]] = {
+    "TINY": int,
+    "SHORT": int,
+    "LONG": int,
+    "INT24": int,
+    "LONGLONG": int,
+    "YEAR": int,
+    "DECIMAL": Decimal,
+    "NEWDECIMAL": Decimal,
+    "FLOAT": float,
+    "DOUBLE": float,
+    "TIMESTAMP": _parse_datetime,
+    "DATETIME": _parse_datetime,
+    "DATE": _parse_date,
+    "NEWDATE": _parse_date,
+    "TIME": _parse_time,
+    "NULL": lambda text: None,
+}
+
+
+def text_decoders(type_names: Sequence[str]) -> List[Optional[Callable[[str], Any]]]:
+    """每列的解码函数，字符串列为None"""
+    return [TEXT_DECODERS.get(name) for name in type_names]
+
+
+def decode_text_row(values: Sequence[Optional[str]],
+                    decoders: Sequence[Optional[Callable[[str], Any]]]) -> Tuple[Any, ...]:
+    """按列解码一行文本值"""
+    return tuple(
+        value if value is None or decoder is None else decoder(value)
+        for value, decoder in zip(values, decoders)
+    )
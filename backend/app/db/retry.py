@@ -0,0 +1,58 @@
+"""
+事务重试策略
+选课高峰时 courses/enrollments 行上的并发写入会出现InnoDB死锁和锁等待超时，
+这两类错误与数据无关，回滚后重新执行整个事务通常即可成功：
+  - 1213 死锁：InnoDB已回滚整个事务
+  - 1205 锁等待超时：默认只回滚当前语句，事务中之前的写入仍持有锁，同样回滚后整体重试
+其他错误（约束冲突、SQL错误、连接错误等）重试无意义，直接返回给调用方
+
+重试间隔为指数退避加全抖动（0 到 base_delay * 2^(n-1) 之间随机，不超过 max_delay），
+避免同时冲突的请求在同一时刻再次冲突；所有重试在 deadline 秒内完成，超出后不再重试
+"""
+import random
+from typing import Optional
+
+from app.core.config import settings
+from app.db.backend import DatabaseError
+
+DEADLOCK = 1213
+LOCK_WAIT_TIMEOUT = 1205
+RETRYABLE_ERRNOS = frozenset((DEADLOCK, LOCK_WAIT_TIMEOUT))
+
+
+def is_retryable(error: BaseException) -> bool:
+    """是否为回滚后重试可能成功的锁冲突错误"""
+    return isinstance(error, DatabaseError) and error.errno in RETRYABLE_ERRNOS
+
+
+class RetryPolicy:
+    """事务重试策略：最多执行 max_attempts 次，重试须在事务首次开始后 deadline 秒内开始"""
+
+    def __init__(self, max_attempts: int, base_delay: float, max_delay: float, deadline: float):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次执行失败后的等待秒数（全抖动）"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def next_delay(self, error: BaseException, attempt: int, elapsed: float) -> Optional[float]:
+        """第 attempt 次执行失败后的等待秒数，不应重试时返回None"""
+        if not is_retryable(error) or attempt >= self.max_attempts:
+            return None
+        delay = self.backoff(attempt)
+        if elapsed + delay >= self.deadline:
+            return None
+        return delay
+
+
+def default_retry_policy() -> RetryPolicy:
+    """根据配置创建事务重试策略"""
+    return RetryPolicy(
+        max_attempts=settings.DB_TX_RETRY_MAX_ATTEMPTS,
+        base_delay=settings.DB_TX_RETRY_BASE_DELAY,
+        max_delay=settings.DB_TX_RETRY_MAX_DELAY,
+        deadline=settings.DB_TX_RETRY_DEADLINE
+    )
@@ -0,0 +1,271 @@
+"""
+读写分离
+只读查询路由到从库，写操作、事务和加锁读始终走主库：
+  - 同一请求（或携带粘滞Cookie的后续请求）发生写操作后，后续读取改走主库，保证读到自己的写入
+  - 从库连接失败或复制延迟超过 MYSQL_REPLICA_MAX_LAG 时暂时摘除，读取回退到主库
+  - 从库执行 SHOW REPLICA STATUS 无结果（未配置复制，如测试中用第二个本地数据库模拟从库）时视为无延迟
+
+从库通过 MYSQL_REPLICAS 配置，格式为逗号分隔的 host[:port][/database]，账号密码与主库相同
+"""
+import itertools
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.db.backend import is_connection_error
+from app.db.result import QueryResult
+from app.db.statements import CompiledStatement, compile_statement
+
+logger = logging.getLogger(__name__)
+
+# 会修改数据或需要加锁的查询，即使返回结果集也必须走主库
+_PRIMARY_ONLY_PATTERN = re.compile(
+    r'\bFOR\s+UPDATE\b|\bFOR\s+SHARE\b|\bLOCK\s+IN\s+SHARE\s+MODE\b|\bGET_LOCK\s*\(|\bLAST_INSERT_ID\s*\(',
+    re.IGNORECASE
+)
+
+class RoutingState:
+    """一个请求（或会话）内的路由状态，写操作后置 wrote，primary_only 时读取也走主库"""
+
+    __slots__ = ("primary_only", "wrote")
+
+    def __init__(self, primary_only: bool = False):
+        self.primary_only = primary_only
+        self.wrote = False
+
+
+_routing_state: ContextVar[Optional[RoutingState]] = ContextVar("db_routing_state", default=None)
+
+
+def begin_routing(primary_only: bool = False) -> RoutingState:
+    """在请求开始时调用；primary_only=True 表示本请求的读取全部走主库（如粘滞期内的请求）"""
+    state = RoutingState(primary_only)
+    _routing_state.set(state)
+    return state
+
+
+@contextmanager
+def use_primary():
+    """在代码块内强制读取走主库，用于对延迟敏感的读取"""
+    outer = _routing_state.get()
+    state = RoutingState(primary_only=True)
+    token = _routing_state.set(state)
+    try:
+        yield
+    finally:
+        _routing_state.reset(token)
+        if outer is not None and state.wrote:
+            outer.wrote = True
+
+
+@lru_cache(maxsize=1024)
+def is_replica_safe(sql: str) -> bool:
+    """判断语句能否在从库执行：返回结果集且不加锁"""
+    head = sql.lstrip().upper()
+    if not head.startswith(('SELECT', 'SHOW', 'WITH', 'DESCRIBE', 'EXPLAIN')):
+        return False
+    return _PRIMARY_ONLY_PATTERN.search(sql) is None
+
+
+def parse_replicas(spec: str, default_port: int, default_database: str) -> List[Dict[str, Any]]:
+    """解析 host[:port][/database] 列表"""
+    replicas = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        address, _, database = item.partition("/")
+        host, _, port = address.partition(":")
+        replicas.append({
+            "host": host,
+            "port": int(port) if port else default_port,
+            "database": database or default_database
+        })
+    return replicas
+
+
+class Replica:
+    """一个从库执行后端及其健康状态"""
+
+    def __init__(self, name: str, backend):
+        self.name = name
+        self.backend = backend
+        self.down_until = 0.0
+        self.lag: Optional[float] = None
+        self.lag_checked_at = 0.0
+        self.lag_check_supported = True
+        self.reads = 0
+        self.failures = 0
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "available": self.down_until <= time.monotonic(),
+            "lag": self.lag,
+            "reads": self.reads,
+            "failures": self.failures,
+            "backend": self.backend.status()
+        }
+
+
+class RoutingBackend:
+    """
+    读写分离执行后端，包装一个主库后端和若干从库后端
+    对外接口与单库执行后端一致（run/session/stream/close/status）
+    """
+
+    name = "routing"
+
+    _LAG_SQL = ("SHOW REPLICA STATUS", "SHOW SLAVE STATUS")
+
+    def __init__(self, primary, replicas: List[Replica], max_lag: float,
+                 lag_check_interval: float, retry_interval: float):
+        self.primary = primary
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.lag_check_interval = lag_check_interval
+        self.retry_interval = retry_interval
+        self._cycle = itertools.cycle(replicas)
+        self._lock = threading.Lock()
+        self._primary_reads = 0
+        self._fallbacks = 0
+
+    # ---- 路由 ----
+
+    def _mark_down(self, replica: Replica, reason: str):
+        replica.down_until = time.monotonic() + self.retry_interval
+        logger.warning(f"从库 {replica.name} 暂时摘除 {self.retry_interval:.0f} 秒: {reason}")
+
+    def _check_lag(self, replica: Replica):
+        """按间隔检查复制延迟，同一时刻只有一个线程执行检查"""
+        now = time.monotonic()
+        if not replica.lag_check_supported or now - replica.lag_checked_at < self.lag_check_interval:
+            return
+        with self._lock:
+            if now - replica.lag_checked_at < self.lag_check_interval:
+                return
+            replica.lag_checked_at = now
+
+        for sql in self._LAG_SQL:
+            try:
+                rows = replica.backend.run(compile_statement(sql), None, True).as_rows()
+                break
+            except Exception as e:
+                if is_connection_error(e):
+                    self._mark_down(replica, str(e))
+                    return
+        else:
+            # 没有查看复制状态的权限或语法不支持，之后不再检查延迟
+            replica.lag_check_supported = False
+            logger.warning(f"无法查询从库 {replica.name} 的复制状态，停止延迟检查")
+            return
+
+        if not rows:
+            replica.lag = 0.0
+            return
+        status = rows[0]
+        lag = status.get("Seconds_Behind_Source", status.get("Seconds_Behind_Master"))
+        replica.lag = None if lag is None else float(lag)
+        if replica.lag is None:
+            self._mark_down(replica, "复制已停止")
+        elif replica.lag > self.max_lag:
+            self._mark_down(replica, f"复制延迟 {replica.lag:.0f} 秒")
+
+    def _pick_replica(self) -> Optional[Replica]:
+        """轮询选择一个可用从库，全部不可用时返回None"""
+        for _ in range(len(self.replicas)):
+            with self._lock:
+                replica = next(self._cycle)
+            if replica.down_until > time.monotonic():
+                continue
+            self._check_lag(replica)
+            if replica.down_until <= time.monotonic():
+                return replica
+        return None
+
+    def _read_target(self, statement: CompiledStatement) -> Optional[Replica]:
+        """确定读取使用的从库，需要走主库时返回None；写语句标记本请求的读写粘滞"""
+        state = _routing_state.get()
+        if not is_replica_safe(statement.sql):
+            if state is not None:
+                state.wrote = True
+            return None
+        if state is not None and (state.primary_only or state.wrote):
+            return None
+        return self._pick_replica()
+
+    def _count_primary_read(self, fallback: bool):
+        with self._lock:
+            self._primary_reads += 1
+            if fallback:
+                self._fallbacks += 1
+
+    # ---- 执行后端接口 ----
+
+    def run(self, statement: CompiledStatement, params: Optional[Dict[str, Any]] = None,
+            fetch_results: bool = True) -> QueryResult:
+        replica = self._read_target(statement)
+        if replica is not None:
+            try:
+                result = replica.backend.run(statement, params, fetch_results)
+                replica.reads += 1
+                return result
+            except Exception as e:
+                if not is_connection_error(e):
+                    raise
+                replica.failures += 1
+                self._mark_down(replica, str(e))
+            self._count_primary_read(fallback=True)
+        elif is_replica_safe(statement.sql):
+            self._count_primary_read(fallback=False)
+        return self.primary.run(statement, params, fetch_results)
+
+    def stream(self, statement: CompiledStatement, params: Optional[Dict[str, Any]],
+               batch_size: int) -> Iterator[QueryResult]:
+        replica = self._read_target(statement)
+        if replica is not None:
+            batches = replica.backend.stream(statement, params, batch_size)
+            try:
+                first = next(batches, None)
+            except Exception as e:
+                if not is_connection_error(e):
+                    raise
+                replica.failures += 1
+                self._mark_down(replica, str(e))
+            else:
+                # 已开始读取后不再切换，避免重复输出
+                replica.reads += 1
+                try:
+                    if first is not None:
+                        yield first
+                        yield from batches
+                finally:
+                    batches.close()
+                return
+            self._count_primary_read(fallback=True)
+        yield from self.primary.stream(statement, params, batch_size)
+
+    @contextmanager
+    def session(self):
+        """事务始终在主库执行，事务结束后本请求的读取同样走主库"""
+        state = _routing_state.get()
+        if state is not None:
+            state.wrote = True
+        with self.primary.session() as conn:
+            yield conn
+
+    def close(self):
+        self.primary.close()
+        for replica in self.replicas:
+            replica.backend.close()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "primary": self.primary.status(),
+            "replicas": [replica.status() for replica in self.replicas],
+            "primary_reads": self._primary_reads,
+            "fallbacks": self._fallbacks
+        }
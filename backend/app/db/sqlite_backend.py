@@ -0,0 +1,540 @@
+"""
+SQLite执行后端
+在没有MySQL的环境中代替MySQL运行，用于离线测试、基准测试和进程内压测（DB_BACKEND=sqlite）：
+  - 首次打开空数据库时执行 database/init.sql，DDL翻译为SQLite语法
+    （ENUM改为CHECK约束、表内索引改为 CREATE INDEX、ON UPDATE CURRENT_TIMESTAMP 改为触发器，存储过程跳过）
+  - 运行时语句按需翻译：ON DUPLICATE KEY UPDATE、INSERT IGNORE、DATE_SUB/DATE_ADD、FOR UPDATE 等，
+    NOW()/CURDATE()/YEAR()/MONTH()/CONCAT() 以自定义函数提供
+  - 按声明的列类型把 DATE/DATETIME/TIMESTAMP/DECIMAL 转换为Python类型，与MySQL驱动的返回值一致
+  - 错误转换为带MySQL错误码的 DatabaseError（如唯一键冲突为1062）
+
+SQLite同一时刻只允许一个写事务，这里所有语句共用一个连接并串行执行，
+会话（事务）期间独占该连接。与MySQL的差异：字符串比较区分大小写、不支持存储过程和 SHOW 语句。
+"""
+import logging
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.db.backend import BaseBackend, DatabaseError, _from_driver_rows
+from app.db.instrumentation import record_round_trip
+from app.db.result import QueryResult
+from app.db.statements import CompiledStatement, statement_cache_info
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INIT_SCRIPT = Path(__file__).resolve().parents[3] / "database" / "init.sql"
+
+_LOCAL_NOW = "(strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime'))"
+
+
+# ---- 类型转换 ----
+
+def _parse_datetime(value: bytes):
+    text = value.decode()
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        return text
+
+
+def _parse_date(value: bytes):
+    text = value.decode()
+    try:
+        return date.fromisoformat(text[:10])
+    except ValueError:
+        return text
+
+
+def _parse_decimal(value: bytes):
+    try:
+        return Decimal(value.decode())
+    except InvalidOperation:
+        return value.decode()
+
+
+def _decimal_with_scale(scale: int):
+    """DECIMAL(M,D) 列按小数位数补齐，与MySQL返回的 Decimal('3.0') 一致（SQLite会把3.0存为整数3）"""
+    exponent = Decimal(1).scaleb(-scale)
+
+    def parse(value: bytes):
+        parsed = _parse_decimal(value)
+        return parsed.quantize(exponent) if isinstance(parsed, Decimal) else parsed
+    return parse
+
+
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" ", "seconds"))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_adapter(timedelta, lambda value: str(value))
+for _type in ("DATETIME", "TIMESTAMP"):
+    sqlite3.register_converter(_type, _parse_datetime)
+sqlite3.register_converter("DATE", _parse_date)
+sqlite3.register_converter("DECIMAL", _parse_decimal)
+for _scale in range(31):
+    # 建表时 DECIMAL(M,D) 翻译为 DECIMAL_S<D>，转换器按声明类型的第一个单词匹配
+    sqlite3.register_converter(f"DECIMAL_S{_scale}", _decimal_with_scale(_scale))
+
+
+# ---- MySQL函数 ----
+
+def _now() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _curdate() -> str:
+    return date.today().isoformat()
+
+
+def _date_part(index: slice):
+    def part(value):
+        if value is None:
+            return None
+        try:
+            return int(str(value)[index])
+        except ValueError:
+            return None
+    return part
+
+
+_INTERVAL_UNITS = {
+    "SECOND": lambda n: timedelta(seconds=n),
+    "MINUTE": lambda n: timedelta(minutes=n),
+    "HOUR": lambda n: timedelta(hours=n),
+    "DAY": lambda n: timedelta(days=n),
+    "WEEK": lambda n: timedelta(weeks=n),
+}
+
+
+def _date_add(value, amount, unit):
+    """DATE_ADD/DATE_SUB，日期输入返回日期，日期时间输入返回日期时间"""
+    if value is None or amount is None:
+        return None
+    text = str(value)
+    unit = unit.upper()
+    parsed = datetime.fromisoformat(text if len(text) > 10 else text + " 00:00:00")
+    if unit in ("MONTH", "YEAR"):
+        months = parsed.year * 12 + parsed.month - 1 + int(amount) * (12 if unit == "YEAR" else 1)
+        year, month = divmod(months, 12)
+        day = min(parsed.day, [31, 29 if year % 4 == 0 and (year % 100 or year % 400 == 0) else 28,
+                               31, 30, 31, 30, 31, 31, 30, 31, 30, 31][month])
+        parsed = parsed.replace(year=year, month=month + 1, day=day)
+    else:
+        parsed += _INTERVAL_UNITS[unit](amount)
+    return parsed.date().isoformat() if len(text) <= 10 else parsed.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _concat(*values):
+    if any(value is None for value in values):
+        return None
+    return "".join(str(value) for value in values)
+
+
+_FUNCTIONS = [
+    ("NOW", 0, _now),
+    ("CURDATE", 0, _curdate),
+    ("YEAR", 1, _date_part(slice(0, 4))),
+    ("MONTH", 1, _date_part(slice(5, 7))),
+    ("DAY", 1, _date_part(slice(8, 10))),
+    ("MYSQL_DATE_ADD", 3, _date_add),
+    ("CONCAT", -1, _concat),
+]
+
+
+# ---- 运行时语句翻译 ----
+
+_UNSUPPORTED_PATTERN = re.compile(r"^\s*(CALL|SHOW|DESCRIBE|LOCK\s+TABLES|UNLOCK\s+TABLES)\b", re.IGNORECASE)
+_DUPLICATE_KEY_PATTERN = re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.IGNORECASE)
+_VALUES_FUNCTION_PATTERN = re.compile(r"\bVALUES\s*\(\s*`?(\w+)`?\s*\)", re.IGNORECASE)
+_DATE_ADD_PATTERN = re.compile(
+    r"\bDATE_(ADD|SUB)\s*\(\s*((?:[^(),]|\([^()]*\))+?)\s*,\s*INTERVAL\s+(-?\d+|\?)\s+(\w+)\s*\)",
+    re.IGNORECASE
+)
+_SQL_RULES = [
+    (re.compile(r"\bINSERT\s+IGNORE\b", re.IGNORECASE), "INSERT OR IGNORE"),
+    (re.compile(r"\s+(?:FOR\s+UPDATE|FOR\s+SHARE|LOCK\s+IN\s+SHARE\s+MODE)\b(?:\s+(?:NOWAIT|SKIP\s+LOCKED))?", re.IGNORECASE), ""),
+    (re.compile(r"\bLAST_INSERT_ID\s*\(\s*\)", re.IGNORECASE), "last_insert_rowid()"),
+    (re.compile(r"\bROW_COUNT\s*\(\s*\)", re.IGNORECASE), "changes()"),
+    (re.compile(r"\bCURRENT_TIMESTAMP\b(?:\s*\(\s*\))?", re.IGNORECASE), "NOW()"),
+    (re.compile(r"\bCURRENT_DATE\b(?:\s*\(\s*\))?", re.IGNORECASE), "CURDATE()"),
+    (re.compile(r"\bIF\s*\(", re.IGNORECASE), "iif("),
+    (re.compile(r"\bGREATEST\s*\(", re.IGNORECASE), "max("),
+    (re.compile(r"\bLEAST\s*\(", re.IGNORECASE), "min("),
+]
+
+
+def _date_add_sql(match) -> str:
+    sign = "-" if match.group(1).upper() == "SUB" else ""
+    return f"MYSQL_DATE_ADD({match.group(2)}, {sign}({match.group(3)}), '{match.group(4).upper()}')"
+
+
+@lru_cache(maxsize=1024)
+def translate_sql(sql: str) -> str:
+    """把MySQL语句翻译为SQLite语句，不支持的语句抛出 DatabaseError"""
+    unsupported = _UNSUPPORTED_PATTERN.match(sql)
+    if unsupported:
+        raise DatabaseError(f"SQLite执行后端不支持 {unsupported.group(1).upper()} 语句", 1235)
+    duplicate = _DUPLICATE_KEY_PATTERN.search(sql)
+    if duplicate:
+        tail = _VALUES_FUNCTION_PATTERN.sub(r"excluded.\1", sql[duplicate.end():])
+        sql = sql[:duplicate.start()] + "ON CONFLICT DO UPDATE SET" + tail
+    sql = _DATE_ADD_PATTERN.sub(_date_add_sql, sql)
+    for pattern, replacement in _SQL_RULES:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+# ---- 初始化脚本翻译 ----
+
+def split_script(script: str) -> List[str]:
+    """按分号（或 DELIMITER 指定的分隔符）切分SQL脚本，忽略字符串和注释中的分隔符"""
+    statements = []
+    delimiter = ";"
+    current: List[str] = []
+    for line in script.splitlines():
+        stripped = line.strip()
+        if stripped.upper().startswith("DELIMITER "):
+            delimiter = stripped.split(None, 1)[1]
+            continue
+        if not current and (not stripped or stripped.startswith("--")):
+            continue
+        current.append(line)
+        text = "\n".join(current)
+        if _ends_with(text, delimiter):
+            statement = text.rstrip()[:-len(delimiter)].strip()
+            if statement:
+                statements.append(statement)
+            current = []
+    if current and "\n".join(current).strip():
+        statements.append("\n".join(current).strip())
+    return statements
+
+
+def _ends_with(text: str, delimiter: str) -> bool:
+    """语句以分隔符结束且分隔符不在字符串或注释中"""
+    body = text.rstrip()
+    if not body.endswith(delimiter):
+        return False
+    quote = None
+    index = 0
+    end = len(body) - len(delimiter)
+    while index < end:
+        char = body[index]
+        if quote:
+            if char == "\\":
+                index += 1
+            elif char == quote:
+                quote = None
+        elif char in ("'", '"', "`"):
+            quote = char
+        elif body.startswith("--", index):
+            newline = body.find("\n", index)
+            if newline == -1 or newline >= end:
+                return False
+            index = newline
+        index += 1
+    return quote is None
+
+
+def _split_items(body: str) -> List[str]:
+    """按顶层逗号切分 CREATE TABLE 的定义列表"""
+    items, depth, quote, start = [], 0, None, 0
+    for index, char in enumerate(body):
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in ("'", '"'):
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            items.append(body[start:index].strip())
+            start = index + 1
+    items.append(body[start:].strip())
+    return [item for item in items if item]
+
+
+_COMMENT_PATTERN = re.compile(r"\s+COMMENT\s+'(?:[^'\\]|\\.|'')*'", re.IGNORECASE)
+_CREATE_TABLE_PATTERN = re.compile(r"^CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?`?(\w+)`?\s*\(", re.IGNORECASE)
+_INDEX_ITEM_PATTERN = re.compile(r"^(UNIQUE\s+)?(?:INDEX|KEY)\s+`?(\w+)`?\s*(\(.*\))$", re.IGNORECASE | re.DOTALL)
+_UNIQUE_KEY_PATTERN = re.compile(r"^UNIQUE\s+(?:KEY|INDEX)\s+`?\w+`?\s*(\(.*\))$", re.IGNORECASE | re.DOTALL)
+_ENUM_PATTERN = re.compile(r"^`?(\w+)`?\s+ENUM\s*(\([^)]*\))", re.IGNORECASE)
+_COLUMN_RULES = [
+    (re.compile(r"\bINT(?:EGER)?(?:\(\d+\))?\s+(?:UNSIGNED\s+)?(?:NOT\s+NULL\s+)?AUTO_INCREMENT\s+PRIMARY\s+KEY\b",
+                re.IGNORECASE), "INTEGER PRIMARY KEY AUTOINCREMENT"),
+    (re.compile(r"\bDECIMAL\s*\(\s*\d+\s*,\s*(\d+)\s*\)", re.IGNORECASE), r"DECIMAL_S\1"),
+    (re.compile(r"\s+AUTO_INCREMENT\b", re.IGNORECASE), ""),
+    (re.compile(r"\s+ON\s+UPDATE\s+CURRENT_TIMESTAMP\b", re.IGNORECASE), ""),
+    (re.compile(r"\bDEFAULT\s+CURRENT_TIMESTAMP\b", re.IGNORECASE), f"DEFAULT {_LOCAL_NOW}"),
+    (re.compile(r"\s+UNSIGNED\b", re.IGNORECASE), ""),
+    (re.compile(r"\s+(?:CHARACTER\s+SET|CHARSET|COLLATE)\s+\w+", re.IGNORECASE), ""),
+]
+_ON_UPDATE_PATTERN = re.compile(r"^`?(\w+)`?\s.*\bON\s+UPDATE\s+CURRENT_TIMESTAMP\b", re.IGNORECASE | re.DOTALL)
+
+
+def _translate_create_table(statement: str) -> List[str]:
+    match = _CREATE_TABLE_PATTERN.match(statement)
+    table = match.group(1)
+    close = statement.rfind(")")
+    items = _split_items(statement[match.end():close])
+
+    definitions, indexes, touched = [], [], []
+    for item in items:
+        item = _COMMENT_PATTERN.sub("", item)
+        unique_key = _UNIQUE_KEY_PATTERN.match(item)
+        if unique_key:
+            definitions.append(f"UNIQUE {unique_key.group(1)}")
+            continue
+        index = _INDEX_ITEM_PATTERN.match(item)
+        if index:
+            kind = "UNIQUE INDEX" if index.group(1) else "INDEX"
+            # SQLite的索引名在整个库内唯一，加上表名前缀
+            indexes.append(f"CREATE {kind} IF NOT EXISTS {table}_{index.group(2)} ON {table} {index.group(3)}")
+            continue
+        on_update = _ON_UPDATE_PATTERN.match(item)
+        if on_update:
+            touched.append(on_update.group(1))
+        enum = _ENUM_PATTERN.match(item)
+        if enum:
+            item = f"{enum.group(1)} TEXT CHECK ({enum.group(1)} IN {enum.group(2)})" + item[enum.end():]
+        for pattern, replacement in _COLUMN_RULES:
+            item = pattern.sub(replacement, item)
+        definitions.append(item)
+
+    statements = [f"CREATE TABLE IF NOT EXISTS {table} (\n    " + ",\n    ".join(definitions) + "\n)"]
+    statements.extend(indexes)
+    for column in touched:
+        # ON UPDATE CURRENT_TIMESTAMP：未显式修改该列的UPDATE后自动刷新
+        statements.append(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_{column}_on_update AFTER UPDATE ON {table} "
+            f"FOR EACH ROW WHEN NEW.{column} IS OLD.{column} BEGIN "
+            f"UPDATE {table} SET {column} = {_LOCAL_NOW} WHERE rowid = NEW.rowid; END"
+        )
+    return statements
+
+
+def translate_script(script: str) -> List[str]:
+    """把MySQL初始化脚本翻译为SQLite语句列表"""
+    statements = []
+    for statement in split_script(script):
+        head = statement.lstrip().upper()
+        if head.startswith(("CREATE DATABASE", "USE ", "SET ")):
+            continue
+        if head.startswith(("CREATE PROCEDURE", "CREATE FUNCTION")):
+            name = statement.split("(", 1)[0].split()[-1]
+            logger.info(f"SQLite执行后端跳过存储过程 {name}")
+            continue
+        if _CREATE_TABLE_PATTERN.match(statement):
+            statements.extend(_translate_create_table(statement))
+        elif head.startswith("CREATE TRIGGER"):
+            # 触发器体以 END 结束，SQLite要求体内每条语句以分号结束
+            statements.append(translate_sql(statement))
+        else:
+            statements.append(translate_sql(_COMMENT_PATTERN.sub("", statement)))
+    return statements
+
+
+# ---- 错误转换 ----
+
+_ERROR_CODES = [
+    ("UNIQUE constraint failed", 1062),
+    ("FOREIGN KEY constraint failed", 1452),
+    ("NOT NULL constraint failed", 1048),
+    ("CHECK constraint failed", 1265),
+    ("no such table", 1146),
+    ("no such column", 1054),
+    ("syntax error", 1064),
+    ("database is locked", 1205),
+]
+
+
+def _from_sqlite_error(e: sqlite3.Error) -> DatabaseError:
+    message = str(e)
+    for text, errno in _ERROR_CODES:
+        if text in message:
+            return DatabaseError(message, errno)
+    return DatabaseError(message, 1105)
+
+
+# ---- 执行后端 ----
+
+class SQLiteBackend(BaseBackend):
+    """SQLite执行后端，接口与MySQL执行后端一致"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str = ":memory:", init_script: Optional[str] = None, timeout: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        self._conn = sqlite3.connect(
+            path,
+            timeout=timeout,
+            isolation_level=None,
+            check_same_thread=False,
+            detect_types=sqlite3.PARSE_DECLTYPES
+        )
+        for name, argc, fn in _FUNCTIONS:
+            self._conn.create_function(name, argc, fn, deterministic=name not in ("NOW", "CURDATE"))
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode = WAL")
+        # 会话期间独占连接；会话可能在不同线程中执行各条语句，因此使用普通锁而不是可重入锁
+        self._lock = threading.Lock()
+        self._statements = 0
+        self._initialize(init_script or str(DEFAULT_INIT_SCRIPT))
+
+    def _initialize(self, init_script: str):
+        """空数据库执行初始化脚本"""
+        exists = self._conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0]
+        if exists:
+            return
+        script = Path(init_script)
+        if not script.exists():
+            logger.warning(f"SQLite初始化脚本不存在: {script}")
+            return
+        statements = translate_script(script.read_text(encoding="utf-8"))
+        try:
+            self._conn.execute("BEGIN")
+            for statement in statements:
+                self._conn.execute(statement)
+            self._conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            self._conn.execute("ROLLBACK")
+            raise _from_sqlite_error(e)
+        logger.info(f"SQLite数据库已初始化: {self.path}（{len(statements)} 条语句）")
+
+    def _acquire(self):
+        if not self._lock.acquire(timeout=self.timeout):
+            raise DatabaseError("等待SQLite连接超时", 1205)
+
+    def _run_unlocked(self, statement: CompiledStatement, params: Optional[Dict[str, Any]],
+                      fetch_results: bool) -> QueryResult:
+        record_round_trip()
+        self._statements += 1
+        if statement.param_names:
+            sql, values = translate_sql(statement.driver_sql), statement.bind(params)
+        else:
+            sql, values = translate_sql(statement.sql), ()
+        cursor = self._conn.cursor()
+        try:
+            cursor.execute(sql, values)
+            if cursor.description is not None:
+                rows = cursor.fetchall()
+                if not fetch_results:
+                    return QueryResult(rowcount=len(rows))
+                columns = [desc[0] for desc in cursor.description]
+                return QueryResult(columns, _from_driver_rows(rows), rowcount=len(rows))
+            return QueryResult(rowcount=cursor.rowcount, lastrowid=cursor.lastrowid)
+        except sqlite3.Error as e:
+            raise _from_sqlite_error(e)
+        finally:
+            cursor.close()
+
+    def _stream_unlocked(self, statement: CompiledStatement, params: Optional[Dict[str, Any]],
+                         batch_size: int, locked: bool) -> Iterator[QueryResult]:
+        """按批读取，locked=False 时每次读取前加锁"""
+        record_round_trip()
+        if statement.param_names:
+            sql, values = translate_sql(statement.driver_sql), statement.bind(params)
+        else:
+            sql, values = translate_sql(statement.sql), ()
+        cursor = self._conn.cursor()
+        try:
+            if not locked:
+                self._acquire()
+            try:
+                cursor.execute(sql, values)
+                columns = [desc[0] for desc in cursor.description or ()]
+                rows = cursor.fetchmany(batch_size)
+            finally:
+                if not locked:
+                    self._lock.release()
+            while rows:
+                yield QueryResult(columns, _from_driver_rows(rows), rowcount=len(rows))
+                if not locked:
+                    self._acquire()
+                try:
+                    rows = cursor.fetchmany(batch_size)
+                finally:
+                    if not locked:
+                        self._lock.release()
+        except sqlite3.Error as e:
+            raise _from_sqlite_error(e)
+        finally:
+            cursor.close()
+
+    def run(self, statement: CompiledStatement, params: Optional[Dict[str, Any]] = None,
+            fetch_results: bool = True) -> QueryResult:
+        self._acquire()
+        try:
+            return self._run_unlocked(statement, params, fetch_results)
+        finally:
+            self._lock.release()
+
+    def stream(self, statement: CompiledStatement, params: Optional[Dict[str, Any]],
+               batch_size: int) -> Iterator[QueryResult]:
+        return self._stream_unlocked(statement, params, batch_size, locked=False)
+
+    @contextmanager
+    def session(self):
+        """会话期间独占连接，结束时仍处于事务中则回滚"""
+        self._acquire()
+        try:
+            yield _SQLiteSession(self)
+        finally:
+            try:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+            finally:
+                self._lock.release()
+
+    def close(self):
+        self._conn.close()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "path": self.path,
+            "sqlite_version": sqlite3.sqlite_version,
+            "statements": self._statements,
+            "statement_cache": statement_cache_info()
+        }
+
+
+class _SQLiteSession:
+    """独占SQLite连接的会话"""
+
+    def __init__(self, backend: SQLiteBackend):
+        self._backend = backend
+
+    def _call(self, sql: str):
+        record_round_trip()
+        try:
+            self._backend._conn.execute(sql)
+        except sqlite3.Error as e:
+            raise _from_sqlite_error(e)
+
+    def run(self, statement: CompiledStatement, params: Optional[Dict[str, Any]] = None,
+            fetch_results: bool = True) -> QueryResult:
+        return self._backend._run_unlocked(statement, params, fetch_results)
+
+    def stream(self, statement: CompiledStatement, params: Optional[Dict[str, Any]],
+               batch_size: int) -> Iterator[QueryResult]:
+        return self._backend._stream_unlocked(statement, params, batch_size, locked=True)
+
+    def begin(self):
+        self._call("BEGIN")
+
+    def commit(self):
+        self._call("COMMIT")
+
+    def rollback(self):
+        self._call("ROLLBACK")
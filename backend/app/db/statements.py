@@ -0,0 +1,140 @@
+"""
+SQL语句模板
+将使用 :name 命名参数的SQL模板解析一次并缓存编译结果：
+  - 安全校验只在模板首次编译时执行
+  - 连接池后端使用 ? 占位符在服务端绑定参数
+  - 命令行后端按占位符位置拼接转义后的字面量，不再依赖字符串替换
+"""
+import re
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+# 危险的SQL关键字（在模板上校验，参数值通过绑定传递，不参与校验）
+DANGEROUS_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE) for pattern in (
+        r'\bDROP\b', r'\bDELETE\b.*\bWHERE\s+1\s*=\s*1\b',
+        r'\bTRUNCATE\b', r'\bALTER\b', r'\bCREATE\b.*\bUSER\b',
+        r'\bGRANT\b', r'\bREVOKE\b', r'--', r'/\*', r'\*/',
+        r'\bUNION\b.*\bSELECT\b', r'\bEXEC\b', r'\bEVAL\b'
+    )
+]
+
+# 依次匹配：单引号字符串、双引号字符串、反引号标识符、命名参数
+_TOKEN_PATTERN = re.compile(
+    r"'(?:[^'\\]|\\.|'')*'"
+    r'|"(?:[^"\\]|\\.|"")*"'
+    r"|`[^`]*`"
+    r"|(?<![:\w]):([A-Za-z_]\w*)",
+    re.DOTALL
+)
+
+
+class CompiledStatement:
+    """
+    编译后的SQL模板
+    - sql: 原始模板
+    - driver_sql: 命名参数替换为 ? 的语句，用于服务端预处理
+    - param_names: 按出现顺序排列的参数名（同名参数可出现多次）
+    """
+
+    __slots__ = ("sql", "driver_sql", "param_names", "_segments")
+
+    def __init__(self, sql: str):
+        self.sql = sql
+        segments: List[str] = []
+        names: List[str] = []
+        last = 0
+        for match in _TOKEN_PATTERN.finditer(sql):
+            name = match.group(1)
+            if name is None:
+                continue
+            segments.append(sql[last:match.start()])
+            names.append(name)
+            last = match.end()
+        segments.append(sql[last:])
+
+        self._segments = tuple(segments)
+        self.param_names = tuple(names)
+        self.driver_sql = "?".join(segments)
+
+    def bind(self, params: Optional[Dict[str, Any]]) -> Tuple[Any, ...]:
+        """按占位符顺序取出参数值"""
+        if not self.param_names:
+            return ()
+        params = params or {}
+        try:
+            return tuple(params[name] for name in self.param_names)
+        except KeyError as e:
+            raise ValueError(f"缺少SQL参数: {e.args[0]}")
+
+    def render(self, params: Optional[Dict[str, Any]]) -> str:
+        """将参数转义为字面量后拼接成完整SQL（命令行后端使用）"""
+        if not self.param_names:
+            return self.sql
+        values = self.bind(params)
+        parts = [self._segments[0]]
+        for value, segment in zip(values, self._segments[1:]):
+            parts.append(to_sql_literal(value))
+            parts.append(segment)
+        return "".join(parts)
+
+
+def to_sql_literal(value: Any) -> str:
+    """将Python值转换为SQL字面量"""
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    if isinstance(value, datetime):
+        value = value.strftime("%Y-%m-%d %H:%M:%S.%f")
+    elif isinstance(value, (date, time, timedelta)):
+        value = str(value)
+    elif isinstance(value, (bytes, bytearray)):
+        value = value.decode("utf-8", errors="replace")
+    else:
+        value = str(value)
+    escaped = value.replace("\\", "\\\\").replace("'", "''")
+    return f"'{escaped}'"
+
+
+def validate_sql(sql: str):
+    """SQL注入防护：拒绝包含危险关键字的语句模板"""
+    if not sql or not isinstance(sql, str):
+        raise ValueError("SQL语句不能为空")
+    for pattern in DANGEROUS_PATTERNS:
+        if pattern.search(sql):
+            raise ValueError(f"检测到潜在的SQL注入攻击: {pattern.pattern}")
+
+
+def in_clause(values: List[Any], params: Dict[str, Any], prefix: str) -> str:
+    """为 IN (...) 生成命名参数列表并把取值写入 params，返回 ":p0, :p1, ..." """
+    names = []
+    for index, value in enumerate(values):
+        name = f"{prefix}{index}"
+        params[name] = value
+        names.append(f":{name}")
+    return ", ".join(names)
+
+
+@lru_cache(maxsize=settings.STATEMENT_CACHE_SIZE)
+def compile_statement(sql: str) -> CompiledStatement:
+    """校验并编译SQL模板，结果按模板文本缓存"""
+    validate_sql(sql)
+    return CompiledStatement(sql)
+
+
+def statement_cache_info() -> Dict[str, int]:
+    """模板缓存的命中/未命中统计"""
+    info = compile_statement.cache_info()
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "max_size": info.maxsize
+    }
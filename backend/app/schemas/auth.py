@@ -2,7 +2,7 @@
 认证相关数据模式
 """
 from typing import Optional
-from datetime import date
+from datetime import date, datetime
 from pydantic import BaseModel, EmailStr, Field
 
 
@@ -93,8 +93,8 @@ class UserResponse(BaseModel):
     status: Optional[str] = None
     role: Optional[str] = None
     user_type: Optional[str] = None
-    created_at: Optional[str] = None
-    updated_at: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
     
     class Config:
         schema_extra = {
@@ -0,0 +1,166 @@
+"""
+批量选课和退课
+一次请求处理一组选课和退课：
+  - 检查阶段：一次读取涉及的课程和学生的全部选课记录，在内存中对整组课程检查课程状态、名额、重复选课、
+    先修课程和上课时间冲突
+    （与已选课程及同一组中排在前面的课程比较，同一组中退掉的课程不再计入）
+  - 写入阶段：在一个事务中先退课再选课，名额仍以 seats 模块中带条件的UPDATE为准；
+    退课释放的名额先递补给该课程的候补队首
+两种模式：
+  - all_or_nothing：任一课程检查或写入失败时整组不生效
+  - best_effort：跳过失败的课程，其余课程照常生效
+"""
+from typing import Any, Dict, List, Optional
+
+from app.db.statements import in_clause
+from app.services import seats, waitlist
+from app.utils.course_validation import check_enrollment_conflicts
+
+ALL_OR_NOTHING = "all_or_nothing"
+BEST_EFFORT = "best_effort"
+
+ADD = "add"
+DROP = "drop"
+
+
+class BatchRejectedError(Exception):
+    """all_or_nothing 模式下有课程失败，整组回滚"""
+
+    def __init__(self, results: List[Dict[str, Any]]):
+        super().__init__("批量选课未全部成功")
+        self.results = results
+
+
+def _result(course_id: str, action: str, success: bool, message: str,
+            enrollment_id: Optional[int] = None) -> Dict[str, Any]:
+    return {
+        "course_id": course_id,
+        "action": action,
+        "success": success,
+        "enrollment_id": enrollment_id,
+        "message": message
+    }
+
+
+async def load(database, student_id: str, course_ids: List[str]):
+    """一次读取检查所需的数据，返回 (课程号 -> 课程, 课程号 -> 该学生的选课记录)"""
+    params: Dict[str, Any] = {}
+    course_sql = (
+        "SELECT course_id, course_name, credits, status, current_students, max_students, schedule, schedule_mask "
+        "FROM courses "
+        f"WHERE course_id IN ({in_clause(course_ids, params, 'c')})"
+    )
+    enrollment_sql = """
+    SELECT e.enrollment_id, e.course_id, e.status, e.grade, c.course_name, c.schedule, c.schedule_mask
+    FROM enrollments e
+    JOIN courses c ON e.course_id = c.course_id
+    WHERE e.student_id = :student_id
+    """
+    success, (courses, enrollments), error = await database.execute_batch([
+        (course_sql, params),
+        (enrollment_sql, {"student_id": student_id})
+    ])
+    if not success:
+        raise RuntimeError(error)
+    return (
+        {row["course_id"]: row for row in courses},
+        {row["course_id"]: row for row in enrollments}
+    )
+
+
+def check(courses: Dict[str, Dict[str, Any]], enrollments: Dict[str, Dict[str, Any]],
+          add: List[str], drop: List[str], prerequisites=None) -> Dict[str, Optional[str]]:
+    """
+    对整组课程做一次检查，返回 {课程号: 失败原因}，可以处理的课程原因为None
+    prerequisites 为先修课程关系图（PrerequisiteGraph），为None时不检查先修课程
+    名额按读取时的人数判断，写入时可能因并发选课而满员
+    """
+    errors: Dict[str, Optional[str]] = {}
+    for course_id in drop:
+        enrollment = enrollments.get(course_id)
+        # 与单门退课一致：只有在修且没有成绩的课程可以退
+        droppable = enrollment and enrollment["status"] == "enrolled" and enrollment["grade"] is None
+        errors[course_id] = None if droppable else "未选该课程或不能退课"
+
+    dropped = {course_id for course_id in drop if errors[course_id] is None}
+    completed = [course_id for course_id, row in enrollments.items() if row["status"] == "completed"]
+    # 本学期在修的课程，用于检查时间冲突；新选上的课程依次加入
+    schedule = [
+        row for course_id, row in enrollments.items()
+        if row["status"] == "enrolled" and course_id not in dropped
+    ]
+    for course_id in add:
+        course = courses.get(course_id)
+        enrollment = enrollments.get(course_id)
+        missing = prerequisites.missing(course_id, completed) if prerequisites is not None else []
+        if course is None or course["status"] != "active":
+            errors[course_id] = "课程不存在或未开放选课"
+        elif enrollment and enrollment["status"] in seats.SEAT_STATUSES:
+            errors[course_id] = "您已经选过这门课程"
+        elif course["current_students"] >= course["max_students"]:
+            errors[course_id] = "课程选课人数已满"
+        elif missing:
+            errors[course_id] = f"缺少先修课程: {', '.join(missing)}"
+        else:
+            conflicts = check_enrollment_conflicts(course, schedule)
+            if conflicts:
+                errors[course_id] = f"与已选课程时间冲突: {', '.join(conflict['name'] for conflict in conflicts)}"
+            else:
+                errors[course_id] = None
+                schedule.append(course)
+    return errors
+
+
+def rejected(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """all_or_nothing 模式整组不生效时的结果：原本成功的课程标记为未生效"""
+    return [
+        result if not result["success"] else
+        {**result, "success": False, "enrollment_id": None, "message": "其他课程失败，未生效"}
+        for result in results
+    ]
+
+
+def unapplied(add: List[str], drop: List[str], errors: Dict[str, Optional[str]]) -> List[Dict[str, Any]]:
+    """all_or_nothing 模式检查未通过、不进入事务时的结果"""
+    return rejected([
+        _result(course_id, action, errors[course_id] is None, errors[course_id] or "")
+        for action, course_ids in ((DROP, drop), (ADD, add)) for course_id in course_ids
+    ])
+
+
+async def apply(tx, student_id: str, enrollments: Dict[str, Dict[str, Any]],
+                add: List[str], drop: List[str], errors: Dict[str, Optional[str]],
+                mode: str, prerequisites=None) -> List[Dict[str, Any]]:
+    """
+    事务体（可能因死锁重试而执行多次）：先退课再选课，返回各课程的处理结果
+    prerequisites 为先修课程关系图，递补候补学生时检查
+    all_or_nothing 模式下有课程失败时抛出 BatchRejectedError，由事务回滚
+    """
+    results = []
+    for course_id in drop:
+        if errors[course_id] is not None:
+            results.append(_result(course_id, DROP, False, errors[course_id]))
+        elif await seats.drop(tx, enrollments[course_id]["enrollment_id"], course_id):
+            # 释放的名额在同一事务中递补给候补队首，promoted 不返回给客户端，只用于事务提交后通知
+            promoted = await waitlist.promote(tx, course_id, limit=1, prerequisites=prerequisites)
+            result = _result(course_id, DROP, True, "退课成功", enrollments[course_id]["enrollment_id"])
+            results.append({**result, "promoted": promoted})
+        else:
+            results.append(_result(course_id, DROP, False, "未选该课程或不能退课"))
+
+    for course_id in add:
+        if errors[course_id] is not None:
+            results.append(_result(course_id, ADD, False, errors[course_id]))
+            continue
+        try:
+            enrollment_id = await seats.enroll(tx, student_id, course_id)
+        except seats.SeatUnavailableError:
+            results.append(_result(course_id, ADD, False, "课程选课人数已满"))
+        except seats.AlreadyEnrolledError:
+            results.append(_result(course_id, ADD, False, "您已经选过这门课程"))
+        else:
+            results.append(_result(course_id, ADD, True, "选课成功", enrollment_id))
+
+    if mode == ALL_OR_NOTHING and not all(result["success"] for result in results):
+        raise BatchRejectedError(rejected(results))
+    return results
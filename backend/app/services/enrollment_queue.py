@@ -0,0 +1,334 @@
+"""
+选课排队（ENROLLMENT_QUEUE_ENABLED 开启，用于选课高峰期）
+选课请求不再各自争抢课程行，而是进入所选课程的先进先出队列并立即返回排队凭证：
+  - 少量工作协程轮流处理各课程的队列，每次取出至多 batch_size 个请求，在一个事务中按排队顺序逐个选课，
+    同一课程同一时刻只有一个工作协程在处理，数据库并发数不超过工作协程数
+  - 课程已满后同一批中排在后面的请求直接拒绝，不再访问数据库
+  - 排队期间同一学生可能已选上（或同时排队）时间冲突的课程：处理时锁定本批学生，
+    按其当前的选课记录再检查一次时间冲突，冲突的请求拒绝
+  - 处理结果写回凭证，客户端轮询凭证或通过 WebSocket 收到通知
+  - 已结束的凭证保留 ticket_ttl 秒后清除
+
+凭证只保存在进程内，多进程部署时需要把同一课程的选课请求路由到同一进程，否则各进程的队列之间没有先后顺序；
+队列的所有方法都只在事件循环线程中调用，不需要加锁
+"""
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.db.statements import in_clause
+from app.services import seats
+from app.utils.course_validation import check_enrollment_conflicts, schedule_mask
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+PROCESSING = "processing"
+ENROLLED = "enrolled"
+REJECTED = "rejected"
+FAILED = "failed"
+
+# 计算等待时间分位数时保留的最近样本数
+_SAMPLE_SIZE = 1000
+
+_COURSE_SQL = "SELECT course_id, course_name, schedule, schedule_mask FROM courses WHERE course_id = :course_id"
+
+# 按学号顺序锁定本批学生，同一学生对不同课程的排队请求依次检查时间冲突
+_LOCK_SQL = "SELECT student_id FROM students WHERE student_id IN ({ids}) ORDER BY student_id FOR UPDATE"
+
+_ENROLLED_SQL = """
+SELECT e.student_id, c.course_id, c.course_name, c.schedule, c.schedule_mask
+FROM enrollments e
+JOIN courses c ON e.course_id = c.course_id
+WHERE e.status = 'enrolled' AND e.student_id IN ({ids})
+"""
+
+
+class QueueFullError(Exception):
+    """课程排队人数已达上限"""
+
+
+class Ticket:
+    """选课排队凭证"""
+
+    __slots__ = (
+        "ticket_id", "student_id", "course_id", "seq", "status", "enrollment_id", "message",
+        "queued_at", "started_at", "finished_at"
+    )
+
+    def __init__(self, student_id: str, course_id: str, seq: int):
+        self.ticket_id = uuid.uuid4().hex
+        self.student_id = student_id
+        self.course_id = course_id
+        self.seq = seq
+        self.status = QUEUED
+        self.enrollment_id: Optional[int] = None
+        self.message: Optional[str] = None
+        self.queued_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self, position: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            "ticket_id": self.ticket_id,
+            "course_id": self.course_id,
+            "status": self.status,
+            "position": position,
+            "enrollment_id": self.enrollment_id,
+            "message": self.message,
+            "queued_at": datetime.fromtimestamp(self.queued_at),
+            "finished_at": datetime.fromtimestamp(self.finished_at) if self.finished_at else None
+        }
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+
+class EnrollmentQueue:
+    """按课程排队的选课队列"""
+
+    def __init__(self, workers: int, batch_size: int, max_depth: int, ticket_ttl: float):
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.max_depth = max_depth
+        self.ticket_ttl = ticket_ttl
+        self.enabled = False
+        self._db = None
+        self._notify: Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]] = None
+        self._queues: Dict[str, Deque[Ticket]] = {}
+        # 每门课程已分配和已取出的排队序号，二者之差为排在某个凭证之前的人数
+        self._next_seq: Dict[str, int] = {}
+        self._served_seq: Dict[str, int] = {}
+        # 有待处理请求的课程，每门课程至多出现一次，工作协程轮流取出；_scheduled 为在其中或正在处理的课程
+        self._ready: Optional[asyncio.Queue] = None
+        self._scheduled: set = set()
+        self._tickets: Dict[str, Ticket] = {}
+        self._active: Dict[Tuple[str, str], Ticket] = {}
+        self._finished: Deque[Ticket] = deque()
+        self._tasks: List[asyncio.Task] = []
+        self._notifications: set = set()
+        self._waits: Deque[float] = deque(maxlen=_SAMPLE_SIZE)
+        self._peak_depth = 0
+        self._submitted = 0
+        self._batches = 0
+        self._counts = {ENROLLED: 0, REJECTED: 0, FAILED: 0}
+
+    # ---- 生命周期 ----
+
+    async def start(self, database, notify: Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]] = None):
+        """启动工作协程，notify(学号, 消息) 用于推送处理结果"""
+        self._db = database
+        self._notify = notify
+        self._ready = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self.enabled = True
+        logger.info(f"选课排队已启用，工作协程 {self.workers} 个")
+
+    async def stop(self, timeout: float = 10.0):
+        """停止接收新请求，处理完已排队的请求（至多等待 timeout 秒）后停止工作协程"""
+        self.enabled = False
+        try:
+            await asyncio.wait_for(self._ready.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"选课排队停止时仍有 {self.depth()} 个请求未处理")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # ---- 排队和查询 ----
+
+    def submit(self, student_id: str, course_id: str) -> Ticket:
+        """
+        排队选课并返回凭证；同一学生对同一课程已在排队时返回原凭证
+        课程排队人数达到 max_depth 时抛出 QueueFullError
+        """
+        self._expire()
+        key = (student_id, course_id)
+        if key in self._active:
+            return self._active[key]
+
+        queue = self._queues.setdefault(course_id, deque())
+        if len(queue) >= self.max_depth:
+            raise QueueFullError(course_id)
+
+        seq = self._next_seq.get(course_id, 0)
+        self._next_seq[course_id] = seq + 1
+        ticket = Ticket(student_id, course_id, seq)
+        queue.append(ticket)
+        self._tickets[ticket.ticket_id] = ticket
+        self._active[key] = ticket
+        self._submitted += 1
+        self._peak_depth = max(self._peak_depth, self.depth())
+        if course_id not in self._scheduled:
+            self._schedule(course_id)
+        return ticket
+
+    def get(self, ticket_id: str) -> Optional[Ticket]:
+        """查询凭证，不存在或已过期时返回None"""
+        self._expire()
+        return self._tickets.get(ticket_id)
+
+    def position(self, ticket: Ticket) -> Optional[int]:
+        """排在该凭证之前的人数，已开始处理时返回None"""
+        if ticket.status != QUEUED:
+            return None
+        return ticket.seq - self._served_seq.get(ticket.course_id, 0)
+
+    def depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _expire(self):
+        deadline = time.time() - self.ticket_ttl
+        while self._finished and self._finished[0].finished_at < deadline:
+            self._tickets.pop(self._finished.popleft().ticket_id, None)
+
+    # ---- 工作协程 ----
+
+    def _schedule(self, course_id: str):
+        self._scheduled.add(course_id)
+        self._ready.put_nowait(course_id)
+
+    async def _worker(self):
+        while True:
+            course_id = await self._ready.get()
+            try:
+                queue = self._queues[course_id]
+                batch = [queue.popleft() for _ in range(min(self.batch_size, len(queue)))]
+                if batch:
+                    self._served_seq[course_id] = batch[-1].seq + 1
+                    await self._process(batch)
+            except Exception as e:
+                logger.error(f"处理选课排队失败: {str(e)}")
+            finally:
+                # 处理完一批后排到其他课程之后，各课程轮流处理
+                self._scheduled.discard(course_id)
+                if self._queues.get(course_id):
+                    self._schedule(course_id)
+                elif course_id in self._queues:
+                    del self._queues[course_id]
+                self._ready.task_done()
+
+    async def _process(self, batch: List[Ticket]):
+        """在一个事务中按排队顺序处理一批选课"""
+        started_at = time.time()
+        for ticket in batch:
+            ticket.status = PROCESSING
+            ticket.started_at = started_at
+            self._waits.append(started_at - ticket.queued_at)
+
+        try:
+            outcomes = await self._db.run_transaction(lambda tx: self._admit(tx, batch))
+        except Exception as e:
+            logger.error(f"选课排队批量处理失败: {str(e)}")
+            outcomes = {ticket.ticket_id: (FAILED, None, "选课失败") for ticket in batch}
+        self._batches += 1
+
+        for ticket in batch:
+            self._finish(ticket, *outcomes[ticket.ticket_id])
+
+    async def _admit(self, tx, batch: List[Ticket]) -> Dict[str, Tuple[str, Optional[int], str]]:
+        """
+        事务体（可能因死锁重试而执行多次）：按排队顺序逐个选课
+        返回 {凭证号: (状态, 选课记录ID, 说明)}
+        """
+        outcomes: Dict[str, Tuple[str, Optional[int], str]] = {}
+        course = await tx.fetch_one(_COURSE_SQL, {"course_id": batch[0].course_id})
+        enrolled = await self._enrolled(tx, batch) if course and schedule_mask(course) else {}
+        full = False
+        for ticket in batch:
+            if full:
+                outcomes[ticket.ticket_id] = (REJECTED, None, "课程选课人数已满")
+                continue
+            conflicts = check_enrollment_conflicts(course, enrolled.get(ticket.student_id, [])) if enrolled else []
+            if conflicts:
+                names = ", ".join(conflict["name"] for conflict in conflicts)
+                outcomes[ticket.ticket_id] = (REJECTED, None, f"与已选课程时间冲突: {names}")
+                continue
+            try:
+                enrollment_id = await seats.enroll(tx, ticket.student_id, ticket.course_id)
+            except seats.SeatUnavailableError:
+                full = True
+                outcomes[ticket.ticket_id] = (REJECTED, None, "课程选课人数已满")
+            except seats.AlreadyEnrolledError:
+                outcomes[ticket.ticket_id] = (REJECTED, None, "您已经选过这门课程")
+            else:
+                outcomes[ticket.ticket_id] = (ENROLLED, enrollment_id, "选课成功")
+                if enrolled:
+                    enrolled.setdefault(ticket.student_id, []).append(course)
+        return outcomes
+
+    @staticmethod
+    async def _enrolled(tx, batch: List[Ticket]) -> Dict[str, List[Dict[str, Any]]]:
+        """锁定本批学生并读取其在修课程 {学号: [课程]}；其他课程的排队请求在本事务提交前不能为这些学生选课"""
+        student_ids = sorted({ticket.student_id for ticket in batch})
+        params: Dict[str, Any] = {}
+        ids = in_clause(student_ids, params, "s")
+        await tx.fetch(_LOCK_SQL.format(ids=ids), params)
+        rows = await tx.fetch(_ENROLLED_SQL.format(ids=ids), params)
+        enrolled: Dict[str, List[Dict[str, Any]]] = {student_id: [] for student_id in student_ids}
+        for row in rows:
+            enrolled[row["student_id"]].append(row)
+        return enrolled
+
+    def _finish(self, ticket: Ticket, result: str, enrollment_id: Optional[int], message: str):
+        ticket.status = result
+        ticket.enrollment_id = enrollment_id
+        ticket.message = message
+        ticket.finished_at = time.time()
+        self._counts[result] += 1
+        self._active.pop((ticket.student_id, ticket.course_id), None)
+        self._finished.append(ticket)
+        if self._notify is not None:
+            # 推送在单独的任务中进行，客户端连接缓慢时不阻塞工作协程
+            task = asyncio.create_task(self._push(ticket))
+            self._notifications.add(task)
+            task.add_done_callback(self._notifications.discard)
+
+    async def _push(self, ticket: Ticket):
+        try:
+            message = {
+                key: value.isoformat() if isinstance(value, datetime) else value
+                for key, value in ticket.to_dict().items()
+            }
+            await self._notify(ticket.student_id, {"event": "enrollment_ticket", **message})
+        except Exception as e:
+            logger.warning(f"推送选课结果失败: {str(e)}")
+
+    def status(self) -> Dict[str, Any]:
+        waits = list(self._waits)
+        deepest = sorted(self._queues.items(), key=lambda item: len(item[1]), reverse=True)[:10]
+        return {
+            "enabled": self.enabled,
+            "workers": self.workers,
+            "batch_size": self.batch_size,
+            "max_depth": self.max_depth,
+            "depth": self.depth(),
+            "peak_depth": self._peak_depth,
+            "deepest_courses": {course_id: len(queue) for course_id, queue in deepest if queue},
+            "submitted": self._submitted,
+            "batches": self._batches,
+            "enrolled": self._counts[ENROLLED],
+            "rejected": self._counts[REJECTED],
+            "failed": self._counts[FAILED],
+            "tickets": len(self._tickets),
+            "wait_p50_ms": round(_percentile(waits, 0.5) * 1000, 2),
+            "wait_p95_ms": round(_percentile(waits, 0.95) * 1000, 2),
+            "wait_max_ms": round(max(waits) * 1000, 2) if waits else 0.0
+        }
+
+
+# 全局选课队列，ENROLLMENT_QUEUE_ENABLED 时在应用启动时启动工作协程
+enrollment_queue = EnrollmentQueue(
+    workers=settings.ENROLLMENT_QUEUE_WORKERS,
+    batch_size=settings.ENROLLMENT_QUEUE_BATCH_SIZE,
+    max_depth=settings.ENROLLMENT_QUEUE_MAX_DEPTH,
+    ticket_ttl=settings.ENROLLMENT_QUEUE_TICKET_TTL
+)
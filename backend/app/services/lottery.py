@@ -0,0 +1,233 @@
+"""
+预选课抽签分配
+预选窗口内学生在 registration_carts 中提交按志愿排序的课程，窗口结束后一次性分配，不再在开放时刻争抢名额：
+  - 抽签顺序：固定种子的随机数生成器，学号排序后依次抽取，同一种子和同一组志愿的结果可复现；
+    seniority 权重下按年级加权（高年级权重大），排序键为 u ** (1 / 权重)
+  - 分配按轮进行：每轮每个学生按抽签顺序依次拿到自己剩余志愿中第一门仍有名额、且与已分到及在修课程不冲突的课程，
+    相邻两轮顺序相反（蛇形），抽签靠后的学生不会每轮都排在最后
+  - 课程未开放、已选过和缺少先修课程的志愿在分配前排除；名额不足和时间冲突的志愿在分配时跳过
+  - 写入：一个事务内每门课程一次带条件的UPDATE占用全部名额，选课记录用 insert_many 批量插入，
+    之前退过的课程批量恢复原记录，最后清空志愿表
+"""
+import random
+from collections import Counter, deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.db.statements import in_clause
+from app.services import seats
+from app.utils.course_validation import schedule_mask
+
+RANDOM = "random"
+SENIORITY = "seniority"
+
+# 志愿未分配的原因
+UNAVAILABLE = "unavailable"
+ENROLLED = "enrolled"
+PREREQUISITE = "prerequisite"
+FULL = "full"
+CONFLICT = "conflict"
+
+_CARTS_SQL = "SELECT student_id, course_id, choice_rank FROM registration_carts ORDER BY student_id, choice_rank"
+
+_COURSES_SQL = """
+SELECT course_id, max_students, current_students, schedule, schedule_mask
+FROM courses
+WHERE status = 'active'
+"""
+
+_ENROLLMENTS_SQL = """
+SELECT e.enrollment_id, e.student_id, e.course_id, e.status, c.schedule, c.schedule_mask
+FROM enrollments e
+JOIN courses c ON e.course_id = c.course_id
+WHERE e.student_id IN (SELECT DISTINCT student_id FROM registration_carts)
+"""
+
+_GRADES_SQL = """
+SELECT student_id, grade
+FROM students
+WHERE student_id IN (SELECT DISTINCT student_id FROM registration_carts)
+"""
+
+_RESTORE_SQL = """
+UPDATE enrollments
+SET status = 'enrolled', enrollment_date = NOW()
+WHERE status = 'dropped' AND enrollment_id IN ({ids})
+"""
+
+# 批量恢复退课记录时每条语句的记录数
+_RESTORE_CHUNK = 1000
+
+
+def _parse_time(text: str) -> Optional[datetime]:
+    return datetime.strptime(text, "%Y-%m-%d %H:%M:%S") if text else None
+
+
+def cart_open(now: Optional[datetime] = None) -> bool:
+    """当前是否在预选窗口内（REGISTRATION_CART_OPENS_AT <= 当前 < REGISTRATION_CART_CLOSES_AT）"""
+    opens = _parse_time(settings.REGISTRATION_CART_OPENS_AT)
+    closes = _parse_time(settings.REGISTRATION_CART_CLOSES_AT)
+    now = now or datetime.now()
+    return opens is not None and closes is not None and opens <= now < closes
+
+
+def cart_closed(now: Optional[datetime] = None) -> bool:
+    """预选窗口是否已结束，结束后才能抽签"""
+    closes = _parse_time(settings.REGISTRATION_CART_CLOSES_AT)
+    return closes is not None and (now or datetime.now()) >= closes
+
+
+async def load(database) -> Dict[str, Any]:
+    """一次读取抽签所需的全部数据"""
+    success, (carts, courses, enrollments, grades), error = await database.execute_batch([
+        (_CARTS_SQL, None), (_COURSES_SQL, None), (_ENROLLMENTS_SQL, None), (_GRADES_SQL, None)
+    ])
+    if not success:
+        raise RuntimeError(error)
+
+    by_student: Dict[str, List[str]] = {}
+    for row in carts:
+        by_student.setdefault(row["student_id"], []).append(row["course_id"])
+    owned: Dict[str, Dict[str, Any]] = {}
+    for row in enrollments:
+        owned.setdefault(row["student_id"], {})[row["course_id"]] = row
+    return {
+        "carts": by_student,
+        "courses": {row["course_id"]: row for row in courses},
+        "enrollments": owned,
+        "grades": {row["student_id"]: row["grade"] for row in grades if row["grade"] is not None}
+    }
+
+
+def seniority_weights(grades: Dict[str, Any]) -> Dict[str, float]:
+    """按年级（入学年份）加权：最新一届权重为1，每早一届加1"""
+    if not grades:
+        return {}
+    newest = max(int(grade) for grade in grades.values())
+    return {student_id: 1.0 + newest - int(grade) for student_id, grade in grades.items()}
+
+
+def lottery_order(student_ids, seed: int, weights: Optional[Dict[str, float]] = None) -> List[str]:
+    """抽签顺序；按学号排序后依次抽取随机数，与读取顺序无关"""
+    rng = random.Random(seed)
+    ordered = sorted(student_ids)
+    if not weights:
+        rng.shuffle(ordered)
+        return ordered
+    keys = {student_id: rng.random() ** (1.0 / weights.get(student_id, 1.0)) for student_id in ordered}
+    return sorted(ordered, key=keys.__getitem__, reverse=True)
+
+
+def allocate(carts: Dict[str, List[str]], courses: Dict[str, Dict[str, Any]],
+             enrollments: Dict[str, Dict[str, Any]], seed: int,
+             weights: Optional[Dict[str, float]] = None, prerequisites=None) -> Dict[str, Any]:
+    """
+    抽签分配，不访问数据库
+    carts 为 {学号: [按志愿排序的课程号]}，courses 为开放的课程，enrollments 为 {学号: {课程号: 选课记录}}，
+    prerequisites 为先修课程关系图（PrerequisiteGraph），为None时不检查先修课程
+    返回 {"assignments": [(学号, 课程号)], "stats": 统计}
+    """
+    remaining = {
+        course_id: course["max_students"] - course["current_students"] for course_id, course in courses.items()
+    }
+    masks = {course_id: schedule_mask(course) for course_id, course in courses.items()}
+    rejected: Counter = Counter()
+
+    # 不随分配过程变化的条件先排除；每个学生剩余的志愿为 (志愿序号, 课程号) 队列
+    choices: Dict[str, deque] = {}
+    taken: Dict[str, int] = {}
+    for student_id, cart in carts.items():
+        owned = enrollments.get(student_id, {})
+        completed = [course_id for course_id, row in owned.items() if row["status"] == "completed"]
+        taken[student_id] = 0
+        for row in owned.values():
+            if row["status"] == "enrolled":
+                taken[student_id] |= schedule_mask(row)
+        queue = deque()
+        for rank, course_id in enumerate(cart, start=1):
+            if course_id not in remaining:
+                rejected[UNAVAILABLE] += 1
+            elif course_id in owned and owned[course_id]["status"] in seats.SEAT_STATUSES:
+                rejected[ENROLLED] += 1
+            elif prerequisites is not None and prerequisites.missing(course_id, completed):
+                rejected[PREREQUISITE] += 1
+            else:
+                queue.append((rank, course_id))
+        if queue:
+            choices[student_id] = queue
+
+    assignments: List[Tuple[str, str]] = []
+    by_choice: Counter = Counter()
+    active = [student_id for student_id in lottery_order(carts, seed, weights) if student_id in choices]
+    rounds = 0
+    while active:
+        still = []
+        for student_id in (active if rounds % 2 == 0 else reversed(active)):
+            queue = choices[student_id]
+            mask = taken[student_id]
+            while queue:
+                rank, course_id = queue.popleft()
+                if remaining[course_id] <= 0:
+                    rejected[FULL] += 1
+                elif masks[course_id] & mask:
+                    rejected[CONFLICT] += 1
+                else:
+                    remaining[course_id] -= 1
+                    taken[student_id] = mask | masks[course_id]
+                    assignments.append((student_id, course_id))
+                    by_choice[rank] += 1
+                    break
+            if queue:
+                still.append(student_id)
+        if rounds % 2:
+            still.reverse()
+        active = still
+        rounds += 1
+
+    allocated_students = len({student_id for student_id, _ in assignments})
+    return {
+        "assignments": assignments,
+        "stats": {
+            "seed": seed,
+            "students": len(carts),
+            "choices": sum(len(cart) for cart in carts.values()),
+            "allocated": len(assignments),
+            "students_allocated": allocated_students,
+            "rounds": rounds,
+            "by_choice": {rank: by_choice[rank] for rank in sorted(by_choice)},
+            "rejected": dict(rejected)
+        }
+    }
+
+
+async def write(tx, assignments: List[Tuple[str, str]], enrollments: Dict[str, Dict[str, Any]]) -> int:
+    """
+    事务体：占用名额、批量写入选课记录并清空志愿表，返回写入的选课数
+    课程名额在分配后被其他请求占用时抛出 seats.SeatUnavailableError，整个分配回滚
+    """
+    for course_id, count in Counter(course_id for _, course_id in assignments).items():
+        if not await seats.reserve_seats(tx, course_id, count):
+            raise seats.SeatUnavailableError(course_id)
+
+    fresh, restore = [], []
+    for student_id, course_id in assignments:
+        row = enrollments.get(student_id, {}).get(course_id)
+        if row is None:
+            fresh.append({"student_id": student_id, "course_id": course_id, "status": "enrolled"})
+        else:
+            restore.append(row["enrollment_id"])
+
+    if fresh:
+        success, _, error = await tx.insert_many("enrollments", fresh)
+        if not success:
+            raise RuntimeError(error)
+    for start in range(0, len(restore), _RESTORE_CHUNK):
+        chunk = restore[start:start + _RESTORE_CHUNK]
+        params: Dict[str, Any] = {}
+        result = await tx.execute(_RESTORE_SQL.format(ids=in_clause(chunk, params, "e")), params)
+        if result.rowcount != len(chunk):
+            raise RuntimeError("退课记录在分配期间被修改")
+
+    await tx.execute("DELETE FROM registration_carts")
+    return len(assignments)
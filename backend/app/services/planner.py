@@ -0,0 +1,166 @@
+"""
+选课方案规划
+学生给出一组想选的课程，找出彼此以及与已选课程都不冲突、课程数最多（count）或学分最多（credits）的子集，
+按得分给出前 limit 个方案：
+  - 候选课程先按 batch_enrollment.check 逐门检查状态、名额、重复选课、先修课程以及与已选课程的时间冲突，
+    不通过的课程直接排除并给出原因
+  - 候选课程之间两两按时间位图求冲突关系，每门课程的冲突课程记为一个位集
+  - 分支限界搜索：每层选或不选当前课程，上界为已选得分加上剩余可选课程分组（组内两两冲突）后
+    各组最高得分之和，低于第 limit 个方案时剪枝；只保留不能再加入任何课程的（极大）方案
+  - 搜索超过 time_budget 秒时停止，返回已找到的方案并标记 complete=False
+"""
+import heapq
+import time
+from typing import Any, Dict, List, Tuple
+
+from app.services import batch_enrollment
+from app.utils.course_validation import schedule_mask
+
+COUNT = "count"
+CREDITS = "credits"
+
+
+def _score(course: Dict[str, Any], objective: str) -> float:
+    return float(course.get("credits") or 0) if objective == CREDITS else 1.0
+
+
+def candidates(courses: Dict[str, Dict[str, Any]], enrollments: Dict[str, Dict[str, Any]],
+               wishlist: List[str], prerequisites=None) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+    """逐门检查愿望清单中的课程，返回 (可选课程, {课程号: 排除原因})"""
+    eligible, excluded = [], {}
+    for course_id in wishlist:
+        error = batch_enrollment.check(courses, enrollments, [course_id], [], prerequisites)[course_id]
+        if error:
+            excluded[course_id] = error
+        else:
+            eligible.append(courses[course_id])
+    return eligible, excluded
+
+
+def search(courses: List[Dict[str, Any]], objective: str = COUNT, limit: int = 3,
+           time_budget: float = 0.08) -> Dict[str, Any]:
+    """
+    在互不冲突的课程子集中搜索得分最高的 limit 个极大方案
+    返回 {"plans": [[课程, ...], ...], "complete": 是否搜索完整个空间, "nodes": 搜索的节点数}
+    """
+    # 得分高、冲突少的课程排在前面，更早找到好方案，剪枝更多
+    masks = [schedule_mask(course) for course in courses]
+    conflicts = [
+        sum(1 << j for j in range(len(courses)) if j != i and masks[i] & masks[j])
+        for i in range(len(courses))
+    ]
+    order = sorted(range(len(courses)),
+                   key=lambda i: (-_score(courses[i], objective), bin(conflicts[i]).count("1")))
+    courses = [courses[i] for i in order]
+    scores = [_score(course, objective) for course in courses]
+    # 得分相同时的次序：按课程数规划时学分多的在前，按学分规划时课程少的在前
+    ties = [_score(course, CREDITS if objective == COUNT else COUNT) for course in courses]
+    if objective == CREDITS:
+        ties = [-tie for tie in ties]
+    position = {old: new for new, old in enumerate(order)}
+    conflicts = [
+        sum(1 << position[j] for j in range(len(order)) if conflicts[old] >> j & 1)
+        for old in order
+    ]
+    every = (1 << len(courses)) - 1
+
+    # 小顶堆保存当前最好的 limit 个方案: (得分, 次序, -序号, 选中位集)
+    best: List[Tuple[float, float, int, int]] = []
+    deadline = time.perf_counter() + time_budget
+    state = {"nodes": 0, "complete": True, "found": 0}
+
+    def bound_ok(score: float, available: int) -> bool:
+        if len(best) < limit:
+            return True
+        # 上界：把剩余可选课程贪心地分成若干组两两冲突的课程，每组至多选一门，取各组最高得分之和；
+        # 课程已按得分从高到低排列，每组第一门课程得分最高
+        upper = score
+        groups: List[int] = []
+        for i in range(len(courses)):
+            if not available >> i & 1:
+                continue
+            for k, members in enumerate(groups):
+                if not members & ~conflicts[i]:
+                    groups[k] = members | 1 << i
+                    break
+            else:
+                groups.append(1 << i)
+                upper += scores[i]
+        # 得分相同的方案也作为备选，上界等于第 limit 个方案的得分时继续搜索
+        return upper >= best[0][0]
+
+    def record(chosen: int, score: float):
+        # 只保留极大方案：不能再加入任何不冲突的课程
+        for i in range(len(courses)):
+            if not chosen >> i & 1 and not conflicts[i] & chosen:
+                return
+        state["found"] += 1
+        tie = sum(ties[i] for i in range(len(courses)) if chosen >> i & 1)
+        entry = (score, tie, -state["found"], chosen)
+        if len(best) < limit:
+            heapq.heappush(best, entry)
+        elif entry > best[0]:
+            heapq.heapreplace(best, entry)
+
+    def visit(index: int, chosen: int, available: int, score: float):
+        state["nodes"] += 1
+        if state["nodes"] & 63 == 0 and time.perf_counter() > deadline:
+            state["complete"] = False
+        if not state["complete"]:
+            return
+        while index < len(courses) and not available >> index & 1:
+            index += 1
+        if index == len(courses):
+            record(chosen, score)
+            return
+        if not bound_ok(score, available):
+            return
+        rest = available & ~(1 << index)
+        visit(index + 1, chosen | 1 << index, rest & ~conflicts[index], score + scores[index])
+        visit(index + 1, chosen, rest, score)
+
+    visit(0, 0, every, 0.0)
+
+    # 方案中的课程按传入的顺序排列
+    plans = [
+        [courses[i] for i in sorted((i for i in range(len(courses)) if chosen >> i & 1), key=order.__getitem__)]
+        for _, _, _, chosen in sorted(best, reverse=True)
+    ]
+    return {"plans": plans, "complete": state["complete"], "nodes": state["nodes"]}
+
+
+def summarize(courses: List[Dict[str, Any]], rank: int) -> Dict[str, Any]:
+    """方案的返回格式"""
+    return {
+        "rank": rank,
+        "course_ids": [course["course_id"] for course in courses],
+        "courses": [
+            {
+                "course_id": course["course_id"],
+                "course_name": course["course_name"],
+                "credits": course.get("credits"),
+                "schedule": course.get("schedule")
+            }
+            for course in courses
+        ],
+        "count": len(courses),
+        "credits": sum(float(course.get("credits") or 0) for course in courses)
+    }
+
+
+def plan(courses: Dict[str, Dict[str, Any]], enrollments: Dict[str, Dict[str, Any]],
+         wishlist: List[str], objective: str = COUNT, limit: int = 3,
+         time_budget: float = 0.08, prerequisites=None) -> Dict[str, Any]:
+    """为愿望清单规划不冲突的选课方案"""
+    started = time.perf_counter()
+    eligible, excluded = candidates(courses, enrollments, wishlist, prerequisites)
+    result = search(eligible, objective, limit, time_budget) if eligible else {
+        "plans": [], "complete": True, "nodes": 0
+    }
+    return {
+        "objective": objective,
+        "complete": result["complete"],
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        "plans": [summarize(chosen, rank) for rank, chosen in enumerate(result["plans"], start=1)],
+        "excluded": [{"course_id": course_id, "reason": reason} for course_id, reason in excluded.items()]
+    }
@@ -0,0 +1,214 @@
+"""
+先修课程关系图
+从 course_prerequisites 表加载一次，构建后回答先修相关的查询，不再逐次递归查表：
+  - 课程按拓扑序排列（先修课程在前），按该顺序一次算出每门课程全部（传递）先修课程的位集，
+    第 i 位表示拓扑序中的第 i 门课程
+  - 缺少的先修课程：直接先修课程位集去掉学生已修完课程的位集
+  - 先修课程树：非递归后序遍历构建并缓存，共享的子树只构建一次
+  - 写入先修关系前检查：新的先修课程（或其传递先修课程）中包含本课程时形成环，拒绝写入
+
+数据库中已有环（如直接改表）时，环上的课程不参与拓扑排序，按不动点迭代计算传递先修，树在环处截断，并记录错误日志。
+关系图在进程内缓存 ttl 秒；本进程修改先修关系时立即失效
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_LOAD_SQL = "SELECT course_id, prerequisite_id FROM course_prerequisites"
+
+_NAMES_SQL = "SELECT course_id, course_name FROM courses"
+
+
+class CyclicPrerequisiteError(ValueError):
+    """先修关系形成环，cycle 为环上的课程号（首尾相同）"""
+
+    def __init__(self, cycle: List[str]):
+        super().__init__(f"先修课程形成循环: {' -> '.join(cycle)}")
+        self.cycle = cycle
+
+
+class PrerequisiteGraph:
+    """先修课程关系图及其拓扑序、传递闭包位集和先修课程树"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = asyncio.Lock()
+        self._loaded_at: Optional[float] = None
+        self.build({}, {})
+
+    # ---- 加载和构建 ----
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    async def ensure(self, database):
+        """关系图过期时从数据库重新加载，并发请求只加载一次"""
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return
+        async with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return
+            success, (edges, names), error = await database.execute_batch([(_LOAD_SQL, None), (_NAMES_SQL, None)])
+            if not success:
+                raise RuntimeError(error)
+            prerequisites: Dict[str, List[str]] = {}
+            for row in edges:
+                prerequisites.setdefault(row["course_id"], []).append(row["prerequisite_id"])
+            self.build(prerequisites, {row["course_id"]: row["course_name"] for row in names})
+            self._loaded_at = time.monotonic()
+
+    def build(self, prerequisites: Dict[str, List[str]], names: Dict[str, str]):
+        """由 {课程号: [直接先修课程号]} 构建关系图"""
+        nodes = set(prerequisites)
+        for items in prerequisites.values():
+            nodes.update(items)
+        self._names = names
+        self._direct = {course_id: sorted(set(prerequisites.get(course_id, ()))) for course_id in nodes}
+
+        # Kahn 拓扑排序：先修课程排在前面；剩下的课程在环上或依赖环
+        dependents: Dict[str, List[str]] = {course_id: [] for course_id in nodes}
+        pending = {course_id: len(items) for course_id, items in self._direct.items()}
+        for course_id, items in self._direct.items():
+            for prerequisite_id in items:
+                dependents[prerequisite_id].append(course_id)
+        order = sorted(course_id for course_id, count in pending.items() if not count)
+        for course_id in order:
+            for dependent in dependents[course_id]:
+                pending[dependent] -= 1
+                if not pending[dependent]:
+                    order.append(dependent)
+        self._cyclic = sorted(nodes.difference(order))
+        self.order = order + self._cyclic
+        self._bit = {course_id: index for index, course_id in enumerate(self.order)}
+
+        self._direct_bits = {
+            course_id: self._bits(items) for course_id, items in self._direct.items()
+        }
+        self._closure: Dict[str, int] = {}
+        for course_id in order:
+            closure = self._direct_bits[course_id]
+            for prerequisite_id in self._direct[course_id]:
+                closure |= self._closure[prerequisite_id]
+            self._closure[course_id] = closure
+        if self._cyclic:
+            logger.error(f"先修课程关系中存在循环，涉及课程: {', '.join(self._cyclic)}")
+            for course_id in self._cyclic:
+                self._closure[course_id] = self._direct_bits[course_id]
+            changed = True
+            while changed:
+                changed = False
+                for course_id in self._cyclic:
+                    closure = self._closure[course_id]
+                    for prerequisite_id in self._direct[course_id]:
+                        closure |= self._closure[prerequisite_id]
+                    if closure != self._closure[course_id]:
+                        self._closure[course_id] = closure
+                        changed = True
+        self._trees: Dict[str, Dict[str, Any]] = {}
+
+    def _bits(self, course_ids: Iterable[str]) -> int:
+        bits = 0
+        for course_id in course_ids:
+            index = self._bit.get(course_id)
+            if index is not None:
+                bits |= 1 << index
+        return bits
+
+    def _decode(self, bits: int) -> List[str]:
+        result = []
+        while bits:
+            low = bits & -bits
+            result.append(self.order[low.bit_length() - 1])
+            bits ^= low
+        return result
+
+    # ---- 查询 ----
+
+    def direct(self, course_id: str) -> List[str]:
+        """直接先修课程"""
+        return list(self._direct.get(course_id, ()))
+
+    def all_prerequisites(self, course_id: str) -> List[str]:
+        """全部（传递）先修课程，按拓扑序"""
+        return self._decode(self._closure.get(course_id, 0))
+
+    def missing(self, course_id: str, completed: Iterable[str]) -> List[str]:
+        """学生选 course_id 还缺少的直接先修课程，completed 为学生已修完的课程号"""
+        required = self._direct_bits.get(course_id, 0)
+        if not required:
+            return []
+        return self._decode(required & ~self._bits(completed))
+
+    def tree(self, course_id: str) -> Dict[str, Any]:
+        """先修课程树 {course_id, name, prerequisites: [子树]}，共享子树只构建一次"""
+        if course_id not in self._trees:
+            self._build_tree(course_id)
+        return self._trees[course_id]
+
+    def _build_tree(self, root: str):
+        # 非递归的后序遍历；环上的课程再次出现时截断为不含子树的节点
+        stack = [(root, False)]
+        visiting = set()
+        while stack:
+            course_id, expanded = stack.pop()
+            if course_id in self._trees:
+                continue
+            children = self._direct.get(course_id, [])
+            if not expanded:
+                visiting.add(course_id)
+                stack.append((course_id, True))
+                stack.extend((child, False) for child in children
+                             if child not in self._trees and child not in visiting)
+                continue
+            visiting.discard(course_id)
+            self._trees[course_id] = {
+                "course_id": course_id,
+                "name": self._names.get(course_id, ""),
+                "prerequisites": [
+                    self._trees.get(child) or {"course_id": child, "name": self._names.get(child, ""),
+                                               "prerequisites": [], "cycle": True}
+                    for child in children
+                ]
+            }
+
+    def check_new_prerequisites(self, course_id: str, prerequisite_ids: Iterable[str]):
+        """
+        将 course_id 的先修课程设为 prerequisite_ids 前检查，会形成环时抛出 CyclicPrerequisiteError
+        环只能经过 course_id：某个新的先修课程就是本课程，或其传递先修课程中包含本课程
+        """
+        target = self._bit.get(course_id)
+        for prerequisite_id in prerequisite_ids:
+            if prerequisite_id == course_id:
+                raise CyclicPrerequisiteError([course_id, course_id])
+            if target is not None and self._closure.get(prerequisite_id, 0) >> target & 1:
+                raise CyclicPrerequisiteError([course_id] + self._path(prerequisite_id, course_id))
+
+    def _path(self, start: str, goal: str) -> List[str]:
+        """沿先修关系从 start 到 goal 的一条路径（用于错误信息）"""
+        goal_bit = 1 << self._bit[goal]
+        path = [start]
+        while path[-1] != goal:
+            step = next(
+                prerequisite_id for prerequisite_id in self._direct[path[-1]]
+                if prerequisite_id not in path
+                and (prerequisite_id == goal or self._closure.get(prerequisite_id, 0) & goal_bit)
+            )
+            path.append(step)
+        return path
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "courses": len(self.order),
+            "edges": sum(len(items) for items in self._direct.values()),
+            "cyclic_courses": list(self._cyclic),
+            "loaded_at": self._loaded_at
+        }
+
+
+# 全局先修课程关系图
+prerequisite_graph = PrerequisiteGraph(ttl=settings.PREREQUISITE_GRAPH_TTL)
@@ -0,0 +1,96 @@
+"""
+课程时间索引
+"只看不冲突的课程"需要把学生在修课程的时间位图与整个课程目录逐一比较。索引把全部课程的时间位图
+载入一个 (课程数, 32) 的 uint64 矩阵（每周 2016 个5分钟时段，补齐到 2048 位），一次向量化的按位与
+得到所有课程是否冲突，院系、学期、状态和关键词筛选也在同一组数组上完成，只有当前页的课程再查数据库。
+
+索引在进程内缓存 ttl 秒；本进程修改课程时立即失效，其他进程的修改在缓存过期后生效
+"""
+import asyncio
+import logging
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.utils.course_validation import WEEK_SLOTS, schedule_mask
+
+logger = logging.getLogger(__name__)
+
+WORDS = -(-WEEK_SLOTS // 64)
+
+_LOAD_SQL = """
+SELECT course_id, department_id, semester, status, course_name, teacher_name, schedule, schedule_mask
+FROM courses
+ORDER BY created_at DESC
+"""
+
+
+def mask_words(mask: int) -> np.ndarray:
+    """时间位图转为 WORDS 个 uint64（低位在前）"""
+    return np.frombuffer(mask.to_bytes(WORDS * 8, "little"), dtype="<u8")
+
+
+class ScheduleIndex:
+    """课程目录的时间位图矩阵和筛选字段，行按课程创建时间倒序"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = asyncio.Lock()
+        self._loaded_at: Optional[float] = None
+        self._course_ids = np.empty(0, dtype=object)
+        self._masks = np.zeros((0, WORDS), dtype=np.uint64)
+        self._departments = np.empty(0, dtype=object)
+        self._semesters = np.empty(0, dtype=object)
+        self._statuses = np.empty(0, dtype=object)
+        self._texts = np.empty(0, dtype=str)
+
+    def invalidate(self):
+        """课程新增、修改或删除后调用，下次查询时重新加载"""
+        self._loaded_at = None
+
+    async def ensure(self, database):
+        """索引过期时从 courses 表重新加载，并发请求只加载一次"""
+        if self._fresh():
+            return
+        async with self._lock:
+            if self._fresh():
+                return
+            rows = await database.fetch(_LOAD_SQL)
+            self._course_ids = np.array([row["course_id"] for row in rows], dtype=object)
+            self._masks = np.array([mask_words(schedule_mask(row)) for row in rows], dtype=np.uint64)
+            self._masks = self._masks.reshape(len(rows), WORDS)
+            self._departments = np.array([row["department_id"] for row in rows], dtype=object)
+            self._semesters = np.array([row["semester"] for row in rows], dtype=object)
+            self._statuses = np.array([row["status"] for row in rows], dtype=object)
+            # 与 LIKE 一样不区分大小写，课程名和教师名之间用换行分隔，避免跨字段匹配
+            self._texts = np.array(
+                [f"{row['course_name'] or ''}\n{row['teacher_name'] or ''}".lower() for row in rows], dtype=str
+            )
+            self._loaded_at = time.monotonic()
+            logger.debug(f"课程时间索引已加载 {len(rows)} 门课程")
+
+    def _fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    def fits(self, taken: int, department_id: Optional[str] = None, semester: Optional[str] = None,
+             status: Optional[str] = None, search: Optional[str] = None) -> List[str]:
+        """与 taken 时段不冲突且符合筛选条件的课程号，按创建时间倒序"""
+        keep = ~(self._masks & mask_words(taken)).any(axis=1)
+        if department_id:
+            keep &= self._departments == department_id
+        if semester:
+            keep &= self._semesters == semester
+        if status:
+            keep &= self._statuses == status
+        if search:
+            keep &= np.char.find(self._texts, search.lower()) >= 0
+        return self._course_ids[keep].tolist()
+
+    def size(self) -> int:
+        return len(self._course_ids)
+
+
+# 全局课程时间索引
+schedule_index = ScheduleIndex(ttl=settings.COURSE_SCHEDULE_INDEX_TTL)
@@ -0,0 +1,339 @@
+"""
+选课名额账本（SEAT_LEDGER_ENABLED 开启，用于选课高峰期）
+在进程内维护各课程的已占名额，减少高峰期对数据库的访问：
+  - 启动时从 courses 表加载，之后每隔 reconcile_interval 秒按表中的人数对账
+  - 账本中已满的课程直接拒绝，不访问数据库
+  - 有名额时先在内存中占用，再交给批量写入任务：攒满 batch_size 条或每隔 flush_interval 秒，
+    在一个事务中按课程带条件地增加人数并批量插入选课记录；请求在所在批次提交后才返回，不会丢失已确认的选课
+  - 账本只是过滤器，名额以数据库中带条件的UPDATE为准。账本与数据库不一致时
+    （多进程部署时其他进程占用了名额、已有退课记录需要恢复等），相关请求改走逐条选课的事务
+
+多进程部署时每个进程各有一份账本，其他进程的退课要到下次对账后才能在本进程选到；
+账本的所有方法都只在事件循环线程中调用，不需要加锁
+"""
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.db.statements import in_clause
+from app.services import seats
+
+logger = logging.getLogger(__name__)
+
+_LOAD_SQL = "SELECT course_id, max_students, current_students FROM courses WHERE status = 'active'"
+
+# 批量写入中需要改走逐条选课事务的请求
+_FALLBACK = object()
+
+
+class _Pending:
+    """已在内存中占用名额、等待写入的选课请求"""
+
+    __slots__ = ("student_id", "course_id", "future")
+
+    def __init__(self, student_id: str, course_id: str, future: asyncio.Future):
+        self.student_id = student_id
+        self.course_id = course_id
+        self.future = future
+
+
+class SeatLedger:
+    """进程内的课程名额账本"""
+
+    def __init__(self, batch_size: int, flush_interval: float, reconcile_interval: float):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.reconcile_interval = reconcile_interval
+        self.enabled = False
+        self._db = None
+        self._capacity: Dict[str, int] = {}
+        self._taken: Dict[str, int] = {}
+        # 已在内存中占用但尚未提交的名额，对账时加到表中的人数上
+        self._inflight: Dict[str, int] = {}
+        self._queue: List[_Pending] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._fallback_tasks: set = set()
+        # 对账与写入互斥：对账读取人数时没有进行中的写入，已提交但尚未结算的名额不会同时计入表中人数和 _inflight
+        self._gate: Optional[asyncio.Condition] = None
+        self._writers = 0
+        self._reconciling = False
+        self._reconciled_at: Optional[float] = None
+        self._rejected = 0
+        self._reserved = 0
+        self._batches = 0
+        self._batched_rows = 0
+        self._fallbacks = 0
+
+    # ---- 生命周期 ----
+
+    async def start(self, database):
+        """加载名额并启动批量写入和定期对账任务"""
+        self._db = database
+        self._wakeup = asyncio.Event()
+        self._gate = asyncio.Condition()
+        await self.reconcile()
+        self._tasks = [
+            asyncio.create_task(self._flush_loop()),
+            asyncio.create_task(self._reconcile_loop()),
+        ]
+        self.enabled = True
+        logger.info(f"选课名额账本已启用，加载 {len(self._capacity)} 门课程")
+
+    async def stop(self):
+        """停止接收新请求，写入剩余的选课后停止后台任务"""
+        self.enabled = False
+        while self._queue:
+            await self._flush(self._take_batch())
+        if self._fallback_tasks:
+            await asyncio.gather(*self._fallback_tasks, return_exceptions=True)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def reconcile(self):
+        """
+        按 courses 表重建账本，已占名额 = 表中人数 + 尚未提交的内存占用
+        读取期间不开始新的写入，并等待进行中的写入结算完，_inflight 中只剩未提交的占用
+        """
+        async with self._gate:
+            await self._gate.wait_for(lambda: not self._reconciling and not self._writers)
+            self._reconciling = True
+        try:
+            rows = await self._db.fetch(_LOAD_SQL)
+            self._capacity = {row["course_id"]: row["max_students"] for row in rows}
+            self._taken = {
+                row["course_id"]: row["current_students"] + self._inflight.get(row["course_id"], 0)
+                for row in rows
+            }
+            self._reconciled_at = time.time()
+        finally:
+            async with self._gate:
+                self._reconciling = False
+                self._gate.notify_all()
+
+    @contextlib.asynccontextmanager
+    async def _writing(self):
+        """写入账本中已占用的名额（提交并结算）期间持有，对账进行中时等待"""
+        async with self._gate:
+            await self._gate.wait_for(lambda: not self._reconciling)
+            self._writers += 1
+        try:
+            yield
+        finally:
+            async with self._gate:
+                self._writers -= 1
+                self._gate.notify_all()
+
+    async def _reconcile_loop(self):
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.warning(f"选课名额账本对账失败: {str(e)}")
+
+    # ---- 选课和退课 ----
+
+    def is_full(self, course_id: str) -> bool:
+        """账本中该课程已满（账本未启用或没有该课程时返回False）"""
+        if not self.enabled or course_id not in self._capacity:
+            return False
+        if self._taken[course_id] >= self._capacity[course_id]:
+            self._rejected += 1
+            return True
+        return False
+
+    async def enroll(self, student_id: str, course_id: str) -> int:
+        """
+        选课并返回选课记录ID，失败时抛出与 seats.enroll 相同的异常
+        账本中没有的课程（未开放或启动后新建）直接走逐条选课事务
+        """
+        if course_id not in self._capacity:
+            return await self._enroll_directly(student_id, course_id)
+        if self._taken[course_id] >= self._capacity[course_id]:
+            self._rejected += 1
+            raise seats.SeatUnavailableError(course_id)
+
+        self._taken[course_id] += 1
+        self._inflight[course_id] = self._inflight.get(course_id, 0) + 1
+        self._reserved += 1
+        pending = _Pending(student_id, course_id, asyncio.get_running_loop().create_future())
+        self._queue.append(pending)
+        if len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+        return await pending.future
+
+    def release(self, course_id: str):
+        """退课提交后归还名额"""
+        if course_id in self._taken:
+            self._taken[course_id] = max(0, self._taken[course_id] - 1)
+
+    def take(self, course_id: str):
+        """不经过账本提交的选课（批量选课等）提交后记入已占名额"""
+        if course_id in self._taken:
+            self._taken[course_id] += 1
+
+    async def _enroll_directly(self, student_id: str, course_id: str) -> int:
+        async def body(tx):
+            return await seats.enroll(tx, student_id, course_id)
+
+        return await self._db.run_transaction(body)
+
+    # ---- 批量写入 ----
+
+    def _settle(self, pending: _Pending, result: Any = None, error: Optional[BaseException] = None):
+        """请求结束：成功时名额转为已提交，失败时归还"""
+        self._inflight[pending.course_id] -= 1
+        if error is not None:
+            self.release(pending.course_id)
+            if not pending.future.done():
+                pending.future.set_exception(error)
+        elif not pending.future.done():
+            pending.future.set_result(result)
+
+    def _take_batch(self) -> List[_Pending]:
+        batch, self._queue = self._queue[:self.batch_size], self._queue[self.batch_size:]
+        if not self._queue:
+            self._wakeup.clear()
+        return batch
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            while self._queue:
+                await self._flush(self._take_batch())
+
+    async def _flush(self, batch: List[_Pending]):
+        """在一个事务中写入一批选课，数据库与账本不一致的请求改走逐条选课事务"""
+        unique: Dict[Tuple[str, str], _Pending] = {}
+        for pending in batch:
+            key = (pending.student_id, pending.course_id)
+            if key in unique:
+                self._settle(pending, error=seats.AlreadyEnrolledError(pending.course_id))
+            else:
+                unique[key] = pending
+
+        by_course: Dict[str, List[str]] = {}
+        for student_id, course_id in unique:
+            by_course.setdefault(course_id, []).append(student_id)
+
+        async with self._writing():
+            try:
+                outcomes = await self._db.run_transaction(lambda tx: self._write_batch(tx, by_course))
+            except Exception as e:
+                logger.error(f"批量写入选课失败: {str(e)}")
+                for pending in unique.values():
+                    self._settle(pending, error=e)
+                return
+
+            self._batches += 1
+            for key, pending in unique.items():
+                outcome = outcomes.get(key, _FALLBACK)
+                if outcome is _FALLBACK:
+                    self._fallbacks += 1
+                    # 保留任务引用，避免执行中被回收导致请求一直等待；stop() 时等待其完成
+                    task = asyncio.create_task(self._fallback(pending))
+                    self._fallback_tasks.add(task)
+                    task.add_done_callback(self._fallback_tasks.discard)
+                else:
+                    self._batched_rows += 1
+                    self._settle(pending, outcome)
+
+    async def _write_batch(self, tx, by_course: Dict[str, List[str]]) -> Dict[Tuple[str, str], Any]:
+        """
+        事务体（可能因死锁重试而执行多次）：按课程带条件地增加人数并批量插入选课记录
+        返回 {(学号, 课程号): 选课记录ID}，未写入的请求不在结果中
+        """
+        outcomes: Dict[Tuple[str, str], Any] = {}
+        for course_id, student_ids in by_course.items():
+            params = {"course_id": course_id}
+            rows = await tx.fetch(
+                "SELECT student_id FROM enrollments WHERE course_id = :course_id "
+                f"AND student_id IN ({in_clause(student_ids, params, 's')})",
+                params
+            )
+            # 已有选课记录（重复选课或恢复退课记录）交给逐条选课事务判断
+            existing = {row["student_id"] for row in rows}
+            fresh = [student_id for student_id in student_ids if student_id not in existing]
+            if not fresh:
+                continue
+
+            result = await tx.execute(
+                "UPDATE courses SET current_students = current_students + :count "
+                "WHERE course_id = :course_id AND status = 'active' AND current_students + :count <= max_students",
+                {"course_id": course_id, "count": len(fresh)}
+            )
+            if result.rowcount != 1:
+                continue
+
+            success, _, error = await tx.insert_many("enrollments", [
+                {"student_id": student_id, "course_id": course_id, "status": "enrolled"}
+                for student_id in fresh
+            ])
+            if not success:
+                # 检查后有同一学生的记录被并发写入（直接选课、候补递补等），多行INSERT整体失败：
+                # 撤销本课程占用的名额，这些请求改走逐条选课事务，由其判断重复选课
+                logger.warning(f"批量写入课程 {course_id} 的选课失败，改为逐条选课: {error}")
+                await tx.execute(
+                    "UPDATE courses SET current_students = current_students - :count WHERE course_id = :course_id",
+                    {"course_id": course_id, "count": len(fresh)}
+                )
+                continue
+
+            params = {"course_id": course_id}
+            rows = await tx.fetch(
+                "SELECT enrollment_id, student_id FROM enrollments WHERE course_id = :course_id "
+                f"AND student_id IN ({in_clause(fresh, params, 's')})",
+                params
+            )
+            for row in rows:
+                outcomes[(row["student_id"], course_id)] = row["enrollment_id"]
+        return outcomes
+
+    async def _fallback(self, pending: _Pending):
+        async with self._writing():
+            try:
+                enrollment_id = await self._enroll_directly(pending.student_id, pending.course_id)
+            except seats.SeatUnavailableError as e:
+                self._settle(pending, error=e)
+                # 数据库中已满，在下次对账前账本也按已满处理（在结算归还名额之后设置）
+                if pending.course_id in self._capacity:
+                    self._taken[pending.course_id] = self._capacity[pending.course_id]
+            except Exception as e:
+                self._settle(pending, error=e)
+            else:
+                self._settle(pending, enrollment_id)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "courses": len(self._capacity),
+            "full_courses": sum(1 for course_id, taken in self._taken.items() if taken >= self._capacity[course_id]),
+            "pending": len(self._queue),
+            "inflight": sum(self._inflight.values()),
+            "rejected": self._rejected,
+            "reserved": self._reserved,
+            "batches": self._batches,
+            "batched_rows": self._batched_rows,
+            "fallbacks": self._fallbacks,
+            "reconciled_at": self._reconciled_at,
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+            "reconcile_interval": self.reconcile_interval
+        }
+
+
+# 全局名额账本，SEAT_LEDGER_ENABLED 时在应用启动时加载
+seat_ledger = SeatLedger(
+    batch_size=settings.SEAT_LEDGER_BATCH_SIZE,
+    flush_interval=settings.SEAT_LEDGER_FLUSH_INTERVAL,
+    reconcile_interval=settings.SEAT_LEDGER_RECONCILE_INTERVAL
+)
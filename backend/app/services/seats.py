@@ -0,0 +1,116 @@
+"""
+课程名额
+courses.current_students 记录占用名额的选课记录数（状态不是 dropped 的记录），
+只通过本模块在选课/退课事务中用带条件的单条 UPDATE 修改：
+  - 占用名额: current_students < max_students 时加1，影响行数为0表示已满
+  - 释放名额: current_students > 0 时减1
+条件判断和修改在同一条语句中完成，并发选课不会超卖，也不会因先读后写丢失更新。
+选课事务先占名额再写选课记录，课程行锁只持有两条语句的时间
+"""
+from app.db.backend import DatabaseError
+
+# 占用名额的选课记录状态
+SEAT_STATUSES = ("enrolled", "completed", "failed")
+
+DUPLICATE_KEY = 1062
+
+_RESERVE_SQL = """
+UPDATE courses
+SET current_students = current_students + 1
+WHERE course_id = :course_id AND status = 'active' AND current_students < max_students
+"""
+
+_RESERVE_MANY_SQL = """
+UPDATE courses
+SET current_students = current_students + :count
+WHERE course_id = :course_id AND status = 'active' AND current_students + :count <= max_students
+"""
+
+_RELEASE_SQL = """
+UPDATE courses
+SET current_students = current_students - 1
+WHERE course_id = :course_id AND current_students > 0
+"""
+
+
+class SeatUnavailableError(Exception):
+    """课程已满或未开放选课"""
+
+
+class AlreadyEnrolledError(Exception):
+    """学生已选过该课程"""
+
+
+async def reserve_seat(tx, course_id: str) -> bool:
+    """占用一个名额，课程已满或未开放时返回False"""
+    result = await tx.execute(_RESERVE_SQL, {"course_id": course_id})
+    return result.rowcount == 1
+
+
+async def reserve_seats(tx, course_id: str, count: int) -> bool:
+    """一次占用 count 个名额（批量写入选课记录前），剩余名额不足时不占用并返回False"""
+    result = await tx.execute(_RESERVE_MANY_SQL, {"course_id": course_id, "count": count})
+    return result.rowcount == 1
+
+
+async def release_seat(tx, course_id: str) -> bool:
+    """释放一个名额"""
+    result = await tx.execute(_RELEASE_SQL, {"course_id": course_id})
+    return result.rowcount == 1
+
+
+async def enroll(tx, student_id: str, course_id: str) -> int:
+    """
+    在事务 tx 中为学生选课并占用名额，返回选课记录ID
+    之前退过该课程时恢复原记录；已选或名额不足时抛出异常，抛出前撤销已占用的名额，
+    批量选课可以在同一事务中逐条捕获异常后继续处理其他学生
+    """
+    existing = await tx.fetch_one(
+        "SELECT enrollment_id, status FROM enrollments WHERE student_id = :student_id AND course_id = :course_id",
+        {"student_id": student_id, "course_id": course_id}
+    )
+    if existing is not None and existing["status"] in SEAT_STATUSES:
+        raise AlreadyEnrolledError(course_id)
+
+    if not await reserve_seat(tx, course_id):
+        raise SeatUnavailableError(course_id)
+
+    if existing is not None:
+        result = await tx.execute(
+            "UPDATE enrollments SET status = 'enrolled', enrollment_date = NOW() "
+            "WHERE enrollment_id = :enrollment_id AND status = 'dropped'",
+            {"enrollment_id": existing["enrollment_id"]}
+        )
+        if result.rowcount != 1:
+            # 读取后被同一学生的并发请求恢复
+            await release_seat(tx, course_id)
+            raise AlreadyEnrolledError(course_id)
+        return existing["enrollment_id"]
+
+    try:
+        result = await tx.execute(
+            "INSERT INTO enrollments (student_id, course_id, status) VALUES (:student_id, :course_id, 'enrolled')",
+            {"student_id": student_id, "course_id": course_id}
+        )
+    except DatabaseError as e:
+        # 同一学生的并发请求先插入了记录
+        if e.errno == DUPLICATE_KEY:
+            await release_seat(tx, course_id)
+            raise AlreadyEnrolledError(course_id)
+        raise
+    return result.lastrowid
+
+
+async def drop(tx, enrollment_id: int, course_id: str) -> bool:
+    """
+    在事务 tx 中退课并释放名额
+    只有 enrolled 状态的记录可以退课，记录已被并发请求修改时返回False
+    """
+    result = await tx.execute(
+        "UPDATE enrollments SET status = 'dropped' WHERE enrollment_id = :enrollment_id AND status = 'enrolled'",
+        {"enrollment_id": enrollment_id}
+    )
+    if result.rowcount != 1:
+        return False
+    await release_seat(tx, course_id)
+    return True
@@ -0,0 +1,151 @@
+"""
+选课候补
+课程已满时学生加入该课程的候补队列并等待通知，不再反复提交选课请求：
+  - course_waitlists 表中同一课程按 waitlist_id 先后排队，取队首是 (course_id, waitlist_id) 索引上的一次查找
+  - 退课释放名额或调大课程人数时，在释放名额的同一事务中用 seats.enroll 为队首学生选课并删除其候补记录，
+    名额不会先被其他选课请求占走；队首已选上该课程，或按当前选课记录与在修课程时间冲突、缺少先修课程时，
+    删除后看下一位
+  - 事务提交后由调用方通过 WebSocket 通知递补成功的学生
+  - 候补位次（排在前面的人数）只在查询时计算
+"""
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.db.backend import DatabaseError
+from app.services import seats
+from app.utils.course_validation import check_enrollment_conflicts
+
+logger = logging.getLogger(__name__)
+
+_HEAD_SQL = """
+SELECT waitlist_id, student_id
+FROM course_waitlists
+WHERE course_id = :course_id
+ORDER BY waitlist_id
+LIMIT 1
+"""
+
+_COURSE_SQL = "SELECT course_id, schedule, schedule_mask FROM courses WHERE course_id = :course_id"
+
+# 候补学生当前的选课记录，递补前检查时间冲突和先修课程
+_ENROLLMENTS_SQL = """
+SELECT e.course_id, e.status, c.course_name, c.schedule, c.schedule_mask
+FROM enrollments e
+JOIN courses c ON e.course_id = c.course_id
+WHERE e.student_id = :student_id
+"""
+
+_POSITION_SQL = """
+SELECT COUNT(*) AS position
+FROM course_waitlists
+WHERE course_id = :course_id AND waitlist_id < :waitlist_id
+"""
+
+_STUDENT_SQL = """
+SELECT w.waitlist_id, w.course_id, c.course_name, w.created_at,
+       (SELECT COUNT(*) FROM course_waitlists o
+        WHERE o.course_id = w.course_id AND o.waitlist_id < w.waitlist_id) AS position
+FROM course_waitlists w
+JOIN courses c ON w.course_id = c.course_id
+WHERE w.student_id = :student_id
+ORDER BY w.waitlist_id
+"""
+
+
+class AlreadyWaitlistedError(Exception):
+    """学生已在该课程的候补队列中"""
+
+
+async def join(tx, student_id: str, course_id: str) -> Dict[str, Any]:
+    """加入课程候补，返回 {waitlist_id, position}；已在候补中时抛出 AlreadyWaitlistedError"""
+    try:
+        result = await tx.execute(
+            "INSERT INTO course_waitlists (student_id, course_id) VALUES (:student_id, :course_id)",
+            {"student_id": student_id, "course_id": course_id}
+        )
+    except DatabaseError as e:
+        if e.errno == seats.DUPLICATE_KEY:
+            raise AlreadyWaitlistedError(course_id)
+        raise
+    row = await tx.fetch_one(_POSITION_SQL, {"course_id": course_id, "waitlist_id": result.lastrowid})
+    return {"waitlist_id": result.lastrowid, "position": row["position"]}
+
+
+async def leave(tx, student_id: str, course_id: str) -> bool:
+    """退出课程候补，不在候补中时返回False"""
+    result = await tx.execute(
+        "DELETE FROM course_waitlists WHERE student_id = :student_id AND course_id = :course_id",
+        {"student_id": student_id, "course_id": course_id}
+    )
+    return result.rowcount == 1
+
+
+async def _ineligible(tx, course: Dict[str, Any], student_id: str, prerequisites) -> Optional[str]:
+    """按学生当前的选课记录检查能否递补，返回不能递补的原因"""
+    rows = await tx.fetch(_ENROLLMENTS_SQL, {"student_id": student_id})
+    enrolled = [row for row in rows if row["status"] == "enrolled" and row["course_id"] != course["course_id"]]
+    conflicts = check_enrollment_conflicts(course, enrolled)
+    if conflicts:
+        return f"与已选课程时间冲突: {', '.join(conflict['name'] for conflict in conflicts)}"
+    if prerequisites is not None:
+        completed = [row["course_id"] for row in rows if row["status"] == "completed"]
+        missing = prerequisites.missing(course["course_id"], completed)
+        if missing:
+            return f"缺少先修课程: {', '.join(missing)}"
+    return None
+
+
+async def promote(tx, course_id: str, limit: Optional[int] = None, prerequisites=None) -> List[Dict[str, Any]]:
+    """
+    在事务 tx 中按候补顺序为队首学生选课，直到课程没有名额、候补为空或已递补 limit 人
+    prerequisites 为先修课程关系图（PrerequisiteGraph），为None时不检查先修课程
+    返回递补成功的 [{student_id, course_id, enrollment_id}]
+    """
+    promoted: List[Dict[str, Any]] = []
+    course = await tx.fetch_one(_COURSE_SQL, {"course_id": course_id})
+    while course is not None and (limit is None or len(promoted) < limit):
+        head = await tx.fetch_one(_HEAD_SQL, {"course_id": course_id})
+        if head is None:
+            break
+        reason = await _ineligible(tx, course, head["student_id"], prerequisites)
+        if reason:
+            # 加入候补后选了时间冲突的课程等：不再递补，删除候补记录
+            logger.info(f"候补学生 {head['student_id']} 不能递补课程 {course_id}，移出候补: {reason}")
+            enrollment_id = None
+        else:
+            try:
+                enrollment_id = await seats.enroll(tx, head["student_id"], course_id)
+            except seats.SeatUnavailableError:
+                break
+            except seats.AlreadyEnrolledError:
+                enrollment_id = None
+        await tx.execute(
+            "DELETE FROM course_waitlists WHERE waitlist_id = :waitlist_id",
+            {"waitlist_id": head["waitlist_id"]}
+        )
+        if enrollment_id is not None:
+            promoted.append({
+                "student_id": head["student_id"],
+                "course_id": course_id,
+                "enrollment_id": enrollment_id
+            })
+    return promoted
+
+
+async def for_student(database, student_id: str) -> List[Dict[str, Any]]:
+    """学生的全部候补及位次（排在前面的人数）"""
+    return await database.fetch(_STUDENT_SQL, {"student_id": student_id})
+
+
+async def notify(push: Callable[[str, Dict[str, Any]], Awaitable[None]], promoted: List[Dict[str, Any]]):
+    """事务提交后通知递补成功的学生，push 为 push_notification(学号, 消息)；推送失败只记录日志"""
+    for item in promoted:
+        try:
+            await push(item["student_id"], {
+                "event": "waitlist_promoted",
+                "title": "候补选课成功",
+                "content": f"您已从候补递补选上课程 {item['course_id']}",
+                **item
+            })
+        except Exception as e:
+            logger.warning(f"推送候补递补通知失败: {str(e)}")
@@ -4,7 +4,8 @@
 - 先修课程验证
 """
 import re
-from typing import List, Dict, Tuple, Optional
+from functools import lru_cache
+from typing import Any, Iterable, List, Dict, Tuple, Optional
 from datetime import datetime
 
 
@@ -39,100 +40,178 @@ def parse_schedule(schedule: str) -> List[Tuple[int, int, int]]:
     start_minutes = start_hour * 60 + start_min
     end_minutes = end_hour * 60 + end_min
 
-    # 提取星期
-    for char in schedule:
+    # 提取星期（只看时间段之前的部分，时间中的数字不是星期）
+    for char in schedule[:time_match.start()]:
         if char in weekday_map:
             results.append((weekday_map[char], start_minutes, end_minutes))
 
     return results
 
 
-def check_time_conflict(schedule1: str, schedule2: str) -> bool:
+# ==================== 时间位图 ====================
+# 一周按5分钟划分为 7 × 288 个时段，课程时间表编译为整数位图（第 (星期-1)*288 + 时段 位表示该时段有课），
+# 两门课程的位图按位与不为0即为时间冲突。位图以十六进制文本保存在 courses.schedule_mask，
+# 旧数据没有位图时按 schedule 编译；同一时间表文本的编译结果在进程内缓存
+
+SLOT_MINUTES = 5
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+WEEK_SLOTS = 7 * SLOTS_PER_DAY
+
+
+@lru_cache(maxsize=4096)
+def compile_schedule(schedule: Optional[str]) -> int:
     """
-    检查两个课程时间是否冲突
-    返回 True 表示有冲突
+    将课程时间表编译为周时段位图，没有时间表时返回0
+    开始时间向前、结束时间向后取整到5分钟。起止时间都在5分钟整点上时，位图判断的冲突与按时间段比较一致
+    （首尾相接不算冲突）；不在整点上的时间（新建和修改课程时会拒绝，只可能来自旧数据）位图可能多报冲突，
+    如 8:00-9:02 与 9:03-10:00，check_time_conflict 和 check_enrollment_conflicts 会再按时间段确认
     """
-    times1 = parse_schedule(schedule1)
-    times2 = parse_schedule(schedule2)
+    mask = 0
+    for weekday, start, end in parse_schedule(schedule or ""):
+        first = start // SLOT_MINUTES
+        last = min(-(-end // SLOT_MINUTES), SLOTS_PER_DAY)
+        if last > first:
+            offset = (weekday - 1) * SLOTS_PER_DAY
+            mask |= ((1 << (last - first)) - 1) << (offset + first)
+    return mask
+
+
+def schedule_aligned(schedule: Optional[str]) -> bool:
+    """时间表的起止时间都在5分钟整点上，位图可以精确表示"""
+    return all(
+        start % SLOT_MINUTES == 0 and end % SLOT_MINUTES == 0 for _, start, end in parse_schedule(schedule or "")
+    )
 
-    for weekday1, start1, end1 in times1:
-        for weekday2, start2, end2 in times2:
-            # 同一天
-            if weekday1 == weekday2:
-                # 时间重叠
-                if not (end1 <= start2 or end2 <= start1):
-                    return True
 
+def _intervals_overlap(schedule1: Optional[str], schedule2: Optional[str]) -> bool:
+    """
+    位图相交后按时间段确认是否重叠，只在有时间不在5分钟整点上时需要；
+    都在整点上或缺少时间表文本（只有位图）时按位图的结果（重叠）处理
+    """
+    if not schedule1 or not schedule2 or (schedule_aligned(schedule1) and schedule_aligned(schedule2)):
+        return True
+    for weekday1, start1, end1 in parse_schedule(schedule1):
+        for weekday2, start2, end2 in parse_schedule(schedule2):
+            if weekday1 == weekday2 and start1 < end2 and start2 < end1:
+                return True
     return False
 
 
+def mask_to_text(mask: int) -> Optional[str]:
+    """位图转为保存到 courses.schedule_mask 的十六进制文本，没有时间表时为None"""
+    return format(mask, "x") if mask else None
+
+
+def schedule_mask(course: Dict[str, Any]) -> int:
+    """课程的时间位图：优先使用已保存的 schedule_mask，没有时按 schedule 编译"""
+    text = course.get("schedule_mask")
+    if text:
+        return int(text, 16)
+    return compile_schedule(course.get("schedule"))
+
+
+def union_mask(courses: Iterable[Dict[str, Any]]) -> int:
+    """多门课程占用的全部时段"""
+    mask = 0
+    for course in courses:
+        mask |= schedule_mask(course)
+    return mask
+
+
+def check_time_conflict(schedule1: str, schedule2: str) -> bool:
+    """
+    检查两个课程时间是否冲突
+    返回 True 表示有冲突
+    """
+    if not compile_schedule(schedule1) & compile_schedule(schedule2):
+        return False
+    return _intervals_overlap(schedule1, schedule2)
+
+
 def check_enrollment_conflicts(
-    new_course_schedule: str,
+    new_course: Any,
     enrolled_courses: List[Dict]
 ) -> List[Dict]:
     """
     检查新选课程与已选课程的时间冲突
+    new_course 为课程记录（使用已保存的位图）或时间表文本
     返回冲突的课程列表
     """
-    conflicts = []
-
-    for course in enrolled_courses:
-        if check_time_conflict(new_course_schedule, course.get('schedule', '')):
-            conflicts.append({
-                'course_id': course['course_id'],
-                'name': course['name'],
-                'schedule': course['schedule']
-            })
+    if new_course is None or isinstance(new_course, str):
+        new_schedule = new_course
+        new_mask = compile_schedule(new_course)
+    else:
+        new_schedule = new_course.get('schedule')
+        new_mask = schedule_mask(new_course)
+    if not new_mask or not new_mask & union_mask(enrolled_courses):
+        return []
 
-    return conflicts
+    return [
+        {
+            'course_id': course['course_id'],
+            'name': course.get('course_name', course.get('name')),
+            'schedule': course.get('schedule')
+        }
+        for course in enrolled_courses
+        if new_mask & schedule_mask(course) and _intervals_overlap(new_schedule, course.get('schedule'))
+    ]
 
 
 # ==================== 先修课程验证 ====================
 
 def check_prerequisites(
     course_prerequisites: List[str],
-    completed_courses: List[str]
+    completed_courses: Iterable[str]
 ) -> Tuple[bool, List[str]]:
     """
     检查是否满足先修课程要求
     返回: (是否满足, 缺少的先修课程列表)
+    接口中使用 app.services.prerequisites 的先修关系图，这里用于单独的列表检查
     """
     if not course_prerequisites:
         return True, []
 
-    missing = []
-    for prereq in course_prerequisites:
-        if prereq not in completed_courses:
-            missing.append(prereq)
+    completed = set(completed_courses)
+    missing = [prereq for prereq in course_prerequisites if prereq not in completed]
 
     return len(missing) == 0, missing
 
 
 def get_prerequisite_tree(
     course_id: str,
-    all_courses: Dict[str, Dict]
+    all_courses: Dict[str, Dict],
+    _memo: Optional[Dict[str, Dict]] = None,
+    _visiting: Optional[set] = None
 ) -> Dict:
     """
     获取课程的先修课程树
-    用于可视化展示先修关系
+    用于可视化展示先修关系；共享的子树只构建一次，循环的先修关系在再次出现处截断
     """
     if course_id not in all_courses:
         return {}
+    memo = {} if _memo is None else _memo
+    visiting = set() if _visiting is None else _visiting
+    if course_id in memo:
+        return memo[course_id]
 
     course = all_courses[course_id]
-    prerequisites = course.get('prerequisites', [])
-
     tree = {
         'course_id': course_id,
         'name': course.get('name', ''),
         'prerequisites': []
     }
+    if course_id in visiting:
+        tree['cycle'] = True
+        return tree
 
-    for prereq_id in prerequisites:
-        subtree = get_prerequisite_tree(prereq_id, all_courses)
+    visiting.add(course_id)
+    for prereq_id in course.get('prerequisites', []):
+        subtree = get_prerequisite_tree(prereq_id, all_courses, memo, visiting)
         if subtree:
             tree['prerequisites'].append(subtree)
+    visiting.discard(course_id)
 
+    memo[course_id] = tree
     return tree
 
 
@@ -170,7 +249,7 @@ def validate_enrollment(
         return False, "课程容量已满"
 
     # 2. 检查时间冲突
-    conflicts = check_enrollment_conflicts(course.get('schedule', ''), enrolled_courses)
+    conflicts = check_enrollment_conflicts(course, enrolled_courses)
     if conflicts:
         conflict_names = ', '.join([c['name'] for c in conflicts])
         return False, f"与已选课程时间冲突: {conflict_names}"
@@ -0,0 +1,40 @@
+"""
+数据导出工具
+将数据库流式查询的结果按批转换为CSV文本，供 StreamingResponse 直接使用
+"""
+import csv
+import io
+import logging
+from typing import Any, AsyncIterator, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+async def csv_stream(batches: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[str]:
+    """
+    将按批产出的行转换为CSV文本块，每批输出一块
+    首块带UTF-8 BOM，保证Excel正确识别中文；列名取自第一行
+    """
+    yield "\ufeff"
+    writer = None
+    buffer = io.StringIO()
+    try:
+        async for rows in batches:
+            if not rows:
+                continue
+            if writer is None:
+                writer = csv.DictWriter(buffer, fieldnames=list(rows[0].keys()))
+                writer.writeheader()
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    except Exception as e:
+        # 响应头已发送，无法再返回错误状态码，只能记录日志并截断输出
+        logger.error(f"导出数据失败: {str(e)}")
+        raise
+
+
+def attachment_headers(filename: str) -> Dict[str, str]:
+    """下载文件的响应头"""
+    return {"Content-Disposition": f'attachment; filename="{filename}"'}
@@ -37,6 +37,9 @@ import uvicorn
 
 from app.core.config import settings
 from app.api.v1.api import api_router
+from app.db.breaker import DatabaseUnavailableError
+from app.db.instrumentation import begin_request
+from app.db.routing import begin_routing
 
 
 # 配置日志
@@ -54,14 +57,17 @@ async def lifespan(app: FastAPI):
     logger.info("🚀 学生选课系统启动中...")
     logger.info(f"📦 版本: {settings.VERSION}")
     logger.info(f"📊 数据库: {settings.MYSQL_HOST}:{settings.MYSQL_PORT}/{settings.MYSQL_DATABASE}")
+    logger.info(f"🔌 数据库执行后端: {settings.DB_BACKEND}")
+    if settings.MYSQL_REPLICAS:
+        logger.info(f"📚 只读从库: {settings.MYSQL_REPLICAS}")
     logger.info(f"🔧 调试模式: {settings.DEBUG}")
     logger.info(f"🎨 前端地址: {settings.FRONTEND_URL}")
     
     # 可以在这里添加数据库连接测试等启动检查
     try:
-        from app.db.mysql_client import mysql_client
+        from app.db.async_client import db
         # 简单的数据库连接测试
-        success, results, error = mysql_client.execute_raw_sql("SELECT 1 as test;")
+        success, results, error = await db.execute_raw_sql("SELECT 1 as test;")
         if success:
             logger.info("✅ 数据库连接正常")
         else:
@@ -69,8 +75,39 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"⚠️ 数据库连接测试异常: {str(e)}")
     
+    if settings.SEAT_LEDGER_ENABLED:
+        from app.db.async_client import db
+        from app.services.seat_ledger import seat_ledger
+        try:
+            await seat_ledger.start(db)
+        except Exception as e:
+            logger.warning(f"⚠️ 选课名额账本加载失败，选课直接访问数据库: {str(e)}")
+
+    if settings.ENROLLMENT_QUEUE_ENABLED:
+        from app.db.async_client import db
+        from app.api.v1.endpoints.websocket import push_notification
+        from app.services.enrollment_queue import enrollment_queue
+        await enrollment_queue.start(db, notify=push_notification)
+
     yield
     # 关闭时执行
+    try:
+        from app.services.enrollment_queue import enrollment_queue
+        if enrollment_queue.enabled:
+            await enrollment_queue.stop()
+    except Exception as e:
+        logger.warning(f"⚠️ 处理剩余排队选课失败: {str(e)}")
+    try:
+        from app.services.seat_ledger import seat_ledger
+        if seat_ledger.enabled:
+            await seat_ledger.stop()
+    except Exception as e:
+        logger.warning(f"⚠️ 写入剩余选课失败: {str(e)}")
+    try:
+        from app.db.async_client import db
+        db.close()
+    except Exception as e:
+        logger.warning(f"⚠️ 关闭数据库连接失败: {str(e)}")
     logger.info("🛑 学生选课系统已关闭")
 
 
@@ -102,14 +139,38 @@ if not settings.DEBUG:
     )
 
 
+# 写操作后在该时间之前的请求读取走主库（读写分离粘滞Cookie）
+DB_STICKY_COOKIE = "db_primary_until"
+
+
+def _sticky_to_primary(request: Request) -> bool:
+    """请求是否处于上一次写操作后的主库粘滞期内"""
+    try:
+        return float(request.cookies.get(DB_STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
 # 请求处理时间中间件
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
-    """添加请求处理时间头"""
+    """添加请求处理时间头和数据库往返次数头"""
     start_time = time.time()
+    db_stats = begin_request(request.scope)
+    routing = begin_routing(primary_only=_sticky_to_primary(request))
     response = await call_next(request)
     process_time = time.time() - start_time
+    if routing.wrote and settings.MYSQL_REPLICAS:
+        # 本请求写过主库，后续请求在复制追上之前继续读主库
+        response.set_cookie(
+            DB_STICKY_COOKIE,
+            str(time.time() + settings.DB_STICKY_SECONDS),
+            max_age=int(settings.DB_STICKY_SECONDS) + 1,
+            httponly=True,
+            samesite="lax"
+        )
     response.headers["X-Process-Time"] = str(process_time)
+    response.headers["X-DB-Round-Trips"] = str(db_stats.round_trips)
     response.headers["X-API-Version"] = settings.VERSION
     
     # 记录慢请求
@@ -120,6 +181,20 @@ async def add_process_time_header(request: Request, call_next):
 
 
 # 全局异常处理器
+@app.exception_handler(DatabaseUnavailableError)
+async def database_unavailable_handler(request: Request, exc: DatabaseUnavailableError):
+    """数据库熔断期间的请求直接返回503，提示客户端稍后重试"""
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": str(max(1, int(exc.retry_after + 0.999)))},
+        content={
+            "code": 503,
+            "message": exc.message,
+            "version": settings.VERSION
+        }
+    )
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """全局异常处理"""
@@ -138,39 +213,31 @@ async def global_exception_handler(request: Request, exc: Exception):
 # 健康检查端点
 @app.get("/health")
 async def health_check():
-    """健康检查接口"""
-    try:
-        # 数据库连接检查
-        from app.db.mysql_client import mysql_client
-        success, results, error = mysql_client.execute_raw_sql("SELECT 1 as test;")
-        
-        return {
-            "status": "healthy" if success else "degraded",
-            "version": settings.VERSION,
-            "timestamp": int(time.time()),
-            "environment": "development" if settings.DEBUG else "production",
-            "database": "connected" if success else f"error: {error}",
-            "features": {
-                "authentication": "enabled",
-                "mysql_cli": "enabled",
-                "cors": "enabled",
-                "friendships": "enabled",
-                "transactions": "enabled",
-                "messages": "enabled",
-                "student_management": "enabled",
-                "frontend_ui": "enabled"
-            }
+    """健康检查接口，数据库状态取自熔断器，不执行查询"""
+    from app.db.async_client import db
+    breaker = db.client.breaker.status()
+    database_up = breaker["state"] != "open"
+
+    content = {
+        "status": "healthy" if breaker["state"] == "closed" else ("degraded" if database_up else "unhealthy"),
+        "version": settings.VERSION,
+        "timestamp": int(time.time()),
+        "environment": "development" if settings.DEBUG else "production",
+        "database": "connected" if database_up else f"unavailable: {breaker['last_error']}",
+        "database_breaker": breaker,
+        "database_backend": db.client.backend.status(),
+        "features": {
+            "authentication": "enabled",
+            "mysql_cli": "enabled",
+            "cors": "enabled",
+            "friendships": "enabled",
+            "transactions": "enabled",
+            "messages": "enabled",
+            "student_management": "enabled",
+            "frontend_ui": "enabled"
         }
-    except Exception as e:
-        logger.error(f"健康检查失败: {str(e)}")
-        return JSONResponse(
-            status_code=503,
-            content={
-                "status": "unhealthy",
-                "version": settings.VERSION,
-                "error": str(e)
-            }
-        )
+    }
+    return JSONResponse(status_code=200 if database_up else 503, content=content)
 
 
 # 根路径
@@ -58,9 +58,10 @@ CREATE TABLE courses (
     description TEXT COMMENT '课程描述',
     teacher_name VARCHAR(50) COMMENT '授课教师',
     max_students INT DEFAULT 100 COMMENT '最大选课人数',
-    current_students INT DEFAULT 0 COMMENT '当前选课人数',
+    current_students INT DEFAULT 0 COMMENT '当前选课人数（占用名额的选课记录数）',
     semester VARCHAR(20) COMMENT '开课学期',
     schedule VARCHAR(200) COMMENT '上课时间安排',
+    schedule_mask VARCHAR(504) COMMENT '上课时间位图（7天×288个5分钟时段，十六进制），由应用按 schedule 生成',
     status ENUM('active', 'inactive', 'completed') DEFAULT 'active' COMMENT '课程状态',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
@@ -170,6 +171,41 @@ CREATE TABLE system_config (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
 ) COMMENT '系统配置表';
 
+-- 11. 先修课程关系表
+CREATE TABLE course_prerequisites (
+    course_id VARCHAR(20) NOT NULL COMMENT '课程号',
+    prerequisite_id VARCHAR(20) NOT NULL COMMENT '先修课程号',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (course_id, prerequisite_id),
+    FOREIGN KEY (course_id) REFERENCES courses(course_id) ON DELETE CASCADE,
+    FOREIGN KEY (prerequisite_id) REFERENCES courses(course_id) ON DELETE CASCADE,
+    INDEX idx_prerequisite (prerequisite_id)
+) COMMENT '先修课程关系表（应用写入时检查不形成环）';
+
+-- 12. 选课候补表
+CREATE TABLE course_waitlists (
+    waitlist_id INT AUTO_INCREMENT PRIMARY KEY COMMENT '候补ID，同一课程按ID先后排队',
+    student_id VARCHAR(20) NOT NULL COMMENT '学号',
+    course_id VARCHAR(20) NOT NULL COMMENT '课程号',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '加入候补时间',
+    FOREIGN KEY (student_id) REFERENCES students(student_id) ON DELETE CASCADE,
+    FOREIGN KEY (course_id) REFERENCES courses(course_id) ON DELETE CASCADE,
+    UNIQUE KEY uk_student_course (student_id, course_id),
+    INDEX idx_course_queue (course_id, waitlist_id)
+) COMMENT '选课候补表（有名额释放时在同一事务中递补队首）';
+
+-- 13. 预选课志愿表
+CREATE TABLE registration_carts (
+    student_id VARCHAR(20) NOT NULL COMMENT '学号',
+    course_id VARCHAR(20) NOT NULL COMMENT '课程号',
+    choice_rank TINYINT NOT NULL COMMENT '志愿顺序，1为第一志愿',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '提交时间',
+    PRIMARY KEY (student_id, course_id),
+    FOREIGN KEY (student_id) REFERENCES students(student_id) ON DELETE CASCADE,
+    FOREIGN KEY (course_id) REFERENCES courses(course_id) ON DELETE CASCADE,
+    UNIQUE KEY uk_student_rank (student_id, choice_rank)
+) COMMENT '预选课志愿表（预选窗口结束后抽签分配，分配后清空）';
+
 -- 插入初始数据
 
 -- 院系数据
@@ -193,26 +229,8 @@ INSERT INTO system_config (config_key, config_value, description) VALUES
 ('friend_recommendation_count', '10', '好友推荐数量'),
 ('high_risk_amount', '500.00', '高风险转账金额阈值');
 
--- 创建触发器：选课时更新课程当前人数
-DELIMITER //
-CREATE TRIGGER tr_enrollment_insert 
-AFTER INSERT ON enrollments 
-FOR EACH ROW 
-BEGIN
-    UPDATE courses 
-    SET current_students = current_students + 1 
-    WHERE course_id = NEW.course_id;
-END//
-
-CREATE TRIGGER tr_enrollment_delete 
-AFTER DELETE ON enrollments 
-FOR EACH ROW 
-BEGIN
-    UPDATE courses 
-    SET current_students = current_students - 1 
-    WHERE course_id = OLD.course_id;
-END//
-DELIMITER ;
+-- 课程当前人数（current_students）由应用在选课/退课事务中用带条件的UPDATE维护，不使用触发器，
+-- 见 backend/app/services/seats.py；已有数据库执行 database/migrations/001_seat_counter_without_triggers.sql
 
 -- 创建视图：学生课程成绩视图
 CREATE VIEW student_grades AS
@@ -0,0 +1,16 @@
+-- 课程名额改由应用维护
+-- 删除选课触发器（选课接口同时更新 current_students 会重复计数，退课只改状态时触发器也不会减少人数），
+-- 并按占用名额的选课记录（状态不是 dropped）重新计算各课程的当前人数
+USE student_course_system;
+
+DROP TRIGGER IF EXISTS tr_enrollment_insert;
+DROP TRIGGER IF EXISTS tr_enrollment_delete;
+
+UPDATE courses c
+LEFT JOIN (
+    SELECT course_id, COUNT(*) AS seats
+    FROM enrollments
+    WHERE status <> 'dropped'
+    GROUP BY course_id
+) e ON c.course_id = e.course_id
+SET c.current_students = COALESCE(e.seats, 0);
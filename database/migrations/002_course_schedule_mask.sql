@@ -0,0 +1,8 @@
+-- 课程时间位图
+-- 应用按 schedule 编译出每周5分钟时段的位图并保存，时间冲突检查只需按位与；
+-- 已有课程的位图为NULL，读取时按 schedule 编译，课程时间表下次修改时写入
+USE student_course_system;
+
+ALTER TABLE courses
+    ADD COLUMN schedule_mask VARCHAR(504) NULL COMMENT '上课时间位图（7天×288个5分钟时段，十六进制），由应用按 schedule 生成'
+    AFTER schedule;
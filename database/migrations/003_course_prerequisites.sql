@@ -0,0 +1,13 @@
+-- 先修课程关系
+-- 每行表示选 course_id 之前需要修完 prerequisite_id，应用写入时检查不形成环
+USE student_course_system;
+
+CREATE TABLE IF NOT EXISTS course_prerequisites (
+    course_id VARCHAR(20) NOT NULL COMMENT '课程号',
+    prerequisite_id VARCHAR(20) NOT NULL COMMENT '先修课程号',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (course_id, prerequisite_id),
+    FOREIGN KEY (course_id) REFERENCES courses(course_id) ON DELETE CASCADE,
+    FOREIGN KEY (prerequisite_id) REFERENCES courses(course_id) ON DELETE CASCADE,
+    INDEX idx_prerequisite (prerequisite_id)
+) COMMENT '先修课程关系表（应用写入时检查不形成环）';
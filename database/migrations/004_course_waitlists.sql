@@ -0,0 +1,14 @@
+-- 选课候补
+-- 课程已满时学生加入候补，退课或调大课程人数释放名额时按 waitlist_id 顺序递补
+USE student_course_system;
+
+CREATE TABLE IF NOT EXISTS course_waitlists (
+    waitlist_id INT AUTO_INCREMENT PRIMARY KEY COMMENT '候补ID，同一课程按ID先后排队',
+    student_id VARCHAR(20) NOT NULL COMMENT '学号',
+    course_id VARCHAR(20) NOT NULL COMMENT '课程号',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '加入候补时间',
+    FOREIGN KEY (student_id) REFERENCES students(student_id) ON DELETE CASCADE,
+    FOREIGN KEY (course_id) REFERENCES courses(course_id) ON DELETE CASCADE,
+    UNIQUE KEY uk_student_course (student_id, course_id),
+    INDEX idx_course_queue (course_id, waitlist_id)
+) COMMENT '选课候补表（有名额释放时在同一事务中递补队首）';
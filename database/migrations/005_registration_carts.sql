@@ -0,0 +1,14 @@
+-- 预选课志愿
+-- 预选窗口内学生提交按志愿排序的课程，窗口结束后由抽签分配批量写入选课记录
+USE student_course_system;
+
+CREATE TABLE IF NOT EXISTS registration_carts (
+    student_id VARCHAR(20) NOT NULL COMMENT '学号',
+    course_id VARCHAR(20) NOT NULL COMMENT '课程号',
+    choice_rank TINYINT NOT NULL COMMENT '志愿顺序，1为第一志愿',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '提交时间',
+    PRIMARY KEY (student_id, course_id),
+    FOREIGN KEY (student_id) REFERENCES students(student_id) ON DELETE CASCADE,
+    FOREIGN KEY (course_id) REFERENCES courses(course_id) ON DELETE CASCADE,
+    UNIQUE KEY uk_student_rank (student_id, choice_rank)
+) COMMENT '预选课志愿表（预选窗口结束后抽签分配，分配后清空）';
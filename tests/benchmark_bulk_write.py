@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+批量写入性能对比
+在配置的MySQL数据库上比较逐行 insert() 与 insert_many()/upsert_many()/update_many() 的吞吐量
+
+用法:
+    python tests/benchmark_bulk_write.py [行数] [--backend=cli]
+
+数据写入 bench_bulk_write 表（不存在时自动创建），每轮开始和脚本结束时清空，
+测试完成后可手动删除该表。
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from app.db.instrumentation import total_round_trips  # noqa: E402
+from app.db.mysql_client import MySQLCommandLineClient, create_backend  # noqa: E402
+
+TABLE = "bench_bulk_write"
+
+
+def make_rows(count):
+    return [
+        {"student_id": f"B{i:09d}", "name": f"学生{i}", "score": i % 100}
+        for i in range(count)
+    ]
+
+
+def run_case(client, title, fn, rows_count):
+    client.execute_raw_sql(f"DELETE FROM {TABLE} WHERE id > 0")
+    start_trips = total_round_trips()
+    start = time.perf_counter()
+    ok = fn()
+    elapsed = time.perf_counter() - start
+    trips = total_round_trips() - start_trips
+    status = "✅" if ok else "❌"
+    print(f"{status} {title:<32} {elapsed:8.3f}s  {rows_count / elapsed:10.0f} 行/秒  往返 {trips}")
+    return elapsed
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    count = int(args[0]) if args else 2000
+    backend = "cli" if "--backend=cli" in sys.argv else "pool"
+
+    client = MySQLCommandLineClient(create_backend(backend))
+    ok, _, error = client.execute_raw_sql(
+        f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+        "id INT AUTO_INCREMENT PRIMARY KEY, "
+        "student_id VARCHAR(20) NOT NULL UNIQUE, "
+        "name VARCHAR(50) NOT NULL, "
+        "score INT NOT NULL)"
+    )
+    if not ok:
+        print(f"❌ 创建测试表失败: {error}")
+        return 1
+
+    rows = make_rows(count)
+    print(f"执行后端: {backend}  行数: {count}")
+    print("=" * 72)
+
+    def row_at_a_time():
+        return all(client.insert(TABLE, row)[0] for row in rows)
+
+    baseline = run_case(client, "逐行 insert()", row_at_a_time, count)
+
+    for chunk_size in (100, 500, 1000):
+        elapsed = run_case(
+            client, f"insert_many(chunk_size={chunk_size})",
+            lambda: client.insert_many(TABLE, rows, chunk_size=chunk_size)[0], count
+        )
+        print(f"   提速 {baseline / elapsed:.1f}x")
+
+    def in_transaction():
+        with client.transaction() as tx:
+            return tx.insert_many(TABLE, rows)[0]
+
+    run_case(client, "insert_many 事务内", in_transaction, count)
+
+    def upsert():
+        client.insert_many(TABLE, rows)
+        changed = [dict(row, score=row["score"] + 1) for row in rows]
+        return client.upsert_many(TABLE, changed, update_columns=["score"])[0]
+
+    run_case(client, "insert_many + upsert_many", upsert, count * 2)
+
+    def update():
+        client.insert_many(TABLE, rows)
+        changed = [{"student_id": row["student_id"], "score": 0} for row in rows]
+        return client.update_many(TABLE, changed, key="student_id")[0]
+
+    run_case(client, "insert_many + update_many", update, count * 2)
+
+    client.execute_raw_sql(f"DELETE FROM {TABLE} WHERE id > 0")
+    client.backend.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
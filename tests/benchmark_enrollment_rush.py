@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+"""
+抢课并发压测
+大量学生同时选同一门课程，检查名额不超卖、课程人数与选课记录一致，并输出吞吐量和延迟分位数
+
+用法:
+    python tests/benchmark_enrollment_rush.py [学生数] [--seats=100] [--repeat=1]
+    DB_BACKEND=pool python tests/benchmark_enrollment_rush.py 1000   # 在MySQL上验证（需先初始化数据库）
+    SEAT_LEDGER_ENABLED=true python tests/benchmark_enrollment_rush.py 1000   # 经过选课名额账本
+
+默认以 SQLite 执行后端在进程内运行应用；所有请求同时发出（学生数即并发数），
+每轮使用新的课程和学生编号，可重复运行在同一个库上
+"""
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+os.environ.setdefault("DB_BACKEND", "sqlite")
+os.environ.setdefault("DEBUG", "true")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import logging  # noqa: E402
+
+import httpx  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.db.async_client import db  # noqa: E402
+from app.db.mysql_client import mysql_client  # noqa: E402
+from app.services.seat_ledger import seat_ledger  # noqa: E402
+from app.utils.security import create_access_token  # noqa: E402
+from main import app  # noqa: E402
+
+
+def option(name, default):
+    for arg in sys.argv[1:]:
+        if arg.startswith(f"--{name}="):
+            return int(arg.split("=", 1)[1])
+    return default
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+
+def seed(run_id, students, seats):
+    """生成一门课程和一批学生，返回 (课程号, 学号列表)"""
+    course_id = f"R{run_id}"
+    student_ids = [f"R{run_id}{i:05d}" for i in range(students)]
+    success, _, error = mysql_client.insert("courses", {
+        "course_id": course_id, "course_name": "抢课压测", "department_id": "CS",
+        "credits": 2, "hours": 32, "max_students": seats
+    })
+    if not success:
+        raise RuntimeError(error)
+    success, _, error = mysql_client.insert_many("students", [
+        {
+            "student_id": student_id, "password_hash": "x", "name": f"压测学生{i}",
+            "id_number": f"R{run_id}{i:08d}", "department_id": "CS", "balance": 0
+        }
+        for i, student_id in enumerate(student_ids)
+    ])
+    if not success:
+        raise RuntimeError(error)
+    return course_id, student_ids
+
+
+async def rush(client, course_id, student_ids):
+    """所有学生同时选课，返回 (各请求状态码, 各请求延迟, 总耗时)"""
+    start_signal = asyncio.Event()
+
+    async def enroll(student_id):
+        headers = {
+            "Authorization": f"Bearer {create_access_token(data={'sub': student_id, 'user_type': 'student'})}"
+        }
+        await start_signal.wait()
+        start = time.perf_counter()
+        response = await client.post("/api/v1/enrollments/", headers=headers, json={"course_id": course_id})
+        return response.status_code, time.perf_counter() - start
+
+    tasks = [asyncio.create_task(enroll(student_id)) for student_id in student_ids]
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    start_signal.set()
+    results = await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    return [code for code, _ in results], [latency for _, latency in results], elapsed
+
+
+def verify(course_id, seats, codes):
+    """名额不超卖、课程人数与选课记录一致、没有服务端错误"""
+    success, rows, error = mysql_client.execute_raw_sql(
+        "SELECT current_students, max_students FROM courses WHERE course_id = :course_id", {"course_id": course_id}
+    )
+    counter = rows[0]["current_students"]
+    success, rows, error = mysql_client.execute_raw_sql(
+        "SELECT COUNT(*) AS total FROM enrollments WHERE course_id = :course_id AND status <> 'dropped'",
+        {"course_id": course_id}
+    )
+    enrolled = rows[0]["total"]
+    accepted = codes.count(200)
+    expected = min(seats, len(codes))
+    checks = [
+        ("选课成功数等于名额", accepted == expected, f"{accepted}（预期 {expected}）"),
+        ("选课记录数等于名额", enrolled == expected, f"{enrolled}（预期 {expected}）"),
+        ("课程人数与选课记录一致", counter == enrolled, f"current_students={counter}"),
+        ("没有服务端错误", not any(code >= 500 for code in codes),
+         f"{sum(1 for code in codes if code >= 500)} 个5xx"),
+    ]
+    for title, ok, detail in checks:
+        print(f"  {'✅' if ok else '❌'} {title}: {detail}")
+    return all(ok for _, ok, _ in checks)
+
+
+async def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    students = int(args[0]) if args else 1000
+    seats = option("seats", 100)
+    repeat = option("repeat", 1)
+
+    logging.disable(logging.WARNING)
+    print(f"执行后端: {mysql_client.backend.name}  学生: {students}（同时发出）  名额: {seats}  "
+          f"名额账本: {'开启' if settings.SEAT_LEDGER_ENABLED else '关闭'}")
+    print("=" * 100)
+
+    ok = True
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver", timeout=120) as client:
+        for round_no in range(1, repeat + 1):
+            course_id, student_ids = seed(uuid.uuid4().hex[:8], students, seats)
+            if settings.SEAT_LEDGER_ENABLED:
+                # ASGITransport 不执行应用的 lifespan，这里手动加载账本（新建的课程需要对账后才进入账本）
+                if seat_ledger.enabled:
+                    await seat_ledger.reconcile()
+                else:
+                    await seat_ledger.start(db)
+            codes, latencies, elapsed = await rush(client, course_id, student_ids)
+            print(
+                f"第{round_no}轮 {len(codes) / elapsed:8.0f} 请求/秒  "
+                f"p50 {percentile(latencies, 0.5) * 1000:7.2f}ms  p95 {percentile(latencies, 0.95) * 1000:7.2f}ms  "
+                f"p99 {percentile(latencies, 0.99) * 1000:7.2f}ms  成功 {codes.count(200)}  "
+                f"名额已满 {codes.count(400)}  其他 {len(codes) - codes.count(200) - codes.count(400)}"
+            )
+            ok = verify(course_id, seats, codes) and ok
+    if seat_ledger.enabled:
+        print(f"名额账本: {seat_ledger.status()}")
+        await seat_ledger.stop()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
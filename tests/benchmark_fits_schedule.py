@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""
+"只看不冲突的课程"筛选性能
+比较逐门课程调用 check_time_conflict 与课程时间索引一次向量化按位与，在不同目录规模下的单次筛选耗时
+
+用法:
+    python tests/benchmark_fits_schedule.py [课程数,...]
+
+不需要数据库：随机生成课程时间表，学生在修 6 门课程
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from app.services.schedule_index import ScheduleIndex  # noqa: E402
+from app.utils.course_validation import check_time_conflict, compile_schedule, mask_to_text  # noqa: E402
+
+WEEKDAYS = "一二三四五"
+PERIODS = ["8:00-9:40", "10:00-11:40", "14:00-15:40", "16:00-17:40", "19:00-20:40"]
+
+
+def random_schedule(rng):
+    days = "".join(sorted(rng.sample(WEEKDAYS, rng.randint(1, 2)), key=WEEKDAYS.index))
+    return f"周{days} {rng.choice(PERIODS)}"
+
+
+class CatalogDatabase:
+    """只提供 fetch 的内存课程目录"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def fetch(self, sql, params=None):
+        return self.rows
+
+
+def make_catalog(count, rng):
+    rows = []
+    for i in range(count):
+        schedule = random_schedule(rng)
+        rows.append({
+            "course_id": f"C{i:06d}", "department_id": rng.choice(["CS", "MATH", "ENG"]),
+            "semester": "2024-2025-1", "status": "active", "course_name": f"课程{i}",
+            "teacher_name": f"教师{i % 50}", "schedule": schedule,
+            "schedule_mask": mask_to_text(compile_schedule(schedule))
+        })
+    return rows
+
+
+def best_of(fn, rounds=5):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    sizes = [int(size) for size in args[0].split(",")] if args else [100, 1000, 10000]
+    rng = random.Random(42)
+    enrolled = [random_schedule(rng) for _ in range(6)]
+    taken = 0
+    for schedule in enrolled:
+        taken |= compile_schedule(schedule)
+
+    print(f"{'课程数':>8} {'逐门比较':>12} {'向量化索引':>12} {'加速':>8} {'不冲突':>8}")
+    print("=" * 56)
+    for size in sizes:
+        rows = make_catalog(size, rng)
+        index = ScheduleIndex(ttl=3600)
+        asyncio.run(index.ensure(CatalogDatabase(rows)))
+
+        def nested():
+            return [
+                row["course_id"] for row in rows
+                if not any(check_time_conflict(row["schedule"], schedule) for schedule in enrolled)
+            ]
+
+        loop_time, expected = best_of(nested)
+        index_time, result = best_of(lambda: index.fits(taken))
+        assert result == expected
+        print(f"{size:>8} {loop_time * 1000:>10.2f}ms {index_time * 1000:>10.2f}ms "
+              f"{loop_time / index_time:>7.1f}x {len(result):>8}")
+
+
+if __name__ == "__main__":
+    main()
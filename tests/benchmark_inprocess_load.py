@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+"""
+进程内压测
+以 SQLite 执行后端在进程内运行整个FastAPI应用，不需要MySQL和运行中的服务，
+用于比较优化前后各接口的吞吐量、延迟分位数和每请求数据库往返次数
+
+用法:
+    python tests/benchmark_inprocess_load.py [请求数] [--concurrency=32] [--students=2000] [--courses=200]
+    SQLITE_PATH=/tmp/bench.db python tests/benchmark_inprocess_load.py   # 使用文件库
+
+数据在启动时批量生成；SQLite串行执行语句，结果用于同一环境下的前后对比，不代表MySQL上的绝对性能
+"""
+import asyncio
+import os
+import sys
+import time
+
+os.environ.setdefault("DB_BACKEND", "sqlite")
+os.environ.setdefault("DEBUG", "true")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import logging  # noqa: E402
+
+import httpx  # noqa: E402
+
+from app.db.mysql_client import mysql_client  # noqa: E402
+from app.utils.security import create_access_token  # noqa: E402
+from main import app  # noqa: E402
+
+DEPARTMENTS = ["CS", "MATH", "ENG", "BUS", "ART"]
+
+
+def option(name, default):
+    for arg in sys.argv[1:]:
+        if arg.startswith(f"--{name}="):
+            return int(arg.split("=", 1)[1])
+    return default
+
+
+def seed(students, courses):
+    """批量生成学生、课程和选课记录"""
+    mysql_client.insert_many("students", [
+        {
+            "student_id": f"S{i:06d}", "password_hash": "x", "name": f"学生{i}",
+            "id_number": f"ID{i:016d}", "department_id": DEPARTMENTS[i % len(DEPARTMENTS)],
+            "grade": 2021 + i % 4, "balance": 1000
+        }
+        for i in range(students)
+    ])
+    mysql_client.insert_many("courses", [
+        {
+            "course_id": f"C{i:05d}", "course_name": f"课程{i}", "department_id": DEPARTMENTS[i % len(DEPARTMENTS)],
+            "credits": 1 + i % 4, "hours": 16 * (1 + i % 4), "max_students": 200,
+            "semester": "2024-2025-1", "schedule": f"周{1 + i % 5} {1 + 2 * (i % 5)}-{2 + 2 * (i % 5)}节"
+        }
+        for i in range(courses)
+    ])
+    mysql_client.insert_many("enrollments", [
+        {"student_id": f"S{i:06d}", "course_id": f"C{(i * 7 + j) % courses:05d}"}
+        for i in range(students) for j in range(3)
+    ])
+
+
+def scenarios(students, courses):
+    """(名称, 方法, 路径生成函数, 认证身份)"""
+    return [
+        ("院系列表", "GET", lambda i: "/api/v1/departments/", None),
+        ("课程列表", "GET", lambda i: f"/api/v1/courses/?page={1 + i % 5}&page_size=20", None),
+        ("课程详情", "GET", lambda i: f"/api/v1/courses/C{i % courses:05d}", None),
+        ("我的课程", "GET", lambda i: "/api/v1/enrollments/my-courses", "student"),
+        ("学生列表", "GET", lambda i: f"/api/v1/students/list?page={1 + i % 5}&page_size=20", "admin"),
+    ]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+
+async def run_scenario(client, name, method, path, headers, total, concurrency):
+    latencies, trips, errors = [], [], 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            response = await client.request(method, path(i), headers=headers)
+            latencies.append(time.perf_counter() - start)
+            trips.append(int(response.headers.get("X-DB-Round-Trips", 0)))
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<8} {total / elapsed:8.0f} 请求/秒  "
+        f"p50 {percentile(latencies, 0.5) * 1000:7.2f}ms  p95 {percentile(latencies, 0.95) * 1000:7.2f}ms  "
+        f"p99 {percentile(latencies, 0.99) * 1000:7.2f}ms  往返/请求 {sum(trips) / len(trips):5.1f}  错误 {errors}"
+    )
+
+
+async def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    total = int(args[0]) if args else 2000
+    concurrency = option("concurrency", 32)
+    students = option("students", 2000)
+    courses = option("courses", 200)
+
+    logging.disable(logging.WARNING)
+    start = time.perf_counter()
+    seed(students, courses)
+    print(f"执行后端: {mysql_client.backend.name}  学生: {students}  课程: {courses}  "
+          f"生成数据 {time.perf_counter() - start:.2f}s")
+    print(f"每个接口 {total} 个请求，并发 {concurrency}")
+    print("=" * 100)
+
+    tokens = {
+        "student": create_access_token(data={"sub": "S000000", "user_type": "student"}),
+        "admin": create_access_token(data={"sub": "admin001", "user_type": "admin"}),
+    }
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        for name, method, path, identity in scenarios(students, courses):
+            headers = {"Authorization": f"Bearer {tokens[identity]}"} if identity else {}
+            await run_scenario(client, name, method, path, headers, total, concurrency)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""
+预选课抽签分配性能
+随机生成学生志愿（热门课程集中，名额不足），统计 lottery.allocate 的耗时；加 --write 时再写入内存SQLite库
+
+用法:
+    python tests/benchmark_lottery.py [学生数] [志愿数] [--write]
+
+同一种子重复分配，检查结果可复现
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("DB_BACKEND", "sqlite")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from app.services import lottery  # noqa: E402
+from app.utils.course_validation import compile_schedule, mask_to_text  # noqa: E402
+
+WEEKDAYS = "一二三四五"
+PERIODS = ["8:00-9:40", "10:00-11:40", "14:00-15:40", "16:00-17:40", "19:00-20:40"]
+COURSES = 2000
+
+
+def make_catalog(rng):
+    courses = {}
+    for i in range(COURSES):
+        schedule = f"周{rng.choice(WEEKDAYS)} {rng.choice(PERIODS)}"
+        courses[f"C{i:05d}"] = {
+            "course_id": f"C{i:05d}", "max_students": rng.choice([30, 60, 120, 200]), "current_students": 0,
+            "schedule": schedule, "schedule_mask": mask_to_text(compile_schedule(schedule))
+        }
+    return courses
+
+
+def make_carts(students, choices, rng):
+    course_ids = [f"C{i:05d}" for i in range(COURSES)]
+    # 前 10% 的课程被选的概率更高
+    weights = [10 if i < COURSES // 10 else 1 for i in range(COURSES)]
+    carts = {}
+    for i in range(students):
+        cart = []
+        while len(cart) < choices:
+            course_id = rng.choices(course_ids, weights)[0]
+            if course_id not in cart:
+                cart.append(course_id)
+        carts[f"S{i:06d}"] = cart
+    return carts
+
+
+async def write(courses, carts, result):
+    from app.db.async_client import AsyncDatabase
+    from app.db.mysql_client import MySQLCommandLineClient
+    from app.db.sqlite_backend import SQLiteBackend
+
+    client = MySQLCommandLineClient(SQLiteBackend(":memory:"))
+    client.insert_many("students", [
+        {"student_id": student_id, "password_hash": "x", "name": "学生", "id_number": f"ID{student_id}"}
+        for student_id in carts
+    ])
+    client.insert_many("courses", [
+        {"course_id": course_id, "course_name": "课程", "department_id": "CS", "credits": 2, "hours": 32,
+         "max_students": course["max_students"], "schedule": course["schedule"]}
+        for course_id, course in courses.items()
+    ])
+    database = AsyncDatabase(client, max_concurrency=2, timeout=600)
+    start = time.perf_counter()
+    written = await database.run_transaction(lambda tx: lottery.write(tx, result["assignments"], {}))
+    elapsed = time.perf_counter() - start
+    success, rows, _ = client.execute_raw_sql("SELECT COUNT(*) AS n FROM enrollments")
+    assert rows[0]["n"] == written
+    return elapsed
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    students = int(args[0]) if args else 50000
+    choices = int(args[1]) if len(args) > 1 else 8
+    rng = random.Random(42)
+    courses = make_catalog(rng)
+    carts = make_carts(students, choices, rng)
+    weights = {student_id: 1.0 + int(student_id[1:]) % 4 for student_id in carts}
+
+    for weighting, student_weights in ((lottery.RANDOM, None), (lottery.SENIORITY, weights)):
+        start = time.perf_counter()
+        result = lottery.allocate(carts, courses, {}, seed=2024, weights=student_weights)
+        elapsed = time.perf_counter() - start
+        again = lottery.allocate(carts, courses, {}, seed=2024, weights=student_weights)
+        assert again["assignments"] == result["assignments"]
+        stats = result["stats"]
+        print(f"{weighting:>10}: {students} 名学生 x {choices} 个志愿，分配 {elapsed:.2f}s，"
+              f"选上 {stats['allocated']} 门（{stats['rounds']} 轮），未分配 {stats['rejected']}")
+
+    if "--write" in sys.argv:
+        elapsed = asyncio.run(write(courses, carts, result))
+        print(f"写入 {len(result['assignments'])} 条选课记录 {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""
+选课方案规划性能
+随机生成愿望清单（课程时间集中在少数时段，冲突较多），统计 planner.search 的耗时和是否在时间上限内搜索完整
+
+用法:
+    python tests/benchmark_planner.py [愿望清单课程数] [轮数]
+
+不需要数据库
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from app.services import planner  # noqa: E402
+
+WEEKDAYS = "一二三四五"
+PERIODS = ["8:00-9:40", "10:00-11:40", "14:00-15:40", "16:00-17:40"]
+
+
+def random_wishlist(count, rng):
+    courses = []
+    for i in range(count):
+        days = "".join(sorted(rng.sample(WEEKDAYS, rng.randint(1, 2)), key=WEEKDAYS.index))
+        courses.append({
+            "course_id": f"C{i:03d}", "course_name": f"课程{i}", "credits": rng.choice([1, 2, 3, 4]),
+            "schedule": f"周{days} {rng.choice(PERIODS)}"
+        })
+    return courses
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    rng = random.Random(42)
+
+    print(f"愿望清单 {count} 门课程，{rounds} 轮")
+    print(f"{'目标':>8} {'平均':>10} {'p99':>10} {'最大':>10} {'未搜完':>8}")
+    print("=" * 52)
+    for objective in (planner.COUNT, planner.CREDITS):
+        timings, incomplete = [], 0
+        for _ in range(rounds):
+            courses = random_wishlist(count, rng)
+            start = time.perf_counter()
+            result = planner.search(courses, objective, limit=3, time_budget=0.08)
+            timings.append(time.perf_counter() - start)
+            incomplete += not result["complete"]
+        timings.sort()
+        print(f"{objective:>8} {sum(timings) / rounds * 1000:>8.2f}ms "
+              f"{timings[int(rounds * 0.99) - 1] * 1000:>8.2f}ms {timings[-1] * 1000:>8.2f}ms {incomplete:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""
+数据行解码性能对比
+比较旧的"字符串字典"结果与按列类型解码的 Row 结果在列表接口场景下的内存占用和CPU耗时
+
+用法:
+    python tests/benchmark_row_decoding.py [行数]
+
+不需要数据库：以课程列表接口的列构造结果集，分别模拟两条路径：
+  - 字符串字典：驱动值转为字符串 -> dict(zip()) -> 接口中 int()/Decimal(str()) 再解析 -> pydantic再转换
+  - Row：驱动值保持原类型 -> 共享列索引的 Row -> pydantic校验
+"""
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from app.api.v1.endpoints.courses import CourseResponse  # noqa: E402
+from app.db.mysql_client import _from_driver_rows  # noqa: E402
+from app.db.result import QueryResult  # noqa: E402
+
+COLUMNS = [
+    "course_id", "course_name", "department_id", "department_name", "credits", "hours",
+    "description", "teacher_name", "max_students", "current_students", "semester",
+    "schedule", "status", "created_at", "updated_at"
+]
+
+
+def make_driver_rows(count):
+    """模拟驱动返回的已按类型转换的行"""
+    base = datetime(2024, 9, 1, 8, 0, 0)
+    return [
+        (
+            f"C{i:06d}", f"课程{i}", "CS", "计算机学院", Decimal("3.0"), 48,
+            None, f"教师{i % 50}", 60, i % 60, "2024-2025-1",
+            "周一 1-2节", "active", base + timedelta(minutes=i), base + timedelta(minutes=i)
+        )
+        for i in range(count)
+    ]
+
+
+def as_text(value):
+    return None if value is None else str(value)
+
+
+def text_dict_path(driver_rows):
+    """旧路径：结果统一转为字符串，再组装为字典"""
+    text_rows = [tuple(map(as_text, row)) for row in driver_rows]
+    return [dict(zip(COLUMNS, row)) for row in text_rows]
+
+
+def typed_row_path(driver_rows):
+    """新路径：保留驱动类型，组装为 Row"""
+    rows = _from_driver_rows(driver_rows)
+    return QueryResult(COLUMNS, rows, rowcount=len(rows)).as_rows()
+
+
+def measure_memory(build, count):
+    """结果集常驻内存，驱动返回的行在追踪范围内创建，未被结果引用的部分会被释放"""
+    gc.collect()
+    tracemalloc.start()
+    result = build(make_driver_rows(count))
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current
+
+
+def measure_cpu(build, driver_rows, reparse, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = build(driver_rows)
+        for row in rows:
+            if reparse:
+                # 旧接口中的重复解析，如 int(course.get("current_students", 0))
+                int(row.get("current_students", 0))
+                int(row.get("max_students", 0))
+                Decimal(str(row["credits"]))
+            else:
+                row["current_students"]
+                row["max_students"]
+                row["credits"]
+            CourseResponse(**row)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    driver_rows = make_driver_rows(count)
+
+    print(f"行数: {count}  列数: {len(COLUMNS)}")
+    print("=" * 64)
+
+    text_memory = measure_memory(text_dict_path, count)
+    row_memory = measure_memory(typed_row_path, count)
+    print(f"内存  字符串字典: {text_memory / count:8.0f} 字节/行")
+    print(f"内存  Row:        {row_memory / count:8.0f} 字节/行  ({text_memory / row_memory:.1f}x)")
+
+    text_cpu = measure_cpu(text_dict_path, driver_rows, reparse=True)
+    row_cpu = measure_cpu(typed_row_path, driver_rows, reparse=False)
+    print(f"CPU   字符串字典: {text_cpu * 1e6 / count:8.2f} 微秒/行")
+    print(f"CPU   Row:        {row_cpu * 1e6 / count:8.2f} 微秒/行  ({text_cpu / row_cpu:.1f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""
+读写分离路由检查
+用同一MySQL服务器上的第二个数据库模拟从库（两个库之间没有复制，SHOW REPLICA STATUS 为空视为无延迟），
+在两个库中写入不同的标记，通过读取到的标记判断语句被路由到了哪个库
+
+用法:
+    mysql -e "CREATE DATABASE IF NOT EXISTS student_course_system_replica"
+    python tests/check_replica_routing.py
+
+未设置 MYSQL_REPLICAS 时默认使用 <MYSQL_DATABASE>_replica 作为从库
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from app.core.config import settings  # noqa: E402
+
+if not settings.MYSQL_REPLICAS:
+    settings.MYSQL_REPLICAS = f"{settings.MYSQL_HOST}:{settings.MYSQL_PORT}/{settings.MYSQL_DATABASE}_replica"
+
+from app.db.mysql_client import MySQLCommandLineClient, create_backend  # noqa: E402
+from app.db.routing import begin_routing, use_primary  # noqa: E402
+from app.db.statements import compile_statement  # noqa: E402
+
+TABLE = "db_routing_marker"
+
+
+def prepare(backend, source):
+    """在指定库中创建标记表并写入来源标记"""
+    backend.run(compile_statement(
+        f"CREATE TABLE IF NOT EXISTS {TABLE} (id INT PRIMARY KEY, source VARCHAR(20) NOT NULL)"
+    ), None, False)
+    backend.run(compile_statement(
+        f"REPLACE INTO {TABLE} (id, source) VALUES (1, :source)"
+    ), {"source": source}, False)
+
+
+def read_source(client):
+    success, results, error = client.select(TABLE, columns=["source"], where={"id": 1})
+    if not success:
+        raise RuntimeError(error)
+    return results[0]["source"] if results else None
+
+
+def check(title, actual, expected):
+    ok = actual == expected
+    print(f"{'✅' if ok else '❌'} {title}: {actual}（预期 {expected}）")
+    return ok
+
+
+def main():
+    backend = create_backend()
+    client = MySQLCommandLineClient(backend)
+    print(f"主库: {settings.MYSQL_HOST}:{settings.MYSQL_PORT}/{settings.MYSQL_DATABASE}")
+    print(f"从库: {settings.MYSQL_REPLICAS}")
+    print("=" * 60)
+
+    prepare(backend.primary, "primary")
+    for replica in backend.replicas:
+        prepare(replica.backend, "replica")
+
+    results = []
+
+    begin_routing()
+    results.append(check("普通读取走从库", read_source(client), "replica"))
+
+    client.update(TABLE, {"source": "primary"}, {"id": 1})
+    results.append(check("同一请求写入后读取走主库", read_source(client), "primary"))
+
+    begin_routing(primary_only=True)
+    results.append(check("粘滞期内的请求读取走主库", read_source(client), "primary"))
+
+    begin_routing()
+    with use_primary():
+        results.append(check("use_primary() 内读取走主库", read_source(client), "primary"))
+
+    begin_routing()
+    with client.transaction() as tx:
+        success, rows, _ = tx.select(TABLE, columns=["source"], where={"id": 1})
+        results.append(check("事务内读取走主库", rows[0]["source"] if rows else None, "primary"))
+
+    begin_routing()
+    for replica in backend.replicas:
+        backend._mark_down(replica, "检查脚本模拟从库故障")
+    results.append(check("从库不可用时回退主库", read_source(client), "primary"))
+
+    print("=" * 60)
+    print(backend.status())
+    backend.close()
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,929 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQLite执行后端测试
+不需要MySQL和运行中的服务：以 DB_BACKEND=sqlite 在进程内启动应用，
+验证初始化脚本翻译、数据类型、触发器、事务和主要接口
+"""
+import asyncio
+import os
+import sys
+import time
+from decimal import Decimal
+
+os.environ.setdefault("DB_BACKEND", "sqlite")
+os.environ.setdefault("DEBUG", "true")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.db.async_client import TIMEOUT_MESSAGE, AsyncDatabase, db  # noqa: E402
+from app.db.backend import QUERY_TIMEOUT_ERRNO, DatabaseError, is_connection_error  # noqa: E402
+from app.db.breaker import CircuitBreaker  # noqa: E402
+from app.db.instrumentation import transaction_stats  # noqa: E402
+from app.db.mysql_client import MySQLCommandLineClient, mysql_client  # noqa: E402
+from app.db.retry import RetryPolicy  # noqa: E402
+from app.services import batch_enrollment, lottery, planner, seats, waitlist  # noqa: E402
+from app.services.enrollment_queue import EnrollmentQueue  # noqa: E402
+from app.services.prerequisites import CyclicPrerequisiteError, PrerequisiteGraph  # noqa: E402
+from app.services.schedule_index import ScheduleIndex  # noqa: E402
+from app.services.seat_ledger import SeatLedger  # noqa: E402
+from app.db.sqlite_backend import SQLiteBackend, translate_sql  # noqa: E402
+from app.db.statements import compile_statement  # noqa: E402
+from app.utils.course_validation import (  # noqa: E402
+    SLOTS_PER_DAY, check_enrollment_conflicts, check_time_conflict, compile_schedule, mask_to_text,
+    schedule_aligned, schedule_mask
+)
+from app.utils.security import create_access_token  # noqa: E402
+
+
+def make_client():
+    """每个测试使用独立的内存库"""
+    return MySQLCommandLineClient(SQLiteBackend(":memory:"))
+
+
+def add_student(client, student_id="S001"):
+    success, _, error = client.insert("students", {
+        "student_id": student_id, "password_hash": "x", "name": "测试学生",
+        "id_number": f"ID{student_id}", "department_id": "CS", "balance": Decimal("100.50")
+    })
+    assert success, error
+
+
+def add_course(client, course_id="C001", max_students=2):
+    success, _, error = client.insert("courses", {
+        "course_id": course_id, "course_name": "测试课程", "department_id": "CS",
+        "credits": 3, "hours": 48, "max_students": max_students
+    })
+    assert success, error
+
+
+def test_init_script():
+    """初始化脚本建表并写入院系和管理员数据"""
+    client = make_client()
+    success, rows, error = client.select("departments", order_by="department_id")
+    assert success, error
+    assert [row["department_id"] for row in rows] == ["ART", "BUS", "CS", "ENG", "MATH"]
+    assert rows[0]["created_at"].year >= 2024
+
+    success, rows, _ = client.select("administrators", where={"admin_id": "admin001"})
+    assert success and rows[0]["role"] == "super_admin"
+
+
+def test_column_types_and_constraints():
+    """DECIMAL保留小数位，唯一键冲突返回MySQL错误信息，ENUM取值受约束"""
+    client = make_client()
+    add_student(client)
+    add_course(client)
+
+    success, rows, _ = client.select("courses", columns=["credits", "max_students"])
+    assert rows[0]["credits"] == Decimal("3.0") and str(rows[0]["credits"]) == "3.0"
+    assert rows[0]["max_students"] == 2
+
+    success, _, error = client.insert("courses", {
+        "course_id": "C001", "course_name": "重复", "department_id": "CS", "credits": 1, "hours": 16
+    })
+    assert not success and "UNIQUE" in error
+
+    success, _, _ = client.update("courses", {"status": "unknown"}, {"course_id": "C001"})
+    assert not success
+
+
+def test_view():
+    """视图可查询"""
+    client = make_client()
+    add_student(client)
+    add_course(client)
+
+    success, _, error = client.insert("enrollments", {"student_id": "S001", "course_id": "C001"})
+    assert success, error
+    success, rows, _ = client.execute_raw_sql("SELECT * FROM student_grades WHERE student_id = :id", {"id": "S001"})
+    assert success and rows[0]["course_name"] == "测试课程"
+
+
+def test_seat_reservation():
+    """名额用带条件的UPDATE占用：并发选课不超卖，退课释放名额，退过的课程可以重新选"""
+    client = make_client()
+    for student_id in ("S001", "S002", "S003"):
+        add_student(client, student_id)
+    add_course(client, max_students=2)
+    database = AsyncDatabase(client, max_concurrency=4, timeout=5)
+
+    async def enroll(student_id):
+        async def body(tx):
+            return await seats.enroll(tx, student_id, "C001")
+        try:
+            return await database.run_transaction(body)
+        except (seats.SeatUnavailableError, seats.AlreadyEnrolledError) as e:
+            return type(e).__name__
+
+    async def scenario():
+        outcomes = await asyncio.gather(*(enroll(s) for s in ("S001", "S002", "S003", "S001")))
+        enrolled = [outcome for outcome in outcomes if isinstance(outcome, int)]
+        assert len(enrolled) == 2 and len(set(enrolled)) == 2
+        assert await database.run_transaction(lambda tx: seats.drop(tx, enrolled[0], "C001"))
+        assert not await database.run_transaction(lambda tx: seats.drop(tx, enrolled[0], "C001"))
+        return enrolled
+
+    enrolled = asyncio.run(scenario())
+    success, rows, _ = client.select("courses", columns=["current_students"], where={"course_id": "C001"})
+    assert rows[0]["current_students"] == 1
+
+    success, rows, _ = client.select("enrollments", columns=["student_id"], where={"enrollment_id": enrolled[0]})
+    assert asyncio.run(enroll(rows[0]["student_id"])) == enrolled[0]
+    success, rows, _ = client.execute_raw_sql(
+        "SELECT c.current_students, COUNT(*) AS seats FROM courses c "
+        "JOIN enrollments e ON e.course_id = c.course_id AND e.status <> 'dropped' GROUP BY c.current_students"
+    )
+    assert rows[0]["current_students"] == rows[0]["seats"] == 2
+
+
+def test_call_timeout_keeps_slot():
+    """调用超时后工作线程仍在执行（占用连接），并发名额在线程结束时才归还"""
+    database = AsyncDatabase(make_client(), max_concurrency=1, timeout=5)
+
+    async def scenario():
+        try:
+            await database._call(time.sleep, 0.2, timeout=0.02)
+        except asyncio.TimeoutError:
+            pass
+        else:
+            raise AssertionError("应超时")
+        held = database._semaphore().locked()
+        await asyncio.sleep(0.3)
+        return held, database._semaphore().locked()
+
+    assert asyncio.run(scenario()) == (True, False)
+
+
+def test_transaction_rollback():
+    """事务内的写入在异常时回滚"""
+    client = make_client()
+    add_student(client)
+    try:
+        with client.transaction() as tx:
+            tx.update("students", {"balance": 0}, {"student_id": "S001"})
+            raise RuntimeError("模拟失败")
+    except RuntimeError:
+        pass
+    success, rows, _ = client.select("students", columns=["balance"], where={"student_id": "S001"})
+    assert rows[0]["balance"] == Decimal("100.50")
+
+
+def test_mysql_dialect():
+    """ON DUPLICATE KEY UPDATE、DATE_SUB、FOR UPDATE 等MySQL语法"""
+    client = make_client()
+    success, _, error = client.upsert_many(
+        "departments",
+        [{"department_id": "CS", "department_name": "计算机学院", "description": "新描述"}],
+        update_columns=["department_name"]
+    )
+    assert success, error
+    success, rows, _ = client.select("departments", where={"department_id": "CS"})
+    assert rows[0]["department_name"] == "计算机学院"
+    assert rows[0]["description"] == "计算机科学与技术相关专业"
+
+    success, rows, error = client.execute_raw_sql(
+        "SELECT COUNT(*) AS total FROM departments "
+        "WHERE DATE(created_at) >= DATE_SUB(CURDATE(), INTERVAL 7 DAY) FOR UPDATE"
+    )
+    assert success, error
+    assert rows[0]["total"] == 5
+
+    assert "ON CONFLICT DO UPDATE SET score = excluded.score" in translate_sql(
+        "INSERT INTO t (id, score) VALUES (?, ?) ON DUPLICATE KEY UPDATE score = VALUES(score)"
+    )
+
+
+class OutageBackend(SQLiteBackend):
+    """可模拟数据库不可用的SQLite后端，记录实际执行的语句数"""
+
+    down = False
+    calls = 0
+
+    def run(self, statement, params=None, fetch_results=True):
+        self.calls += 1
+        if self.down:
+            raise DatabaseError("Can't connect to MySQL server", 2003)
+        return super().run(statement, params, fetch_results)
+
+
+def test_circuit_breaker():
+    """连续连接失败后熔断快速失败，探测间隔后放行一个调用，成功则恢复；SQL错误不计入失败"""
+    backend = OutageBackend(":memory:")
+    breaker = CircuitBreaker(failure_threshold=2, probe_interval=0.05)
+    client = MySQLCommandLineClient(backend, breaker=breaker)
+
+    success, _, _ = client.execute_raw_sql("SELECT * FROM missing_table")
+    assert not success and breaker.state == "closed"
+
+    backend.down = True
+    for _ in range(2):
+        assert not client.select("departments")[0]
+    assert breaker.state == "open"
+
+    calls = backend.calls
+    success, _, error = client.select("departments")
+    assert not success and "不可用" in error
+    assert backend.calls == calls
+
+    time.sleep(0.06)
+    assert not client.select("departments")[0]
+    assert breaker.state == "open" and backend.calls == calls + 1
+
+    backend.down = False
+    time.sleep(0.06)
+    assert client.select("departments")[0]
+    assert breaker.status()["state"] == "closed"
+
+    # 事务体中的异常（如单条语句等待超时）不计入熔断
+    breaker = CircuitBreaker(failure_threshold=1, probe_interval=60)
+    client = MySQLCommandLineClient(SQLiteBackend(":memory:"), breaker=breaker)
+    for error in (DatabaseError(TIMEOUT_MESSAGE, QUERY_TIMEOUT_ERRNO), DatabaseError("未知错误")):
+        try:
+            with client.transaction() as tx:
+                tx.select("departments")
+                raise error
+        except DatabaseError:
+            pass
+        assert breaker.state == "closed"
+    assert not is_connection_error(DatabaseError(TIMEOUT_MESSAGE, QUERY_TIMEOUT_ERRNO))
+    assert is_connection_error(DatabaseError("Lost connection to MySQL server", 2013))
+
+
+def test_seat_ledger():
+    """名额账本：已满课程不访问数据库，有名额的请求批量写入，账本与数据库不一致时改走逐条选课，数据库中已满时账本也记为已满"""
+    client = make_client()
+    for i in range(10):
+        add_student(client, f"S{i:03d}")
+    add_course(client, "C001", max_students=3)
+    add_course(client, "C002", max_students=5)
+    database = AsyncDatabase(client, max_concurrency=4, timeout=5)
+    ledger = SeatLedger(batch_size=50, flush_interval=0.01, reconcile_interval=60)
+
+    async def attempt(student_id, course_id):
+        try:
+            return await ledger.enroll(student_id, course_id)
+        except (seats.SeatUnavailableError, seats.AlreadyEnrolledError) as e:
+            return type(e).__name__
+
+    async def scenario():
+        await ledger.start(database)
+        # 账本加载后数据库中的名额被占用（如其他进程），批量写入时按数据库判断
+        client.execute_raw_sql("UPDATE courses SET current_students = 4 WHERE course_id = 'C002'")
+        try:
+            first = await asyncio.gather(*(attempt(f"S{i:03d}", "C001") for i in range(10)))
+            second = await asyncio.gather(*(attempt(f"S{i:03d}", "C002") for i in range(3)))
+            full = ledger.is_full("C001") and ledger.is_full("C002")
+            # 调大人数上限后对账才能继续选课，不经过账本提交的选课用 take() 记入
+            client.execute_raw_sql("UPDATE courses SET max_students = 4 WHERE course_id = 'C001'")
+            await ledger.reconcile()
+            reopened = not ledger.is_full("C001")
+            ledger.take("C001")
+            return first, second, full and reopened and ledger.is_full("C001"), ledger.status()
+        finally:
+            await ledger.stop()
+
+    first, second, full, status = asyncio.run(scenario())
+    assert sum(isinstance(outcome, int) for outcome in first) == 3
+    assert first.count("SeatUnavailableError") == 7
+    assert sum(isinstance(outcome, int) for outcome in second) == 1
+    assert full and status["batches"] >= 1 and status["fallbacks"] >= 1 and status["inflight"] == 0
+
+    success, rows, _ = client.select("courses", columns=["course_id", "current_students"], order_by="course_id")
+    assert [row["current_students"] for row in rows] == [3, 5]
+
+
+class ConcurrentInsertBackend(SQLiteBackend):
+    """批量写入检查已有选课记录之后，模拟同一学生的选课记录被并发写入"""
+
+    student_id = None
+
+    def _run_unlocked(self, statement, params, fetch_results):
+        result = super()._run_unlocked(statement, params, fetch_results)
+        if self.student_id and statement.sql.startswith("SELECT student_id FROM enrollments"):
+            student_id, self.student_id = self.student_id, None
+            super()._run_unlocked(compile_statement(
+                "INSERT INTO enrollments (student_id, course_id, status) VALUES (:student_id, 'C001', 'enrolled')"
+            ), {"student_id": student_id}, False)
+            super()._run_unlocked(compile_statement(
+                "UPDATE courses SET current_students = current_students + 1 WHERE course_id = 'C001'"
+            ), None, False)
+        return result
+
+
+def test_seat_ledger_concurrent_writes():
+    """批量INSERT因并发写入的重复记录失败时逐条选课，只有重复的请求失败；对账等待进行中的写入结算"""
+    backend = ConcurrentInsertBackend(":memory:")
+    client = MySQLCommandLineClient(backend)
+    for i in range(4):
+        add_student(client, f"S{i:03d}")
+    add_course(client, "C001", max_students=10)
+    database = AsyncDatabase(client, max_concurrency=4, timeout=5)
+    ledger = SeatLedger(batch_size=50, flush_interval=0.01, reconcile_interval=60)
+
+    async def attempt(student_id):
+        try:
+            return await ledger.enroll(student_id, "C001")
+        except seats.AlreadyEnrolledError as e:
+            return type(e).__name__
+
+    async def scenario():
+        await ledger.start(database)
+        try:
+            backend.student_id = "S001"
+            outcomes = await asyncio.gather(*(attempt(f"S{i:03d}") for i in range(4)))
+            async with ledger._writing():
+                reconcile = asyncio.create_task(ledger.reconcile())
+                await asyncio.sleep(0.01)
+                blocked = not reconcile.done()
+            await reconcile
+            return outcomes, blocked, ledger.status()
+        finally:
+            await ledger.stop()
+
+    outcomes, blocked, status = asyncio.run(scenario())
+    assert outcomes[1] == "AlreadyEnrolledError"
+    assert all(isinstance(outcome, int) for i, outcome in enumerate(outcomes) if i != 1)
+    assert blocked and status["fallbacks"] == 4 and status["inflight"] == 0
+    success, rows, _ = client.select("courses", columns=["current_students"], where={"course_id": "C001"})
+    assert rows[0]["current_students"] == 4
+
+
+def test_enrollment_queue():
+    """选课排队：按排队顺序录取，已选的学生被拒绝，满员后其余请求不再访问数据库，处理结果推送给学生"""
+    client = make_client()
+    for i in range(8):
+        add_student(client, f"S{i:03d}")
+    add_course(client, "C001", max_students=3)
+    client.insert("enrollments", {"student_id": "S001", "course_id": "C001", "status": "enrolled"})
+    client.execute_raw_sql("UPDATE courses SET current_students = 1 WHERE course_id = 'C001'")
+    database = AsyncDatabase(client, max_concurrency=4, timeout=5)
+    queue = EnrollmentQueue(workers=2, batch_size=3, max_depth=100, ticket_ttl=60)
+    pushed = []
+
+    async def notify(student_id, message):
+        pushed.append((student_id, message["status"]))
+
+    async def scenario():
+        await queue.start(database, notify=notify)
+        tickets = [queue.submit(f"S{i:03d}", "C001") for i in range(8)]
+        assert queue.submit("S000", "C001") is tickets[0]
+        positions = [queue.position(ticket) for ticket in tickets]
+        await queue.stop()
+        await asyncio.sleep(0)
+        return tickets, positions, queue.status()
+
+    tickets, positions, status = asyncio.run(scenario())
+    assert positions == list(range(8))
+    assert [ticket.status for ticket in tickets] == [
+        "enrolled", "rejected", "enrolled", "rejected", "rejected", "rejected", "rejected", "rejected"
+    ]
+    assert tickets[1].message == "您已经选过这门课程" and tickets[3].message == "课程选课人数已满"
+    assert status["enrolled"] == 2 and status["rejected"] == 6 and status["depth"] == 0 and status["batches"] == 3
+    assert sorted(pushed) == sorted((ticket.student_id, ticket.status) for ticket in tickets)
+
+    success, rows, _ = client.select("courses", columns=["current_students"], where={"course_id": "C001"})
+    assert rows[0]["current_students"] == 3
+
+
+def test_enrollment_queue_conflicts():
+    """同一学生同时排队两门时间冲突的课程：处理时按已选上的课程再检查，只录取其中一门"""
+    client = make_client()
+    for student_id in ("S000", "S001"):
+        add_student(client, student_id)
+    for course_id, schedule in (("C001", "周一 8:00-9:40"), ("C002", "周一 9:00-10:00")):
+        add_course(client, course_id, max_students=5)
+        client.update("courses", {"schedule": schedule}, {"course_id": course_id})
+    database = AsyncDatabase(client, max_concurrency=4, timeout=5)
+    queue = EnrollmentQueue(workers=2, batch_size=3, max_depth=100, ticket_ttl=60)
+
+    async def scenario():
+        await queue.start(database)
+        tickets = [queue.submit("S000", "C001"), queue.submit("S000", "C002"), queue.submit("S001", "C002")]
+        await queue.stop()
+        return tickets
+
+    tickets = asyncio.run(scenario())
+    assert sorted(ticket.status for ticket in tickets[:2]) == ["enrolled", "rejected"]
+    assert "时间冲突" in next(ticket.message for ticket in tickets[:2] if ticket.status == "rejected")
+    assert tickets[2].status == "enrolled"
+    success, rows, _ = client.select("enrollments", where={"student_id": "S000"})
+    assert len(rows) == 1
+
+
+def test_schedule_mask():
+    """时间表编译为周时段位图：按位与判断冲突，首尾相接不冲突，已保存的位图优先于时间表文本"""
+    monday = compile_schedule("周一 8:00-9:40")
+    assert monday == ((1 << 20) - 1) << 96
+    assert compile_schedule("周一三五 8:00-9:40") == monday | monday << SLOTS_PER_DAY * 2 | monday << SLOTS_PER_DAY * 4
+    assert compile_schedule("周一 9:00-10:40") & monday
+    assert not compile_schedule("周一 9:40-11:20") & monday
+    assert not compile_schedule("周二 8:00-9:40") & monday
+    assert compile_schedule(None) == 0 and mask_to_text(0) is None
+
+    stored = {"course_id": "C001", "schedule": "周五 8:00-9:40", "schedule_mask": mask_to_text(monday)}
+    assert schedule_mask(stored) == monday
+    enrolled = [
+        stored,
+        {"course_id": "C002", "course_name": "英语", "schedule": "周一 9:00-9:30", "schedule_mask": None},
+        {"course_id": "C003", "course_name": "体育", "schedule": "周三 9:00-9:30", "schedule_mask": None},
+    ]
+    conflicts = check_enrollment_conflicts("周一 9:20-10:00", enrolled)
+    assert [conflict["course_id"] for conflict in conflicts] == ["C001", "C002"]
+
+    # 不在5分钟整点上的时间（旧数据）：位图取整后相交，按时间段确认不冲突
+    assert compile_schedule("周一 8:00-9:02") & compile_schedule("周一 9:03-10:00")
+    assert not check_time_conflict("周一 8:00-9:02", "周一 9:03-10:00")
+    assert check_time_conflict("周一 8:00-9:02", "周一 9:01-10:00")
+    assert not check_enrollment_conflicts("周一 9:03-10:00", [
+        {"course_id": "C004", "course_name": "旧课程", "schedule": "周一 8:00-9:02", "schedule_mask": None}
+    ])
+    assert schedule_aligned("周一三 8:00-9:40") and not schedule_aligned("周一 8:00-9:02")
+
+
+def test_schedule_index():
+    """课程时间索引：整个目录一次按位与筛出不冲突的课程，并按院系、状态和关键词筛选"""
+    client = make_client()
+    for course_id, schedule in (("C001", "周一 8:00-9:40"), ("C002", "周一 9:00-10:40"),
+                                ("C003", "周二 8:00-9:40"), ("C004", None)):
+        add_course(client, course_id)
+        client.update("courses", {"schedule": schedule, "teacher_name": f"Teacher {course_id}"},
+                      {"course_id": course_id})
+    client.update("courses", {"status": "inactive"}, {"course_id": "C004"})
+    index = ScheduleIndex(ttl=60)
+    asyncio.run(index.ensure(AsyncDatabase(client, max_concurrency=4, timeout=5)))
+
+    taken = compile_schedule("周一 9:30-9:50")
+    assert index.size() == 4
+    assert sorted(index.fits(taken)) == ["C003", "C004"]
+    assert index.fits(taken, status="active") == ["C003"]
+    assert sorted(index.fits(0, search="teacher c00")) == ["C001", "C002", "C003", "C004"]
+    assert index.fits(taken, department_id="MATH") == []
+
+
+def test_prerequisite_graph():
+    """先修关系图：拓扑序、传递先修位集、缺少的先修课程、共享子树和写入前的循环检查"""
+    graph = PrerequisiteGraph(ttl=60)
+    graph.build(
+        {"C400": ["C300", "C310"], "C300": ["C200"], "C310": ["C200"], "C200": ["C100"]},
+        {"C100": "导论", "C200": "基础", "C300": "进阶A", "C310": "进阶B", "C400": "毕业设计"}
+    )
+    assert graph.order.index("C100") < graph.order.index("C200") < graph.order.index("C300")
+    closure = graph.all_prerequisites("C400")
+    assert sorted(closure) == ["C100", "C200", "C300", "C310"] and closure[:2] == ["C100", "C200"]
+    assert graph.missing("C400", ["C300", "C100"]) == ["C310"]
+    assert graph.missing("C100", []) == []
+
+    tree = graph.tree("C400")
+    assert [child["course_id"] for child in tree["prerequisites"]] == ["C300", "C310"]
+    assert tree["prerequisites"][0]["prerequisites"][0] is tree["prerequisites"][1]["prerequisites"][0]
+
+    for course_id, prerequisites in (("C100", ["C400"]), ("C200", ["C200"])):
+        try:
+            graph.check_new_prerequisites(course_id, prerequisites)
+        except CyclicPrerequisiteError as e:
+            assert e.cycle[0] == e.cycle[-1] == course_id
+        else:
+            raise AssertionError("应检测到循环")
+    graph.check_new_prerequisites("C100", ["C999"])
+
+    # 已有的循环（如直接改表）不会导致无限递归
+    graph.build({"A": ["B"], "B": ["A"], "C": ["A"]}, {})
+    assert graph.status()["cyclic_courses"] == ["A", "B", "C"]
+    assert set(graph.all_prerequisites("C")) == {"A", "B"}
+    assert graph.tree("A")["prerequisites"][0]["prerequisites"][0]["cycle"]
+
+
+def test_batch_enrollment():
+    """批量选课：一次检查整组课程的名额、重复和时间冲突，all_or_nothing 整组回滚，best_effort 跳过失败的课程"""
+    client = make_client()
+    add_student(client, "S001")
+    add_student(client, "S002")
+    for course_id, max_students, schedule in (
+        ("C001", 5, "周一 8:00-9:40"), ("C002", 5, "周一 9:00-10:40"),
+        ("C003", 1, "周二 8:00-9:40"), ("C004", 5, "周三 8:00-9:40")
+    ):
+        add_course(client, course_id, max_students=max_students)
+        client.update("courses", {"schedule": schedule}, {"course_id": course_id})
+    database = AsyncDatabase(client, max_concurrency=4, timeout=5)
+
+    async def run(student_id, add, drop, mode):
+        courses, enrollments = await batch_enrollment.load(database, student_id, add + drop)
+        errors = batch_enrollment.check(courses, enrollments, add, drop)
+        try:
+            return await database.run_transaction(
+                lambda tx: batch_enrollment.apply(tx, student_id, enrollments, add, drop, errors, mode)
+            )
+        except batch_enrollment.BatchRejectedError as e:
+            return e.results
+
+    results = asyncio.run(run("S001", ["C001", "C002", "C003"], [], batch_enrollment.BEST_EFFORT))
+    assert [result["success"] for result in results] == [True, False, True]
+    assert results[1]["message"].startswith("与已选课程时间冲突")
+
+    # C003 已满：整组不生效
+    results = asyncio.run(run("S002", ["C001", "C003"], [], batch_enrollment.ALL_OR_NOTHING))
+    assert not any(result["success"] for result in results) and results[1]["message"] == "课程选课人数已满"
+
+    # 退掉 C001 后 C002 不再冲突
+    results = asyncio.run(run("S001", ["C002", "C004"], ["C001"], batch_enrollment.ALL_OR_NOTHING))
+    assert [(result["action"], result["success"]) for result in results] == [
+        ("drop", True), ("add", True), ("add", True)
+    ]
+
+    success, rows, _ = client.select("courses", columns=["current_students"], order_by="course_id")
+    assert [row["current_students"] for row in rows] == [0, 1, 1, 1]
+
+
+def test_timetable_planner():
+    """选课方案规划：排除不能选的课程，按课程数或学分给出互不冲突的极大方案，超过时间上限时返回已找到的方案"""
+    client = make_client()
+    add_student(client, "S001")
+    for course_id, credits, schedule in (
+        ("C001", 4, "周一 8:00-9:40"), ("C002", 2, "周一 9:00-10:40"), ("C003", 2, "周一 10:00-11:40"),
+        ("C004", 3, "周二 8:00-9:40"), ("C005", 3, "周二 8:00-9:40"), ("C006", 1, "周三 8:00-9:40")
+    ):
+        add_course(client, course_id)
+        client.update("courses", {"credits": credits, "schedule": schedule}, {"course_id": course_id})
+    client.update("courses", {"current_students": 2}, {"course_id": "C005"})
+    database = AsyncDatabase(client, max_concurrency=4, timeout=5)
+    wishlist = ["C001", "C002", "C003", "C004", "C005", "C006", "NOPE"]
+    courses, enrollments = asyncio.run(batch_enrollment.load(database, "S001", wishlist))
+
+    result = planner.plan(courses, enrollments, wishlist, planner.COUNT)
+    assert result["complete"]
+    assert {item["course_id"] for item in result["excluded"]} == {"C005", "NOPE"}
+    # C002 与 C001、C003 都冲突：选 C001+C003 比只选 C002 多一门
+    assert [plan["course_ids"] for plan in result["plans"]] == [["C001", "C003", "C004", "C006"], ["C002", "C004", "C006"]]
+
+    result = planner.plan(courses, enrollments, wishlist, planner.CREDITS, limit=1)
+    assert result["plans"][0]["credits"] == 10 and result["plans"][0]["rank"] == 1
+
+    result = planner.search([courses["C001"], courses["C002"]], time_budget=0)
+    assert result["plans"] and result["plans"][0][0]["course_id"] in ("C001", "C002")
+
+
+def test_waitlist():
+    """候补：按加入顺序排队，退课释放的名额在同一事务中递补队首，调大人数时依次递补，已选上的候补跳过"""
+    client = make_client()
+    for student_id in ("S001", "S002", "S003", "S004"):
+        add_student(client, student_id)
+    add_course(client, "C001", max_students=1)
+    database = AsyncDatabase(client, max_concurrency=4, timeout=5)
+
+    async def run():
+        enrollment_id = await database.run_transaction(lambda tx: seats.enroll(tx, "S001", "C001"))
+        entries = [
+            await database.run_transaction(lambda tx, student_id=student_id: waitlist.join(tx, student_id, "C001"))
+            for student_id in ("S002", "S003", "S004")
+        ]
+        assert [entry["position"] for entry in entries] == [0, 1, 2]
+        try:
+            await database.run_transaction(lambda tx: waitlist.join(tx, "S002", "C001"))
+        except waitlist.AlreadyWaitlistedError:
+            pass
+        else:
+            raise AssertionError("重复候补应被拒绝")
+
+        async def drop(tx):
+            assert await seats.drop(tx, enrollment_id, "C001")
+            return await waitlist.promote(tx, "C001", limit=1)
+
+        promoted = await database.run_transaction(drop)
+        assert [item["student_id"] for item in promoted] == ["S002"]
+        rows = await waitlist.for_student(database, "S004")
+        assert rows[0]["position"] == 1
+
+        # S003 已通过其他途径选上：递补时跳过
+        await database.execute("UPDATE courses SET max_students = 2 WHERE course_id = 'C001'")
+        await database.run_transaction(lambda tx: seats.enroll(tx, "S003", "C001"))
+        await database.execute("UPDATE courses SET max_students = 3 WHERE course_id = 'C001'")
+        promoted = await database.run_transaction(lambda tx: waitlist.promote(tx, "C001"))
+        assert [item["student_id"] for item in promoted] == ["S004"]
+        assert await waitlist.for_student(database, "S003") == []
+        assert await database.run_transaction(lambda tx: waitlist.promote(tx, "C001")) == []
+
+    asyncio.run(run())
+    success, rows, _ = client.select("courses", columns=["current_students"], where={"course_id": "C001"})
+    assert rows[0]["current_students"] == 3
+
+
+def test_waitlist_promotion_checks():
+    """递补时按学生当前的选课记录检查：加入候补后选了时间冲突的课程或缺少先修课程的学生移出候补"""
+    client = make_client()
+    for student_id in ("S001", "S002", "S003"):
+        add_student(client, student_id)
+    add_course(client, "C001", max_students=0)
+    add_course(client, "C002", max_students=5)
+    client.update("courses", {"schedule": "周一 8:00-9:40", "schedule_mask": None}, {"course_id": "C001"})
+    client.update("courses", {"schedule": "周一 9:00-10:00", "schedule_mask": None}, {"course_id": "C002"})
+    database = AsyncDatabase(client, max_concurrency=4, timeout=5)
+    graph = PrerequisiteGraph(ttl=60)
+    graph.build({"C001": ["C000"]}, {})
+    client.insert("courses", {
+        "course_id": "C000", "course_name": "先修", "department_id": "CS", "credits": 1, "hours": 16
+    })
+    for student_id in ("S001", "S002"):
+        client.insert("enrollments", {"student_id": student_id, "course_id": "C000", "status": "completed"})
+
+    async def run():
+        for student_id in ("S001", "S002", "S003"):
+            await database.run_transaction(lambda tx, student_id=student_id: waitlist.join(tx, student_id, "C001"))
+        await database.run_transaction(lambda tx: seats.enroll(tx, "S001", "C002"))
+        await database.execute("UPDATE courses SET max_students = 3 WHERE course_id = 'C001'")
+        return await database.run_transaction(lambda tx: waitlist.promote(tx, "C001", prerequisites=graph))
+
+    promoted = asyncio.run(run())
+    assert [item["student_id"] for item in promoted] == ["S002"]
+    success, rows, _ = client.select("course_waitlists")
+    assert success and rows == []
+    success, rows, _ = client.select("courses", columns=["current_students"], where={"course_id": "C001"})
+    assert rows[0]["current_students"] == 1
+
+
+def test_registration_lottery():
+    """预选抽签：同一种子结果相同，遵守人数上限、时间冲突和先修课程，批量写入选课记录并清空志愿"""
+    client = make_client()
+    students = [f"S{i:03d}" for i in range(20)]
+    for student_id in students:
+        add_student(client, student_id)
+    for course_id, max_students, schedule in (
+        ("C001", 5, "周一 8:00-9:40"), ("C002", 30, "周一 9:00-10:40"), ("C003", 30, "周二 8:00-9:40"),
+        ("C004", 30, "周三 8:00-9:40")
+    ):
+        add_course(client, course_id, max_students=max_students)
+        client.update("courses", {"schedule": schedule}, {"course_id": course_id})
+    client.insert_many("registration_carts", [
+        {"student_id": student_id, "course_id": course_id, "choice_rank": rank}
+        for student_id in students
+        for rank, course_id in enumerate(["C001", "C002", "C003", "C004"], start=1)
+    ])
+    # S000 之前退过 C003，分配时恢复原记录
+    client.insert("enrollments", {"student_id": "S000", "course_id": "C003", "status": "dropped"})
+    graph = PrerequisiteGraph(ttl=60)
+    graph.build({"C004": ["C001"]}, {})
+    database = AsyncDatabase(client, max_concurrency=4, timeout=5)
+
+    data = asyncio.run(lottery.load(database))
+    result = lottery.allocate(data["carts"], data["courses"], data["enrollments"], seed=7, prerequisites=graph)
+    again = lottery.allocate(data["carts"], data["courses"], data["enrollments"], seed=7, prerequisites=graph)
+    assert result["assignments"] == again["assignments"]
+    assert lottery.lottery_order(students, 8) != lottery.lottery_order(students, 7)
+
+    stats = result["stats"]
+    by_course = {}
+    for student_id, course_id in result["assignments"]:
+        by_course.setdefault(course_id, []).append(student_id)
+    # C001 只有5个名额；没抽到 C001 的学生拿到与其冲突的 C002，C004 缺少先修课程
+    assert len(by_course["C001"]) == 5 and not set(by_course["C001"]) & set(by_course["C002"])
+    assert len(by_course["C002"]) == 15 and len(by_course["C003"]) == 20 and "C004" not in by_course
+    assert stats["rejected"] == {"prerequisite": 20, "full": 15, "conflict": 5}
+    assert stats["by_choice"] == {1: 5, 2: 15, 3: 20}
+
+    written = asyncio.run(database.run_transaction(
+        lambda tx: lottery.write(tx, result["assignments"], data["enrollments"])
+    ))
+    assert written == 40
+    success, rows, _ = client.select("courses", columns=["current_students"], order_by="course_id")
+    assert [row["current_students"] for row in rows] == [5, 15, 20, 0]
+    success, rows, _ = client.execute_raw_sql("SELECT COUNT(*) AS n FROM enrollments WHERE status = 'enrolled'")
+    assert rows[0]["n"] == 40
+    success, rows, _ = client.execute_raw_sql("SELECT COUNT(*) AS n FROM registration_carts")
+    assert rows[0]["n"] == 0
+
+    weighted = lottery.lottery_order(students, 7, {"S019": 1000.0})
+    assert weighted[0] == "S019"
+
+
+class DeadlockBackend(SQLiteBackend):
+    """前 deadlocks 次UPDATE返回死锁错误的SQLite后端"""
+
+    deadlocks = 0
+
+    def _run_unlocked(self, statement, params, fetch_results):
+        if self.deadlocks and statement.sql.lstrip().upper().startswith("UPDATE"):
+            self.deadlocks -= 1
+            raise DatabaseError("Deadlock found when trying to get lock; try restarting transaction", 1213)
+        return super()._run_unlocked(statement, params, fetch_results)
+
+
+def test_transaction_retry():
+    """死锁时整个事务回滚后重试（即使调用方忽略了失败的语句），重试用尽后抛出错误"""
+    backend = DeadlockBackend(":memory:")
+    client = MySQLCommandLineClient(backend)
+    add_student(client)
+    database = AsyncDatabase(client, max_concurrency=2, timeout=5)
+    policy = RetryPolicy(max_attempts=3, base_delay=0.001, max_delay=0.005, deadline=5)
+    attempts = []
+
+    async def charge(tx):
+        attempts.append(1)
+        await tx.insert("login_logs", {"user_id": "S001", "user_type": "student", "login_status": "success"})
+        # 忽略UPDATE的返回值，死锁仍会使事务回滚并重试
+        await tx.update("students", {"balance": Decimal("90.50")}, {"student_id": "S001"})
+        return "ok"
+
+    backend.deadlocks = 2
+    assert asyncio.run(database.run_transaction(charge, policy)) == "ok"
+    assert len(attempts) == 3
+    success, rows, _ = client.execute_raw_sql("SELECT COUNT(*) AS total FROM login_logs")
+    assert rows[0]["total"] == 1
+
+    backend.deadlocks = 3
+    try:
+        asyncio.run(database.run_transaction(charge, policy))
+        raise AssertionError("重试用尽后应抛出 DatabaseError")
+    except DatabaseError as e:
+        assert e.errno == 1213
+    stats = {entry["endpoint"]: entry for entry in transaction_stats()}["(background)"]
+    assert stats["retries"] >= 4 and stats["exhausted"] >= 1
+
+
+def test_app_in_process():
+    """应用在进程内以SQLite运行：健康检查、院系列表、令牌认证、创建课程、课程分页和选课"""
+    from main import app
+
+    with TestClient(app) as client:
+        response = client.get("/health")
+        assert response.status_code == 200
+        assert response.json()["database_backend"]["backend"] == "sqlite"
+
+        response = client.get("/api/v1/departments/")
+        assert response.status_code == 200
+        assert len(response.json()["data"]) == 5
+
+        # 直接写入学生，避免依赖bcrypt版本（注册和登录接口在此只验证令牌流程）
+        add_student(mysql_client, "20240001")
+        student_token = create_access_token(data={"sub": "20240001", "user_type": "student"})
+        student_headers = {"Authorization": f"Bearer {student_token}"}
+
+        response = client.get("/api/v1/auth/me", headers=student_headers)
+        assert response.status_code == 200, response.text
+
+        admin_token = create_access_token(data={"sub": "admin001", "user_type": "admin"})
+        response = client.post("/api/v1/courses/", headers={"Authorization": f"Bearer {admin_token}"}, json={
+            "course_id": "CS101", "course_name": "程序设计", "department_id": "CS",
+            "credits": 3, "hours": 48, "max_students": 30
+        })
+        assert response.status_code == 200, response.text
+
+        response = client.get("/api/v1/courses/", params={"page_size": 10})
+        assert response.status_code == 200, response.text
+        page = response.json()["data"]
+        assert page["total"] == 1 and [item["course_id"] for item in page["items"]] == ["CS101"]
+
+        response = client.post("/api/v1/enrollments/", headers=student_headers, json={"course_id": "CS101"})
+        assert response.status_code == 200, response.text
+
+        response = client.get("/api/v1/enrollments/my-courses", headers=student_headers)
+        assert response.status_code == 200, response.text
+        assert [item["course_id"] for item in response.json()["data"]] == ["CS101"]
+
+        response = client.post("/api/v1/courses/", headers={"Authorization": f"Bearer {admin_token}"}, json={
+            "course_id": "CS102", "course_name": "数据结构", "department_id": "CS",
+            "credits": 3, "hours": 48, "schedule": "周二 8:00-9:40"
+        })
+        assert response.status_code == 200, response.text
+        success, rows, _ = mysql_client.select("courses", columns=["schedule_mask"], where={"course_id": "CS102"})
+        assert rows[0]["schedule_mask"] == mask_to_text(compile_schedule("周二 8:00-9:40"))
+        mysql_client.update("courses", {"schedule": "周二 9:00-9:40"}, {"course_id": "CS101"})
+
+        response = client.get("/api/v1/courses/", headers=student_headers, params={"fits_schedule": True})
+        assert response.status_code == 200, response.text
+        assert response.json()["data"]["total"] == 0
+
+        response = client.post("/api/v1/enrollments/batch", headers=student_headers, json={
+            "add": ["CS101", "NOPE"], "mode": "all_or_nothing"
+        })
+        assert response.status_code == 400, response.text
+        assert [item["success"] for item in response.json()["data"]["results"]] == [False, False]
+
+        response = client.post("/api/v1/enrollments/batch", headers=student_headers, json={"drop": ["CS101"]})
+        assert response.status_code == 200, response.text
+        assert response.json()["data"]["succeeded"] == 1
+
+        response = client.get("/api/v1/courses/", headers=student_headers, params={"fits_schedule": True})
+        assert sorted(item["course_id"] for item in response.json()["data"]["items"]) == ["CS101", "CS102"]
+
+        admin_headers = {"Authorization": f"Bearer {admin_token}"}
+        # 按时间冲突筛选时未指定状态只返回开放的课程
+        response = client.put("/api/v1/courses/CS101", headers=admin_headers, json={"schedule": "周二 9:00-9:42"})
+        assert response.status_code == 400 and "5分钟" in response.json()["detail"]
+        response = client.post("/api/v1/courses/", headers=admin_headers, json={
+            "course_id": "CS110", "course_name": "停开课程", "department_id": "CS", "credits": 2, "hours": 32
+        })
+        assert response.status_code == 200, response.text
+        response = client.put("/api/v1/courses/CS110", headers=admin_headers, json={"status": "inactive"})
+        assert response.status_code == 200, response.text
+        response = client.get("/api/v1/courses/", headers=student_headers, params={"fits_schedule": True})
+        assert sorted(item["course_id"] for item in response.json()["data"]["items"]) == ["CS101", "CS102"]
+        response = client.get("/api/v1/courses/", headers=student_headers,
+                              params={"fits_schedule": True, "status": "inactive"})
+        assert [item["course_id"] for item in response.json()["data"]["items"]] == ["CS110"]
+        response = client.get("/api/v1/courses/", headers=student_headers, params={"fits_schedule": True, "page": 5})
+        assert response.status_code == 200, response.text
+        assert response.json()["data"]["items"] == [] and response.json()["data"]["total"] == 2
+        response = client.post("/api/v1/courses/", headers=admin_headers, json={
+            "course_id": "CS201", "course_name": "算法", "department_id": "CS",
+            "credits": 3, "hours": 48, "prerequisites": ["CS102"]
+        })
+        assert response.status_code == 200, response.text
+        assert response.json()["data"]["prerequisites"] == ["CS102"]
+        response = client.put("/api/v1/courses/CS102", headers=admin_headers, json={"prerequisites": ["CS201"]})
+        assert response.status_code == 400 and "循环" in response.json()["detail"]
+
+        response = client.post("/api/v1/enrollments/", headers=student_headers, json={"course_id": "CS201"})
+        assert response.status_code == 400 and "CS102" in response.json()["detail"]
+        response = client.get("/api/v1/courses/CS201/prerequisites", headers=student_headers)
+        assert response.json()["data"]["missing"] == ["CS102"]
+
+        # 读取选课记录失败时不跳过先修课程检查：返回500，熔断中返回503
+        async def failing_sql(*args, **kwargs):
+            return False, [], "读取失败"
+
+        unavailable = AsyncDatabase.unavailable
+        db.execute_raw_sql = failing_sql
+        try:
+            response = client.post("/api/v1/enrollments/", headers=student_headers, json={"course_id": "CS201"})
+            assert response.status_code == 500, response.text
+            AsyncDatabase.unavailable = property(lambda self: True)
+            response = client.post("/api/v1/enrollments/", headers=student_headers, json={"course_id": "CS201"})
+            assert response.status_code == 503, response.text
+            response = client.get("/api/v1/students/profile", headers=student_headers)
+            assert response.status_code == 503, response.text
+        finally:
+            del db.execute_raw_sql
+            AsyncDatabase.unavailable = unavailable
+        response = client.get("/api/v1/students/profile", headers=student_headers)
+        assert response.status_code == 200, response.text
+        success, rows, _ = mysql_client.select("enrollments", where={"course_id": "CS201"})
+        assert success and rows == []
+
+        response = client.post("/api/v1/enrollments/plan", headers=student_headers, json={
+            "course_ids": ["CS101", "CS102", "CS201"]
+        })
+        assert response.status_code == 200, response.text
+        data = response.json()["data"]
+        assert sorted(plan["course_ids"][0] for plan in data["plans"]) == ["CS101", "CS102"]
+        assert [item["course_id"] for item in data["excluded"]] == ["CS201"]
+
+        # CS102 只有一个名额：S002 候补，S001 退课后在同一事务中递补
+        mysql_client.update("courses", {"max_students": 1}, {"course_id": "CS102"})
+        response = client.post("/api/v1/enrollments/", headers=student_headers, json={"course_id": "CS102"})
+        assert response.status_code == 200, response.text
+        enrollment_id = response.json()["data"]["enrollment_id"]
+        add_student(mysql_client, "S002")
+        other_headers = {"Authorization": f"Bearer {create_access_token({'sub': 'S002', 'user_type': 'student'})}"}
+        response = client.post("/api/v1/enrollments/waitlist", headers=student_headers, json={"course_id": "CS102"})
+        assert response.status_code == 400
+        response = client.post("/api/v1/enrollments/waitlist", headers=other_headers, json={"course_id": "CS102"})
+        assert response.status_code == 200, response.text
+        assert response.json()["data"]["position"] == 0
+        response = client.delete(f"/api/v1/enrollments/{enrollment_id}", headers=student_headers)
+        assert response.status_code == 200, response.text
+        response = client.get("/api/v1/enrollments/waitlist", headers=other_headers)
+        assert response.json()["data"] == []
+        success, rows, _ = mysql_client.select("enrollments", columns=["status"], where={"student_id": "S002"})
+        assert [row["status"] for row in rows] == ["enrolled"]
+
+        response = client.post("/api/v1/enrollments/waitlist", headers=student_headers, json={"course_id": "CS102"})
+        assert response.status_code == 200, response.text
+        response = client.put("/api/v1/courses/CS102", headers=admin_headers, json={"max_students": 2})
+        assert response.status_code == 200, response.text
+        assert response.json()["data"]["current_students"] == 2
+
+        # 预选窗口内提交志愿，窗口结束后抽签；CS101 与已选上的 CS102 冲突
+        window = (settings.REGISTRATION_CART_OPENS_AT, settings.REGISTRATION_CART_CLOSES_AT)
+        try:
+            settings.REGISTRATION_CART_OPENS_AT = "2000-01-01 00:00:00"
+            settings.REGISTRATION_CART_CLOSES_AT = "2999-01-01 00:00:00"
+            response = client.put("/api/v1/enrollments/cart", headers=student_headers,
+                                  json={"course_ids": ["CS101", "NOPE"]})
+            assert response.status_code == 400 and "NOPE" in response.json()["detail"]
+            response = client.put("/api/v1/enrollments/cart", headers=student_headers, json={"course_ids": ["CS101"]})
+            assert response.status_code == 200, response.text
+            assert [item["choice_rank"] for item in response.json()["data"]] == [1]
+            response = client.post("/api/v1/admin/registration-lottery", headers=admin_headers, json={"seed": 1})
+            assert response.status_code == 400
+
+            settings.REGISTRATION_CART_CLOSES_AT = "2000-01-02 00:00:00"
+            response = client.put("/api/v1/enrollments/cart", headers=student_headers, json={"course_ids": []})
+            assert response.status_code == 400
+            response = client.post("/api/v1/admin/registration-lottery", headers=admin_headers,
+                                   json={"seed": 1, "dry_run": True})
+            assert response.status_code == 200, response.text
+            assert response.json()["data"]["rejected"] == {"conflict": 1}
+            response = client.post("/api/v1/admin/registration-lottery", headers=admin_headers, json={"seed": 1})
+            assert response.status_code == 200, response.text
+            assert client.get("/api/v1/enrollments/cart", headers=student_headers).json()["data"] == []
+        finally:
+            settings.REGISTRATION_CART_OPENS_AT, settings.REGISTRATION_CART_CLOSES_AT = window
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"✅ {name}")